@@ -0,0 +1,89 @@
+"""
+归档读取的基准测试：直接从 zip 读取（ArchiveSource）对比先解压到临时目录再生成
+
+生成一个 GitHub 风格的 zip（所有文件在 repo-main/ 下）：一个 --files 个模块的包、一个文档目录，
+和一个更大的不需要的目录（--extra-files 个文件，例如测试数据、前端资源），然后分别：
+- extract：zipfile.extractall 到临时目录，再 merge_from_dir 包和文档目录（原来 gen_github_proj_* 的做法）
+- archive：set_project_propery(archive=ArchiveSource(...))，按目录和后缀过滤后只解压需要的成员
+
+并检查两种方式的输出逐字节相同。
+
+运行:
+    python benchmarks/bench_archive_source.py --files 2000 --extra-files 20000
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+import zipfile
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from nb_ai_context import AiMdGenerator  # noqa: E402
+from nb_ai_context.archive_source import ArchiveSource  # noqa: E402
+from bench_parallel_metadata import make_synthetic_module  # noqa: E402
+
+SUFFIXES = [".py", ".md"]
+
+
+def make_zip(path: str, n_files: int, n_extra: int, lines: int):
+    source = make_synthetic_module(lines)
+    with zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED) as zf:
+        zf.writestr("repo-main/README.md", "# repo\n")
+        for i in range(n_files):
+            zf.writestr(f"repo-main/pkg/sub_{i // 100:03d}/module_{i:05d}.py", source.replace("Service", f"Service{i}_"))
+        for i in range(n_files // 10):
+            zf.writestr(f"repo-main/docs/page_{i:04d}.md", f"# page {i}\n\n" + "some text\n" * 100)
+        for i in range(n_extra):
+            zf.writestr(f"repo-main/frontend/assets/asset_{i:06d}.js", "var x = 1;\n" * 200)
+
+
+def build(generator: AiMdGenerator) -> bytes:
+    with generator.output_session():
+        generator.merge_from_files(["README.md"], as_title="README")
+        for name in ["docs", "pkg"]:
+            generator.merge_from_dir(name, as_title=name, should_include_suffixes=SUFFIXES, use_gitignore=False)
+    return generator.read_bytes()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--files", type=int, default=2000)
+    parser.add_argument("--extra-files", type=int, default=20000, help="不需要的目录中的文件数")
+    parser.add_argument("--lines", type=int, default=100, help="每个模块的行数")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as root:
+        archive = os.path.join(root, "repo.zip")
+        make_zip(archive, args.files, args.extra_files, args.lines)
+        print(f"zip: {os.path.getsize(archive) / 1024 / 1024:.1f} MB, "
+              f"{args.files} modules + {args.extra_files} unneeded files")
+
+        start = time.perf_counter()
+        with tempfile.TemporaryDirectory() as temp_dir:
+            with zipfile.ZipFile(archive) as zf:
+                zf.extractall(temp_dir)
+            extracted = build(AiMdGenerator(os.path.join(root, "extract.md")).set_project_propery(
+                "repo", os.path.join(temp_dir, "repo-main")))
+        extract_seconds = time.perf_counter() - start
+
+        start = time.perf_counter()
+        source = ArchiveSource(archive, os.path.join(root, "virtual"), include_dirs=["docs", "pkg"],
+                               include_files=["README.md"], should_include_suffixes=SUFFIXES)
+        from_archive = build(AiMdGenerator(os.path.join(root, "archive.md")).set_project_propery(
+            "repo", os.path.join(root, "virtual"), archive=source))
+        archive_seconds = time.perf_counter() - start
+        stats = source.stats()
+        source.close()
+
+    print(f"{'backend':<8} {'seconds':>8}")
+    print(f"{'extract':<8} {extract_seconds:>8.2f}")
+    print(f"{'archive':<8} {archive_seconds:>8.2f}   ({stats['files']} of {stats['members']} members selected)")
+    print(f"speedup: {extract_seconds / archive_seconds:.2f}x, identical: {extracted == from_archive}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,143 @@
+"""
+AST 元数据提取引擎的基准测试
+
+生成 1k / 10k / 50k 行的合成模块，测量 ModuleAstExtractor 的耗时，
+并打印每千行耗时，用来证明提取时间与模块大小是线性关系。
+
+加上 --with-legacy 会同时测量旧版嵌套 ast.walk 的实现（只在 1k 行上跑，更大的模块旧实现要跑几十分钟）。
+
+运行:
+    python benchmarks/bench_ast_extractor.py
+    python benchmarks/bench_ast_extractor.py --sizes 1000 10000 50000 --with-legacy
+"""
+
+import argparse
+import ast
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from nb_ai_context.ast_extractor import (  # noqa: E402
+    extract_class_metadata,
+    extract_function_metadata,
+    extract_import_records,
+    extract_module_metadata,
+)
+
+_CLASS_TEMPLATE = '''
+class Service{i}(Base{i}):
+    """Service {i} docstring"""
+    timeout: int = {i}
+    name = "service_{i}"
+
+    def __init__(self, url: str, retries: int = 3, **kwargs):
+        self.url = url
+        self.retries = retries
+
+    def fetch(self, key: str, default=None) -> dict:
+        """fetch {i}"""
+        def _inner(x):
+            return x
+        return {{"key": key}}
+
+    @property
+    def size(self) -> int:
+        return {i}
+
+
+def helper_{i}(a, b: int = 1, *args) -> int:
+    import json
+    if a:
+        return a + b
+    return b
+'''
+
+
+def make_synthetic_module(n_lines: int) -> str:
+    """生成大约 n_lines 行的合成 Python 模块"""
+    parts = ['"""synthetic module"""', "import os", "from typing import List"]
+    line_count = len(parts)
+    template_lines = _CLASS_TEMPLATE.count("\n")
+    i = 0
+    while line_count < n_lines:
+        parts.append("class Base{i}: pass".format(i=i))
+        parts.append(_CLASS_TEMPLATE.format(i=i))
+        line_count += template_lines + 1
+        i += 1
+    return "\n".join(parts)
+
+
+def legacy_extract(tree):
+    """旧版 _parse_python_file_ast 的遍历逻辑（嵌套 ast.walk）"""
+    classes, functions, imports = [], [], []
+    for node in ast.walk(tree):
+        if isinstance(node, ast.ClassDef):
+            parent = None
+            for potential_parent in ast.walk(tree):
+                if isinstance(potential_parent, ast.ClassDef) and node in ast.walk(potential_parent) and node != potential_parent:
+                    parent = potential_parent
+                    break
+            if parent is None:
+                classes.append(extract_class_metadata(node))
+        elif isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)):
+            parent_class = None
+            for potential_parent in ast.walk(tree):
+                if isinstance(potential_parent, ast.ClassDef) and node in ast.walk(potential_parent):
+                    parent_class = potential_parent
+                    break
+            if parent_class is None:
+                functions.append(extract_function_metadata(node))
+        elif isinstance(node, (ast.Import, ast.ImportFrom)):
+            imports.extend(extract_import_records(node))
+    return classes, functions, imports
+
+
+def _best_of(func, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+
+def run(sizes, repeat=3, with_legacy=False) -> list:
+    results = []
+    for n_lines in sizes:
+        source = make_synthetic_module(n_lines)
+        tree = ast.parse(source)
+        elapsed = _best_of(lambda: extract_module_metadata(tree, "synthetic.py"), repeat)
+        row = {
+            "lines": n_lines,
+            "extract_seconds": elapsed,
+            "ms_per_1k_lines": elapsed * 1000 / (n_lines / 1000),
+        }
+        if with_legacy and n_lines <= 1000:
+            row["legacy_seconds"] = _best_of(lambda: legacy_extract(tree), 1)
+        results.append(row)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 50000])
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--with-legacy", action="store_true")
+    args = parser.parse_args()
+
+    results = run(args.sizes, args.repeat, args.with_legacy)
+    print(f"{'lines':>8} {'extract(s)':>12} {'ms/1k lines':>12} {'legacy(s)':>10}")
+    for row in results:
+        legacy = f"{row['legacy_seconds']:.3f}" if "legacy_seconds" in row else "-"
+        print(f"{row['lines']:>8} {row['extract_seconds']:>12.4f} {row['ms_per_1k_lines']:>12.3f} {legacy:>10}")
+
+    # 线性判定：每千行耗时在最小和最大规模之间的波动不超过 3 倍
+    per_k = [row["ms_per_1k_lines"] for row in results]
+    ratio = max(per_k) / min(per_k)
+    print(f"\nms/1k-lines max/min ratio: {ratio:.2f} ({'linear' if ratio < 3 else 'NOT linear'})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""
+输出文件 I/O 基准测试：20 个章节的链式构建
+
+对比两种方式的累计读写字节数：
+- legacy: 每个章节结束后调用 ensure_utf8_bom()（旧版 merge_from_files 的做法），每次都要读取整个输出文件
+- current: BOM 在文件创建时写一次，不再有每个章节的整文件读取
+
+读写字节数来自 /proc/self/io 的 rchar / wchar（仅 Linux）。legacy 的累计读取量随章节数平方增长，
+current 的读写量与输出大小成线性关系。
+
+运行:
+    python benchmarks/bench_bom_io.py --sections 20 --files-per-section 20 --file-kb 64
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from nb_ai_context import AiMdGenerator  # noqa: E402
+
+
+def read_proc_io() -> dict:
+    with open("/proc/self/io") as f:
+        return {k: int(v) for k, v in (line.split(": ") for line in f)}
+
+
+def make_project(root: str, sections: int, files_per_section: int, file_kb: int):
+    body = ("x = 'synthetic line for the io benchmark'\n" * (file_kb * 1024 // 42 + 1))
+    for s in range(sections):
+        d = os.path.join(root, f"section_{s:02d}")
+        os.makedirs(d)
+        for i in range(files_per_section):
+            with open(os.path.join(d, f"f_{i:03d}.txt"), "w", encoding="utf-8") as f:
+                f.write(body)
+
+
+def run(root: str, sections: int, legacy: bool) -> list:
+    generator = AiMdGenerator(os.path.join(root, "out.md")).set_project_propery("bench", root).clear_text()
+    rows = []
+    start = read_proc_io()
+    for s in range(sections):
+        generator.merge_from_dir(f"section_{s:02d}", as_title=f"section {s}", use_gitignore=False)
+        if legacy:
+            generator.ensure_utf8_bom()
+        now = read_proc_io()
+        rows.append((s + 1, os.path.getsize(generator), now["rchar"] - start["rchar"], now["wchar"] - start["wchar"]))
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sections", type=int, default=20)
+    parser.add_argument("--files-per-section", type=int, default=20)
+    parser.add_argument("--file-kb", type=int, default=64)
+    args = parser.parse_args()
+    if not os.path.exists("/proc/self/io"):
+        sys.exit("this benchmark needs /proc/self/io (Linux)")
+
+    with tempfile.TemporaryDirectory() as root:
+        make_project(root, args.sections, args.files_per_section, args.file_kb)
+        results = {mode: run(root, args.sections, legacy=(mode == "legacy")) for mode in ("legacy", "current")}
+
+    mb = 1024 * 1024
+    print(f"{'sections':>8} {'output MB':>10} {'legacy read MB':>15} {'current read MB':>16} {'current write MB':>17}")
+    for legacy_row, current_row in zip(results["legacy"], results["current"]):
+        print(f"{current_row[0]:>8} {current_row[1] / mb:>10.2f} {legacy_row[2] / mb:>15.2f} "
+              f"{current_row[2] / mb:>16.2f} {current_row[3] / mb:>17.2f}")
+    final = results["current"][-1]
+    print(f"\ncurrent: read/output = {final[2] / final[1]:.2f}, write/output = {final[3] / final[1]:.2f}")
+    legacy_final = results["legacy"][-1]
+    print(f"legacy : read/output = {legacy_final[2] / legacy_final[1]:.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""
+评审上下文的基准测试：merge_changed_since（只合并变化的文件和依赖它们的文件）对比合并整个包
+
+为每个 --files 大小（默认 1000 和 4000）生成一个 git 仓库：一个包，每个模块 import 另外两个模块，提交后修改 --changes 个模块，
+然后分别：
+- full：merge_from_dir 整个包 + add_file_dependencies，评审时要把整个包交给 AI
+- changed：merge_changed_since("HEAD")，diff + 变化文件的源码 + 依赖它们的文件的元数据
+
+并检查 merge_changed_since 找到的依赖文件与完整依赖分析的结果相同。
+changed 的时间应该基本不随包的大小增长（列出文件和读取文本前缀过滤仍然与文件数有关）。
+
+运行:
+    python benchmarks/bench_changed_since.py --files 1000 4000 --changes 5
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from nb_ai_context import AiMdGenerator  # noqa: E402
+
+
+def make_repo(root: str, n_files: int, lines: int):
+    pkg = os.path.join(root, "pkg")
+    os.makedirs(pkg)
+    open(os.path.join(pkg, "__init__.py"), "w").close()
+    body = "".join(f"\n\ndef function_{j}(value):\n    return value + {j}\n" for j in range(lines // 3))
+    for i in range(n_files):
+        with open(os.path.join(pkg, f"module_{i:05d}.py"), "w", encoding="utf-8") as f:
+            f.write(f"from pkg import module_{(i * 7 + 3) % n_files:05d}\n"
+                    f"from .module_{(i + 1) % n_files:05d} import function_0\n{body}")
+    git = ["git", "-C", root, "-c", "user.name=bench", "-c", "user.email=bench@example.com"]
+    subprocess.run(git + ["init", "-q"], check=True)
+    subprocess.run(git + ["add", "-A"], check=True)
+    subprocess.run(git + ["commit", "-q", "-m", "bench"], check=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--files", type=int, nargs="+", default=[1000, 4000])
+    parser.add_argument("--lines", type=int, default=150, help="每个模块的行数")
+    parser.add_argument("--changes", type=int, default=5, help="修改的模块数")
+    args = parser.parse_args()
+
+    rows = []
+    for n_files in args.files:
+        with tempfile.TemporaryDirectory() as root:
+            root = os.path.realpath(root)
+            make_repo(root, n_files, args.lines)
+            changed = [f"pkg/module_{(i * 997) % n_files:05d}.py" for i in range(args.changes)]
+            for path in changed:
+                with open(os.path.join(root, path), "a", encoding="utf-8") as f:
+                    f.write("\n\ndef added_in_review():\n    return None\n")
+
+            full = AiMdGenerator(os.path.join(root, "full.md")).set_project_propery("bench", root)
+            start = time.perf_counter()
+            with full.output_session():
+                full.merge_from_dir("pkg", as_title="pkg").add_file_dependencies()
+            full_seconds = time.perf_counter() - start
+
+            review = AiMdGenerator(os.path.join(root, "review.md")).set_project_propery("bench", root)
+            start = time.perf_counter()
+            with review.output_session():
+                review.merge_changed_since("HEAD")
+            changed_seconds = time.perf_counter() - start
+
+            all_py = full._list_project_py_files(Path(root))
+            reverse_deps = full._analyze_file_dependencies(all_py, root)["reverse_deps"]
+            expected = sorted({d for path in changed for d in reverse_deps[path]} - set(changed))
+            text = review.read_text(encoding="utf-8-sig")
+            found = sorted(p for p in all_py if f"Python File Metadata: `{p}`" in text.split("dependents (metadata only)")[-1])
+            rows.append((n_files, full_seconds, full.stat().st_size, changed_seconds, review.stat().st_size, found == expected))
+
+    print(f"{'files':>6} {'full s':>8} {'full KB':>9} {'changed s':>10} {'changed KB':>11} {'deps match':>11}")
+    for n_files, full_seconds, full_size, changed_seconds, changed_size, match in rows:
+        print(f"{n_files:>6} {full_seconds:>8.2f} {full_size / 1024:>9.0f} {changed_seconds:>10.2f} "
+              f"{changed_size / 1024:>11.0f} {str(match):>11}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+"""
+下载缓存的基准测试：每次重新下载 GitHub 归档对比 DownloadCache
+
+本地的 http.server 代替 codeload.github.com，按 --mbps 限速发送一个 --size-mb 的归档（带 ETag），
+每种方式重复 --runs 次：
+- no cache：每次下载到新的临时目录（原来 gen_github_proj_* 的做法）
+- tag：refs/tags/... 的 URL，第一次下载后直接使用缓存，不访问服务器
+- branch：refs/heads/main 的 URL，第一次下载后每次发送 If-None-Match，服务器返回 304
+- resume：第一次下载在一半处断开，重试时用 Range 只下载剩下的一半
+
+运行:
+    python benchmarks/bench_download_cache.py --size-mb 50 --mbps 200 --runs 5
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from nb_ai_context.download_cache import DownloadCache  # noqa: E402
+
+ETAG = '"bench"'
+
+
+def make_handler(data: bytes, bytes_per_second: float):
+    class Handler(BaseHTTPRequestHandler):
+        requests = 0
+        bytes_sent = 0
+        truncate_next = 0
+
+        def log_message(self, *args):
+            pass
+
+        def do_GET(self):
+            type(self).requests += 1
+            if self.headers.get("If-None-Match") == ETAG:
+                self.send_response(304)
+                self.send_header("ETag", ETAG)
+                self.end_headers()
+                return
+            start = 0
+            if self.headers.get("Range") and self.headers.get("If-Range") == ETAG:
+                start = int(self.headers["Range"].split("=")[1].rstrip("-"))
+                self.send_response(206)
+                self.send_header("Content-Range", f"bytes {start}-{len(data) - 1}/{len(data)}")
+            else:
+                self.send_response(200)
+            self.send_header("ETag", ETAG)
+            self.send_header("Content-Length", str(len(data) - start))
+            self.end_headers()
+            end = len(data)
+            if type(self).truncate_next:
+                end, type(self).truncate_next = start + type(self).truncate_next, 0
+                self.close_connection = True
+            chunk = 256 * 1024
+            for offset in range(start, end, chunk):
+                piece = data[offset:min(offset + chunk, end)]
+                self.wfile.write(piece)
+                type(self).bytes_sent += len(piece)
+                time.sleep(len(piece) / bytes_per_second)
+
+    return Handler
+
+
+def timed(fn) -> float:
+    start = time.perf_counter()
+    fn()
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--size-mb", type=float, default=50)
+    parser.add_argument("--mbps", type=float, default=200, help="模拟的带宽（MB/s）")
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    data = os.urandom(int(args.size_mb * 1024 * 1024))
+    handler = make_handler(data, args.mbps * 1024 * 1024)
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    base = f"http://127.0.0.1:{httpd.server_address[1]}/owner/repo/zip/refs"
+
+    def no_cache():
+        with tempfile.TemporaryDirectory() as temp_dir:
+            DownloadCache(temp_dir).fetch(base + "/heads/main")
+
+    results = []
+    with tempfile.TemporaryDirectory() as cache_dir:
+        for name, fn in [
+            ("no cache", no_cache),
+            ("tag", lambda: DownloadCache(cache_dir).fetch(base + "/tags/1.0")),
+            ("branch", lambda: DownloadCache(cache_dir).fetch(base + "/heads/main")),
+        ]:
+            handler.requests, handler.bytes_sent = 0, 0
+            seconds = [timed(fn) for _ in range(args.runs)]
+            results.append((name, seconds[0], sum(seconds[1:]) / max(len(seconds) - 1, 1),
+                            handler.requests, handler.bytes_sent))
+
+        handler.requests, handler.bytes_sent = 0, 0
+        handler.truncate_next = len(data) // 2
+        cache = DownloadCache(os.path.join(cache_dir, "resume"))
+        seconds = timed(lambda: cache.fetch(base + "/tags/2.0"))
+        results.append(("resume", seconds, seconds, handler.requests, handler.bytes_sent))
+        with open(cache.fetch(base + "/tags/2.0"), "rb") as f:
+            resumed_ok = f.read() == data
+    httpd.shutdown()
+
+    print(f"archive: {args.size_mb:.0f} MB at {args.mbps:.0f} MB/s, {args.runs} runs")
+    print(f"{'mode':<9} {'first s':>8} {'repeat s':>9} {'requests':>9} {'MB sent':>8}")
+    for name, first, repeat, requests, sent in results:
+        print(f"{name:<9} {first:>8.3f} {repeat:>9.4f} {requests:>9} {sent / 1024 / 1024:>8.1f}")
+    print(f"resumed download identical: {resumed_ok}")
+
+
+if __name__ == "__main__":
+    main()
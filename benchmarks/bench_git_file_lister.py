@@ -0,0 +1,96 @@
+"""
+文件枚举基准测试：PruningDirWalker（scandir + .gitignore 匹配）对比 GitFileLister（git ls-files）
+
+生成一个 git 仓库：--files 个被跟踪的源文件（默认 100000 个，分布在两层目录中）、
+一个被 .gitignore 忽略的 node_modules 目录和一些被忽略的 *.log 文件，然后分别用两种方式列出 src 目录的文件，
+每种方式运行 --repeat 次取最好成绩，并检查结果和顺序完全相同。
+
+两种方式都会读取每个文件的前 1KB 判断是否文本文件，这部分 I/O 两者相同。
+
+运行:
+    python benchmarks/bench_git_file_lister.py --files 100000
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from nb_ai_context.dir_walker import PruningDirWalker  # noqa: E402
+from nb_ai_context.git_file_lister import GitFileLister  # noqa: E402
+from nb_ai_context.gitignore_matcher import GitIgnoreMatcher  # noqa: E402
+
+
+def make_repo(root: str, n_files: int):
+    with open(os.path.join(root, ".gitignore"), "w") as f:
+        f.write("node_modules/\n*.log\n__pycache__/\n*.pyc\nbuild/\n")
+    per_dir = 100
+    for i in range(n_files):
+        directory = os.path.join(root, "src", f"pkg_{i // (per_dir * 10):03d}", f"mod_{i // per_dir % 10}")
+        if i % per_dir == 0:
+            os.makedirs(directory)
+            with open(os.path.join(directory, "debug.log"), "w") as f:
+                f.write("log\n")
+        suffix = ".py" if i % 4 else ".md"
+        with open(os.path.join(directory, f"file_{i:06d}{suffix}"), "w") as f:
+            f.write(f"value = {i}\n")
+    for i in range(n_files // 5):
+        directory = os.path.join(root, "src", "node_modules", f"dep_{i // 100:04d}")
+        if i % 100 == 0:
+            os.makedirs(directory)
+        with open(os.path.join(directory, f"index_{i}.js"), "w") as f:
+            f.write("module.exports = 1\n")
+    git = ["git", "-C", root, "-c", "user.name=bench", "-c", "user.email=bench@example.com"]
+    subprocess.run(git + ["init", "-q"], check=True)
+    subprocess.run(git + ["add", "-A"], check=True)
+    subprocess.run(git + ["commit", "-q", "-m", "bench"], check=True)
+
+
+def best_of(repeat: int, func) -> (float, list):
+    best, result = None, None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--files", type=int, default=100000)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--suffix", action="append", default=[], help="only include this suffix, e.g. .py")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as root:
+        root = os.path.realpath(root)
+        start = time.perf_counter()
+        make_repo(root, args.files)
+        print(f"created a repo with {args.files} tracked files in {time.perf_counter() - start:.1f}s")
+        target = os.path.join(root, "src")
+
+        def walk():
+            # 每次新建匹配器，.gitignore 的读取和编译也计入
+            walker = PruningDirWalker(root, gitignore_matcher=GitIgnoreMatcher(root), should_include_suffixes=args.suffix)
+            return list(walker.walk(target))
+
+        def git_list():
+            return list(GitFileLister(root, root, should_include_suffixes=args.suffix).walk(target))
+
+        walk_seconds, walked = best_of(args.repeat, walk)
+        git_seconds, listed = best_of(args.repeat, git_list)
+
+    print(f"{'backend':<16} {'seconds':>8} {'files':>8}")
+    print(f"{'PruningDirWalker':<16} {walk_seconds:>8.3f} {len(walked):>8}")
+    print(f"{'GitFileLister':<16} {git_seconds:>8.3f} {len(listed):>8}")
+    print(f"speedup: {walk_seconds / git_seconds:.2f}x, identical: {walked == listed}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+"""
+历史版本生成的基准测试：set_project_propery(git_rev=...)（cat-file 读取对象）对比检出到临时目录再生成
+
+生成一个 git 仓库：一个有 --files 个合成模块的包（默认 500 个），之后提交 --revisions 个版本（默认 10 个），
+每个版本修改一部分模块，然后为每个版本生成一份上下文：
+- worktree：git worktree add 把该版本检出到临时目录，按检出的目录生成，再删除临时目录
+- git_rev：工作区不动，通过一个常驻的 git cat-file --batch 进程读取该版本的 tree 和 blob
+
+git_rev 使用 AST 元数据缓存目录（见 ast_cache）：缓存按路径索引，git_rev 的路径在各个版本之间不变，
+没有变化的模块不会重新解析。每个临时目录的路径都不同，缓存不会命中，所以 worktree 不使用缓存。
+最后检查每个版本两种方式的输出逐字节相同。
+
+运行:
+    python benchmarks/bench_git_revision.py --files 500 --revisions 10
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from nb_ai_context import AiMdGenerator  # noqa: E402
+from bench_parallel_metadata import make_package  # noqa: E402
+
+
+def git(root: str, *args: str) -> str:
+    command = ["git", "-C", root, "-c", "user.name=bench", "-c", "user.email=bench@example.com", *args]
+    return subprocess.run(command, check=True, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL).stdout.decode().strip()
+
+
+def make_history(root: str, n_files: int, lines: int, n_revisions: int, changes: int) -> list:
+    make_package(root, n_files, lines)
+    git(root, "init", "-q")
+    git(root, "add", "-A")
+    git(root, "commit", "-q", "-m", "rev 0")
+    revisions = [git(root, "rev-parse", "HEAD")]
+    for r in range(1, n_revisions):
+        for i in range(changes):
+            with open(os.path.join(root, "pkg", f"module_{(r * 7919 + i * 104729) % n_files:05d}.py"), "a") as f:
+                f.write(f"\n\ndef changed_in_rev_{r}_{i}():\n    return {r}\n")
+        git(root, "commit", "-q", "-a", "-m", f"rev {r}")
+        revisions.append(git(root, "rev-parse", "HEAD"))
+    return revisions
+
+
+def build(project_root: str, output: str, cache_dir: str = None, git_rev: str = None) -> bytes:
+    generator = AiMdGenerator(output).set_project_propery("bench", project_root, cache_dir=cache_dir, git_rev=git_rev)
+    with generator.output_session():
+        generator.merge_from_dir("pkg", as_title="pkg", use_gitignore=False)
+        generator.add_file_dependencies()
+    return generator.read_bytes()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--files", type=int, default=500)
+    parser.add_argument("--lines", type=int, default=200, help="每个模块的行数")
+    parser.add_argument("--revisions", type=int, default=10)
+    parser.add_argument("--changes", type=int, default=20, help="每个版本修改的模块数")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as root:
+        root = os.path.realpath(root)
+        start = time.perf_counter()
+        revisions = make_history(root, args.files, args.lines, args.revisions, args.changes)
+        print(f"created {args.revisions} revisions of {args.files} modules in {time.perf_counter() - start:.1f}s")
+        output_dir = os.path.join(root, "out")
+        os.makedirs(output_dir)
+
+        start = time.perf_counter()
+        from_rev = [
+            build(root, os.path.join(output_dir, f"rev_{i}.md"), os.path.join(output_dir, "rev_cache"), git_rev=rev)
+            for i, rev in enumerate(revisions)
+        ]
+        rev_seconds = time.perf_counter() - start
+
+        start = time.perf_counter()
+        from_checkout = []
+        for i, rev in enumerate(revisions):
+            checkout = os.path.join(root, "worktrees", f"rev_{i}")
+            git(root, "worktree", "add", "-q", "--detach", checkout, rev)
+            from_checkout.append(build(checkout, os.path.join(output_dir, f"co_{i}.md")))
+            git(root, "worktree", "remove", "--force", checkout)
+        checkout_seconds = time.perf_counter() - start
+
+    print(f"{'backend':<10} {'seconds':>8} {'per rev':>8}")
+    print(f"{'worktree':<10} {checkout_seconds:>8.2f} {checkout_seconds / len(revisions):>8.3f}")
+    print(f"{'git_rev':<10} {rev_seconds:>8.2f} {rev_seconds / len(revisions):>8.3f}")
+    print(f"speedup: {checkout_seconds / rev_seconds:.2f}x, identical: {from_rev == from_checkout}")
+
+
+if __name__ == "__main__":
+    main()
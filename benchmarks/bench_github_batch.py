@@ -0,0 +1,112 @@
+"""
+批量生成 GitHub 项目的基准测试：逐个下载、生成（每个项目一个串行脚本的做法）对比 gen_github_projects_batch
+
+本地的 http.server 代替 codeload.github.com，提供 --repos 个 zip（每个 --files 个模块），
+每个连接先等待 --latency-ms 再按 --mbps 限速发送，模拟真实的下载。两种方式都不使用下载缓存，
+并检查每个项目的输出逐字节相同。
+
+运行:
+    python benchmarks/bench_github_batch.py --repos 12 --files 300 --max-parallel 4
+"""
+
+import argparse
+import io
+import os
+import sys
+import tempfile
+import threading
+import time
+import zipfile
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from nb_ai_context.contrib.gen_github_proj_ai_md import (  # noqa: E402
+    _build_github_project, downloaded_archive, gen_github_projects_batch,
+)
+from bench_parallel_metadata import make_synthetic_module  # noqa: E402
+
+
+def make_zip(repo: str, n_files: int, lines: int) -> bytes:
+    source = make_synthetic_module(lines)
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w", zipfile.ZIP_DEFLATED) as zf:
+        zf.writestr(f"{repo}-main/README.md", f"# {repo}\n")
+        for i in range(n_files):
+            zf.writestr(f"{repo}-main/{repo}/sub_{i // 50:03d}/module_{i:05d}.py", source.replace("Service", f"Service{i}_"))
+    return buffer.getvalue()
+
+
+def make_handler(zips: dict, latency: float, bytes_per_second: float):
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, *args):
+            pass
+
+        def do_GET(self):
+            data = zips.get(self.path)
+            if data is None:
+                self.send_error(404)
+                return
+            time.sleep(latency)
+            self.send_response(200)
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            chunk = 64 * 1024
+            for offset in range(0, len(data), chunk):
+                self.wfile.write(data[offset:offset + chunk])
+                time.sleep(min(chunk, len(data) - offset) / bytes_per_second)
+
+    return Handler
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repos", type=int, default=12)
+    parser.add_argument("--files", type=int, default=300, help="每个项目的模块数")
+    parser.add_argument("--lines", type=int, default=100, help="每个模块的行数")
+    parser.add_argument("--latency-ms", type=float, default=300)
+    parser.add_argument("--mbps", type=float, default=2, help="每个连接的带宽（MB/s）")
+    parser.add_argument("--max-parallel", type=int, default=4)
+    args = parser.parse_args()
+
+    repos = [f"repo{i:02d}" for i in range(args.repos)]
+    zips = {f"/owner/{repo}/zip/refs/heads/main": make_zip(repo, args.files, args.lines) for repo in repos}
+    handler = make_handler(zips, args.latency_ms / 1000, args.mbps * 1024 * 1024)
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    base = f"http://127.0.0.1:{httpd.server_address[1]}"
+    total_mb = sum(len(data) for data in zips.values()) / 1024 / 1024
+    print(f"{args.repos} repos, {total_mb:.1f} MB of zips, {args.latency_ms:.0f} ms latency, {args.mbps} MB/s per connection")
+
+    with tempfile.TemporaryDirectory() as out_dir:
+        def specs(mode: str):
+            return [dict(github_zip_url=f"{base}/owner/{repo}/zip/refs/heads/main", project_name=repo,
+                         output_md_path=os.path.join(out_dir, f"{repo}.{mode}.md"), should_include_suffixes=[".py", ".md"])
+                    for repo in repos]
+
+        start = time.perf_counter()
+        for spec in specs("serial"):
+            with downloaded_archive(spec["github_zip_url"], use_download_cache=False) as zip_file:
+                _build_github_project(zip_file, **spec)
+        serial_seconds = time.perf_counter() - start
+
+        start = time.perf_counter()
+        results = gen_github_projects_batch(specs("batch"), max_parallel=args.max_parallel, use_download_cache=False)
+        batch_seconds = time.perf_counter() - start
+
+        identical = all(
+            Path(out_dir, f"{repo}.serial.md").read_bytes() == Path(out_dir, f"{repo}.batch.md").read_bytes()
+            for repo in repos
+        )
+    httpd.shutdown()
+
+    print(f"{'mode':<8} {'seconds':>8}")
+    print(f"{'serial':<8} {serial_seconds:>8.2f}")
+    print(f"{'batch':<8} {batch_seconds:>8.2f}   (max_parallel={args.max_parallel}, "
+          f"{sum(r.error is None for r in results)}/{len(results)} ok)")
+    print(f"speedup: {serial_seconds / batch_seconds:.2f}x, identical: {identical}")
+
+
+if __name__ == "__main__":
+    main()
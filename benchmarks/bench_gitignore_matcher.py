@@ -0,0 +1,144 @@
+"""
+GitIgnoreMatcher 基准测试与正确性校验
+
+在临时目录里生成一个约 50k 文件的 git 仓库（带根目录 .gitignore、嵌套 .gitignore 和 .git/info/exclude），然后：
+1. 测量旧版 fnmatch 逐模式匹配（merge_from_dir 原来的做法）的耗时
+2. 测量 GitIgnoreMatcher 的耗时
+3. 用 `git check-ignore --stdin` 的结果校验 GitIgnoreMatcher 的正确性
+
+运行:
+    python benchmarks/bench_gitignore_matcher.py --files 50000
+"""
+
+import argparse
+import fnmatch
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from nb_ai_context.gitignore_matcher import GitIgnoreMatcher  # noqa: E402
+
+ROOT_GITIGNORE = """
+*.pyc
+__pycache__/
+/build/
+dist/
+*.log
+!important.log
+*.egg-info/
+.venv/
+node_modules/
+docs/**/_build/
+**/generated/
+coverage*
+*.tmp
+!keep.tmp
+data/*.csv
+.idea/
+*.so
+"""
+
+NESTED_GITIGNORE = """
+*.md
+!README.md
+/local_*.py
+fixtures/
+"""
+
+_NAMES = ["core", "utils", "api", "models", "views", "tasks", "helpers", "io", "net", "db"]
+_SUFFIXES = [".py", ".py", ".py", ".pyc", ".md", ".log", ".tmp", ".csv", ".txt", ".so"]
+
+
+def make_tree(root: str, n_files: int, seed: int = 0) -> list:
+    """生成 n_files 个空文件，返回它们的相对 posix 路径"""
+    rnd = random.Random(seed)
+    tops = ["src", "build", "dist", "docs", "node_modules", "data", "tests", "pkg"]
+    paths = set()
+    while len(paths) < n_files:
+        depth = rnd.randint(1, 5)
+        parts = [rnd.choice(tops)]
+        for _ in range(depth - 1):
+            parts.append(rnd.choice(_NAMES + ["__pycache__", "generated", "_build", "fixtures"]))
+        name = f"{rnd.choice(_NAMES)}_{rnd.randint(0, 300)}{rnd.choice(_SUFFIXES)}"
+        if rnd.random() < 0.02:
+            name = rnd.choice(["important.log", "keep.tmp", "README.md", "local_x.py"])
+        paths.add("/".join(parts + [name]))
+    for rel in paths:
+        abs_path = os.path.join(root, *rel.split("/"))
+        os.makedirs(os.path.dirname(abs_path), exist_ok=True)
+        open(abs_path, "w").close()
+    for d in ("src", "pkg", "tests"):
+        os.makedirs(os.path.join(root, d), exist_ok=True)
+        with open(os.path.join(root, d, ".gitignore"), "w") as f:
+            f.write(NESTED_GITIGNORE)
+    with open(os.path.join(root, ".gitignore"), "w") as f:
+        f.write(ROOT_GITIGNORE)
+    return sorted(paths)
+
+
+def legacy_is_ignored(rel_path: str, patterns: list) -> bool:
+    """merge_from_dir 原来的 fnmatch 做法"""
+    for p in patterns:
+        p_glob = f"**/{p.strip('/')}" if '/' not in p.strip('/') else p
+        if fnmatch.fnmatch(rel_path, p_glob) or fnmatch.fnmatch(rel_path, p):
+            return True
+    return False
+
+
+def git_check_ignore(root: str, paths: list) -> set:
+    env = dict(os.environ, HOME=root, GIT_CONFIG_NOSYSTEM="1")
+    proc = subprocess.run(
+        ["git", "-c", "core.excludesFile=", "check-ignore", "--stdin", "-z"],
+        cwd=root, input="\0".join(paths) + "\0", capture_output=True, text=True, env=env,
+    )
+    return {p for p in proc.stdout.split("\0") if p}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--files", type=int, default=50000)
+    parser.add_argument("--skip-git", action="store_true", help="不调用 git check-ignore 做正确性校验")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as root:
+        subprocess.run(["git", "init", "-q", root], check=True)
+        with open(os.path.join(root, ".git", "info", "exclude"), "w") as f:
+            f.write("secret_*\n")
+        t0 = time.perf_counter()
+        paths = make_tree(root, args.files)
+        print(f"generated {len(paths)} files in {time.perf_counter() - t0:.2f}s")
+
+        patterns = [line.strip() for line in ROOT_GITIGNORE.splitlines() if line.strip() and not line.startswith("#")]
+        t0 = time.perf_counter()
+        legacy_ignored = sum(1 for p in paths if legacy_is_ignored(p, patterns))
+        legacy_seconds = time.perf_counter() - t0
+
+        t0 = time.perf_counter()
+        matcher = GitIgnoreMatcher(root)
+        ignored = {p for p in paths if matcher.is_ignored(p)}
+        matcher_seconds = time.perf_counter() - t0
+
+        print(f"legacy fnmatch   : {legacy_seconds:8.3f}s  ({legacy_ignored} ignored, root .gitignore only)")
+        print(f"GitIgnoreMatcher : {matcher_seconds:8.3f}s  ({len(ignored)} ignored)")
+        print(f"speedup          : {legacy_seconds / matcher_seconds:8.1f}x")
+
+        if not args.skip_git:
+            t0 = time.perf_counter()
+            expected = git_check_ignore(root, paths)
+            print(f"git check-ignore : {time.perf_counter() - t0:8.3f}s  ({len(expected)} ignored)")
+            mismatches = sorted(ignored ^ expected)
+            print(f"mismatches vs git: {len(mismatches)}")
+            for p in mismatches[:20]:
+                print(f"  {p}  matcher={p in ignored} git={p in expected}")
+            if mismatches:
+                sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+"""
+增量生成的基准测试：修改一个文件后重新生成
+
+生成一个有 N 个合成模块的包（默认 5000 个），依次：
+1. incremental=True 第一次生成（没有清单，相当于完整生成并写出清单）
+2. 修改其中一个文件，incremental=True 重新生成
+3. 完整生成（incremental=False）作为对照
+
+打印每一步的耗时、复用的文件块数，并检查增量生成与完整生成的输出逐字节相同。
+
+运行:
+    python benchmarks/bench_incremental_build.py --files 5000
+"""
+
+import argparse
+import hashlib
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from nb_ai_context import AiMdGenerator  # noqa: E402
+from bench_parallel_metadata import make_package  # noqa: E402
+
+
+def build(root: str, name: str, incremental: bool) -> (float, str, dict):
+    generator = AiMdGenerator(os.path.join(root, name)).set_project_propery("bench", root)
+    start = time.perf_counter()
+    generator.open_output_session(incremental=incremental)
+    generator.merge_from_dir("pkg", as_title="pkg", use_gitignore=False)
+    stats = generator._get_incremental_build().stats() if incremental else {}
+    generator.commit_output_session()
+    elapsed = time.perf_counter() - start
+    return elapsed, hashlib.sha256(generator.read_bytes()).hexdigest(), stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--files", type=int, default=5000)
+    parser.add_argument("--lines", type=int, default=300, help="每个模块的行数")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as root:
+        make_package(root, args.files, args.lines)
+        first = build(root, "incremental.md", incremental=True)
+
+        edited = os.path.join(root, "pkg", f"module_{args.files // 2:05d}.py")
+        with open(edited, "a", encoding="utf-8") as f:
+            f.write("\n\ndef edited_function(x: int) -> int:\n    return x + 1\n")
+        rebuild = build(root, "incremental.md", incremental=True)
+        clean = build(root, "clean.md", incremental=False)
+
+    print(f"{args.files} files x {args.lines} lines, one file edited")
+    print(f"{'build':<28} {'seconds':>9} {'reused':>7} {'rendered':>9}")
+    for label, (elapsed, _, stats) in [
+        ("incremental (no manifest)", first), ("incremental after 1 edit", rebuild), ("clean", clean),
+    ]:
+        print(f"{label:<28} {elapsed:>9.2f} {stats.get('reused', '-'):>7} {stats.get('rendered', '-'):>9}")
+    print(f"speedup over clean build: {clean[0] / rebuild[0]:.1f}x, identical to clean build: {rebuild[1] == clean[1]}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,55 @@
+"""
+内存分析模式（profile_memory=True）的基准测试
+
+在 synthetic_repo 生成的项目上运行 bench_suite 的 full_chain，分别关闭、开启内存分析，比较耗时，
+并打印开启时的报告：每个阶段、章节的峰值内存，持有内存最多的分配位置，module_registry 中占用最多的文件。
+关闭时 BuildStats 每个阶段只多一次 None 判断，两次关闭的运行之间的差别就是噪声。
+
+运行:
+    python benchmarks/bench_memory_profile.py --files 2000
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from nb_ai_context import AiMdGenerator  # noqa: E402
+from bench_suite import stage_full_chain  # noqa: E402
+from synthetic_repo import PACKAGE, make_synthetic_repo  # noqa: E402
+
+
+def run(root: str, repo: dict, output: str, profile_memory: bool) -> (float, AiMdGenerator):
+    generator = AiMdGenerator(output).set_project_propery(PACKAGE, root, profile_memory=profile_memory).clear_text()
+    start = time.perf_counter()
+    stage_full_chain(generator, repo)
+    return time.perf_counter() - start, generator
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--files", type=int, default=2000)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        root = os.path.join(temp_dir, "repo")
+        repo = make_synthetic_repo(root, args.files)
+        output = os.path.join(temp_dir, "out.md")
+        disabled = min(run(root, repo, output, False)[0] for _ in range(args.repeat))
+        enabled, generator = run(root, repo, output, True)
+        report = generator.stats.memory.format_report()
+        generator.stats.memory.stop()
+
+    print(f"files: {args.files}")
+    print(f"full_chain, profile_memory=False: {disabled:.3f}s (best of {args.repeat})")
+    print(f"full_chain, profile_memory=True:  {enabled:.3f}s ({enabled / disabled:.1f}x)")
+    print(report)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+"""
+流式输出的峰值内存基准测试
+
+生成 N 个大小为 S 的文件，用 tracemalloc 测量 merge_from_dir 的峰值内存，
+并与输出文件大小、最大单文件大小对比。流式写入后峰值内存应该只和最大单文件大小相关，与输出总大小无关。
+
+运行:
+    python benchmarks/bench_output_memory.py --files 200 --file-kb 256
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from nb_ai_context import AiMdGenerator  # noqa: E402
+
+
+def make_project(root: str, n_files: int, file_kb: int):
+    pkg = os.path.join(root, "pkg")
+    os.makedirs(pkg)
+    line = "# 中文注释 mixed english comment line for the synthetic file\n"
+    body = line * max(1, file_kb * 1024 // len(line.encode("utf-8")))
+    for i in range(n_files):
+        with open(os.path.join(pkg, f"doc_{i:05d}.md"), "w", encoding="utf-8") as f:
+            f.write(body)
+    return len(body.encode("utf-8"))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--files", type=int, default=200)
+    parser.add_argument("--file-kb", type=int, default=256)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as root:
+        largest = make_project(root, args.files, args.file_kb)
+        print(f"files            : {args.files}")
+        print(f"largest file     : {largest / 1024 / 1024:8.2f} MB")
+        for use_session in (False, True):
+            generator = AiMdGenerator(os.path.join(root, "out.md")).set_project_propery("bench", root).clear_text()
+            tracemalloc.start()
+            t0 = time.perf_counter()
+            if use_session:
+                generator.open_output_session()
+            generator.merge_from_dir("pkg", as_title="bench", use_gitignore=False)
+            generator.commit_output_session()
+            elapsed = time.perf_counter() - t0
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            output_size = os.path.getsize(generator)
+            print(f"[{'output session' if use_session else 'direct append '}] "
+                  f"output {output_size / 1024 / 1024:.2f} MB, peak traced {peak / 1024 / 1024:.2f} MB "
+                  f"(peak/output {peak / output_size:.3f}), {elapsed:.2f}s")
+
+if __name__ == "__main__":
+    main()
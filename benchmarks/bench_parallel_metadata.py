@@ -0,0 +1,69 @@
+"""
+多进程 AST 元数据提取的基准测试
+
+生成一个有 N 个合成模块的包，用 merge_from_dir 分别以 workers=1,2,4,...,cpu_count 生成文档，
+打印耗时和相对 workers=1 的加速比，并检查每次的输出与 workers=1 逐字节相同。
+
+运行:
+    python benchmarks/bench_parallel_metadata.py --files 3000
+    python benchmarks/bench_parallel_metadata.py --files 3000 --workers 1 2 4 8 16 32
+"""
+
+import argparse
+import hashlib
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from nb_ai_context import AiMdGenerator  # noqa: E402
+from bench_ast_extractor import make_synthetic_module  # noqa: E402
+
+
+def make_package(root: str, n_files: int, lines_per_file: int):
+    pkg = os.path.join(root, "pkg")
+    os.makedirs(pkg)
+    source = make_synthetic_module(lines_per_file)
+    for i in range(n_files):
+        with open(os.path.join(pkg, f"module_{i:05d}.py"), "w", encoding="utf-8") as f:
+            f.write(source.replace("Service", f"Service{i}_"))
+
+
+def build(root: str, workers: int) -> (float, str):
+    generator = AiMdGenerator(os.path.join(root, f"out_{workers}.md")).set_project_propery("bench", root)
+    generator.clear_text()
+    start = time.perf_counter()
+    with generator.output_session():
+        generator.merge_from_dir("pkg", as_title="pkg", use_gitignore=False, workers=workers)
+    elapsed = time.perf_counter() - start
+    digest = hashlib.sha256(generator.read_bytes()).hexdigest()
+    generator.unlink()
+    return elapsed, digest
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--files", type=int, default=3000)
+    parser.add_argument("--lines", type=int, default=300, help="每个模块的行数")
+    parser.add_argument("--workers", type=int, nargs="+", default=None)
+    args = parser.parse_args()
+
+    cpu_count = os.cpu_count() or 1
+    workers_list = args.workers or sorted({1} | {2 ** i for i in range(1, 8) if 2 ** i <= cpu_count} | {cpu_count})
+
+    with tempfile.TemporaryDirectory() as root:
+        make_package(root, args.files, args.lines)
+        results = [(workers,) + build(root, workers) for workers in workers_list]
+
+    base_time, base_digest = results[0][1], results[0][2]
+    print(f"{args.files} files x {args.lines} lines, cpu_count={cpu_count}")
+    print(f"{'workers':>8} {'seconds':>9} {'speedup':>8} {'identical':>10}")
+    for workers, elapsed, digest in results:
+        print(f"{workers:>8} {elapsed:>9.2f} {base_time / elapsed:>7.2f}x {str(digest == base_digest):>10}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+"""
+排除规则（path_exclusions.PathExclusions）的基准测试
+
+在 synthetic_repo 生成的项目的文件列表上，用 6 个排除目录和 3 个排除文件（与 funboost 的生成脚本规模相当）判断每个文件
+是否被排除，比较三种做法：
+
+- parents：最早的 merge_from_dir，对每个文件 resolve()，再与每个排除目录比较 path == d or d in path.parents
+- realpath：之后的遍历器，目录用绝对路径集合判断，文件每个调用一次 os.path.realpath
+- trie：PathExclusions，按路径分段在前缀树上前进，不访问文件系统
+
+运行:
+    python benchmarks/bench_path_exclusions.py --files 10000
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from nb_ai_context.path_exclusions import PathExclusions  # noqa: E402
+from synthetic_repo import PACKAGE, make_synthetic_repo  # noqa: E402
+
+EXCLUDED_DIRS = [f"{PACKAGE}/sub_0001", f"{PACKAGE}/sub_0003/sub_0005", "docs/section_01", "docs/section_02/part_1",
+                 f"{PACKAGE}/sub_0019", "build"]
+EXCLUDED_FILES = ["README.md", f"{PACKAGE}/module_000000.py", "docs/section_00/page_000012.md"]
+
+
+def list_files(root: str) -> list:
+    relative_paths = []
+    for current, dirs, files in os.walk(root):
+        dirs.sort()
+        prefix = os.path.relpath(current, root).replace(os.sep, "/")
+        prefix = "" if prefix == "." else prefix + "/"
+        relative_paths.extend(prefix + name for name in sorted(files))
+    return relative_paths
+
+
+def by_parents(root: str, relative_paths: list) -> int:
+    root_path = Path(root)
+    excluded_dirs = {(root_path / d).resolve() for d in EXCLUDED_DIRS}
+    excluded_files = {(root_path / f).resolve() for f in EXCLUDED_FILES}
+    excluded = 0
+    for relative_path in relative_paths:
+        path_obj = (root_path / relative_path).resolve()
+        if any(path_obj == d or d in path_obj.parents for d in excluded_dirs) or path_obj in excluded_files:
+            excluded += 1
+    return excluded
+
+
+def by_realpath(root: str, relative_paths: list) -> int:
+    excluded_dirs = {os.path.join(root, *d.split("/")) for d in EXCLUDED_DIRS}
+    excluded_files = {os.path.realpath(os.path.join(root, *f.split("/"))) for f in EXCLUDED_FILES}
+    excluded = 0
+    for relative_path in relative_paths:
+        parts = relative_path.split("/")
+        path = os.path.join(root, *parts)
+        # 遍历器在进入每一级目录时比较一次
+        if any(os.path.join(root, *parts[:i]) in excluded_dirs for i in range(1, len(parts))) or \
+                os.path.realpath(path) in excluded_files:
+            excluded += 1
+    return excluded
+
+
+def by_trie(root: str, relative_paths: list) -> int:
+    exclusions = PathExclusions.for_root(root, EXCLUDED_DIRS, EXCLUDED_FILES)
+    return sum(1 for relative_path in relative_paths if exclusions.is_excluded_file(relative_path))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--files", type=int, default=10000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        root = os.path.realpath(os.path.join(temp_dir, "repo"))
+        make_synthetic_repo(root, args.files)
+        relative_paths = list_files(root)
+        results = {}
+        for name, method in (("parents", by_parents), ("realpath", by_realpath), ("trie", by_trie)):
+            start = time.perf_counter()
+            excluded = method(root, relative_paths)
+            results[name] = (time.perf_counter() - start, excluded)
+
+    print(f"{len(relative_paths)} paths, {len(EXCLUDED_DIRS)} excluded dirs, {len(EXCLUDED_FILES)} excluded files")
+    for name, (seconds, excluded) in results.items():
+        print(f"{name:<9} {seconds * 1000:>9.1f} ms  {seconds / len(relative_paths) * 1e6:>7.2f} us/path  excluded {excluded}")
+
+
+if __name__ == "__main__":
+    main()
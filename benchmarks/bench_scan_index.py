@@ -0,0 +1,76 @@
+"""
+扫描索引（scan_index.ScanIndex）的基准测试
+
+在 synthetic_repo 生成的项目上，像 gen_funboost.py 那样对同一个项目多次调用 merge_from_dir（整个包、子包、文档，
+不同的后缀），再用第二个生成器重复一遍，比较每次调用 scan 阶段的耗时：
+
+- scan_index=False：每次都遍历目录、匹配 .gitignore
+- 共享的 ScanIndex：第一次遍历，之后在内存中过滤（命中时检查目录的 mtime）
+
+运行:
+    python benchmarks/bench_scan_index.py --files 10000
+    python benchmarks/bench_scan_index.py --files 10000 --file-enumerator git
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from nb_ai_context import AiMdGenerator  # noqa: E402
+from nb_ai_context.scan_index import ScanIndex  # noqa: E402
+from synthetic_repo import PACKAGE, make_synthetic_repo  # noqa: E402
+
+QUERIES = [
+    (".", [".md"]),
+    (PACKAGE, [".py"]),
+    (f"{PACKAGE}/sub_0001", [".py", ".md"]),
+    ("docs", [".md"]),
+]
+
+
+def scan_seconds(root: str, output: str, scan_index, file_enumerator: str) -> list:
+    """每个查询的 scan 耗时，两个生成器各运行一遍"""
+    seconds = []
+    for _ in range(2):
+        generator = AiMdGenerator(output).set_project_propery(PACKAGE, root, scan_index=scan_index).clear_text()
+        for relative_dir, suffixes in QUERIES:
+            before = generator.stats.stages.get("scan")
+            before = before.seconds if before is not None else 0.0
+            generator.merge_from_dir(relative_dir, as_title=relative_dir, should_include_suffixes=suffixes,
+                                     include_ast_metadata=False, include_file_text=False, file_enumerator=file_enumerator)
+            seconds.append(generator.stats.stages["scan"].seconds - before)
+    return seconds
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--files", type=int, default=10000)
+    parser.add_argument("--file-enumerator", choices=["walk", "git"], default="walk")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        root = os.path.join(temp_dir, "repo")
+        make_synthetic_repo(root, args.files)
+        if args.file_enumerator == "git":
+            subprocess.run(["git", "init", "-q", root], check=True)
+            subprocess.run(["git", "-C", root, "add", "-A"], check=True)
+        output = os.path.join(temp_dir, "out.md")
+        without_index = scan_seconds(root, output, False, args.file_enumerator)
+        index = ScanIndex()
+        with_index = scan_seconds(root, output, index, args.file_enumerator)
+
+    print(f"files: {args.files}, file_enumerator: {args.file_enumerator}, index: {index.stats()}")
+    print(f"{'generator':>9} {'dir':<20} {'suffixes':<14} {'no index ms':>12} {'index ms':>10}")
+    for i, (without, with_) in enumerate(zip(without_index, with_index)):
+        relative_dir, suffixes = QUERIES[i % len(QUERIES)]
+        print(f"{i // len(QUERIES) + 1:>9} {relative_dir:<20} {','.join(suffixes):<14} {without * 1000:>12.2f} {with_ * 1000:>10.2f}")
+    print(f"total: {sum(without_index) * 1000:.1f} ms without index, {sum(with_index) * 1000:.1f} ms with a shared index")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,150 @@
+"""
+基准测试套件：在 1k / 10k / 100k 个文件的合成项目上分阶段计时，结果写成 JSON
+
+每个规模用 synthetic_repo.make_synthetic_repo 生成一个项目，对下面每个阶段各用一个新的生成器运行 --repeat 次，
+记录最短时间、所有运行的时间和输出大小：
+
+- merge_from_dir：merge_from_dir(".", should_include_suffixes=[".py", ".md"])，包括 .gitignore 过滤、读取、AST 元数据
+- add_project_summary：项目概述和 3 个核心文件的元数据、依赖
+- add_file_dependencies：整个项目的依赖分析
+- full_chain：README 里的完整链式调用（概述、auto_merge_from_python_project_some_files、源码、文档、依赖）
+
+结果用 compare_bench_results.py 与提交在仓库中的基线（benchmarks/bench_suite_baseline.json）比较。
+基线与机器有关，换了机器需要在同一台机器上先用 --output benchmarks/bench_suite_baseline.json 重新生成。
+
+运行:
+    python benchmarks/bench_suite.py --sizes 1000 10000 --output /tmp/bench_suite.json
+    python benchmarks/bench_suite.py --sizes 100000 --repeat 1 --work-dir /tmp/bench_repos --output /tmp/bench_100k.json
+    python benchmarks/compare_bench_results.py benchmarks/bench_suite_baseline.json /tmp/bench_suite.json
+"""
+
+import argparse
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import typing
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from nb_ai_context import AiMdGenerator  # noqa: E402
+from synthetic_repo import PACKAGE, make_synthetic_repo  # noqa: E402
+
+SUFFIXES = [".py", ".md"]
+
+
+def stage_merge_from_dir(generator: AiMdGenerator, repo: dict):
+    generator.merge_from_dir(".", as_title="all files", should_include_suffixes=SUFFIXES)
+
+
+def stage_add_project_summary(generator: AiMdGenerator, repo: dict):
+    generator.add_project_summary("synthetic project", repo["core_files"])
+
+
+def stage_add_file_dependencies(generator: AiMdGenerator, repo: dict):
+    generator.add_file_dependencies()
+
+
+def stage_full_chain(generator: AiMdGenerator, repo: dict):
+    (generator
+     .add_project_summary("synthetic project", repo["core_files"])
+     .auto_merge_from_python_project_some_files()
+     .merge_from_dir(PACKAGE, as_title="source code", should_include_suffixes=[".py"])
+     .merge_from_dir("docs", as_title="docs", should_include_suffixes=[".md"])
+     .add_file_dependencies())
+
+
+STAGES = {
+    "merge_from_dir": stage_merge_from_dir,
+    "add_project_summary": stage_add_project_summary,
+    "add_file_dependencies": stage_add_file_dependencies,
+    "full_chain": stage_full_chain,
+}
+
+
+def prepare_repo(work_dir: str, n_files: int, seed: int) -> typing.Tuple[str, dict]:
+    """生成（或者复用 work_dir 中参数相同的）合成项目，返回项目目录和 make_synthetic_repo 的结果"""
+    root = os.path.join(work_dir, f"synthetic_{n_files}_{seed}")
+    marker = os.path.join(root, ".synthetic.json")
+    if os.path.exists(marker):
+        with open(marker, encoding="utf-8") as f:
+            counts = json.load(f)
+        print(f"reusing {root}: {counts}")
+        return root, counts
+    shutil.rmtree(root, ignore_errors=True)
+    start = time.perf_counter()
+    counts = make_synthetic_repo(root, n_files, seed)
+    print(f"generated {root} in {time.perf_counter() - start:.1f}s: {counts}")
+    with open(marker, "w", encoding="utf-8") as f:
+        json.dump(counts, f)
+    return root, counts
+
+
+def run_stage(root: str, repo: dict, output_dir: str, name: str, repeat: int) -> dict:
+    runs, output_bytes = [], 0
+    for _ in range(repeat):
+        output = os.path.join(output_dir, f"{name}.md")
+        generator = AiMdGenerator(output).set_project_propery(PACKAGE, root).clear_text()
+        start = time.perf_counter()
+        STAGES[name](generator, repo)
+        runs.append(time.perf_counter() - start)
+        output_bytes = os.path.getsize(output)
+        os.remove(output)
+    # 最后一次运行的分阶段统计（见 build_stats.BuildStats），定位回退发生在扫描、读取、解析、渲染还是写入
+    return {"seconds": min(runs), "runs": [round(r, 4) for r in runs], "output_bytes": output_bytes,
+            "stages": generator.stats.to_dict()["stages"]}
+
+
+def environment() -> dict:
+    try:
+        commit = subprocess.run(["git", "-C", str(Path(__file__).resolve().parents[1]), "rev-parse", "--short", "HEAD"],
+                                stdout=subprocess.PIPE, stderr=subprocess.DEVNULL).stdout.decode().strip()
+    except OSError:
+        commit = ""
+    return {
+        "commit": commit,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "time": time.strftime("%Y-%m-%d %H:%M:%S"),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000], help="合成项目的文件数，例如 1000 10000 100000")
+    parser.add_argument("--stages", nargs="+", choices=list(STAGES), default=list(STAGES))
+    parser.add_argument("--repeat", type=int, default=3, help="每个阶段运行的次数，结果取最短时间")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--work-dir", default=None, help="保存生成的项目，之后的运行直接复用；默认用临时目录")
+    parser.add_argument("--output", default=None, help="结果 JSON 的路径")
+    args = parser.parse_args()
+
+    results = {"environment": environment(), "repeat": args.repeat, "seed": args.seed, "results": {}}
+    with tempfile.TemporaryDirectory() as temp_dir:
+        work_dir = args.work_dir or temp_dir
+        os.makedirs(work_dir, exist_ok=True)
+        for n_files in args.sizes:
+            root, repo = prepare_repo(work_dir, n_files, args.seed)
+            size_results = results["results"][str(n_files)] = {}
+            for name in args.stages:
+                size_results[name] = run_stage(root, repo, temp_dir, name, args.repeat)
+
+    print(f"{'files':>8} {'stage':<22} {'seconds':>9} {'output MB':>10}")
+    for n_files, size_results in results["results"].items():
+        for name, result in size_results.items():
+            print(f"{n_files:>8} {name:<22} {result['seconds']:>9.3f} {result['output_bytes'] / 1024 / 1024:>10.1f}")
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+            f.write("\n")
+        print(f"results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
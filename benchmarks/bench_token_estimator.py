@@ -0,0 +1,124 @@
+"""
+token 估算基准测试：准确度和速度
+
+准确度：与参考分词器（cl100k_base）在 fixtures/token_reference_cl100k.json 上的 token 数对比，
+按类别（python 源码、英文 markdown、中文 markdown、生成的文档）输出平均相对误差和总量比例，
+并与旧的"非中文字符数 / 4 + 中文字符数"估算对比。
+
+速度：把样本重复拼接成 --mb 大小的文档，按样本大小逐块调用 TokenAccounting.add()（与生成器写入时相同），
+输出总耗时和吞吐量。
+
+运行:
+    python benchmarks/bench_token_estimator.py --mb 300
+
+    # 重新生成参考数据（需要 pip install tiktoken，并能下载 cl100k_base）
+    python benchmarks/bench_token_estimator.py --regenerate
+
+    # 按参考数据重新拟合 token_estimator._COEFFICIENTS（需要 numpy）
+    python benchmarks/bench_token_estimator.py --fit
+"""
+
+import argparse
+import json
+import math
+import re
+import sys
+import time
+from collections import OrderedDict
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from nb_ai_context import token_estimator  # noqa: E402
+from nb_ai_context.token_estimator import TokenAccounting, estimate_tokens, token_features  # noqa: E402
+
+FIXTURE = Path(__file__).resolve().parent / "fixtures" / "token_reference_cl100k.json"
+
+_CJK_RE = re.compile(r"[一-鿿㐀-䶿　-〿＀-￯]")
+
+
+def legacy_estimate(text: str) -> int:
+    cjk = len(_CJK_RE.findall(text))
+    return cjk + math.ceil((len(text) - cjk) / 4)
+
+
+def load_samples() -> list:
+    with open(FIXTURE, encoding="utf-8") as f:
+        return json.load(f)["samples"]
+
+
+def regenerate():
+    import tiktoken
+
+    encoding = tiktoken.get_encoding("cl100k_base")
+    with open(FIXTURE, encoding="utf-8") as f:
+        data = json.load(f)
+    for sample in data["samples"]:
+        sample["tokens"] = len(encoding.encode_ordinary(sample["text"]))
+    with open(FIXTURE, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False, indent=1)
+    print(f"regenerated {len(data['samples'])} samples in {FIXTURE}")
+
+
+def fit(samples: list):
+    import numpy as np
+
+    names = [name for name, _ in token_estimator._COEFFICIENTS]
+    x = np.array([[token_features(s["text"])[name] for name in names] for s in samples], dtype=float)
+    y = np.array([s["tokens"] for s in samples], dtype=float)
+    coef, *_ = np.linalg.lstsq(x, y, rcond=None)
+    print("_COEFFICIENTS = (")
+    for name, value in zip(names, coef):
+        print(f"    ({name!r}, {round(float(value), 3)}),")
+    print(")")
+
+
+def report_accuracy(samples: list):
+    by_category = OrderedDict()
+    for sample in samples:
+        by_category.setdefault(sample["category"], []).append(sample)
+    by_category["all"] = samples
+    print(f"{'category':<12} {'samples':>7} {'tokens':>8} | {'mean err':>8} {'max err':>8} {'total':>6} | {'legacy err':>10} {'total':>6}")
+    for category, items in by_category.items():
+        row = [category, len(items), sum(s["tokens"] for s in items)]
+        for estimate in (estimate_tokens, legacy_estimate):
+            errors = [abs(estimate(s["text"]) - s["tokens"]) / s["tokens"] for s in items]
+            total = sum(estimate(s["text"]) for s in items) / sum(s["tokens"] for s in items)
+            row.append((sum(errors) / len(errors), max(errors), total))
+        (err, max_err, total), (legacy_err, _, legacy_total) = row[3], row[4]
+        print(f"{row[0]:<12} {row[1]:>7} {row[2]:>8} | {err:>8.1%} {max_err:>8.1%} {total:>6.3f} | {legacy_err:>10.1%} {legacy_total:>6.3f}")
+
+
+def report_speed(samples: list, mb: int):
+    blocks = [s["text"] for s in samples]
+    target = mb * 1024 * 1024
+    accounting = TokenAccounting().begin_section("bench")
+    written = 0
+    start = time.perf_counter()
+    while written < target:
+        for block in blocks:
+            accounting.add(block)
+            written += len(block)
+    elapsed = time.perf_counter() - start
+    print(f"\nestimated {written / 1024 / 1024:.0f} MB in {len(blocks)}-sample blocks: {elapsed:.2f}s "
+          f"({written / 1024 / 1024 / elapsed:.0f} MB/s), {accounting.report()['total']} tokens")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--mb", type=int, default=300, help="size of the synthetic bundle for the speed test")
+    parser.add_argument("--regenerate", action="store_true", help="recount the fixture with tiktoken cl100k_base")
+    parser.add_argument("--fit", action="store_true", help="print coefficients fitted on the fixture")
+    args = parser.parse_args()
+    if args.regenerate:
+        regenerate()
+    samples = load_samples()
+    if args.fit:
+        fit(samples)
+        return
+    report_accuracy(samples)
+    report_speed(samples, args.mb)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+"""
+监视模式的基准测试：从保存文件到输出文件更新的端到端延迟
+
+生成一个有 N 个合成模块的包（默认 2000 个）和一个 docs 目录，在后台线程中运行 AiMdGenerator.watch，
+依次修改 pkg 和 docs 中的文件，记录从写入文件到输出文件被替换的时间（包括 debounce 等待）：
+- 修改 pkg 中的文件：pkg 章节重新生成，只有被修改的文件重新渲染，docs 章节整段复制
+- 修改 docs 中的文件：pkg 章节整段复制，不再遍历目录
+
+最后检查输出与完整生成逐字节相同。
+
+运行:
+    python benchmarks/bench_watch_latency.py --files 2000
+
+    # 使用轮询代替 inotify
+    python benchmarks/bench_watch_latency.py --files 2000 --poll 0.2
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from nb_ai_context import AiMdGenerator  # noqa: E402
+from bench_parallel_metadata import make_package  # noqa: E402
+
+
+def build(generator: AiMdGenerator):
+    generator.merge_from_dir("pkg", as_title="pkg", use_gitignore=False)
+    generator.merge_from_dir("docs", as_title="docs", use_gitignore=False)
+
+
+def wait_for_update(path: str, old_mtime_ns: int, timeout: float = 30) -> float:
+    deadline = time.perf_counter() + timeout
+    while time.perf_counter() < deadline:
+        try:
+            if os.stat(path).st_mtime_ns != old_mtime_ns:
+                return time.perf_counter()
+        except OSError:
+            pass
+        time.sleep(0.002)
+    raise TimeoutError(f"{path} was not updated within {timeout}s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--files", type=int, default=2000)
+    parser.add_argument("--lines", type=int, default=300, help="每个模块的行数")
+    parser.add_argument("--edits", type=int, default=5, help="pkg 和 docs 各修改几次")
+    parser.add_argument("--debounce", type=float, default=0.1)
+    parser.add_argument("--poll", type=float, default=None, metavar="SECONDS", help="poll instead of using inotify")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as root:
+        make_package(root, args.files, args.lines)
+        os.makedirs(os.path.join(root, "docs"))
+        for i in range(20):
+            with open(os.path.join(root, "docs", f"doc_{i:02d}.md"), "w", encoding="utf-8") as f:
+                f.write(f"# doc {i}\n\n" + "some text\n" * 50)
+
+        output = os.path.join(root, "out", "watch.md")
+        generator = AiMdGenerator(output).set_project_propery("bench", root)
+        stop = threading.Event()
+        start = time.perf_counter()
+        thread = threading.Thread(target=generator.watch, args=(build,), kwargs=dict(
+            debounce=args.debounce, use_inotify=args.poll is None, poll_interval=args.poll or 0.5, stop_event=stop,
+        ))
+        thread.start()
+        wait_for_update(output, None, timeout=600)
+        print(f"{args.files} files x {args.lines} lines, first build: {time.perf_counter() - start:.2f}s")
+        time.sleep(1)  # 等监视器开始工作
+
+        latencies = {"pkg": [], "docs": []}
+        for i in range(args.edits):
+            for kind, rel in [("pkg", f"pkg/module_{(i * 397) % args.files:05d}.py"), ("docs", f"docs/doc_{i % 20:02d}.md")]:
+                old_mtime_ns = os.stat(output).st_mtime_ns
+                saved = time.perf_counter()
+                with open(os.path.join(root, rel), "a", encoding="utf-8") as f:
+                    f.write(f"\n# edit {i}\n")
+                latencies[kind].append(wait_for_update(output, old_mtime_ns) - saved)
+                time.sleep(0.3)
+        stop.set()
+        thread.join()
+
+        clean = AiMdGenerator(os.path.join(root, "out", "clean.md")).set_project_propery("bench", root)
+        with clean.output_session():
+            build(clean)
+        identical = clean.read_bytes() == generator.read_bytes()
+
+    print(f"{'edited':<8} {'median':>8} {'max':>8}   (save -> output replaced, debounce {args.debounce}s)")
+    for kind, values in latencies.items():
+        print(f"{kind:<8} {statistics.median(values):>7.3f}s {max(values):>7.3f}s")
+    print(f"identical to clean build: {identical}")
+
+
+if __name__ == "__main__":
+    main()
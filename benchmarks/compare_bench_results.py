@@ -0,0 +1,62 @@
+"""
+比较两次 bench_suite.py 的结果，标出变慢的阶段
+
+某个阶段的时间超过基线的 (1 + --threshold) 倍、并且多出的时间超过 --min-delta 秒时算作性能回退
+（很短的阶段受噪声影响大，只看比例会误报）。有回退时退出码为 1，可以直接用在 CI 中。
+
+运行:
+    python benchmarks/compare_bench_results.py benchmarks/bench_suite_baseline.json /tmp/bench_suite.json --threshold 0.2
+"""
+
+import argparse
+import json
+import sys
+import typing
+
+
+def compare(baseline: dict, current: dict, threshold: float, min_delta: float) -> typing.List[dict]:
+    """两个结果中都有的 (规模, 阶段)，按基线中的顺序"""
+    rows = []
+    for n_files, stages in baseline["results"].items():
+        for name, base in stages.items():
+            result = current["results"].get(n_files, {}).get(name)
+            if result is None:
+                continue
+            delta = result["seconds"] - base["seconds"]
+            ratio = result["seconds"] / base["seconds"] if base["seconds"] else float("inf")
+            rows.append({
+                "files": n_files, "stage": name, "baseline": base["seconds"], "current": result["seconds"],
+                "ratio": ratio, "regression": ratio > 1 + threshold and delta > min_delta,
+            })
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("baseline")
+    parser.add_argument("current")
+    parser.add_argument("--threshold", type=float, default=0.2, help="允许变慢的比例")
+    parser.add_argument("--min-delta", type=float, default=0.05, help="允许变慢的秒数")
+    args = parser.parse_args()
+
+    with open(args.baseline, encoding="utf-8") as f:
+        baseline = json.load(f)
+    with open(args.current, encoding="utf-8") as f:
+        current = json.load(f)
+    for label, data in (("baseline", baseline), ("current", current)):
+        env = data.get("environment", {})
+        print(f"{label:<8}: commit {env.get('commit')}, python {env.get('python')}, "
+              f"{env.get('cpu_count')} cpus, {env.get('platform')}")
+    rows = compare(baseline, current, args.threshold, args.min_delta)
+    print(f"{'files':>8} {'stage':<22} {'baseline':>9} {'current':>9} {'ratio':>7}")
+    for row in rows:
+        flag = "  REGRESSION" if row["regression"] else ""
+        print(f"{row['files']:>8} {row['stage']:<22} {row['baseline']:>9.3f} {row['current']:>9.3f} {row['ratio']:>7.2f}{flag}")
+    regressions = [row for row in rows if row["regression"]]
+    print(f"{len(regressions)} regression(s) in {len(rows)} comparisons "
+          f"(threshold {args.threshold:.0%}, min delta {args.min_delta}s)")
+    sys.exit(1 if regressions else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,148 @@
+"""
+基准测试套件用的合成项目生成器
+
+按固定的随机种子生成一个接近真实项目结构的目录，同样的参数每次生成的内容完全相同，不同时间、不同分支的结果可以比较：
+
+- proj/：最深 6 层的包（每层都有 __init__.py），模块之间有绝对导入和相对导入，add_file_dependencies 有真实的依赖边；
+  大约 2% 的模块是几千行的大模块
+- docs/：分层的 .md 文档，大约占 n_files 的 20%
+- README.md、pyproject.toml 和一个常见的 .gitignore（与 bench_gitignore_matcher.ROOT_GITIGNORE 相同）
+- 被 .gitignore 忽略的内容：__pycache__/*.pyc、build/、.venv/、node_modules/、*.log，大约占 n_files 的 10%，
+  不计入 n_files，用来检验遍历时是否真的跳过了它们
+
+运行（只生成项目，不测量）:
+    python benchmarks/synthetic_repo.py /tmp/synthetic_10k --files 10000
+"""
+
+import argparse
+import os
+import random
+import sys
+import typing
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from bench_ast_extractor import make_synthetic_module  # noqa: E402
+from bench_gitignore_matcher import ROOT_GITIGNORE  # noqa: E402
+
+PACKAGE = "proj"
+MAX_DEPTH = 6
+MODULES_PER_PACKAGE = 20
+LARGE_MODULE_RATIO = 0.02
+DOC_RATIO = 0.2
+IGNORED_RATIO = 0.1
+
+_MD_TEMPLATE = """# {title}
+
+{title} 的说明文档。
+
+## 用法
+
+```python
+from {module} import Service0
+
+service = Service0("name")
+service.fetch("key")
+```
+
+## 参数
+
+| 参数 | 说明 |
+| --- | --- |
+| name | 名称 |
+| key | 键 |
+
+""" + "一段较长的说明文字，用来让文档有接近真实的长度。" * 20 + "\n"
+
+
+def _write(root: str, relative_path: str, text: str):
+    path = os.path.join(root, *relative_path.split("/"))
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w", encoding="utf-8", newline="\n") as f:
+        f.write(text)
+
+
+def _make_packages(rnd: random.Random, n_packages: int) -> typing.List[str]:
+    """包的 posix 路径，第一个是 proj，其余每个都挂在深度小于 MAX_DEPTH 的已有包下"""
+    packages = [PACKAGE]
+    while len(packages) < n_packages:
+        parent = rnd.choice([p for p in packages[-50:] + packages[:10] if p.count("/") + 1 < MAX_DEPTH])
+        packages.append(f"{parent}/sub_{len(packages):04d}")
+    return packages
+
+
+def make_synthetic_repo(root: str, n_files: int, seed: int = 0, module_lines: int = 120,
+                        large_module_lines: int = 3000) -> dict:
+    """
+    在 root 下生成大约 n_files 个需要合并的文件（.py 和 .md），返回各类文件的数量和 3 个核心文件（最早生成、被导入最多的模块）
+
+    Args:
+        module_lines: 普通模块的行数
+        large_module_lines: 大模块的行数
+    """
+    rnd = random.Random(seed)
+    n_docs = int(n_files * DOC_RATIO)
+    n_modules = max(1, n_files - n_docs - 2)
+    packages = _make_packages(rnd, max(1, n_modules // MODULES_PER_PACKAGE))
+    n_modules = max(1, n_modules - len(packages))  # 每个包的 __init__.py 也是需要合并的文件
+    module_text = make_synthetic_module(module_lines)
+    large_module_text = make_synthetic_module(large_module_lines)
+
+    counts = {"modules": 0, "large_modules": 0, "packages": len(packages), "docs": 0, "ignored": 0, "core_files": []}
+    for package in packages:
+        _write(root, f"{package}/__init__.py", f'"""{package.replace("/", ".")}"""\n')
+
+    modules: typing.List[str] = []  # 点分模块名
+    for i in range(n_modules):
+        package = rnd.choice(packages)
+        name = f"module_{i:06d}"
+        imports = [f"from {m} import Service0 as Imported{j}" for j, m in enumerate(rnd.sample(modules, min(2, len(modules))))]
+        siblings = [m for m in modules[-30:] if m.rpartition(".")[0] == package.replace("/", ".")]
+        if siblings:
+            imports.append(f"from . import {siblings[-1].rpartition('.')[2]}")
+        large = rnd.random() < LARGE_MODULE_RATIO
+        text = large_module_text if large else module_text
+        _write(root, f"{package}/{name}.py", "\n".join(imports) + "\n" + text)
+        modules.append(f"{package.replace('/', '.')}.{name}")
+        if len(counts["core_files"]) < 3:
+            counts["core_files"].append(f"{package}/{name}.py")
+        counts["modules"] += 1
+        counts["large_modules"] += large
+
+    sections = [f"docs/section_{i:02d}" for i in range(max(1, n_docs // 50))]
+    for i in range(n_docs):
+        section = rnd.choice(sections)
+        if rnd.random() < 0.3:
+            section += f"/part_{rnd.randint(0, 4)}"
+        _write(root, f"{section}/page_{i:06d}.md", _MD_TEMPLATE.format(title=f"page {i}", module=rnd.choice(modules)))
+        counts["docs"] += 1
+
+    _write(root, "README.md", f"# {PACKAGE}\n\nsynthetic project with {n_files} files\n")
+    _write(root, "pyproject.toml", f'[project]\nname = "{PACKAGE}"\nversion = "0.0.1"\n')
+    _write(root, ".gitignore", ROOT_GITIGNORE.lstrip())
+
+    ignored_templates = [
+        lambda i: f"{rnd.choice(packages)}/__pycache__/module_{i:06d}.cpython-311.pyc",
+        lambda i: f"build/lib/{PACKAGE}/module_{i:06d}.py",
+        lambda i: f".venv/lib/python3.11/site-packages/dep_{i % 40:02d}/module_{i:06d}.py",
+        lambda i: f"node_modules/pkg_{i % 30:02d}/lib_{i:06d}.js",
+        lambda i: f"{rnd.choice(packages)}/debug_{i:06d}.log",
+    ]
+    for i in range(int(n_files * IGNORED_RATIO)):
+        _write(root, rnd.choice(ignored_templates)(i), module_text if i % 5 else "ignored\n")
+        counts["ignored"] += 1
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("root")
+    parser.add_argument("--files", type=int, default=10000)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    print(make_synthetic_repo(args.root, args.files, args.seed))
+
+
+if __name__ == "__main__":
+    main()
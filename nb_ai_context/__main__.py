@@ -0,0 +1,3 @@
+from nb_ai_context.cli import main
+
+main()
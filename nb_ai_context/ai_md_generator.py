@@ -1,12 +1,39 @@
 import typing
 import os
-import fnmatch
 import ast
+import re
+import threading
+import time
+from contextlib import contextmanager
 from datetime import datetime
 
 from nb_path import NbPath
 
-FILE_CONTENT_BACKQUOTES = "`````"  # 不用反三引号是为了避免与被合并的如果本身就是.md文件的里面的反三引号冲突，导致文件块提前判断结束
+from nb_ai_context import ast_extractor
+from nb_ai_context import ast_cache
+from nb_ai_context import build_stats
+from nb_ai_context import concurrent_reader
+from nb_ai_context import git_diff
+from nb_ai_context import metadata_markdown
+from nb_ai_context import parallel_extract
+from nb_ai_context import watcher
+from nb_ai_context.token_budget import BudgetEntry, BudgetPlan, TokenBudgetPlanner, MODE_FULL, MODE_METADATA, MODE_STUB
+from nb_ai_context.token_estimator import estimate_tokens, TokenAccounting
+from nb_ai_context.metadata_markdown import FILE_CONTENT_BACKQUOTES
+from nb_ai_context.gitignore_matcher import GitIgnoreMatcher
+from nb_ai_context.dir_walker import PruningDirWalker
+from nb_ai_context.git_file_lister import GitFileLister, GitListError
+from nb_ai_context.git_revision import SourceLister, GitRevisionSource
+from nb_ai_context.archive_source import ArchiveSource
+from nb_ai_context.build_stats import BuildStats, instrumented
+from nb_ai_context.memory_profile import MemoryProfiler
+from nb_ai_context.module_registry import ModuleRegistry, DEFAULT_TEXT_CACHE_BYTES
+from nb_ai_context.scan_index import IndexedLister, ScanIndex
+from nb_ai_context.path_exclusions import PathExclusions
+from nb_ai_context.output_writer import OutputWriter
+from nb_ai_context.sharded_writer import ShardedOutputWriter
+from nb_ai_context.incremental_build import IncrementalBuild, ReusedBlock
+
 
 ai_guide_en = '''
 # 🤖 AI Context Protocol (Generated by nb_ai_context)
@@ -194,10 +221,73 @@ class AiMdGenerator(NbPath):
         ".psscx": "powershell",
     }
 
-    def set_project_propery(self, project_name: str, project_root: typing.Union[os.PathLike, str] ) -> "AiMdGenerator":
-        """Sets the project name for the current markdown file."""
+    def set_project_propery(
+        self,
+        project_name: str,
+        project_root: typing.Union[os.PathLike, str],
+        cache_dir: typing.Union[os.PathLike, str] = None,
+        cache_max_bytes: int = ast_cache.DEFAULT_MAX_BYTES,
+        workers: int = 1,
+        read_concurrency: int = 1,
+        read_max_inflight_bytes: int = concurrent_reader.DEFAULT_MAX_INFLIGHT_BYTES,
+        git_rev: str = None,
+        archive: typing.Union[os.PathLike, str, ArchiveSource] = None,
+        trace: bool = False,
+        profile_memory: bool = False,
+        scan_index: typing.Union[bool, ScanIndex] = True,
+        text_cache_max_bytes: typing.Optional[int] = DEFAULT_TEXT_CACHE_BYTES,
+    ) -> "AiMdGenerator":
+        """
+        Sets the project name for the current markdown file.
+
+        Args:
+            cache_dir: 可选的持久化 AST 元数据缓存目录（SQLite，见 ast_cache.AstMetadataCache），
+                       多次重新生成同一个项目时，未修改的 .py 文件不再重新解析
+            cache_max_bytes: 缓存大小上限，超过后按 LRU 淘汰
+            workers: merge_from_files_with_metadata / merge_from_dir 提取 AST 元数据的默认进程数，1 表示串行
+            read_concurrency: merge_* 方法校验、读取文件的默认并发线程数，网络文件系统上可以调大（见 concurrent_reader）
+            read_max_inflight_bytes: 并发读取时已读出但还没写入输出文件的数据量上限
+            git_rev: 从 git 的这个版本（tag、分支、commit）读取文件而不是工作区，例如 "v1.7"。
+                     不需要检出，所有文件通过一个常驻的 git cat-file --batch 进程读取，见 git_revision.GitRevisionSource。
+                     版本中只有被跟踪的文件，merge_from_dir 不再应用 .gitignore；不能和增量生成、监视模式同时使用
+            archive: 从 .zip / .tar.gz 归档读取文件而不是磁盘上的目录，归档的内容对应 project_root（不需要存在），
+                     不解压到临时目录，见 archive_source.ArchiveSource。可以传入归档路径，
+                     也可以传入按目录、后缀过滤过的 ArchiveSource。同样不应用 .gitignore，不能和 git_rev、增量生成、监视模式同时使用
+            trace: 在 stats 中记录逐个文件的读取、解析、渲染事件，用 stats.export_chrome_trace(path) 导出后
+                   在 chrome://tracing 或 https://ui.perfetto.dev 中查看，见 build_stats.BuildStats
+            profile_memory: 用 tracemalloc 记录每个阶段、每个章节的峰值内存、持有内存最多的分配位置和占用最多的文件，
+                            结果在 stats.memory（见 memory_profile.MemoryProfiler）。tracemalloc 会让构建变慢，
+                            分析完调用 stats.memory.stop()，或者再次 set_project_propery 时不传这个参数
+            scan_index: merge_from_dir 的目录扫描索引，同一个目录和它的子目录只遍历一次，之后的调用在内存中按后缀、排除规则过滤，
+                        见 scan_index.ScanIndex。True 时本生成器使用自己的索引，传入 ScanIndex 时多个生成器共享，False 时每次都遍历
+            text_cache_max_bytes: module_registry 在内存中保留的 .py 源码总大小上限，超过后按 LRU 丢弃，再用到时重新读取
+                                  （见 module_registry.TextCache），None 表示全部保留
+        """
+        if git_rev is not None and archive is not None:
+            raise ValueError("git_rev and archive cannot be used together.")
+        previous_source = getattr(self, "_file_source_instance", None)
+        if previous_source is not None and previous_source is not archive:
+            previous_source.close()
+        self._file_source_instance = archive if isinstance(archive, ArchiveSource) else None
+        self.git_rev = git_rev
+        self.archive = archive
         self.project_name = project_name
         self.project_root = project_root
+        self.cache_dir = cache_dir
+        self.cache_max_bytes = cache_max_bytes
+        self.workers = workers
+        self.read_concurrency = read_concurrency
+        self.read_max_inflight_bytes = read_max_inflight_bytes
+        self.text_cache_max_bytes = text_cache_max_bytes
+        self._module_registry = None
+        self._scan_index = scan_index if isinstance(scan_index, ScanIndex) else (ScanIndex() if scan_index else None)
+        stats = self._get_build_stats()
+        stats.trace = trace
+        if profile_memory and stats.memory is None:
+            stats.memory = MemoryProfiler()
+        elif not profile_memory and stats.memory is not None:
+            stats.memory.stop()
+            stats.memory = None
         return self
     
     def _check_project_name(self) -> "AiMdGenerator":
@@ -206,6 +296,454 @@ class AiMdGenerator(NbPath):
             raise ValueError("Project name is not set. Please call set_project_name() first.")
         return self
 
+    @property
+    def module_registry(self) -> ModuleRegistry:
+        """
+        本生成器共享的 Python 模块解析缓存，见 module_registry.ModuleRegistry
+
+        add_project_summary、add_file_dependencies、merge_from_files_with_metadata 都从这里取源码、元数据和 import，
+        同一个文件一次构建只读取、解析一次。命中情况见 module_registry.stats()
+        """
+        registry = getattr(self, "_module_registry", None)
+        if registry is None:
+            cache_dir = getattr(self, "cache_dir", None)
+            metadata_cache = None
+            if cache_dir is not None:
+                metadata_cache = ast_cache.AstMetadataCache.for_dir(cache_dir, max_bytes=self.cache_max_bytes)
+            registry = self._module_registry = ModuleRegistry(
+                ast_cache=metadata_cache, source=self._file_source(), build_stats=self._get_build_stats(),
+                text_cache_max_bytes=getattr(self, "text_cache_max_bytes", DEFAULT_TEXT_CACHE_BYTES),
+            )
+        return registry
+
+    @property
+    def scan_index(self) -> typing.Optional[ScanIndex]:
+        """merge_from_dir 的目录扫描索引，set_project_propery(scan_index=False) 时为 None，见 scan_index.ScanIndex"""
+        return getattr(self, "_scan_index", None)
+
+    def _get_build_stats(self) -> BuildStats:
+        stats = getattr(self, "_build_stats", None)
+        if stats is None:
+            stats = self._build_stats = BuildStats()
+        return stats
+
+    @property
+    def stats(self) -> BuildStats:
+        """
+        本生成器的分阶段统计：每个公开方法和 scan / is_text / read / parse / render / write 子阶段的
+        调用次数、耗时、文件数、字节数，以及缓存命中情况，见 build_stats.BuildStats
+
+        Example:
+            >>> g = AiMdGenerator("out.md").set_project_propery("my_project", "/path/to/project", trace=True)
+            >>> g.clear_text().merge_from_dir("src", as_title="codes")
+            >>> print(g.stats.format_report())
+            >>> g.stats.export_chrome_trace("out.trace.json")
+        """
+        stats = self._get_build_stats()
+        registry = getattr(self, "_module_registry", None)
+        if registry is not None:
+            stats.caches["module_registry"] = registry.stats()
+        source = getattr(self, "_file_source_instance", None)
+        if source is not None:
+            stats.caches["file_source"] = source.stats()
+        if self.scan_index is not None:
+            stats.caches["scan_index"] = self.scan_index.stats()
+        if stats.memory is not None and registry is not None:
+            stats.memory.measure_modules(registry.modules())
+        return stats
+
+    def _file_source(self) -> typing.Union[GitRevisionSource, ArchiveSource, None]:
+        """
+        set_project_propery(git_rev=...) 时 git 版本的文件视图，set_project_propery(archive=...) 时归档的文件视图，
+        第一次使用时创建；都没有设置时为 None，直接读取磁盘上的文件
+        """
+        source = getattr(self, "_file_source_instance", None)
+        if source is not None:
+            return source
+        git_rev = getattr(self, "git_rev", None)
+        archive = getattr(self, "archive", None)
+        if git_rev is not None:
+            git_root = NbPath(self.project_root).resolve().find_git_root()
+            source = GitRevisionSource(git_root, git_rev)
+            self.logger.info(f"reading files from git revision {git_rev} ({source.commit}) of {git_root}")
+        elif archive is not None:
+            source = ArchiveSource(archive, NbPath(self.project_root).resolve())
+            self.logger.info(f"reading files from archive {source.archive_name}: {source.stats()}")
+        self._file_source_instance = source
+        return source
+
+    def _source_exists(self, path: NbPath) -> bool:
+        source = self._file_source()
+        return path.exists() if source is None else source.exists(path)
+
+    def _source_is_text_file(self, path: NbPath) -> bool:
+        source = self._file_source()
+        return path.is_file() and path.is_text() if source is None else source.is_text(path)
+
+    def _source_size(self, path: NbPath) -> int:
+        source = self._file_source()
+        return path.stat().st_size if source is None else source.size(path)
+
+    @property
+    def token_accounting(self) -> TokenAccounting:
+        """
+        输出内容的 token 估算，写入时逐块累计，按章节（as_title）和文件统计，见 token_estimator.TokenAccounting
+
+        clear_text() 时清零。汇总见 get_token_report() / show_token_report()
+        """
+        accounting = getattr(self, "_token_accounting", None)
+        if accounting is None:
+            accounting = self._token_accounting = TokenAccounting()
+        return accounting
+
+    def get_token_report(self) -> dict:
+        """按章节和文件统计的 token 估算，格式见 TokenAccounting.report()"""
+        return self.token_accounting.report()
+
+    def show_token_report(self, top_n: int = 20) -> "AiMdGenerator":
+        """打印各章节的 token 估算和 token 最多的 top_n 个文件"""
+        self.logger.info(f"{self.name} token report:\n{self.token_accounting.format_report(top_n)}")
+        return self
+
+    def _begin_section(self, title: str):
+        """开始一个章节：token 统计和分片写入器按章节归属后面写入的内容"""
+        self.token_accounting.begin_section(title)
+        session = self._get_output_session()
+        if session is not None:
+            session.begin_section(title)
+        memory = self._get_build_stats().memory
+        if memory is not None:
+            memory.begin_section(title)
+
+    def _begin_file(self, relative_file_name_posix: str, file: NbPath = None, block_key: str = None, reused: dict = None):
+        """
+        开始一个文件块，分片写入器不会在文件块中间切分
+
+        增量生成时 block_key 不为 None 的文件块记录到清单中，reused 是复用的上一次的记录（见 incremental_build）
+        """
+        self.token_accounting.begin_file(relative_file_name_posix)
+        session = self._get_output_session()
+        if session is not None:
+            session.begin_file(relative_file_name_posix)
+        incremental = self._get_incremental_build()
+        if incremental is not None and block_key is not None:
+            incremental.begin_block(block_key, file, session.tell(), self.token_accounting.total, reused)
+
+    def _end_file(self):
+        self.token_accounting.end_file()
+        session = self._get_output_session()
+        if session is not None:
+            session.end_file()
+        incremental = self._get_incremental_build()
+        if incremental is not None:
+            incremental.end_block(session.tell(), self.token_accounting.total)
+
+    def _get_incremental_build(self) -> typing.Optional[IncrementalBuild]:
+        return getattr(self, "_incremental_build", None)
+
+    def _incremental_blocks(
+        self, as_title: str, render_key: str, file_list: typing.List[list],
+    ) -> typing.Dict[str, typing.Tuple[str, typing.Optional[dict]]]:
+        """
+        增量生成时每个文件块的清单 key 和可以复用的上一次的记录 {relative_file_name_posix: (block_key, record)}
+
+        render_key 描述文件块的渲染方式，渲染方式不同的文件块不能复用
+        """
+        incremental = self._get_incremental_build()
+        if incremental is None:
+            return {}
+        blocks = {}
+        for file, relative_file_name_posix, _, _ in file_list:
+            key = incremental.block_key(as_title, f"{render_key}\x00{self.project_name}", relative_file_name_posix)
+            blocks[relative_file_name_posix] = (key, incremental.lookup(key, file))
+        return blocks
+
+    def open_output_session(
+        self, atomic: bool = True, shard_max_tokens: int = None, shard_max_bytes: int = None, incremental: bool = False,
+    ) -> "AiMdGenerator":
+        """
+        开启一个输出会话，之后所有写入都流式写入同一个带缓冲的写入器，直到 commit_output_session()
+
+        会话从空文件开始（相当于 clear_text()）。atomic=True 时写入同目录下的临时文件，
+        commit 时才用 os.replace 原子替换目标文件，生成过程中目标文件始终是上一次完整的结果。
+
+        设置了 shard_max_tokens 或 shard_max_bytes 时按大小分片输出：写成 name.part001.md、name.part002.md ...
+        和 name.manifest.json，不写目标文件本身。只在文件块之间切分，每个分片都重复 AI 阅读指南和分片索引，
+        见 sharded_writer.ShardedOutputWriter
+
+        incremental=True 时增量生成：在输出文件旁边维护清单 output.md.manifest.json，源文件没有变化的文件块
+        直接从上一次的输出中复制，不再读取、解析、渲染，结果与完整生成逐字节相同，见 incremental_build.IncrementalBuild。
+        需要 atomic=True，不能和分片输出同时使用
+
+        show_textfile_info() / get_textfile_info() 会自动提交当前会话。
+
+        Example:
+            >>> (
+            ...     AiMdGenerator("output.md")
+            ...     .set_project_propery("my_project", "/path/to/project")
+            ...     .open_output_session()
+            ...     .add_ai_reading_guide()
+            ...     .merge_from_dir("src", as_title="my_project codes")
+            ...     .commit_output_session()
+            ... )
+        """
+        if self._get_output_session() is not None:
+            raise RuntimeError("An output session is already open, call commit_output_session() first.")
+        if incremental and (not atomic or shard_max_tokens is not None or shard_max_bytes is not None):
+            raise ValueError("incremental=True needs atomic=True and cannot be used with a sharded output.")
+        if incremental and (getattr(self, "git_rev", None) is not None or getattr(self, "archive", None) is not None):
+            raise ValueError("incremental=True cannot be used with git_rev or archive, their files never change.")
+        self._incremental_build = IncrementalBuild(self, getattr(self, "_watch_changed_paths", None)) if incremental else None
+        if shard_max_tokens is not None or shard_max_bytes is not None:
+            self._output_session = ShardedOutputWriter(
+                self, max_tokens=shard_max_tokens, max_bytes=shard_max_bytes, atomic=atomic, logger=self.logger,
+            )
+        else:
+            self._output_session = OutputWriter(self, atomic=atomic, write_bom=True)
+        self.token_accounting.reset()
+        return self
+
+    @instrumented
+    def commit_output_session(self) -> "AiMdGenerator":
+        """提交当前输出会话，原子模式下替换目标文件"""
+        session = self._get_output_session()
+        if session is not None:
+            self._output_session = None
+            session.commit()
+            incremental = self._get_incremental_build()
+            if incremental is not None:
+                self._incremental_build = None
+                incremental.save()
+                self._get_build_stats().caches["incremental"] = incremental.stats()
+                self.logger.info(f"incremental build of {self.name}: {incremental.stats()}")
+        return self
+
+    def abort_output_session(self) -> "AiMdGenerator":
+        """放弃当前输出会话，原子模式下目标文件保持不变"""
+        session = self._get_output_session()
+        if session is not None:
+            self._output_session = None
+            session.abort()
+            incremental = self._get_incremental_build()
+            if incremental is not None:
+                self._incremental_build = None
+                incremental.close()
+        return self
+
+    @contextmanager
+    def output_session(
+        self, atomic: bool = True, shard_max_tokens: int = None, shard_max_bytes: int = None, incremental: bool = False,
+    ):
+        """
+        输出会话的上下文管理器，正常退出时提交，抛出异常时放弃
+
+        Example:
+            >>> with AiMdGenerator("output.md").set_project_propery("my_project", "/path/to/project").output_session() as g:
+            ...     g.add_ai_reading_guide().merge_from_dir("src", as_title="my_project codes")
+        """
+        self.open_output_session(
+            atomic=atomic, shard_max_tokens=shard_max_tokens, shard_max_bytes=shard_max_bytes, incremental=incremental,
+        )
+        try:
+            yield self
+        except BaseException:
+            self.abort_output_session()
+            raise
+        self.commit_output_session()
+
+    def watch(
+        self,
+        build: typing.Callable[["AiMdGenerator"], typing.Any],
+        debounce: float = 0.2,
+        use_inotify: bool = True,
+        poll_interval: float = 0.5,
+        max_builds: int = None,
+        stop_event: threading.Event = None,
+    ) -> "AiMdGenerator":
+        """
+        监视模式：先生成一次，之后输入文件一有变化就增量重新生成，直到 Ctrl+C、stop_event 被设置或者生成了 max_builds 次
+
+        build(generator) 调用 add_ai_reading_guide、merge_from_dir 等方法生成内容，每次都在
+        output_session(incremental=True) 中执行。生成过程中用到的目录和文件就是监视范围：
+        merge_from_dir 的目录按相同的排除、gitignore、后缀规则过滤变化，输出文件自身的变化被忽略。
+
+        连续保存时等到 debounce 秒内没有新的变化才重新生成。目录下没有变化的 merge_from_dir 章节整段复制，
+        有变化的章节只重新渲染变化的文件（见 incremental_build）。
+
+        Linux 下使用 inotify（通过 ctypes），其他平台或 use_inotify=False 时每 poll_interval 秒轮询一次，见 watcher。
+        监视过程中超过 inotify 的 watch 数量限制时换成轮询，并完整重新生成一次（不知道哪些变化没有收到）
+
+        Example:
+            >>> def build(g):
+            ...     g.add_ai_reading_guide().merge_from_dir("src", as_title="my_project codes")
+            >>> AiMdGenerator("output.md").set_project_propery("my_project", "/path/to/project").watch(build)
+        """
+        self._check_project_name()
+        targets = self._watch_build(build, None)
+        builds = 1
+        source_watcher = watcher.create_watcher(targets, use_inotify, poll_interval, logger=self.logger)
+        self.logger.info(f"watching {len(targets.watch_dirs())} dirs for {self.name} ({type(source_watcher).__name__})")
+        try:
+            # 生成失败时这一轮的变化留到下一次生成，不能复用其中的章节
+            failed_changes = set()
+            while max_builds is None or builds < max_builds:
+                try:
+                    changed_paths = self._wait_for_changes(source_watcher, targets, debounce, stop_event)
+                except watcher.WatchLimitError as e:
+                    # 自动监视新建的目录时超过限制，已经读出的事件丢失了
+                    source_watcher = self._fall_back_to_polling(source_watcher, targets, poll_interval, e)
+                    changed_paths = {watcher.OVERFLOW}
+                if changed_paths is None:
+                    break
+                gitignore_changed = any(os.path.basename(path) == ".gitignore" for path in changed_paths)
+                if gitignore_changed:
+                    # gitignore 规则变了，所有目录章节都可能变化
+                    for _, walker in targets.dirs:
+                        if walker.gitignore_matcher is not None:
+                            walker.gitignore_matcher.invalidate()
+                    if self.scan_index is not None:
+                        self.scan_index.invalidate()
+                if gitignore_changed or failed_changes is None or watcher.OVERFLOW in changed_paths:
+                    changed_paths = None
+                else:
+                    changed_paths |= failed_changes
+                builds += 1
+                try:
+                    targets = self._watch_build(build, changed_paths)
+                except Exception as e:
+                    # 例如正在编辑的文件暂时不完整，输出文件保持上一次的结果，继续监视
+                    self.logger.exception(f"failed to rebuild {self.name}: {e}")
+                    failed_changes = changed_paths
+                    continue
+                failed_changes = set()
+                try:
+                    source_watcher.update(targets)
+                except watcher.WatchLimitError as e:
+                    source_watcher = self._fall_back_to_polling(source_watcher, targets, poll_interval, e)
+        except KeyboardInterrupt:
+            pass
+        finally:
+            source_watcher.close()
+        return self
+
+    def _fall_back_to_polling(
+        self, source_watcher, targets: watcher.WatchTargets, poll_interval: float, error: OSError,
+    ) -> watcher.PollingWatcher:
+        """关闭 inotify 监视器，换成监视相同范围的轮询监视器"""
+        self.logger.warning(f"{error}, falling back to polling every {poll_interval}s")
+        source_watcher.close()
+        return watcher.PollingWatcher(targets, poll_interval)
+
+    def _wait_for_changes(
+        self, source_watcher, targets: watcher.WatchTargets, debounce: float, stop_event: threading.Event = None,
+    ) -> typing.Optional[typing.Set[str]]:
+        """等待会影响输出的变化，并等到 debounce 秒内没有新的变化；stop_event 被设置时返回 None"""
+        changed_paths = set()
+        while not changed_paths:
+            if stop_event is not None and stop_event.is_set():
+                return None
+            changes = source_watcher.wait(0.5 if stop_event is not None else None)
+            changed_paths.update(path for path, is_dir in changes if targets.is_relevant(path, is_dir))
+        # 一直有变化（例如正在批量复制文件）时最多等待 debounce 的 10 倍
+        deadline = time.monotonic() + debounce * 10
+        while time.monotonic() < deadline:
+            changes = source_watcher.wait(debounce)
+            if not changes:
+                break
+            changed_paths.update(path for path, is_dir in changes if targets.is_relevant(path, is_dir))
+        return changed_paths
+
+    def _watch_build(self, build: typing.Callable, changed_paths: typing.Optional[typing.Set[str]]) -> watcher.WatchTargets:
+        """执行一次增量生成，返回这次生成用到的监视范围"""
+        output_path = os.path.abspath(self)
+        self._watch_targets = watcher.WatchTargets(ignored_prefixes=[
+            output_path, os.path.join(os.path.dirname(output_path), "." + os.path.basename(output_path)),
+        ])
+        self._watch_changed_paths = changed_paths
+        start = time.perf_counter()
+        try:
+            with self.output_session(incremental=True):
+                build(self)
+        finally:
+            targets, self._watch_targets, self._watch_changed_paths = self._watch_targets, None, None
+        changed = "full" if changed_paths is None else f"{len(changed_paths)} changed paths"
+        self.logger.info(f"built {self.name} in {time.perf_counter() - start:.3f}s ({changed})")
+        return targets
+
+    def _get_output_session(self) -> typing.Optional[OutputWriter]:
+        return getattr(self, "_output_session", None)
+
+    @contextmanager
+    def _output_writer(self):
+        """有会话时使用会话写入器，否则打开一个追加写入器，用完即关闭"""
+        session = self._get_output_session()
+        if session is not None:
+            yield session
+            return
+        writer = OutputWriter(self, write_bom=True)
+        try:
+            yield writer
+        finally:
+            writer.close()
+
+    def _write_parts(self, parts: typing.Iterable[str], separator: str = "\n") -> "AiMdGenerator":
+        """逐个写入 markdown 片段，结果与 separator.join(parts) 一次性写入完全相同"""
+        accounting = self.token_accounting
+        perf_counter = time.perf_counter
+        write_seconds, write_bytes, write_calls = 0.0, 0, 0
+        with self._output_writer() as writer:
+            first = True
+            for part in parts:
+                start = perf_counter()
+                if isinstance(part, ReusedBlock):
+                    # 增量生成复用的文件块，已经包含前面的分隔符
+                    write_bytes += writer.write_bytes(part.data)
+                    accounting.add_tokens(part.tokens)
+                    first = first and not part.data
+                else:
+                    if not first:
+                        write_bytes += writer.write(separator)
+                        accounting.add(separator)
+                    write_bytes += writer.write(part)
+                    accounting.add(part)
+                    first = False
+                write_seconds += perf_counter() - start
+                write_calls += 1
+        # 写入按片段计时，片段的生成（读取、解析、渲染）不计入
+        self._get_build_stats().add(build_stats.WRITE, write_seconds, nbytes=write_bytes, calls=write_calls)
+        return self
+
+    def append_text(self, data: str, encoding: str = "utf-8", errors: str = None) -> "AiMdGenerator":
+        """
+        追加文本，有输出会话时写入会话
+
+        输出文件总是 UTF-8 编码，写入空文件时会先写入 UTF-8 BOM（只写一次），
+        不再需要每次合并后调用 ensure_utf8_bom() 重新读取、重写整个文件
+        """
+        start = time.perf_counter()
+        with self._output_writer() as writer:
+            written = writer.write(data)
+        self.token_accounting.add(data)
+        self._get_build_stats().record(build_stats.WRITE, start, nbytes=written)
+        return self
+
+    def clear_text(self) -> "AiMdGenerator":
+        """清空输出内容，有输出会话时清空会话已写入的内容"""
+        self.token_accounting.reset()
+        session = self._get_output_session()
+        if session is None:
+            return super().clear_text()
+        if self._get_incremental_build() is not None:
+            self._get_incremental_build().reset()
+        session.truncate()
+        return self
+
+    def get_textfile_info(self, encoding: str = "utf-8", is_show_info: bool = False) -> dict:
+        """统计输出文件信息，会先提交当前输出会话"""
+        self.commit_output_session()
+        return super().get_textfile_info(encoding=encoding, is_show_info=is_show_info)
+
+    @instrumented
     def add_ai_reading_guide(self,guide_lang="cn") -> "AiMdGenerator":
         """
         添加 AI 阅读指南，帮助 AI 大模型更好地理解文档结构
@@ -219,9 +757,17 @@ class AiMdGenerator(NbPath):
         guide = ai_guide_en if guide_lang == "en" else ai_guide_cn
         generated_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
         guide = guide.format(generated_time=generated_time)
-        self.append_text(guide)
+        self._begin_section("ai reading guide")
+        session = self._get_output_session()
+        if isinstance(session, ShardedOutputWriter):
+            # 分片输出时阅读指南写在每个分片的开头
+            session.set_preamble(guide)
+            self.token_accounting.add(guide)
+        else:
+            self.append_text(guide)
         return self
 
+    @instrumented
     def add_project_summary(
         self, 
         project_summary: str, 
@@ -270,11 +816,13 @@ class AiMdGenerator(NbPath):
             
             for relative_file_name in most_core_source_code_file_list:
                 file = (project_root_path / relative_file_name).resolve()
-                if not file.exists():
+                if not self._source_exists(file):
                     raise FileNotFoundError(f"File {file} not found.")
 
-                if file.is_file() and file.is_text() and file.suffix == ".py":
+                if self._source_is_text_file(file) and file.suffix == ".py":
                     relative_file_name_posix = file.relative_to(project_root_path).as_posix()
+                    # 记录核心文件，token 预算时优先保留
+                    self.core_file_list = getattr(self, "core_file_list", []) + [relative_file_name_posix]
                     
                     self.logger.info(f"提取核心文件元数据（无源码）: {relative_file_name_posix}")
                     
@@ -284,6 +832,7 @@ class AiMdGenerator(NbPath):
                     str_list.append(metadata_md)
                     str_list.append("\n")
         
+        self._begin_section(f"{self.project_name} project summary")
         self.append_text('\n'.join(str_list))
         self.add_file_dependencies(most_core_source_code_file_list)
         return self
@@ -345,6 +894,7 @@ class AiMdGenerator(NbPath):
 
         return str_list
 
+    @instrumented
     def auto_merge_from_python_project_some_files(self, project_root: typing.Union[os.PathLike, str] = None) -> 'AiMdGenerator':
         """自动合并项目根目录下的 readme.md 或者ReADME.md 以及setup.py 和 pyproject.toml ，如果有就添加"""
         self._check_project_name()
@@ -363,74 +913,133 @@ class AiMdGenerator(NbPath):
         project_root_path = NbPath(project_root).resolve()
         for filename in root_files_to_check:
             file_path = project_root_path / filename
-            if file_path.is_file() and file_path.is_text():
+            if self._source_is_text_file(file_path):
                 file_merge_list.append(filename)
                 
         self.merge_from_files(file_merge_list, f"{self.project_name} Project Root Dir Some Files",project_root, )
         return self
 
+    @instrumented
     def merge_from_files(
         self,
         relative_file_name_list: typing.List[str],
         as_title: str,
         project_root: typing.Union[os.PathLike, str] = None,
+        read_concurrency: int = None,
     ) -> "AiMdGenerator":
         """Merges the content of the given files into the current markdown file.
         the current markdown file will be used to upload to ai model for code review and learning.
+
+        read_concurrency: 并发读取文件的线程数，默认使用 set_project_propery 的 read_concurrency
         """
         self._check_project_name()
         project_root =  project_root or self.project_root
-        file_text_list = []
+        read_concurrency = read_concurrency or getattr(self, "read_concurrency", 1)
+        file_list = self._collect_text_files(relative_file_name_list, project_root, read_concurrency)
+        self._begin_section(as_title)
+        self._write_parts(self._iter_merge_from_files_parts(as_title, file_list, read_concurrency))
+        return self
+
+    def _collect_text_files(
+        self,
+        relative_file_name_list: typing.List[str],
+        project_root: typing.Union[os.PathLike, str],
+        read_concurrency: int = 1,
+    ) -> typing.List[list]:
+        """
+        校验文件并收集 [file, relative_file_name_posix, suffix, size] 列表
+
+        只做校验不读取内容，文件内容在写入时才逐个读取，保证内存只和最大的单个文件有关。
+        read_concurrency > 1 时并发校验，出错时仍然按列表顺序抛出第一个错误
+        """
         project_root_path = NbPath(project_root).resolve()
-        for relative_file_name in relative_file_name_list:
+
+        stats = self._get_build_stats()
+
+        def check_file(relative_file_name):
+            start = time.perf_counter()
             file = (project_root_path / relative_file_name).resolve()
-            if not file.exists():
+            if not self._source_exists(file):
                 raise FileNotFoundError(f"File {file} not found.")
-            if file.is_file() and file.is_text():
-                relative_file_name_posix = file.relative_to(
-                    project_root_path
-                ).as_posix()
-                try:
-                    text = file.read_text()
-                except Exception as e:
-                    self.logger.error(f"Error reading file {file}: {e}")
-                    text = ""
-                file_text_list.append(
-                    [file, relative_file_name_posix, file.suffix, text]
-                )
-                self.logger.debug(f"need merged file: {file}")
-            else:
-                raise ValueError(f"File {file} is not a text file.")
-        str_list = []
-        if file_text_list:
+            if self._source_is_text_file(file):
+                relative_file_name_posix = file.relative_to(project_root_path).as_posix()
+                entry = [file, relative_file_name_posix, file.suffix, self._source_size(file)]
+                stats.record(build_stats.IS_TEXT, start, files=1, detail=relative_file_name_posix)
+                return entry
+            raise ValueError(f"File {file} is not a text file.")
+
+        watch_targets = getattr(self, "_watch_targets", None)
+        if watch_targets is not None:
+            watch_targets.add_files(project_root_path / f for f in relative_file_name_list)
+        file_list = []
+        for entry in concurrent_reader.ordered_map(check_file, relative_file_name_list, read_concurrency):
+            file_list.append(entry)
+            self.logger.debug(f"need merged file: {entry[0]}")
+        return file_list
+
+    def _iter_file_texts(self, file_list: typing.List[list], read_concurrency: int = 1) -> typing.Iterator[str]:
+        """按 file_list 的顺序产出文件内容，read_concurrency > 1 时用线程池提前读取后面的文件"""
+        return concurrent_reader.ordered_map(
+            lambda entry: self._read_file_text(entry[0]),
+            file_list,
+            read_concurrency,
+            max_inflight_bytes=getattr(self, "read_max_inflight_bytes", concurrent_reader.DEFAULT_MAX_INFLIGHT_BYTES),
+            size_func=lambda entry: entry[3] or 0,
+        )
+
+    def _read_file_text(self, file: NbPath) -> str:
+        if file.suffix == ".py":
+            # Python 文件从 module_registry 取，和元数据、依赖分析共用同一次读取
+            module = self.module_registry.get(file)
+            if module.read_error is not None:
+                self.logger.error(f"Error reading file {file}: {module.read_error}")
+                return ""
+            return module.text
+        start = time.perf_counter()
+        try:
+            source = self._file_source()
+            text = file.read_text() if source is None else source.read_text(file)
+        except Exception as e:
+            self.logger.error(f"Error reading file {file}: {e}")
+            return ""
+        # 已经解码，按字符数计，不为统计再编码一次
+        self._get_build_stats().record(build_stats.READ, start, files=1, nbytes=len(text), detail=str(file))
+        return text
+
+    def _iter_merge_from_files_parts(
+        self, as_title: str, file_list: typing.List[list], read_concurrency: int = 1
+    ) -> typing.Iterator[str]:
+        """按顺序产出 merge_from_files 的各个 markdown 片段，片段之间用换行连接"""
+        if file_list:
             # 调用新函数生成头部
-            str_list.extend(self._generate_markdown_header(as_title, file_text_list))
-
-
-        for file, relative_file_name_posix, suffix, text in file_text_list:
-            # 2. Remove the debug print statement.
-            # print(f'file: {file}, relative_file_name_posix: {relative_file_name_posix}, suffix: {suffix}, text: {text}')
-            str_list.append(f"--- **start of file: {relative_file_name_posix}** (project: {self.project_name}) --- \n")
-            # 3. Handle .md files separately to ensure their content is rendered correctly.
-            #    Other file types are wrapped in code blocks.
-            # if suffix == ".md":
-            #     str_list.append(text + "\n")
-            # else:
-            #     lang = self.suffix__lang_map.get(suffix, "text")
-            #     str_list.append(f"{FILE_CONTENT_BACKQUOTES}{lang}\n{text}\n{FILE_CONTENT_BACKQUOTES}\n")
-            lang = self.suffix__lang_map.get(suffix, "text")
-            str_list.append(f"{FILE_CONTENT_BACKQUOTES}{lang}\n{text}\n{FILE_CONTENT_BACKQUOTES}\n")
-
-            str_list.append(f"--- **end of file: {relative_file_name_posix}** (project: {self.project_name}) --- \n")
-            str_list.append("---\n\n")
-
-        # with self.open(mode="a", encoding="utf-8") as f:
-        #     f.write("\n".join(str_list))
-        self.append_text('\n'.join(str_list))
-        self.ensure_utf8_bom()
-        return self
+            yield from self._generate_markdown_header(as_title, file_list)
+
+        # 增量生成时可以复用的文件块不需要读取
+        blocks = self._incremental_blocks(as_title, "files", file_list)
+        texts = self._iter_file_texts(
+            [entry for entry in file_list if blocks.get(entry[1], (None, None))[1] is None], read_concurrency
+        )
+        try:
+            for file, relative_file_name_posix, suffix, _ in file_list:
+                block_key, reused = blocks.get(relative_file_name_posix, (None, None))
+                # 生成器在产出片段之前执行，begin_file 之后写入的片段都计入这个文件
+                self._begin_file(relative_file_name_posix, file, block_key, reused)
+                if reused is not None:
+                    yield self._get_incremental_build().read_block(reused)
+                    self._end_file()
+                    continue
+                text = next(texts)
+                yield f"--- **start of file: {relative_file_name_posix}** (project: {self.project_name}) --- \n"
+                lang = self.suffix__lang_map.get(suffix, "text")
+                yield f"{FILE_CONTENT_BACKQUOTES}{lang}\n{text}\n{FILE_CONTENT_BACKQUOTES}\n"
+                yield f"--- **end of file: {relative_file_name_posix}** (project: {self.project_name}) --- \n"
+                yield "---\n\n"
+                self._end_file()
+        finally:
+            texts.close()
         
         
+    @instrumented
     def merge_from_dir(
         self,
         relative_dir_name: str,
@@ -443,104 +1052,115 @@ class AiMdGenerator(NbPath):
         dry_run: bool = False,
         include_ast_metadata: bool = True,
         include_file_text: bool = True,
+        workers: int = None,
+        read_concurrency: int = None,
+        token_budget: int = None,
+        file_enumerator: str = "auto",
     ) -> "AiMdGenerator":
-        """Merges the content of the given directory into the current file."""
+        """Merges the content of the given directory into the current file.
+
+        excluded_dir_name_list / excluded_file_name_list: 排除的目录、文件，相对项目根目录的路径，
+                         可以使用通配符（"build_*"、"**/migrations"、"static/*.min.js"），见 path_exclusions.PathExclusions
+        token_budget: 这一段内容的 token 上限，见 merge_from_files_with_metadata
+        file_enumerator: 怎样列出目录中的文件。"walk" 遍历目录（见 dir_walker.PruningDirWalker）；
+                         "git" 用 git ls-files 从 git 索引中列出（见 git_file_lister.GitFileLister），需要 use_gitignore=True；
+                         "auto"（默认）在 use_gitignore=True、项目是 git 仓库并且能找到 git 时使用 "git"，否则 "walk"
+        """
+        if file_enumerator not in ("auto", "git", "walk"):
+            raise ValueError(f"file_enumerator must be 'auto', 'git' or 'walk', not {file_enumerator!r}")
         project_root =  project_root or self.project_root
         project_root_path = NbPath(project_root).resolve()
         target_dir_path = (project_root_path / relative_dir_name).resolve()
-        if not target_dir_path.exists():
+        if not self._source_exists(target_dir_path):
             raise FileNotFoundError(f"Directory {target_dir_path} not found.")
 
-        # Use sets for efficient lookups
-        excluded_dir_paths = {
-            (project_root_path / d).resolve() for d in excluded_dir_name_list
-        }
-        excluded_file_paths = {
-            (project_root_path / f).resolve() for f in excluded_file_name_list
-        }
-
-        ignore_patterns = []
-        if use_gitignore:
-            try:
-                gitignore_path = project_root_path.find_git_root() / ".gitignore"
-                if gitignore_path.is_file():
-                    self.logger.debug(f"Using .gitignore rules from: {gitignore_path}")
-                    with open(gitignore_path, "r", encoding="utf-8") as f:
-                        for line in f:
-                            line = line.strip()
-                            if line and not line.startswith("#"):
-                                # Gitignore patterns always use forward slashes.
-                                # We will compare against the posix version of the relative path
-                                # for cross-platform reliability.
-                                ignore_patterns.append(line)
-            except FileNotFoundError:
-                self.logger.warning("use_gitignore is True, but no .git/ or .gitignore file found.")
-
-        relative_paths_to_include = []
-        for path_obj in target_dir_path.rglob("*"):
-            # Automatically exclude directories starting with a dot at the project root
-            # unless the path is under the explicitly specified target directory
-            try:
-                first_part = path_obj.relative_to(project_root_path).parts[0]
-                if first_part.startswith('.') and target_dir_path not in path_obj.parents and path_obj != target_dir_path:
-                    continue
-            except (ValueError, IndexError):
-                continue
-            # Check if the path is within any of the excluded directories
-            is_in_excluded_dir = any(
-                path_obj == excluded_dir or excluded_dir in path_obj.parents
-                for excluded_dir in excluded_dir_paths
+        # 编译成路径分段前缀树，每个路径的判断只和深度有关
+        exclusions = PathExclusions.for_root(project_root_path, excluded_dir_name_list, excluded_file_name_list)
+
+        file_source = self._file_source()
+        gitignore_matcher, git_root_prefix = (None, "")
+        if use_gitignore and file_source is None:
+            gitignore_matcher, git_root_prefix = self._get_gitignore_matcher(project_root_path)
+
+        # 自顶向下遍历，被排除、被 gitignore 的目录不会进入
+        walker = PruningDirWalker(
+            project_root_path,
+            gitignore_matcher=gitignore_matcher,
+            git_root_prefix=git_root_prefix,
+            exclusions=exclusions,
+            should_include_suffixes=should_include_suffixes,
+        )
+        watch_targets = getattr(self, "_watch_targets", None)
+        if watch_targets is not None:
+            watch_targets.add_dir(target_dir_path, walker)
+
+        # 监视模式下目录里没有任何变化时，整个章节从上一次的输出复制，不再遍历目录
+        incremental = self._get_incremental_build()
+        section_key = None
+        if incremental is not None and not dry_run:
+            section_key = incremental.section_key(
+                "merge_from_dir", self.project_name, str(project_root_path), str(target_dir_path), as_title,
+                sorted(should_include_suffixes), exclusions.dir_patterns, exclusions.file_patterns,
+                use_gitignore, include_ast_metadata, include_file_text, token_budget, file_enumerator,
+                sorted(getattr(self, "core_file_list", ())) if token_budget is not None else None,
             )
-            if is_in_excluded_dir:
-                continue
-
-            # Check if the path matches any gitignore patterns.
-            # Convert the relative path to a posix-style string for reliable matching.
-            relative_to_root = path_obj.relative_to(project_root_path)
-            relative_posix_path = relative_to_root.as_posix()
-            # Use fnmatch for robust gitignore-style pattern matching.
-            is_ignored = False
-            for p in ignore_patterns:
-                # If a pattern does not contain a slash, it matches in any directory.
-                # e.g., 'test_git_ignore1.py' should match 'nb_path/example_dir/test_git_ignore1.py'
-                if '/' not in p.strip('/'):
-                    p_glob = f"**/{p.strip('/')}"
-                else:
-                    p_glob = p
-                if fnmatch.fnmatch(relative_posix_path, p_glob) or fnmatch.fnmatch(relative_posix_path, p):
-                    is_ignored = True
-                    break
-            if is_ignored:
-                self.logger.debug(f"Ignoring {relative_to_root} due to .gitignore rule.")
-                continue
-
-            if path_obj.is_file():
-                # Check if the file itself is excluded
-                if path_obj.resolve() in excluded_file_paths:
-                    continue
-                # Check if the file is a text file
-                if not path_obj.is_text():
-                    continue
-                # Check if the suffix is in the inclusion list (if the list is not empty)
-                if (
-                    should_include_suffixes
-                    and path_obj.suffix not in should_include_suffixes
-                ):
-                    continue
-                relative_paths_to_include.append(
-                    path_obj.relative_to(project_root_path).as_posix()
-                )
+            record = incremental.lookup_section(section_key, [str(target_dir_path)])
+            if record is not None:
+                return self._write_reused_section(as_title, record)
+
+        file_lister = walker
+        if file_source is not None:
+            # git 版本、归档中的文件从它们自己的文件列表列出，不访问磁盘上的目录
+            file_lister = SourceLister(
+                file_source,
+                project_root_path,
+                exclusions=exclusions,
+                should_include_suffixes=should_include_suffixes,
+            )
+        elif file_enumerator != "walk" and gitignore_matcher is not None and GitFileLister.available(gitignore_matcher.root):
+            file_lister = GitFileLister(
+                project_root_path,
+                gitignore_matcher.root,
+                git_root_prefix=git_root_prefix,
+                exclusions=exclusions,
+                should_include_suffixes=should_include_suffixes,
+            )
+        elif file_enumerator == "git":
+            raise GitListError("file_enumerator='git' needs use_gitignore=True, a git repository and a git executable")
+        scan_index = self.scan_index if file_source is None else None
+        if scan_index is not None:
+            # 同一个目录或者它的上级目录已经遍历过时，在内存中按后缀、排除规则过滤
+            file_lister = scan_index.wrap(file_lister)
+        with self._get_build_stats().stage(build_stats.SCAN, category="stage", dir=relative_dir_name):
+            try:
+                walked_files = list(file_lister.walk(target_dir_path))
+            except GitListError as e:
+                if file_enumerator == "git":
+                    raise
+                self.logger.warning(f"{e}, falling back to walking the directory")
+                file_lister = walker if scan_index is None else scan_index.wrap(walker)
+                walked_files = list(file_lister.walk(target_dir_path))
+        self._get_build_stats().add(build_stats.SCAN, files=len(walked_files), calls=0)
+        if exclusions.hits:
+            # 每条排除规则命中的目录、文件数：一个被排除的目录计一次，与文件是遍历目录、扫描索引还是 git 列出的无关
+            exclusion_hits = self._get_build_stats().caches.setdefault("exclusions", {})
+            for pattern, hits in exclusions.hits.items():
+                exclusion_hits[pattern] = exclusion_hits.get(pattern, 0) + hits
+        relative_paths_to_include = [f.relative_path for f in walked_files]
+        walk_stats = file_lister.stats
+        lister_name = type(file_lister).__name__
+        if isinstance(file_lister, IndexedLister):
+            lister_name = f"{type(file_lister.lister).__name__}, {'scan index hit' if file_lister.hit else 'indexed'}"
+        self.logger.info(
+            f"Scanned '{relative_dir_name}' ({lister_name}): visited {walk_stats.dirs_visited} dirs, "
+            f"pruned {walk_stats.dirs_pruned} dirs (excluded: {walk_stats.dirs_pruned_excluded}, gitignore: {walk_stats.dirs_pruned_gitignore}), "
+            f"included {walk_stats.files_included} of {walk_stats.files_seen} files, pruned {walk_stats.files_pruned} files"
+        )
 
         # 打印体积最大的20个文件
         if relative_paths_to_include:
-            file_sizes = []
-            for rel_path in relative_paths_to_include:
-                abs_path = project_root_path / rel_path
-                try:
-                    size = abs_path.stat().st_size
-                    file_sizes.append((rel_path, size))
-                except Exception:
-                    file_sizes.append((rel_path, 0))
+            # 文件大小在遍历时已经从 DirEntry 的 stat 结果中拿到
+            file_sizes = [(f.relative_path, f.size) for f in walked_files]
             
             # 按文件大小降序排序
             file_sizes.sort(key=lambda x: x[1], reverse=True)
@@ -566,15 +1186,194 @@ class AiMdGenerator(NbPath):
             print("\n--- End of DRY RUN ---")
             return self
         else:
+            if section_key is not None:
+                incremental.begin_section(section_key, self._get_output_session().tell(), self.token_accounting.total)
             # 使用带元数据的方法
-            return self.merge_from_files_with_metadata(
+            self.merge_from_files_with_metadata(
                 relative_paths_to_include, 
                 as_title,
                 project_root=project_root,
                 include_ast_metadata=include_ast_metadata,
                 include_file_text=include_file_text,
+                workers=workers,
+                read_concurrency=read_concurrency,
+                token_budget=token_budget,
+            )
+            if section_key is not None:
+                incremental.end_section(self._get_output_session().tell(), self.token_accounting.total)
+            return self
+
+    @instrumented
+    def merge_changed_since(
+        self,
+        base_rev: str,
+        head_rev: str = "WORKTREE",
+        as_title: str = None,
+        project_root: typing.Union[os.PathLike, str] = None,
+        should_include_suffixes: typing.List[str] = [],
+        include_dependents: bool = True,
+        context_lines: int = 3,
+        max_diff_lines_per_file: int = 400,
+        workers: int = None,
+        read_concurrency: int = None,
+    ) -> "AiMdGenerator":
+        """
+        代码评审用的上下文：只合并 base_rev 到 head_rev 之间变化的文件，以及 import 了它们的文件
+
+        依次写入三个章节：
+        1. 变化的文件列表和每个文件的 unified diff（一次 git diff 调用得到，见 git_diff.diff_changed_files）
+        2. 变化的文件（新增、修改）的完整源码和 AST 元数据
+        3. import 了变化的（包括被删除的）.py 文件的项目文件，只有 AST 元数据。依赖关系与 add_file_dependencies 相同，
+           但只解析文本中可能引用了变化模块的文件（由 git grep 找出，不在 Python 中读取项目的每个文件），
+           生成时间与变化的大小有关，而不是与项目大小有关
+
+        Args:
+            base_rev: 比较的起点，例如 "main"、"v1.7"、"HEAD~3"
+            head_rev: "WORKTREE"（默认）比较工作区中被跟踪的文件（未跟踪的新文件需要先 git add -N）；
+                      其他版本需要与 set_project_propery 的 git_rev 相同，文件内容从该版本读取
+            as_title: 章节标题，默认 "<project_name> changes since <base_rev>"
+            should_include_suffixes: 只合并这些后缀的变化文件，为空时全部
+            include_dependents: 是否包含 import 了变化文件的文件
+            context_lines: diff 的上下文行数
+            max_diff_lines_per_file: 每个文件的 diff 最多显示的行数，超出部分省略
+        """
+        self._check_project_name()
+        if getattr(self, "archive", None) is not None:
+            raise ValueError("merge_changed_since needs a git repository, it cannot be used with archive.")
+        git_rev = getattr(self, "git_rev", None)
+        if (head_rev == "WORKTREE") != (git_rev is None) or (git_rev is not None and head_rev != git_rev):
+            raise ValueError(
+                f"head_rev={head_rev!r} does not match the files this generator reads (git_rev={git_rev!r}); "
+                f"use head_rev='WORKTREE' without git_rev, or set_project_propery(..., git_rev=head_rev)."
+            )
+        project_root = project_root or self.project_root
+        project_root_path = NbPath(project_root).resolve()
+        as_title = as_title or f"{self.project_name} changes since {base_rev}"
+        changes = git_diff.diff_changed_files(
+            project_root_path, base_rev, None if head_rev == "WORKTREE" else head_rev, context_lines=context_lines,
+        )
+
+        changed_files = [
+            change.path for change in changes
+            if change.status not in ("D", "U")
+            and (not should_include_suffixes or NbPath(change.path).suffix in should_include_suffixes)
+            and self._source_is_text_file(project_root_path / change.path)
+        ]
+        dependents = []
+        changed_py = [change.path for change in changes if change.path.endswith(".py") and change.status != "U"]
+        if include_dependents and changed_py:
+            dependents = self._find_dependents(
+                project_root_path, changed_py, [c.path for c in changes if c.status == "D"],
+                None if head_rev == "WORKTREE" else head_rev,
+            )
+        self.logger.info(
+            f"{len(changes)} files changed since {base_rev} in {project_root_path}, "
+            f"merging {len(changed_files)} changed files and {len(dependents)} dependents"
+        )
+
+        self._begin_section(f"{as_title} diff")
+        self.append_text(self._format_changes_as_markdown(as_title, base_rev, head_rev, changes, max_diff_lines_per_file))
+        if changed_files:
+            self.merge_from_files_with_metadata(
+                changed_files, f"{as_title} changed files", project_root=project_root,
+                workers=workers, read_concurrency=read_concurrency,
+            )
+        if dependents:
+            self.merge_from_files_with_metadata(
+                dependents, f"{as_title} dependents (metadata only)", project_root=project_root,
+                include_file_text=False, workers=workers, read_concurrency=read_concurrency,
             )
+        return self
+
+    def _find_dependents(
+        self, project_root_path: NbPath, changed_py: typing.List[str], deleted_py: typing.List[str], rev: str = None,
+    ) -> typing.List[str]:
+        """import 了 changed_py 中任何一个文件的项目 .py 文件（不包括 changed_py 本身），rev 为 None 时使用工作区"""
+        all_py = self._list_project_py_files(project_root_path)
+        changed = set(changed_py)
+        # 只有文本中出现了变化模块的名字（或者从包的 __init__.py 相对导入）的文件才可能 import 它，
+        # 由 git grep 找出这些文件，只解析它们；模块名到文件的映射仍然使用全部文件（只需要文件名），和完整的依赖分析结果相同
+        names = set()
+        relative_package_import = False
+        for path in changed_py:
+            parts = path[:-3].split("/")
+            if parts[-1] == "__init__":
+                parts.pop()
+                relative_package_import = True
+            if parts:
+                names.add(parts[-1])
+        # 模块名都是标识符，不需要转义；git grep -w 按整词匹配
+        patterns = sorted(names)
+        if relative_package_import:
+            patterns.append(r"from[[:space:]]+\.+[[:space:]]+import")
+        all_py_set = set(all_py)
+        candidates = {
+            path for path in git_diff.grep_files(project_root_path, patterns, rev=rev)
+            if path in all_py_set and path not in changed
+        }
+        file_list = all_py + [path for path in deleted_py if path not in all_py]
+        reverse_deps = self._analyze_file_dependencies(file_list, project_root_path, analyze_files=candidates)["reverse_deps"]
+        self.logger.info(f"parsed {len(candidates)} of {len(all_py)} project files to find the dependents of {len(changed_py)} files")
+        return sorted({dependent for path in changed_py for dependent in reverse_deps.get(path, [])} - changed)
+
+    def _format_changes_as_markdown(
+        self,
+        as_title: str,
+        base_rev: str,
+        head_rev: str,
+        changes: typing.List[git_diff.ChangedFile],
+        max_diff_lines_per_file: int,
+    ) -> str:
+        """变化的文件列表和每个文件的 diff"""
+        status_names = {"A": "added", "M": "modified", "D": "deleted", "T": "type changed", "U": "unmerged"}
+        str_list = [f"# markdown content namespace: {as_title} diff \n\n"]
+        str_list.append(f"`{base_rev}` → `{head_rev}`: {len(changes)} files changed\n\n")
+        for change in changes:
+            str_list.append(f"- `{change.path}` ({status_names.get(change.status, change.status)})\n")
+        str_list.append("\n---\n\n")
+        for change in changes:
+            if not change.patch:
+                continue
+            lines = change.patch.splitlines()
+            if len(lines) > max_diff_lines_per_file:
+                lines = lines[:max_diff_lines_per_file] + [f"... ({len(lines) - max_diff_lines_per_file} more diff lines omitted)"]
+            str_list.append(f"### diff of `{change.path}`\n\n")
+            str_list.append(f"{FILE_CONTENT_BACKQUOTES}diff\n" + "\n".join(lines) + f"\n{FILE_CONTENT_BACKQUOTES}\n\n")
+        return "".join(str_list)
+
+    def _write_reused_section(self, as_title: str, record: dict) -> "AiMdGenerator":
+        """整段复制上一次 merge_from_dir 的章节，token 统计按清单中的记录补上"""
+        session = self._get_output_session()
+        incremental = self._get_incremental_build()
+        data, blocks = incremental.reuse_section(record, session.tell())
+        self._begin_section(as_title)
+        session.write_bytes(data)
+        accounting = self.token_accounting
+        accounting.add_tokens(record["tokens"] - sum(block["tokens"] for block in blocks))
+        for block in blocks:
+            accounting.begin_file(incremental.block_relative_path(block)).add_tokens(block["tokens"]).end_file()
+        self.logger.info(f"'{as_title}' has no changes, reused the whole section ({len(blocks)} files)")
+        return self
 
+    def _get_gitignore_matcher(self, project_root_path: NbPath) -> typing.Tuple[typing.Optional[GitIgnoreMatcher], str]:
+        """
+        获取 project_root 所在 git 仓库的 .gitignore 匹配器
+
+        Returns:
+            (matcher, prefix)，prefix 是 project_root 相对 git 根目录的 posix 路径前缀（以 / 结尾，同目录时为空字符串），
+            找不到 git 根目录时返回 (None, "")
+        """
+        try:
+            git_root = NbPath(project_root_path).find_git_root()
+        except FileNotFoundError:
+            self.logger.warning("use_gitignore is True, but no .git/ or .gitignore file found.")
+            return None, ""
+        self.logger.debug(f"Using .gitignore rules under git root: {git_root}")
+        prefix = NbPath(project_root_path).relative_to(git_root).as_posix()
+        prefix = "" if prefix == "." else prefix + "/"
+        return GitIgnoreMatcher.for_root(git_root), prefix
+
+    @instrumented
     def merge_dir_of_package_examples(self):
         """合并包的examples目录到当前markdown文件"""
         self._check_project_name()
@@ -600,412 +1399,39 @@ class AiMdGenerator(NbPath):
 
     def _ast_to_source(self, node) -> str:
         """将 AST 节点转换为源代码字符串，兼容 Python 3.7+"""
-        if node is None:
-            return ""
-        try:
-            # Python 3.9+ 支持 ast.unparse
-            if hasattr(ast, 'unparse'):
-                return ast.unparse(node)
-            else:
-                # Python 3.7/3.8 的回退方案
-                # 尝试使用 astor
-                try:
-                    import astor
-                    return astor.to_source(node).strip()
-                except ImportError:
-                    pass
-                
-                # 简单的手工处理常见情况
-                if isinstance(node, ast.Name):
-                    return node.id
-                elif isinstance(node, ast.Constant):
-                    return repr(node.value)
-                elif isinstance(node, ast.Attribute):
-                    value = self._ast_to_source(node.value)
-                    return f"{value}.{node.attr}"
-                elif isinstance(node, ast.Subscript):
-                    value = self._ast_to_source(node.value)
-                    slice_val = self._ast_to_source(node.slice)
-                    return f"{value}[{slice_val}]"
-                elif isinstance(node, (ast.List, ast.Tuple)):
-                    elts = [self._ast_to_source(e) for e in node.elts]
-                    if isinstance(node, ast.List):
-                        return f"[{', '.join(elts)}]"
-                    else:
-                        return f"({', '.join(elts)})"
-                else:
-                    # 对于复杂类型，返回类型名称
-                    return node.__class__.__name__
-        except Exception:
-            return ""
+        return ast_extractor.ast_to_source(node)
 
     def _parse_type_annotation(self, annotation) -> str:
         """解析类型注解，返回字符串表示"""
-        return self._ast_to_source(annotation)
+        return ast_extractor.ast_to_source(annotation)
 
     def _extract_function_metadata(self, node: typing.Union[ast.FunctionDef, ast.AsyncFunctionDef]) -> dict:
         """提取函数/方法的元数据"""
-        metadata = {
-            "name": node.name,
-            "type": "async_function" if isinstance(node, ast.AsyncFunctionDef) else "function",
-            "lineno": node.lineno,
-            "docstring": ast.get_docstring(node) or "",
-            "parameters": [],
-            "return_type": self._parse_type_annotation(node.returns),
-            "decorators": [self._ast_to_source(dec) for dec in node.decorator_list],
-            "is_public": not node.name.startswith("_"),
-        }
-
-        # 提取参数信息
-        for arg in node.args.args:
-            param_info = {
-                "name": arg.arg,
-                "type": self._parse_type_annotation(arg.annotation),
-                "default": None,
-            }
-            metadata["parameters"].append(param_info)
-
-        # 处理默认参数
-        defaults = node.args.defaults
-        if defaults:
-            # 默认值从后往前对应参数
-            num_defaults = len(defaults)
-            for i, default in enumerate(defaults):
-                param_idx = len(metadata["parameters"]) - num_defaults + i
-                if param_idx >= 0:
-                    try:
-                        metadata["parameters"][param_idx]["default"] = self._ast_to_source(default)
-                    except Exception:
-                        metadata["parameters"][param_idx]["default"] = "<complex_default>"
-
-        # 处理 *args 和 **kwargs
-        if node.args.vararg:
-            metadata["parameters"].append({
-                "name": f"*{node.args.vararg.arg}",
-                "type": self._parse_type_annotation(node.args.vararg.annotation),
-                "default": None,
-            })
-        if node.args.kwarg:
-            metadata["parameters"].append({
-                "name": f"**{node.args.kwarg.arg}",
-                "type": self._parse_type_annotation(node.args.kwarg.annotation),
-                "default": None,
-            })
-
-        return metadata
+        return ast_extractor.extract_function_metadata(node)
 
     def _extract_class_metadata(self, node: ast.ClassDef) -> dict:
         """提取类的元数据"""
-        metadata = {
-            "name": node.name,
-            "type": "class",
-            "lineno": node.lineno,
-            "docstring": ast.get_docstring(node) or "",
-            "bases": [self._ast_to_source(base) for base in node.bases],
-            "decorators": [self._ast_to_source(dec) for dec in node.decorator_list],
-            "methods": [],
-            "properties": [],
-            "class_variables": [],
-            "is_public": not node.name.startswith("_"),
-        }
-
-        # 遍历类的成员
-        for item in node.body:
-            if isinstance(item, (ast.FunctionDef, ast.AsyncFunctionDef)):
-                method_info = self._extract_function_metadata(item)
-                
-                # 检查是否是 property
-                is_property = any("property" in dec for dec in method_info["decorators"])
-                if is_property:
-                    metadata["properties"].append(method_info)
-                else:
-                    metadata["methods"].append(method_info)
-            
-            elif isinstance(item, ast.AnnAssign) and isinstance(item.target, ast.Name):
-                # 类变量（带类型注解）
-                value_str = ""
-                if item.value:
-                    try:
-                        value_str = self._ast_to_source(item.value)
-                        # 限制值的长度
-                        if len(value_str) > 50:
-                            pass
-                            # value_str = value_str[:50] + "..."
-                    except Exception:
-                        value_str = "<value>"
-                
-                metadata["class_variables"].append({
-                    "name": item.target.id,
-                    "type": self._parse_type_annotation(item.annotation),
-                    "value": value_str,
-                    "lineno": item.lineno,
-                })
-            elif isinstance(item, ast.Assign):
-                # 类变量（无类型注解）
-                for target in item.targets:
-                    if isinstance(target, ast.Name):
-                        # 提取值
-                        value_str = ""
-                        if item.value:
-                            try:
-                                value_str = self._ast_to_source(item.value)
-                                # 限制值的长度
-                                if len(value_str) > 50:
-                                    pass
-                                    # value_str = value_str[:50] + "..."
-                            except Exception:
-                                value_str = "<value>"
-                        
-                        metadata["class_variables"].append({
-                            "name": target.id,
-                            "type": "",
-                            "value": value_str,
-                            "lineno": item.lineno,
-                        })
-
-        return metadata
+        return ast_extractor.extract_class_metadata(node)
 
     def _parse_python_file_ast(self, file_path: NbPath) -> dict:
-        """解析 Python 文件的 AST，提取所有元数据"""
-        try:
-            source_code = file_path.read_text(encoding="utf-8")
-            # 移除 BOM (Byte Order Mark) 字符，如果存在的话
-            # BOM 是 U+FEFF，在 UTF-8 编码中是 \ufeff
-            if source_code.startswith('\ufeff'):
-                source_code = source_code[1:]
-                self.logger.debug(f"Removed BOM from file: {file_path}")
-            tree = ast.parse(source_code, filename=str(file_path))
-        except Exception as e:
-            self.logger.error(f"Failed to parse Python file {file_path}: {e}")
-            return {
-                "error": str(e),
-                "classes": [],
-                "functions": [],
-                "imports": [],
-                "module_docstring": "",
-            }
-
-        metadata = {
-            "file": str(file_path),
-            "module_docstring": ast.get_docstring(tree) or "",
-            "classes": [],
-            "functions": [],
-            "imports": [],
-            "constants": [],
-        }
-
-        # 遍历模块级别的节点
-        for node in ast.walk(tree):
-            # 只处理模块级别的定义（通过检查父节点）
-            if isinstance(node, ast.ClassDef):
-                # 检查是否是顶级类（不在其他类内部）
-                parent = None
-                for potential_parent in ast.walk(tree):
-                    if isinstance(potential_parent, ast.ClassDef) and node in ast.walk(potential_parent) and node != potential_parent:
-                        parent = potential_parent
-                        break
-                if parent is None:  # 顶级类
-                    metadata["classes"].append(self._extract_class_metadata(node))
-
-            elif isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)):
-                # 检查是否是顶级函数（不在类内部）
-                parent_class = None
-                for potential_parent in ast.walk(tree):
-                    if isinstance(potential_parent, ast.ClassDef) and node in ast.walk(potential_parent):
-                        parent_class = potential_parent
-                        break
-                if parent_class is None:  # 顶级函数
-                    metadata["functions"].append(self._extract_function_metadata(node))
-
-            elif isinstance(node, (ast.Import, ast.ImportFrom)):
-                if isinstance(node, ast.Import):
-                    for alias in node.names:
-                        metadata["imports"].append({
-                            "type": "import",
-                            "module": alias.name,
-                            "alias": alias.asname,
-                            "lineno": node.lineno,
-                        })
-                else:  # ImportFrom
-                    module = node.module or ""
-                    for alias in node.names:
-                        metadata["imports"].append({
-                            "type": "from_import",
-                            "module": module,
-                            "name": alias.name,
-                            "alias": alias.asname,
-                            "lineno": node.lineno,
-                        })
-
-        return metadata
+        """解析 Python 文件的 AST，提取所有元数据（结果缓存在 module_registry 中）"""
+        module = self.module_registry.get(file_path)
+        if module.error is not None:
+            self.logger.error(f"Failed to parse Python file {file_path}: {module.error}")
+        return module.metadata
 
     def _format_py_metadata_as_markdown(self, metadata: dict, relative_file_name: str) -> str:
         """将 Python 文件元数据格式化为 Markdown"""
-        lines = []
-        lines.append(f"\n### 📄 Python File Metadata: `{relative_file_name}`\n")
-
-        # 模块文档字符串
-        if metadata.get("module_docstring"):
-            lines.append("#### 📝 Module Docstring\n")
-            lines.append(FILE_CONTENT_BACKQUOTES)
-            lines.append(metadata["module_docstring"])
-            lines.append(f"{FILE_CONTENT_BACKQUOTES}\n")
-
-        # 导入信息
-        if metadata.get("imports"):
-            lines.append("#### 📦 Imports\n")
-            for imp in metadata["imports"]:  # 显示所有 imports，不再限制数量
-                if imp["type"] == "import":
-                    alias_str = f" as {imp['alias']}" if imp['alias'] else ""
-                    lines.append(f"- `import {imp['module']}{alias_str}`")
-                else:
-                    alias_str = f" as {imp['alias']}" if imp['alias'] else ""
-                    lines.append(f"- `from {imp['module']} import {imp['name']}{alias_str}`")
-            lines.append("")
-
-        # 类信息
-        if metadata.get("classes"):
-            lines.append(f"#### 🏛️ Classes ({len(metadata['classes'])})\n")
-            for cls in metadata["classes"]:
-                # 只显示公有类或所有类（根据需要）
-                class_header = f"##### 📌 `class {cls['name']}"
-                if cls["bases"]:
-                    class_header += f"({', '.join(cls['bases'])})"
-                class_header += "`"
-                lines.append(class_header)
-                lines.append(f"*Line: {cls['lineno']}*\n")
-                
-                if cls["docstring"]:
-                    # 显示完整的类文档字符串
-                    docstring_lines = cls["docstring"].split("\n")
-                    lines.append("**Docstring:**")
-                    lines.append(FILE_CONTENT_BACKQUOTES)
-                    lines.extend(docstring_lines)
-                    lines.append(f"{FILE_CONTENT_BACKQUOTES}\n")
-
-                # 首先单独显示 __init__ 方法（非常重要）
-                init_method = None
-                for method in cls["methods"]:
-                    if method["name"] == "__init__":
-                        init_method = method
-                        break
-                
-                if init_method:
-                    lines.append("**🔧 Constructor (`__init__`):**")
-                    params_str = self._format_parameters(init_method["parameters"])
-                    lines.append(f"- `def __init__({params_str})`")
-                    
-                    # 显示 __init__ 的完整文档字符串
-                    if init_method["docstring"]:
-                        lines.append("  - **Docstring:**")
-                        lines.append(f"  {FILE_CONTENT_BACKQUOTES}")
-                        for doc_line in init_method["docstring"].split("\n"):
-                            lines.append(f"  {doc_line}")
-                        lines.append(f"  {FILE_CONTENT_BACKQUOTES}")
-                    
-                    # 显示每个参数的详细信息
-                    if init_method["parameters"]:
-                        lines.append("  - **Parameters:**")
-                        for param in init_method["parameters"]:
-                            param_name = param["name"]
-                            param_type = f": {param['type']}" if param["type"] else ""
-                            param_default = f" = {param['default']}" if param["default"] else ""
-                            lines.append(f"    - `{param_name}{param_type}{param_default}`")
-                    lines.append("")
-
-                # 公有方法（排除 __init__）
-                public_methods = [m for m in cls["methods"] if m["is_public"] and m["name"] != "__init__"]
-                if public_methods:
-                    lines.append(f"**Public Methods ({len(public_methods)}):**")
-                    for method in public_methods:
-                        params_str = self._format_parameters(method["parameters"])
-                        return_str = f" -> {method['return_type']}" if method["return_type"] else ""
-                        async_str = "async " if method["type"] == "async_function" else ""
-                        
-                        decorators_str = ""
-                        if method["decorators"]:
-                            decorators_str = " " + " ".join([f"`{d}`" for d in method["decorators"]])
-                        
-                        lines.append(f"- `{async_str}def {method['name']}({params_str}){return_str}`{decorators_str}")
-                        
-                        # 显示完整的文档字符串
-                        if method["docstring"]:
-                            # 如果文档字符串只有一行，用简短格式显示
-                            docstring_lines = method["docstring"].split("\n")
-                            if len(docstring_lines) == 1:
-                                lines.append(f"  - *{method['docstring'].strip()}*")
-                            else:
-                                # 多行文档字符串,用代码块格式显示
-                                lines.append("  - **Docstring:**")
-                                lines.append(f"  {FILE_CONTENT_BACKQUOTES}")
-                                for doc_line in docstring_lines:
-                                    lines.append(f"  {doc_line}")
-                                lines.append(f"  {FILE_CONTENT_BACKQUOTES}")
-                    lines.append("")
-
-                # Properties
-                if cls["properties"]:
-                    lines.append(f"**Properties ({len(cls['properties'])}):**")
-                    for prop in cls["properties"]:
-                        return_str = f" -> {prop['return_type']}" if prop["return_type"] else ""
-                        lines.append(f"- `@property {prop['name']}{return_str}`")
-                    lines.append("")
-
-                # 类变量
-                if cls["class_variables"]:
-                    lines.append(f"**Class Variables ({len(cls['class_variables'])}):**")
-                    for var in cls["class_variables"]:
-                        type_str = f": {var['type']}" if var["type"] else ""
-                        value_str = f" = {var['value']}" if var.get("value") else ""
-                        lines.append(f"- `{var['name']}{type_str}{value_str}`")
-                    lines.append("")
-
-        # 顶级函数
-        if metadata.get("functions"):
-            public_functions = [f for f in metadata["functions"] if f["is_public"]]
-            if public_functions:
-                lines.append(f"#### 🔧 Public Functions ({len(public_functions)})\n")
-                for func in public_functions:
-                    params_str = self._format_parameters(func["parameters"])
-                    return_str = f" -> {func['return_type']}" if func["return_type"] else ""
-                    async_str = "async " if func["type"] == "async_function" else ""
-                    
-                    decorators_str = ""
-                    if func["decorators"]:
-                        decorators_str = " " + " ".join([f"`{d}`" for d in func["decorators"]])
-                    
-                    lines.append(f"- `{async_str}def {func['name']}({params_str}){return_str}`{decorators_str}")
-                    lines.append(f"  - *Line: {func['lineno']}*")
-                    
-                    if func["docstring"]:
-                        # 如果文档字符串只有一行，用简短格式显示
-                        docstring_lines = func["docstring"].split("\n")
-                        if len(docstring_lines) == 1:
-                            lines.append(f"  - *{func['docstring'].strip()}*")
-                        else:
-                            # 多行文档字符串,用代码块格式显示
-                            lines.append("  - **Docstring:**")
-                            lines.append(f"  {FILE_CONTENT_BACKQUOTES}")
-                            for doc_line in docstring_lines:
-                                lines.append(f"  {doc_line}")
-                            lines.append(f"  {FILE_CONTENT_BACKQUOTES}")
-                    lines.append("")
-
-        lines.append("\n---\n")
-        return "\n".join(lines)
+        start = time.perf_counter()
+        markdown = metadata_markdown.format_py_metadata_as_markdown(metadata, relative_file_name)
+        self._get_build_stats().record(build_stats.RENDER, start, files=1, detail=relative_file_name)
+        return markdown
 
     def _format_parameters(self, parameters: list) -> str:
         """格式化函数参数列表"""
-        param_strs = []
-        for param in parameters:
-            param_str = param["name"]
-            if param["type"]:
-                param_str += f": {param['type']}"
-            if param["default"]:
-                param_str += f" = {param['default']}"
-            param_strs.append(param_str)
-        return ", ".join(param_strs)
+        return metadata_markdown.format_parameters(parameters)
 
+    @instrumented
     def merge_from_files_with_metadata(
         self,
         relative_file_name_list: typing.List[str],
@@ -1013,6 +1439,9 @@ class AiMdGenerator(NbPath):
         project_root: typing.Union[os.PathLike, str] = None,
         include_ast_metadata: bool = True,
         include_file_text: bool = True,
+        workers: int = None,
+        read_concurrency: int = None,
+        token_budget: int = None,
     ) -> "AiMdGenerator":
         """
         合并文件内容到 Markdown，对于 Python 文件会额外生成 AST 元数据
@@ -1023,69 +1452,195 @@ class AiMdGenerator(NbPath):
             as_title: 标题
             include_ast_metadata: 是否包含 AST 元数据（仅对 .py 文件）
             include_file_text: 是否包含完整文件源码（False 时只显示元数据）
+            workers: 提取 AST 元数据的进程数，大于 1 时使用 ProcessPoolExecutor（见 parallel_extract），
+                     输出与串行完全一致；默认使用 set_project_propery 的 workers
+            read_concurrency: 并发读取文件的线程数，默认使用 set_project_propery 的 read_concurrency
+            token_budget: 这一段内容的 token 上限。按优先级（核心文件、后缀、被依赖次数）为每个文件选择
+                          完整源码、只有元数据或一行占位说明，保证不超过预算（见 token_budget.TokenBudgetPlanner）
         """
         self._check_project_name()
         project_root =  project_root or self.project_root
-        file_text_list = []
-        project_root_path = NbPath(project_root).resolve()
-        
-        for relative_file_name in relative_file_name_list:
-            file = (project_root_path / relative_file_name).resolve()
-            if not file.exists():
-                raise FileNotFoundError(f"File {file} not found.")
-            if file.is_file() and file.is_text():
-                relative_file_name_posix = file.relative_to(project_root_path).as_posix()
-                try:
-                    text = file.read_text()
-                except Exception as e:
-                    self.logger.error(f"Error reading file {file}: {e}")
-                    text = ""
-                
-                file_text_list.append([file, relative_file_name_posix, file.suffix, text])
-                self.logger.debug(f"need merged file: {file}")
-            else:
-                raise ValueError(f"File {file} is not a text file.")
-        
-        str_list = []
-        if file_text_list:
-            str_list.extend(self._generate_markdown_header(as_title, file_text_list))
-
-        for file, relative_file_name_posix, suffix, text in file_text_list:
-            # 如果不包含文件内容，只输出元数据（仅对 Python 文件）
-            if not include_file_text:
-                if suffix == ".py" and include_ast_metadata:
-                    # 只显示元数据，不显示源码
-                    metadata = self._parse_python_file_ast(file)
-                    metadata_md = self._format_py_metadata_as_markdown(metadata, relative_file_name_posix)
-                    str_list.append(metadata_md)
-                    str_list.append("\n")
-                # 非 Python 文件跳过
-                continue
-            
-            # 正常流程：包含文件内容
-            str_list.append(f"--- **start of file: {relative_file_name_posix}** (project: {self.project_name}) --- \n")
-            
-            # 对于 Python 文件，添加 AST 元数据
-            if suffix == ".py" and include_ast_metadata:
-                metadata = self._parse_python_file_ast(file)
-                metadata_md = self._format_py_metadata_as_markdown(metadata, relative_file_name_posix)
-                str_list.append(metadata_md)
-            
-            # 添加完整的文件内容
-            lang = self.suffix__lang_map.get(suffix, "text")
-            str_list.append(f"{FILE_CONTENT_BACKQUOTES}{lang}\n{text}\n{FILE_CONTENT_BACKQUOTES}\n")
+        workers = workers or getattr(self, "workers", 1)
+        read_concurrency = read_concurrency or getattr(self, "read_concurrency", 1)
+        file_list = self._collect_text_files(relative_file_name_list, project_root, read_concurrency)
+        budget_plan = None
+        if token_budget is not None and file_list:
+            budget_plan = self._plan_token_budget(
+                as_title, file_list, token_budget, project_root,
+                include_ast_metadata=include_ast_metadata, include_file_text=include_file_text,
+                workers=workers, read_concurrency=read_concurrency,
+            )
+        self._begin_section(as_title)
+        self._write_parts(self._iter_merge_with_metadata_parts(
+            as_title, file_list, include_ast_metadata=include_ast_metadata, include_file_text=include_file_text,
+            workers=workers, read_concurrency=read_concurrency, budget_plan=budget_plan,
+        ))
+        return self
 
-            str_list.append(f"--- **end of file: {relative_file_name_posix}** (project: {self.project_name}) --- \n")
-            str_list.append("---\n\n")
+    def _iter_py_metadata_markdowns(
+        self, py_files: typing.List[typing.Tuple[NbPath, str]], workers: int = 1
+    ) -> typing.Iterator[str]:
+        """按顺序产出 (file, relative_file_name_posix) 的元数据 markdown，workers > 1 时由子进程生成"""
+        if workers > 1:
+            return parallel_extract.iter_metadata_markdown(
+                self.module_registry, py_files, workers,
+                on_error=lambda file_path, error: self.logger.error(f"Failed to parse Python file {file_path}: {error}"),
+            )
+        return (
+            self._format_py_metadata_as_markdown(self._parse_python_file_ast(file), relative_file_name_posix)
+            for file, relative_file_name_posix in py_files
+        )
 
-        self.append_text('\n'.join(str_list))
-        self.ensure_utf8_bom()
-        return self
+    def _file_parts(
+        self,
+        mode: str,
+        relative_file_name_posix: str,
+        suffix: str,
+        text: str = None,
+        metadata_md: str = None,
+        full_tokens: int = 0,
+    ) -> typing.List[str]:
+        """一个文件在某种输出方式（token_budget 的 MODE_*）下的 markdown 片段"""
+        if mode == MODE_STUB:
+            return [f"--- **omitted file: {relative_file_name_posix}** (project: {self.project_name}, "
+                    f"~{full_tokens} tokens, over the token budget) --- \n"]
+        if mode == MODE_METADATA:
+            # 只显示元数据，不显示源码；非 Python 文件跳过
+            return [metadata_md, "\n"] if metadata_md is not None else []
+        parts = [f"--- **start of file: {relative_file_name_posix}** (project: {self.project_name}) --- \n"]
+        # 对于 Python 文件，添加 AST 元数据
+        if metadata_md is not None:
+            parts.append(metadata_md)
+        # 添加完整的文件内容
+        lang = self.suffix__lang_map.get(suffix, "text")
+        parts.append(f"{FILE_CONTENT_BACKQUOTES}{lang}\n{text}\n{FILE_CONTENT_BACKQUOTES}\n")
+        parts.append(f"--- **end of file: {relative_file_name_posix}** (project: {self.project_name}) --- \n")
+        parts.append("---\n\n")
+        return parts
+
+    @staticmethod
+    def _parts_tokens(parts: typing.Iterable[str]) -> int:
+        # 片段之间用换行连接，见 _write_parts
+        return sum(estimate_tokens(part) + 1 for part in parts)
+
+    def _plan_token_budget(
+        self,
+        as_title: str,
+        file_list: typing.List[list],
+        max_tokens: int,
+        project_root: typing.Union[os.PathLike, str],
+        include_ast_metadata: bool = True,
+        include_file_text: bool = True,
+        workers: int = 1,
+        read_concurrency: int = 1,
+    ) -> BudgetPlan:
+        """估算每个文件在各种输出方式下的 token 数，并按预算为每个文件选择输出方式"""
+        py_files = [(file, rel) for file, rel, suffix, _ in file_list if suffix == ".py"]
+        markdowns = self._iter_py_metadata_markdowns(py_files if include_ast_metadata else [], workers)
+        texts = self._iter_file_texts(file_list if include_file_text else [], read_concurrency)
+        entries = []
+        try:
+            for file, rel, suffix, _ in file_list:
+                metadata_md = next(markdowns) if include_ast_metadata and suffix == ".py" else None
+                full_tokens = None
+                if include_file_text:
+                    full_tokens = self._parts_tokens(self._file_parts(MODE_FULL, rel, suffix, next(texts), metadata_md))
+                metadata_tokens = None
+                if metadata_md is not None or not include_file_text:
+                    metadata_tokens = self._parts_tokens(self._file_parts(MODE_METADATA, rel, suffix, metadata_md=metadata_md))
+                entry = BudgetEntry(rel, suffix, full_tokens, metadata_tokens, 0)
+                entry.stub_tokens = self._parts_tokens(
+                    self._file_parts(MODE_STUB, rel, suffix, full_tokens=entry.omitted_tokens)
+                )
+                entries.append(entry)
+        finally:
+            markdowns.close()
+            texts.close()
+
+        # 依赖中心度：项目内有多少个文件 import 了它（解析结果来自 module_registry，不会重复解析）
+        reverse_deps = self._analyze_file_dependencies([rel for _, rel in py_files], project_root)["reverse_deps"]
+        core_files = set(getattr(self, "core_file_list", ()))
+        for entry in entries:
+            entry.is_core = entry.relative_path in core_files
+            entry.centrality = len(reverse_deps.get(entry.relative_path, ()))
+
+        fixed_tokens = self._parts_tokens(self._generate_markdown_header(as_title, file_list))
+        # 预算说明行里的数字按最大位数估算
+        widest_plan = BudgetPlan(max_tokens, max_tokens, [])
+        fixed_tokens += self._parts_tokens([self._budget_summary_line(widest_plan)]) + 3
+        plan = TokenBudgetPlanner(max_tokens, fixed_tokens).plan(entries)
+        if plan.planned_tokens > max_tokens:
+            self.logger.warning(f"'{as_title}': even with every file omitted the section needs ~{plan.planned_tokens} tokens, "
+                                f"more than the token budget {max_tokens}")
+        self.logger.info(f"'{as_title}' {plan.summary()}")
+        return plan
+
+    def _budget_summary_line(self, plan: BudgetPlan) -> str:
+        return f"> 🎯 {plan.summary()}\n"
+
+    def _iter_merge_with_metadata_parts(
+        self,
+        as_title: str,
+        file_list: typing.List[list],
+        include_ast_metadata: bool = True,
+        include_file_text: bool = True,
+        workers: int = 1,
+        read_concurrency: int = 1,
+        budget_plan: BudgetPlan = None,
+    ) -> typing.Iterator[str]:
+        """按顺序产出 merge_from_files_with_metadata 的各个 markdown 片段，片段之间用换行连接"""
+        if file_list:
+            yield from self._generate_markdown_header(as_title, file_list)
+        if budget_plan is not None:
+            yield self._budget_summary_line(budget_plan)
+
+        def mode_of(relative_file_name_posix):
+            if budget_plan is not None:
+                return budget_plan.mode_of(relative_file_name_posix)
+            # 不包含文件内容时只输出元数据（仅对 Python 文件）
+            return MODE_FULL if include_file_text else MODE_METADATA
+
+        # 增量生成时按输出方式分别查找可以复用的文件块；占位说明很短，总是重新生成
+        blocks = {}
+        for mode in (MODE_FULL, MODE_METADATA):
+            blocks.update(self._incremental_blocks(
+                as_title, f"metadata:{include_ast_metadata}:{mode}", [e for e in file_list if mode_of(e[1]) == mode],
+            ))
+
+        def needs_render(relative_file_name_posix, *modes):
+            return mode_of(relative_file_name_posix) in modes and blocks.get(relative_file_name_posix, (None, None))[1] is None
+
+        # workers > 1 时元数据片段由子进程按顺序提前生成；只输出元数据或占位说明的文件、复用的文件块不需要读取文件内容
+        markdowns = self._iter_py_metadata_markdowns([
+            (file, rel) for file, rel, suffix, _ in file_list
+            if include_ast_metadata and suffix == ".py" and needs_render(rel, MODE_FULL, MODE_METADATA)
+        ], workers)
+        texts = self._iter_file_texts([entry for entry in file_list if needs_render(entry[1], MODE_FULL)], read_concurrency)
+        try:
+            for file, relative_file_name_posix, suffix, _ in file_list:
+                mode = mode_of(relative_file_name_posix)
+                block_key, reused = blocks.get(relative_file_name_posix, (None, None))
+                self._begin_file(relative_file_name_posix, file, block_key, reused)
+                if reused is not None:
+                    yield self._get_incremental_build().read_block(reused)
+                elif mode == MODE_STUB:
+                    yield from self._file_parts(
+                        mode, relative_file_name_posix, suffix, full_tokens=budget_plan.entries[relative_file_name_posix].omitted_tokens,
+                    )
+                else:
+                    metadata_md = next(markdowns) if include_ast_metadata and suffix == ".py" else None
+                    text = next(texts) if mode == MODE_FULL else None
+                    yield from self._file_parts(mode, relative_file_name_posix, suffix, text, metadata_md)
+                self._end_file()
+        finally:
+            texts.close()
+            markdowns.close()
 
     def _analyze_file_dependencies(
         self, 
         file_list: typing.List[str], 
-        project_root: typing.Union[os.PathLike, str] = None
+        project_root: typing.Union[os.PathLike, str] = None,
+        analyze_files: typing.Collection[str] = None,
     ) -> dict:
         """
         分析项目文件之间的 import 依赖关系
@@ -1093,6 +1648,7 @@ class AiMdGenerator(NbPath):
         Args:
             file_list: 相对文件路径列表
             project_root: 项目根目录
+            analyze_files: 只解析这些文件的 import（默认 file_list 全部），file_list 仍然全部用于模块名到文件的映射
             
         Returns:
             dict: {
@@ -1143,18 +1699,16 @@ class AiMdGenerator(NbPath):
         for relative_file in file_list:
             if not relative_file.endswith('.py'):
                 continue
+            if analyze_files is not None and relative_file not in analyze_files:
+                continue
                 
             file_path = project_root_path / relative_file
-            if not file_path.exists():
+            if not self._source_exists(file_path):
                 continue
                 
-            try:
-                source_code = file_path.read_text(encoding='utf-8')
-                if source_code.startswith('\ufeff'):
-                    source_code = source_code[1:]
-                tree = ast.parse(source_code)
-            except Exception as e:
-                self.logger.warning(f"无法解析文件 {relative_file}: {e}")
+            module = self.module_registry.get(file_path)
+            if module.error is not None:
+                self.logger.warning(f"无法解析文件 {relative_file}: {module.error}")
                 continue
             
             current_module = file_to_module.get(relative_file, '')
@@ -1165,42 +1719,29 @@ class AiMdGenerator(NbPath):
             else:
                 current_package = '.'.join(current_module.split('.')[:-1]) if '.' in current_module else ''
             
-            for node in ast.walk(tree):
-                if isinstance(node, ast.Import):
-                    for alias in node.names:
-                        module_name = alias.name
-                        self._categorize_import(
-                            module_name, relative_file, module_to_file,
-                            internal_deps, external_deps, reverse_deps
-                        )
-                        
-                elif isinstance(node, ast.ImportFrom):
-                    module_name = node.module or ''
-                    
-                    # 处理相对导入
-                    if node.level > 0:  # 相对导入
-                        if current_package:
-                            # 计算绝对模块名
-                            # level=1 表示当前包，level=2 表示父包，以此类推
-                            package_parts = current_package.split('.')
-                            # 回退 level-1 级（level=1 时不回退，就是当前包）
-                            levels_to_go_up = node.level - 1
-                            if levels_to_go_up < len(package_parts):
-                                base = '.'.join(package_parts[:len(package_parts) - levels_to_go_up])
-                                if module_name:
-                                    module_name = f"{base}.{module_name}"
-                                else:
-                                    module_name = base
+            # import_refs 与 ast.walk 的顺序相同：import a, b 每个别名一条，from x import ... 每条语句一条
+            for module_name, level in module.import_refs:
+                # 处理相对导入
+                if level > 0:  # 相对导入
+                    if current_package:
+                        # 计算绝对模块名
+                        # level=1 表示当前包，level=2 表示父包，以此类推
+                        package_parts = current_package.split('.')
+                        # 回退 level-1 级（level=1 时不回退，就是当前包）
+                        levels_to_go_up = level - 1
+                        if levels_to_go_up < len(package_parts):
+                            base = '.'.join(package_parts[:len(package_parts) - levels_to_go_up])
+                            if module_name:
+                                module_name = f"{base}.{module_name}"
                             else:
-                                # 相对导入超出了包的层级，保持原样
-                                if module_name:
-                                    pass  # 保持 module_name 不变
-                    
-                    if module_name:
-                        self._categorize_import(
-                            module_name, relative_file, module_to_file,
-                            internal_deps, external_deps, reverse_deps
-                        )
+                                module_name = base
+                        # 相对导入超出了包的层级，保持 module_name 不变
+
+                if module_name:
+                    self._categorize_import(
+                        module_name, relative_file, module_to_file,
+                        internal_deps, external_deps, reverse_deps
+                    )
         
         # 转换 set 为 list 并排序
         for f in external_deps:
@@ -1400,6 +1941,31 @@ class AiMdGenerator(NbPath):
         lines.append("\n---\n")
         return "\n".join(lines)
     
+    def _list_project_py_files(self, project_root_path: NbPath) -> typing.List[str]:
+        """项目中所有 .py 文件的相对 posix 路径，排除隐藏目录和被 .gitignore 忽略的文件"""
+        file_source = self._file_source()
+        if file_source is not None:
+            # git 版本、归档中的 .py 文件从它们自己的文件列表列出，不应用 .gitignore
+            file_list = []
+            for path in file_source.iter_files(project_root_path):
+                relative = NbPath(file_source.abs_path(path)).relative_to(project_root_path)
+                if relative.suffix == ".py" and not any(part.startswith('.') for part in relative.parts):
+                    file_list.append(relative.as_posix())
+            return file_list
+        gitignore_matcher, git_root_prefix = self._get_gitignore_matcher(project_root_path)
+        # 自顶向下遍历，隐藏目录和被 .gitignore 忽略的目录（例如 venv、build 目录）不会进入；
+        # 不读取文件头判断是否文本文件
+        walker = PruningDirWalker(
+            project_root_path, gitignore_matcher=gitignore_matcher, git_root_prefix=git_root_prefix,
+            exclusions=PathExclusions(["**/.*"], ["**/.*"]), should_include_suffixes=[".py"], check_text=False,
+        )
+        watch_targets = getattr(self, "_watch_targets", None)
+        if watch_targets is not None:
+            # 新增、删除 .py 文件会改变依赖分析的结果
+            watch_targets.add_dir(project_root_path, walker)
+        return [f.relative_path for f in walker.walk(project_root_path)]
+
+    @instrumented
     def add_file_dependencies(
         self,
         file_list: typing.List[str] = None,
@@ -1425,19 +1991,13 @@ class AiMdGenerator(NbPath):
         
         if file_list is None:
             # 如果没有指定文件列表，扫描整个项目的 .py 文件
-            project_root_path = NbPath(project_root).resolve()
-            file_list = []
-            for py_file in project_root_path.rglob("*.py"):
-                # 排除隐藏目录
-                relative = py_file.relative_to(project_root_path)
-                if not any(part.startswith('.') for part in relative.parts):
-                    file_list.append(relative.as_posix())
-        
+            file_list = self._list_project_py_files(NbPath(project_root).resolve())        
         # 分析依赖
         deps_info = self._analyze_file_dependencies(file_list, project_root)
         
         # 格式化并添加到 markdown
         deps_md = self._format_dependencies_as_markdown(deps_info, file_list)
+        self._begin_section("file dependencies")
         self.append_text(deps_md)
         
         return self
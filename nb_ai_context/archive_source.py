@@ -0,0 +1,228 @@
+"""
+直接从 .zip / .tar.gz 归档中读取文件，不解压到临时目录
+
+gen_github_proj_* 原来把下载的 zip 完整解压到 NbPath.tempdir() 再遍历，磁盘 I/O 翻倍，
+在只读或者很小的 tmpfs 上会失败。ArchiveSource 把归档当作 project_root 下的只读文件视图，
+接口与 git_revision.GitRevisionSource 相同，AiMdGenerator 通过 set_project_propery(..., archive=...) 使用它：
+
+- zip：从中央目录（central directory）得到所有成员的名称和大小，按目录、后缀过滤后只解压需要的成员，
+  判断文本文件时只解压前 1KB
+- tar / tar.gz / tar.bz2 / tar.xz：没有中央目录，按流式顺序读取一遍，只保存通过过滤的成员的内容
+
+GitHub 的归档里所有文件都在一个顶层目录（repo-main/）下，strip_top_dir=True 时去掉这一层。
+目录、符号链接和路径中包含 .. 的成员被忽略，绝对路径按相对 root 的路径处理。
+"""
+
+import io
+import os
+import tarfile
+import threading
+import typing
+import zipfile
+
+from nb_ai_context.dir_walker import path_suffix
+from nb_ai_context.git_revision import decode_text
+
+ArchiveFile = typing.Union[os.PathLike, str, typing.BinaryIO, bytes]
+
+
+class ArchiveError(RuntimeError):
+    pass
+
+
+def _member_name(name: str) -> typing.Optional[str]:
+    """归档内的 posix 路径，不安全的路径返回 None"""
+    name = name.replace("\\", "/").strip("/")
+    parts = [part for part in name.split("/") if part not in ("", ".")]
+    if not parts or ".." in parts or ":" in parts[0]:
+        return None
+    return "/".join(parts)
+
+
+class ArchiveSource:
+    """
+    归档文件的只读文件视图，路径使用 root 下对应的绝对路径
+
+    Args:
+        archive: 归档文件路径、已打开的二进制文件对象或者归档内容
+        root: 归档内容对应的项目根目录（不需要存在），一般就是 set_project_propery 的 project_root
+        include_dirs: 只包含这些目录（相对 root 的 posix 路径）下的文件，None 表示全部
+        include_files: 另外包含这些文件（相对 root），不受 include_dirs 和后缀限制，例如 README.md
+        should_include_suffixes: 只包含这些后缀的文件，为空时包含全部
+        strip_top_dir: 所有成员都在同一个顶层目录下时去掉这一层
+    """
+
+    def __init__(
+        self,
+        archive: ArchiveFile,
+        root: typing.Union[os.PathLike, str],
+        include_dirs: typing.Optional[typing.Iterable[str]] = None,
+        include_files: typing.Iterable[str] = (),
+        should_include_suffixes: typing.Optional[typing.List[str]] = None,
+        strip_top_dir: bool = True,
+    ):
+        self.root = os.path.realpath(os.fspath(root))
+        self._root_prefix = os.path.join(self.root, "")
+        self.include_dirs = None if include_dirs is None else tuple(
+            "" if d.strip("/") in ("", ".") else d.strip("/") + "/" for d in include_dirs
+        )
+        self.include_files = {f.strip("/") for f in include_files}
+        self.should_include_suffixes = set(should_include_suffixes or [])
+        self.strip_top_dir = strip_top_dir
+        if isinstance(archive, (bytes, bytearray, memoryview)):
+            archive = io.BytesIO(archive)
+        self.archive_name = os.fspath(archive) if isinstance(archive, (str, os.PathLike)) else repr(archive)
+        self._zip: typing.Optional[zipfile.ZipFile] = None
+        self._lock = threading.Lock()
+        self.members_seen = 0
+        self.reads = 0
+        # {归档内路径: ZipInfo 或 bytes}
+        self._files: typing.Dict[str, typing.Union[zipfile.ZipInfo, bytes]] = {}
+        if zipfile.is_zipfile(archive):
+            self._load_zip(archive)
+        else:
+            self._load_tar(archive)
+        self._dirs = {""}
+        for inner_path in self._files:
+            parts = inner_path.split("/")
+            for i in range(1, len(parts)):
+                self._dirs.add("/".join(parts[:i]))
+
+    # ---- 读取成员列表 ----
+
+    def _wanted(self, inner_path: str) -> bool:
+        if inner_path in self.include_files:
+            return True
+        if self.include_dirs is not None and not inner_path.startswith(self.include_dirs):
+            return False
+        return not self.should_include_suffixes or path_suffix(inner_path.rpartition("/")[2]) in self.should_include_suffixes
+
+    def _select(self, members: typing.List[typing.Tuple[str, typing.Any]]) -> typing.Dict[str, typing.Any]:
+        """去掉共同的顶层目录后按过滤条件选出成员"""
+        strip = 0
+        if self.strip_top_dir and members:
+            top = members[0][0].split("/", 1)[0] + "/"
+            if all(name.startswith(top) for name, _ in members):
+                strip = len(top)
+        return {name[strip:]: member for name, member in members if self._wanted(name[strip:])}
+
+    def _load_zip(self, archive):
+        try:
+            self._zip = zipfile.ZipFile(archive)
+        except (OSError, zipfile.BadZipFile) as e:
+            raise ArchiveError(f"cannot open zip archive {self.archive_name}: {e}") from e
+        members = []
+        for info in self._zip.infolist():
+            self.members_seen += 1
+            # 高 16 位是 unix 文件类型，跳过符号链接
+            if info.is_dir() or (info.external_attr >> 16) & 0o170000 == 0o120000:
+                continue
+            name = _member_name(info.filename)
+            if name is not None:
+                members.append((name, info))
+        self._files = self._select(members)
+
+    def _load_tar(self, archive):
+        try:
+            if isinstance(archive, (str, os.PathLike)):
+                tar = tarfile.open(os.fspath(archive), mode="r|*")
+            else:
+                archive.seek(0)  # is_zipfile 移动了读取位置
+                tar = tarfile.open(fileobj=archive, mode="r|*")
+        except (OSError, tarfile.TarError) as e:
+            raise ArchiveError(f"{self.archive_name} is not a zip or tar archive: {e}") from e
+        # 流式读取时还不知道是否所有成员都在同一个顶层目录下，两种路径之一需要的成员都先保存，最后再选
+        members = []
+        top = None
+        try:
+            with tar:
+                for member in tar:
+                    self.members_seen += 1
+                    if not member.isreg():
+                        continue
+                    name = _member_name(member.name)
+                    if name is None:
+                        continue
+                    if top is None:
+                        top = name.split("/", 1)[0] + "/"
+                    stripped = name[len(top):] if name.startswith(top) else None
+                    if self._wanted(name) or (stripped is not None and self._wanted(stripped)):
+                        members.append((name, tar.extractfile(member).read()))
+                    else:
+                        members.append((name, None))
+        except (OSError, EOFError, tarfile.TarError) as e:
+            raise ArchiveError(f"cannot read tar archive {self.archive_name}: {e}") from e
+        self._files = {name: data for name, data in self._select(members).items() if data is not None}
+
+    def close(self):
+        if self._zip is not None:
+            self._zip.close()
+
+    # ---- 路径 ----
+
+    def inner_path(self, path: typing.Union[os.PathLike, str]) -> typing.Optional[str]:
+        """root 下的绝对路径转换为归档内的 posix 路径，root 本身为空字符串，不在 root 下时返回 None"""
+        path = os.path.abspath(os.fspath(path))
+        if path == self.root:
+            return ""
+        if not path.startswith(self._root_prefix):
+            return None
+        relative = path[len(self._root_prefix):]
+        return relative if os.sep == "/" else relative.replace(os.sep, "/")
+
+    def abs_path(self, inner_path: str) -> str:
+        return os.path.join(self.root, *inner_path.split("/")) if inner_path else self.root
+
+    def exists(self, path: typing.Union[os.PathLike, str]) -> bool:
+        inner_path = self.inner_path(path)
+        return inner_path in self._files or inner_path in self._dirs
+
+    def is_dir(self, path: typing.Union[os.PathLike, str]) -> bool:
+        return self.inner_path(path) in self._dirs
+
+    def is_file(self, path: typing.Union[os.PathLike, str]) -> bool:
+        return self.inner_path(path) in self._files
+
+    def iter_files(self, path: typing.Union[os.PathLike, str]) -> typing.Iterator[str]:
+        """目录下所有文件的归档内路径（包括子目录）"""
+        inner_dir = self.inner_path(path)
+        if inner_dir not in self._dirs:
+            return iter(())
+        prefix = inner_dir + "/" if inner_dir else ""
+        return (inner_path for inner_path in self._files if inner_path.startswith(prefix))
+
+    # ---- 内容 ----
+
+    def _member(self, path: typing.Union[os.PathLike, str]) -> typing.Union[zipfile.ZipInfo, bytes]:
+        member = self._files.get(self.inner_path(path))
+        if member is None:
+            raise FileNotFoundError(f"{path} is not a file in archive {self.archive_name}")
+        return member
+
+    def read_bytes(self, path: typing.Union[os.PathLike, str]) -> bytes:
+        member = self._member(path)
+        with self._lock:
+            self.reads += 1
+        if isinstance(member, bytes):
+            return member
+        return self._zip.read(member)
+
+    def read_text(self, path: typing.Union[os.PathLike, str], encoding: str = "utf-8", errors: str = None) -> str:
+        return decode_text(self.read_bytes(path), encoding, errors)
+
+    def size(self, path: typing.Union[os.PathLike, str]) -> int:
+        member = self._member(path)
+        return len(member) if isinstance(member, bytes) else member.file_size
+
+    def is_text(self, path: typing.Union[os.PathLike, str]) -> bool:
+        """与 NbPath.is_text 相同的判断：是文件并且前 1KB 中没有空字节，zip 成员只解压前 1KB"""
+        member = self._files.get(self.inner_path(path))
+        if member is None:
+            return False
+        if isinstance(member, bytes):
+            return b"\x00" not in member[:1024]
+        with self._zip.open(member) as f:
+            return b"\x00" not in f.read(1024)
+
+    def stats(self) -> dict:
+        return {"archive": self.archive_name, "members": self.members_seen, "files": len(self._files), "reads": self.reads}
@@ -0,0 +1,195 @@
+"""
+持久化的 AST 元数据缓存（SQLite）
+
+每晚重新生成几十个 AI 上下文文件，但两次运行之间几乎没有文件变化，每次都重新 ast.parse 所有文件是浪费。
+AstMetadataCache 把 ModuleAstExtractor 的结果（元数据 + 依赖分析用的 import_refs + nested_definitions）按文件保存到 SQLite：
+
+- 以文件路径为 key，记录 mtime、size、内容哈希和 EXTRACTOR_VERSION
+- 查询时 mtime 和 size 都没变，直接命中；变了就比较内容哈希（例如 git checkout 只改了 mtime），哈希相同同样命中并更新 mtime
+- EXTRACTOR_VERSION 不同的记录一律视为失效，升级提取逻辑后不会用到旧格式的数据
+- 超过 max_bytes 时按最近使用时间淘汰（LRU）。数据总大小记在 ast_cache_meta 表里，和写入、删除在同一个事务中更新，
+  每次 put 不需要 SUM 整张表，冷启动写入 n 个文件是 O(n) 而不是 O(n²)
+
+只用标准库 sqlite3，多个生成脚本并发运行时依靠 WAL 模式 + busy timeout 共享同一个缓存文件。
+"""
+
+import contextlib
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import typing
+
+from nb_ai_context.ast_extractor import EXTRACTOR_VERSION
+
+DEFAULT_CACHE_FILE_NAME = "ast_metadata_cache.sqlite3"
+DEFAULT_MAX_BYTES = 128 * 1024 * 1024
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS ast_metadata (
+    path TEXT PRIMARY KEY,
+    mtime_ns INTEGER NOT NULL,
+    size INTEGER NOT NULL,
+    content_hash TEXT NOT NULL,
+    extractor_version INTEGER NOT NULL,
+    payload TEXT NOT NULL,
+    nbytes INTEGER NOT NULL,
+    last_used REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS ast_metadata_last_used ON ast_metadata (last_used);
+CREATE TABLE IF NOT EXISTS ast_cache_meta (
+    key TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+-- 旧版本创建的缓存文件只在第一次打开时计算一次总大小
+INSERT OR IGNORE INTO ast_cache_meta
+    SELECT 'total_bytes', COALESCE(SUM(nbytes), 0) FROM ast_metadata
+    WHERE NOT EXISTS (SELECT 1 FROM ast_cache_meta WHERE key = 'total_bytes');
+"""
+
+
+def content_hash(text: str) -> str:
+    return hashlib.blake2b(text.encode("utf-8", "surrogatepass"), digest_size=16).hexdigest()
+
+
+class AstMetadataCache:
+    """
+    SQLite 元数据缓存
+
+    Args:
+        cache_dir: 缓存目录，缓存文件为 cache_dir/ast_metadata_cache.sqlite3
+        max_bytes: 缓存数据总大小上限，超过后淘汰最久没有用到的记录
+
+    >>> cache = AstMetadataCache.for_dir("~/.cache/nb_ai_context")
+    >>> cache.get(path, mtime_ns, size, text)   # 未命中返回 None
+    >>> cache.put(path, mtime_ns, size, text, metadata, import_refs, nested_definitions)
+    """
+
+    _instances: typing.Dict[str, "AstMetadataCache"] = {}
+
+    def __init__(self, cache_dir: typing.Union[os.PathLike, str], max_bytes: int = DEFAULT_MAX_BYTES):
+        self.cache_dir = os.path.abspath(os.path.expanduser(os.fspath(cache_dir)))
+        self.max_bytes = max_bytes
+        self.db_path = os.path.join(self.cache_dir, DEFAULT_CACHE_FILE_NAME)
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        os.makedirs(self.cache_dir, exist_ok=True)
+        self._conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(_SCHEMA)
+
+    @classmethod
+    def for_dir(cls, cache_dir: typing.Union[os.PathLike, str], max_bytes: int = DEFAULT_MAX_BYTES) -> "AstMetadataCache":
+        """获取 cache_dir 对应的共享缓存，同一个目录只打开一个连接"""
+        key = os.path.abspath(os.path.expanduser(os.fspath(cache_dir)))
+        cache = cls._instances.get(key)
+        if cache is None:
+            cache = cls._instances[key] = cls(key, max_bytes=max_bytes)
+        cache.max_bytes = max_bytes
+        return cache
+
+    def get(
+        self, path: str, mtime_ns: int, size: int, text: str
+    ) -> typing.Optional[typing.Tuple[dict, typing.List[typing.Tuple[str, int]], typing.List[dict]]]:
+        """返回 (metadata, import_refs, nested_definitions)，未命中或已失效时返回 None；mtime_ns 为 None（git 版本中的文件）时总是比较内容哈希"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT mtime_ns, size, content_hash, extractor_version, payload FROM ast_metadata WHERE path = ?",
+                (path,),
+            ).fetchone()
+            if row is None or row[3] != EXTRACTOR_VERSION:
+                self.misses += 1
+                return None
+            if mtime_ns is None or (row[0], row[1]) != (mtime_ns, size):
+                # 文件被 touch 过，内容可能没变，用内容哈希确认
+                if row[1] != size or row[2] != content_hash(text):
+                    self.misses += 1
+                    return None
+            if mtime_ns is not None and (row[0], row[1]) != (mtime_ns, size):
+                self._conn.execute(
+                    "UPDATE ast_metadata SET mtime_ns = ?, last_used = ? WHERE path = ?", (mtime_ns, time.time(), path)
+                )
+            else:
+                self._conn.execute("UPDATE ast_metadata SET last_used = ? WHERE path = ?", (time.time(), path))
+            self.hits += 1
+        payload = json.loads(row[4])
+        return payload["metadata"], [tuple(ref) for ref in payload["import_refs"]], payload["nested_definitions"]
+
+    def put(
+        self,
+        path: str,
+        mtime_ns: int,
+        size: int,
+        text: str,
+        metadata: dict,
+        import_refs: typing.List[typing.Tuple[str, int]],
+        nested_definitions: typing.Optional[typing.List[dict]] = None,
+    ) -> "AstMetadataCache":
+        payload = json.dumps({"metadata": metadata, "import_refs": import_refs,
+                              "nested_definitions": nested_definitions or []}, ensure_ascii=False)
+        row = (path, -1 if mtime_ns is None else mtime_ns, size, content_hash(text), EXTRACTOR_VERSION, payload,
+               len(payload), time.time())
+        with self._lock, self._transaction():
+            old = self._conn.execute("SELECT nbytes FROM ast_metadata WHERE path = ?", (path,)).fetchone()
+            # mtime_ns 为 None 时记为 -1，之后按工作区的 mtime 读取时会比较内容哈希
+            self._conn.execute("INSERT OR REPLACE INTO ast_metadata VALUES (?, ?, ?, ?, ?, ?, ?, ?)", row)
+            total = self._add_total(len(payload) - (old[0] if old else 0))
+            if total > self.max_bytes:
+                self._evict(total)
+        return self
+
+    @contextlib.contextmanager
+    def _transaction(self):
+        # BEGIN IMMEDIATE：并发运行的其他生成脚本不会在读取和更新总大小之间写入
+        self._conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield
+        except BaseException:
+            self._conn.execute("ROLLBACK")
+            raise
+        self._conn.execute("COMMIT")
+
+    def _add_total(self, delta: int) -> int:
+        self._conn.execute("UPDATE ast_cache_meta SET value = value + ? WHERE key = 'total_bytes'", (delta,))
+        return self._conn.execute("SELECT value FROM ast_cache_meta WHERE key = 'total_bytes'").fetchone()[0]
+
+    def _evict(self, total: int):
+        # 按 last_used 索引从最旧的开始读，够了就停止，不需要排序整张表
+        rows = self._conn.execute("SELECT path, nbytes FROM ast_metadata ORDER BY last_used, rowid")
+        evicted = []
+        freed = 0
+        for path, nbytes in rows:
+            if total - freed <= self.max_bytes:
+                break
+            evicted.append((path,))
+            freed += nbytes
+        rows.close()
+        self._conn.executemany("DELETE FROM ast_metadata WHERE path = ?", evicted)
+        self._add_total(-freed)
+
+    def clear(self) -> "AstMetadataCache":
+        with self._lock, self._transaction():
+            self._conn.execute("DELETE FROM ast_metadata")
+            self._conn.execute("UPDATE ast_cache_meta SET value = 0 WHERE key = 'total_bytes'")
+        return self
+
+    def total_bytes(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT value FROM ast_cache_meta WHERE key = 'total_bytes'").fetchone()[0]
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM ast_metadata").fetchone()[0]
+
+    def stats(self) -> dict:
+        return {"db_path": self.db_path, "entries": len(self), "bytes": self.total_bytes(),
+                "hits": self.hits, "misses": self.misses}
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+        self._instances.pop(self.cache_dir, None)
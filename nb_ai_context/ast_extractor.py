@@ -0,0 +1,318 @@
+"""
+Python 源码 AST 元数据提取引擎
+
+对每个模块只做一次广度优先遍历，遍历时显式携带作用域信息（是否位于类内部、限定名前缀），
+不再像旧实现那样对每个节点再嵌套 ast.walk 去查找父节点（那种做法是立方级复杂度，5k~10k 行的模块就很慢）。
+
+输出的元数据字典与旧版 `AiMdGenerator._parse_python_file_ast` 完全一致：
+- classes: 所有不位于其他类内部的类（与旧版一致，函数内部定义的类也算）
+- functions: 所有不位于类内部的函数（与旧版一致，函数内部的嵌套函数也算）
+- imports: 模块内所有 import 语句
+列表顺序与 ast.walk 的广度优先顺序一致。
+
+额外地，`ModuleAstExtractor.nested_definitions` 记录所有非模块顶层定义的类和函数（含方法），
+带上与 Python `__qualname__` 相同规则的限定名，例如 `Outer.Inner.method`、`func.<locals>.helper`。
+它不放进元数据字典（保持输出不变），由 extract_module_source 单独返回，
+经 ModuleRegistry、ast_cache、parallel_extract 传递，通过 `ParsedModule.nested_definitions` 取用。
+"""
+
+import ast
+import typing
+from collections import deque, namedtuple
+
+# 元数据的结构或提取规则发生变化时需要递增，持久化缓存用它来判断旧数据是否失效
+EXTRACTOR_VERSION = 2
+
+_DEF_TYPES = (ast.ClassDef, ast.FunctionDef, ast.AsyncFunctionDef)
+
+
+def ast_to_source(node) -> str:
+    """将 AST 节点转换为源代码字符串，兼容 Python 3.7+"""
+    if node is None:
+        return ""
+    try:
+        # Python 3.9+ 支持 ast.unparse
+        if hasattr(ast, 'unparse'):
+            return ast.unparse(node)
+        else:
+            # Python 3.7/3.8 的回退方案
+            # 尝试使用 astor
+            try:
+                import astor
+                return astor.to_source(node).strip()
+            except ImportError:
+                pass
+
+            # 简单的手工处理常见情况
+            if isinstance(node, ast.Name):
+                return node.id
+            elif isinstance(node, ast.Constant):
+                return repr(node.value)
+            elif isinstance(node, ast.Attribute):
+                value = ast_to_source(node.value)
+                return f"{value}.{node.attr}"
+            elif isinstance(node, ast.Subscript):
+                value = ast_to_source(node.value)
+                slice_val = ast_to_source(node.slice)
+                return f"{value}[{slice_val}]"
+            elif isinstance(node, (ast.List, ast.Tuple)):
+                elts = [ast_to_source(e) for e in node.elts]
+                if isinstance(node, ast.List):
+                    return f"[{', '.join(elts)}]"
+                else:
+                    return f"({', '.join(elts)})"
+            else:
+                # 对于复杂类型，返回类型名称
+                return node.__class__.__name__
+    except Exception:
+        return ""
+
+
+def extract_function_metadata(node: typing.Union[ast.FunctionDef, ast.AsyncFunctionDef]) -> dict:
+    """提取函数/方法的元数据"""
+    metadata = {
+        "name": node.name,
+        "type": "async_function" if isinstance(node, ast.AsyncFunctionDef) else "function",
+        "lineno": node.lineno,
+        "docstring": ast.get_docstring(node) or "",
+        "parameters": [],
+        "return_type": ast_to_source(node.returns),
+        "decorators": [ast_to_source(dec) for dec in node.decorator_list],
+        "is_public": not node.name.startswith("_"),
+    }
+
+    # 提取参数信息
+    for arg in node.args.args:
+        metadata["parameters"].append({
+            "name": arg.arg,
+            "type": ast_to_source(arg.annotation),
+            "default": None,
+        })
+
+    # 处理默认参数，默认值从后往前对应参数
+    defaults = node.args.defaults
+    if defaults:
+        num_defaults = len(defaults)
+        for i, default in enumerate(defaults):
+            param_idx = len(metadata["parameters"]) - num_defaults + i
+            if param_idx >= 0:
+                try:
+                    metadata["parameters"][param_idx]["default"] = ast_to_source(default)
+                except Exception:
+                    metadata["parameters"][param_idx]["default"] = "<complex_default>"
+
+    # 处理 *args 和 **kwargs
+    if node.args.vararg:
+        metadata["parameters"].append({
+            "name": f"*{node.args.vararg.arg}",
+            "type": ast_to_source(node.args.vararg.annotation),
+            "default": None,
+        })
+    if node.args.kwarg:
+        metadata["parameters"].append({
+            "name": f"**{node.args.kwarg.arg}",
+            "type": ast_to_source(node.args.kwarg.annotation),
+            "default": None,
+        })
+
+    return metadata
+
+
+def _class_variable_value(value_node) -> str:
+    if not value_node:
+        return ""
+    try:
+        return ast_to_source(value_node)
+    except Exception:
+        return "<value>"
+
+
+def extract_class_metadata(node: ast.ClassDef) -> dict:
+    """提取类的元数据"""
+    metadata = {
+        "name": node.name,
+        "type": "class",
+        "lineno": node.lineno,
+        "docstring": ast.get_docstring(node) or "",
+        "bases": [ast_to_source(base) for base in node.bases],
+        "decorators": [ast_to_source(dec) for dec in node.decorator_list],
+        "methods": [],
+        "properties": [],
+        "class_variables": [],
+        "is_public": not node.name.startswith("_"),
+    }
+
+    # 遍历类的直接成员
+    for item in node.body:
+        if isinstance(item, (ast.FunctionDef, ast.AsyncFunctionDef)):
+            method_info = extract_function_metadata(item)
+            # 检查是否是 property
+            is_property = any("property" in dec for dec in method_info["decorators"])
+            if is_property:
+                metadata["properties"].append(method_info)
+            else:
+                metadata["methods"].append(method_info)
+
+        elif isinstance(item, ast.AnnAssign) and isinstance(item.target, ast.Name):
+            # 类变量（带类型注解）
+            metadata["class_variables"].append({
+                "name": item.target.id,
+                "type": ast_to_source(item.annotation),
+                "value": _class_variable_value(item.value),
+                "lineno": item.lineno,
+            })
+        elif isinstance(item, ast.Assign):
+            # 类变量（无类型注解）
+            for target in item.targets:
+                if isinstance(target, ast.Name):
+                    metadata["class_variables"].append({
+                        "name": target.id,
+                        "type": "",
+                        "value": _class_variable_value(item.value),
+                        "lineno": item.lineno,
+                    })
+
+    return metadata
+
+
+def extract_import_records(node: typing.Union[ast.Import, ast.ImportFrom]) -> typing.List[dict]:
+    """把一条 import 语句转换为元数据中的 imports 记录"""
+    records = []
+    if isinstance(node, ast.Import):
+        for alias in node.names:
+            records.append({
+                "type": "import",
+                "module": alias.name,
+                "alias": alias.asname,
+                "lineno": node.lineno,
+            })
+    else:  # ImportFrom
+        module = node.module or ""
+        for alias in node.names:
+            records.append({
+                "type": "from_import",
+                "module": module,
+                "name": alias.name,
+                "alias": alias.asname,
+                "lineno": node.lineno,
+            })
+    return records
+
+
+def empty_error_metadata(error: str) -> dict:
+    """解析失败时返回的元数据，结构与旧版保持一致"""
+    return {
+        "error": error,
+        "classes": [],
+        "functions": [],
+        "imports": [],
+        "module_docstring": "",
+    }
+
+
+class ModuleAstExtractor:
+    """
+    单次遍历模块 AST，提取模块级元数据。
+
+    遍历顺序与 ast.walk 相同（广度优先），队列里每个节点都带着两份作用域信息：
+    - in_class: 祖先节点中是否有 ClassDef，决定它能否作为顶级类/函数
+    - qualname_prefix: 限定名前缀，规则与 Python 的 __qualname__ 相同
+
+    每个节点只入队、出队一次，复杂度与模块节点数成线性关系。
+
+    同一次遍历还会收集 import_refs：依赖分析需要的 (模块名, 相对导入层级) 列表，
+    顺序与 ast.walk 相同，import a, b 每个别名一条，from x import a, b 整条语句一条。
+    """
+
+    def __init__(self, tree: ast.AST, file: typing.Union[str, None] = None):
+        self.tree = tree
+        self.file = file
+        self.nested_definitions: typing.List[dict] = []
+        self.import_refs: typing.List[typing.Tuple[str, int]] = []
+
+    def extract(self) -> dict:
+        metadata = {
+            "file": str(self.file),
+            "module_docstring": ast.get_docstring(self.tree) or "",
+            "classes": [],
+            "functions": [],
+            "imports": [],
+            "constants": [],
+        }
+        self.nested_definitions = []
+        self.import_refs = []
+
+        todo = deque((child, False, "", True) for child in ast.iter_child_nodes(self.tree))
+        while todo:
+            node, in_class, qualname_prefix, is_module_level = todo.popleft()
+            child_in_class = in_class
+            child_prefix = qualname_prefix
+            child_module_level = is_module_level and not isinstance(node, _DEF_TYPES)
+
+            if isinstance(node, _DEF_TYPES):
+                qualname = qualname_prefix + node.name
+                if isinstance(node, ast.ClassDef):
+                    if not in_class:
+                        metadata["classes"].append(extract_class_metadata(node))
+                    child_in_class = True
+                    child_prefix = qualname + "."
+                else:
+                    if not in_class:
+                        metadata["functions"].append(extract_function_metadata(node))
+                    child_prefix = qualname + ".<locals>."
+                if not is_module_level:
+                    self.nested_definitions.append({
+                        "name": node.name,
+                        "qualname": qualname,
+                        "type": _definition_type(node),
+                        "lineno": node.lineno,
+                    })
+            elif isinstance(node, (ast.Import, ast.ImportFrom)):
+                metadata["imports"].extend(extract_import_records(node))
+                if isinstance(node, ast.Import):
+                    self.import_refs.extend((alias.name, 0) for alias in node.names)
+                else:
+                    self.import_refs.append((node.module or "", node.level or 0))
+
+            for child in ast.iter_child_nodes(node):
+                todo.append((child, child_in_class, child_prefix, child_module_level))
+
+        return metadata
+
+
+def _definition_type(node) -> str:
+    if isinstance(node, ast.ClassDef):
+        return "class"
+    if isinstance(node, ast.AsyncFunctionDef):
+        return "async_function"
+    return "function"
+
+
+def extract_module_metadata(tree: ast.AST, file: typing.Union[str, None] = None) -> dict:
+    """从已解析好的模块 AST 提取元数据"""
+    return ModuleAstExtractor(tree, file).extract()
+
+
+def parse_python_source(source_code: str, filename: str = "<unknown>") -> ast.AST:
+    """解析源码为 AST，会先去掉 UTF-8 BOM"""
+    if source_code.startswith('\ufeff'):
+        source_code = source_code[1:]
+    return ast.parse(source_code, filename=filename)
+
+
+ModuleExtraction = namedtuple("ModuleExtraction", ["metadata", "import_refs", "error", "tree", "nested_definitions"])
+
+
+def extract_module_source(source_code: str, filename: str) -> ModuleExtraction:
+    """
+    解析源码并提取元数据、import_refs 和 nested_definitions，解析失败时 metadata 为 empty_error_metadata，error 为异常
+
+    ModuleRegistry 和 parallel_extract 的子进程都调用这个函数，保证串行和并行的结果完全一致
+    """
+    try:
+        tree = parse_python_source(source_code, filename=filename)
+    except Exception as e:
+        return ModuleExtraction(empty_error_metadata(str(e)), [], e, None, [])
+    extractor = ModuleAstExtractor(tree, filename)
+    metadata = extractor.extract()
+    return ModuleExtraction(metadata, extractor.import_refs, None, tree, extractor.nested_definitions)
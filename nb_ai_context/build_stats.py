@@ -0,0 +1,176 @@
+"""
+一次构建的分阶段统计：generator.stats 返回的 BuildStats
+
+构建慢的时候需要知道时间花在哪里。AiMdGenerator 的每个公开方法是一个阶段（merge_from_dir、add_file_dependencies ...），
+方法内部再按工作类型记录子阶段：
+
+- scan：列出目录中的文件（PruningDirWalker / GitFileLister / SourceLister）
+- is_text：校验文件存在、是文本文件并取大小
+- read：读取文件内容（.py 文件经 module_registry，只读取一次；其他文件的字节数按解码后的字符数计）
+- parse：ast.parse 并提取元数据（ast_cache 命中时不计入；workers > 1 时在子进程中解析，不计入）
+- render：把元数据渲染为 Markdown
+- write：写入输出文件
+
+每个阶段累计调用次数、耗时、文件数和字节数。方法阶段的耗时包括它调用的其他方法（merge_from_dir 包括
+merge_from_files_with_metadata），子阶段按文件累计，read_concurrency > 1 时是各线程耗时之和，可能大于方法的耗时。
+
+to_chrome_trace() / export_chrome_trace(path) 导出 Chrome 的 trace event 格式（chrome://tracing、https://ui.perfetto.dev 可以打开）。
+方法阶段和 scan 总是记录事件；逐个文件的 is_text / read / parse / render 事件数量很大，
+只有 set_project_propery(..., trace=True) 时才记录。write 是按片段写入的，只累计不记录事件。
+
+set_project_propery(..., profile_memory=True) 时 memory 是 memory_profile.MemoryProfiler，方法阶段和 scan 同时记录峰值内存。
+"""
+
+import functools
+import json
+import os
+import threading
+import time
+import typing
+from contextlib import contextmanager
+
+SCAN = "scan"
+IS_TEXT = "is_text"
+READ = "read"
+PARSE = "parse"
+RENDER = "render"
+WRITE = "write"
+SUB_STAGES = (SCAN, IS_TEXT, READ, PARSE, RENDER, WRITE)
+
+
+class StageStats:
+    """一个阶段的累计值"""
+
+    __slots__ = ("calls", "seconds", "files", "bytes")
+
+    def __init__(self):
+        self.calls = 0
+        self.seconds = 0.0
+        self.files = 0
+        self.bytes = 0
+
+    def to_dict(self) -> dict:
+        return {"calls": self.calls, "seconds": round(self.seconds, 6), "files": self.files, "bytes": self.bytes}
+
+
+class BuildStats:
+    """
+    分阶段的耗时、文件数、字节数，以及缓存命中情况，线程安全
+
+    Args:
+        trace: 是否记录逐个文件的 trace 事件
+    """
+
+    def __init__(self, trace: bool = False):
+        self.trace = trace
+        # memory_profile.MemoryProfiler，None 时不做内存分析
+        self.memory = None
+        self._lock = threading.Lock()
+        self._origin = time.perf_counter()
+        self.reset()
+
+    def reset(self) -> "BuildStats":
+        with self._lock:
+            self.stages: typing.Dict[str, StageStats] = {}
+            self.caches: typing.Dict[str, dict] = {}
+            self.events: typing.List[dict] = []
+        return self
+
+    def _stage(self, name: str) -> StageStats:
+        stage = self.stages.get(name)
+        if stage is None:
+            stage = self.stages[name] = StageStats()
+        return stage
+
+    def add(self, name: str, seconds: float = 0.0, files: int = 0, nbytes: int = 0, calls: int = 1):
+        """累计一个阶段"""
+        with self._lock:
+            stage = self._stage(name)
+            stage.calls += calls
+            stage.seconds += seconds
+            stage.files += files
+            stage.bytes += nbytes
+
+    def add_event(self, name: str, category: str, start: float, seconds: float, args: dict = None):
+        """记录一个 trace 事件，start 是 time.perf_counter() 的值"""
+        event = {
+            "name": name, "cat": category, "ph": "X", "pid": os.getpid(), "tid": threading.get_ident(),
+            "ts": round((start - self._origin) * 1e6, 3), "dur": round(seconds * 1e6, 3),
+        }
+        if args:
+            event["args"] = args
+        with self._lock:
+            self.events.append(event)
+
+    def record(self, name: str, start: float, files: int = 0, nbytes: int = 0, detail: str = None):
+        """
+        子阶段的一次操作结束时调用：累计从 start 到现在的耗时，trace=True 时记录事件
+
+        detail 是事件的说明，一般是文件的相对路径
+        """
+        seconds = time.perf_counter() - start
+        self.add(name, seconds, files, nbytes)
+        if self.trace:
+            self.add_event(name, "file", start, seconds, {"file": detail} if detail else None)
+
+    @contextmanager
+    def stage(self, name: str, category: str = "method", always_trace: bool = True, **args):
+        """计时一个阶段，always_trace=False 时只在 trace=True 时记录事件"""
+        memory = self.memory
+        frame = memory.enter(name) if memory is not None else None
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            seconds = time.perf_counter() - start
+            if memory is not None:
+                memory.exit(frame, snapshot=category == "method")
+            self.add(name, seconds)
+            if always_trace or self.trace:
+                self.add_event(name, category, start, seconds, {k: str(v) for k, v in args.items()} or None)
+
+    def to_dict(self) -> dict:
+        with self._lock:
+            result = {
+                "stages": {name: stage.to_dict() for name, stage in self.stages.items()},
+                "caches": dict(self.caches),
+            }
+        if self.memory is not None:
+            result["memory"] = self.memory.report()
+        return result
+
+    def format_report(self) -> str:
+        """方法阶段在前、子阶段在后的文字表格"""
+        with self._lock:
+            rows = sorted(self.stages.items(), key=lambda item: (item[0] in SUB_STAGES, -item[1].seconds))
+            lines = [f"{'stage':<34} {'calls':>7} {'seconds':>9} {'files':>8} {'MB':>9}"]
+            for name, stage in rows:
+                lines.append(f"{name:<34} {stage.calls:>7} {stage.seconds:>9.3f} {stage.files:>8} {stage.bytes / 1024 / 1024:>9.2f}")
+            for name, cache in self.caches.items():
+                lines.append(f"{name}: {cache}")
+        if self.memory is not None:
+            lines.append(self.memory.format_report())
+        return "\n".join(lines)
+
+    def to_chrome_trace(self) -> dict:
+        with self._lock:
+            events = list(self.events)
+        return {"traceEvents": events, "displayTimeUnit": "ms", "otherData": {"stats": self.to_dict()}}
+
+    def export_chrome_trace(self, path: typing.Union[os.PathLike, str]) -> str:
+        """写出 Chrome trace event JSON，返回文件路径"""
+        path = os.fspath(path)
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.to_chrome_trace(), f)
+        return path
+
+
+def instrumented(method: typing.Callable) -> typing.Callable:
+    """AiMdGenerator 公开方法的装饰器：整个方法作为一个阶段计入 self.stats"""
+
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        with self._get_build_stats().stage(method.__name__):
+            return method(self, *args, **kwargs)
+
+    return wrapper
@@ -0,0 +1,89 @@
+"""
+命令行入口：python -m nb_ai_context watch ...
+
+    python -m nb_ai_context watch --project-name my_project --project-root . --output ai_docs/my_project.md \\
+        --guide --dir src:"my_project codes" --dir docs --file README.md
+
+先生成一次，之后输入文件有变化就增量重新生成，见 AiMdGenerator.watch
+"""
+
+import argparse
+import typing
+
+from nb_ai_context.ai_md_generator import AiMdGenerator
+
+
+def _parse_dir(value: str) -> typing.Tuple[str, typing.Optional[str]]:
+    relative_dir_name, _, title = value.partition(":")
+    return relative_dir_name, title or None
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog="python -m nb_ai_context", description="nb_ai_context command line")
+    subparsers = parser.add_subparsers(dest="command")
+    subparsers.required = True
+
+    watch = subparsers.add_parser("watch", help="build the markdown and rebuild it incrementally whenever an input changes")
+    watch.add_argument("--output", required=True, help="output markdown file")
+    watch.add_argument("--project-name", required=True)
+    watch.add_argument("--project-root", default=".")
+    watch.add_argument("--guide", action="store_true", help="start with the AI reading guide")
+    watch.add_argument("--guide-lang", default="cn", choices=["cn", "en"])
+    watch.add_argument("--file", action="append", default=[], dest="files",
+                       help="file merged with merge_from_files, relative to the project root (repeatable)")
+    watch.add_argument("--dir", action="append", default=[], dest="dirs", type=_parse_dir,
+                       help="DIR[:TITLE] merged with merge_from_dir (repeatable)")
+    watch.add_argument("--suffix", action="append", default=[], dest="suffixes",
+                       help="only include files with this suffix in --dir, e.g. .py (repeatable)")
+    watch.add_argument("--exclude-dir", action="append", default=[], dest="exclude_dirs", help="repeatable")
+    watch.add_argument("--exclude-file", action="append", default=[], dest="exclude_files", help="repeatable")
+    watch.add_argument("--no-gitignore", action="store_true", help="do not apply .gitignore rules to --dir")
+    watch.add_argument("--no-ast-metadata", action="store_true")
+    watch.add_argument("--dependencies", action="store_true", help="end with the file dependencies of the whole project")
+    watch.add_argument("--debounce", type=float, default=0.2, help="seconds without changes before rebuilding")
+    watch.add_argument("--poll", type=float, default=None, metavar="SECONDS",
+                       help="poll every SECONDS instead of using inotify")
+    watch.add_argument("--once", action="store_true", help="build once and exit")
+    return parser
+
+
+def make_build(args: argparse.Namespace) -> typing.Callable[[AiMdGenerator], None]:
+    def build(generator: AiMdGenerator):
+        if args.guide:
+            generator.add_ai_reading_guide(guide_lang=args.guide_lang)
+        if args.files:
+            generator.merge_from_files(args.files, as_title=f"{args.project_name} files")
+        for relative_dir_name, title in args.dirs:
+            generator.merge_from_dir(
+                relative_dir_name,
+                as_title=title or f"{args.project_name} {relative_dir_name}",
+                should_include_suffixes=args.suffixes,
+                excluded_dir_name_list=args.exclude_dirs,
+                excluded_file_name_list=args.exclude_files,
+                use_gitignore=not args.no_gitignore,
+                include_ast_metadata=not args.no_ast_metadata,
+            )
+        if args.dependencies:
+            generator.add_file_dependencies()
+
+    return build
+
+
+def main(argv: typing.List[str] = None):
+    args = build_parser().parse_args(argv)
+    generator = AiMdGenerator(args.output).set_project_propery(args.project_name, args.project_root)
+    build = make_build(args)
+    if args.once:
+        with generator.output_session(incremental=True):
+            build(generator)
+        return
+    generator.watch(
+        build,
+        debounce=args.debounce,
+        use_inotify=args.poll is None,
+        poll_interval=args.poll or 0.5,
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+"""
+并发读取文件，按原始顺序重新组装
+
+merge_from_files / merge_from_files_with_metadata 原来逐个文件 read_text()。在 NFS / SMB 挂载的代码目录上，
+每个文件都要等一次网络往返，构建时间几乎全花在等待上。
+
+ordered_map 用线程池同时处理多个文件，但严格按输入顺序产出结果，所以输出文档与串行读取完全一致：
+- concurrency 控制同时进行的读取数，<= 1 时退化为串行，不创建线程池
+- max_inflight_bytes 限制已经读出、但还没有被消费（写入输出文件）的数据总量，
+  配合流式输出写入器，内存占用不会随文件数量增长。单个文件超过上限时也会被读取，只是不会再有别的文件同时在途
+- 某个任务抛出的异常在轮到它产出时才抛出，与串行时的行为相同
+"""
+
+import typing
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+DEFAULT_MAX_INFLIGHT_BYTES = 64 * 1024 * 1024
+
+T = typing.TypeVar("T")
+R = typing.TypeVar("R")
+
+_END = object()
+
+
+def ordered_map(
+    func: typing.Callable[[T], R],
+    items: typing.Iterable[T],
+    concurrency: int = 1,
+    max_inflight_bytes: int = DEFAULT_MAX_INFLIGHT_BYTES,
+    size_func: typing.Callable[[T], int] = None,
+) -> typing.Iterator[R]:
+    """
+    并发执行 func(item)，按 items 的顺序产出结果
+
+    Args:
+        func: 处理单个 item 的函数，在线程池中执行
+        items: 待处理的列表
+        concurrency: 线程数
+        max_inflight_bytes: 在途数据量上限（按 size_func 估算）
+        size_func: 估算 item 结果大小的函数，为 None 时只按 concurrency 限制
+    """
+    if concurrency <= 1:
+        for item in items:
+            yield func(item)
+        return
+
+    max_pending = concurrency * 2
+    pending = deque()  # (future, size)
+    inflight_bytes = 0
+    items = iter(items)
+    next_item = next(items, _END)
+    with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="nb_ai_context_read") as pool:
+        try:
+            while next_item is not _END or pending:
+                # 尽量多提交，直到达到并发数或在途字节上限；队列为空时至少提交一个
+                while next_item is not _END and len(pending) < max_pending:
+                    size = size_func(next_item) if size_func is not None else 0
+                    if pending and inflight_bytes + size > max_inflight_bytes:
+                        break
+                    pending.append((pool.submit(func, next_item), size))
+                    inflight_bytes += size
+                    next_item = next(items, _END)
+                future, size = pending.popleft()
+                result = future.result()
+                inflight_bytes -= size
+                yield result
+        finally:
+            for future, _ in pending:
+                future.cancel()
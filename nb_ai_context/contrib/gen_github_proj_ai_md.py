@@ -5,13 +5,23 @@ Download GitHub project zip file
 https://codeload.github.com/fastapi/sqlmodel/zip/refs/heads/main
 https://codeload.github.com/fastapi/sqlmodel/zip/refs/tags/0.0.25
 
-Unzip the file
+Read the zip members directly (no extraction, see nb_ai_context.archive_source)
 Generate markdown file
+
+gen_github_projects_batch generates many projects at once, downloading and building in parallel
 """
 
+import multiprocessing
+import os
+import time
+import traceback
 import typing
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from contextlib import ExitStack, contextmanager
 from nb_path import NbPath
 from nb_ai_context.ai_md_generator import AiMdGenerator
+from nb_ai_context.archive_source import ArchiveSource
+from nb_ai_context.download_cache import DownloadCache
 import re
 
 
@@ -24,6 +34,21 @@ def extract_repo_name(github_url):
     return None
 
 
+@contextmanager
+def downloaded_archive(github_zip_url: str, use_download_cache: bool = True, download_cache_dir: str = None):
+    """
+    下载归档，产出本地文件路径
+
+    use_download_cache=True 时使用本地下载缓存（见 download_cache.DownloadCache）：tag 的 URL 不再重新下载，
+    分支的 URL 用 ETag 重新验证；否则下载到临时目录，用完删除
+    """
+    if use_download_cache:
+        yield DownloadCache(download_cache_dir).fetch(github_zip_url)
+        return
+    with NbPath.tempdir() as temp_dir:
+        yield DownloadCache(temp_dir).fetch(github_zip_url)
+
+
 def gen_github_proj_docs_and_codes_ai_md(
     github_zip_url: str,
     output_md_path: str,
@@ -33,6 +58,8 @@ def gen_github_proj_docs_and_codes_ai_md(
     should_include_suffixes: list = None,
     excluded_dir_name_list: typing.List[str] = [],
     excluded_file_name_list: typing.List[str] = [],
+    use_download_cache: bool = True,
+    download_cache_dir: str = None,
 ):
     """
     Generate a Markdown document containing README, tutorials, and source code from a GitHub repository URL
@@ -46,29 +73,50 @@ def gen_github_proj_docs_and_codes_ai_md(
         codes_dir_name: Source code directory name, e.g. "sqlmodel"
         should_include_suffixes: List of file extensions to include,
                                 By default includes ['.py', '.java', '.go', '.md', '.html']
+        use_download_cache: Reuse downloads across calls (see downloaded_archive)
+        download_cache_dir: Download cache directory, default ~/.cache/nb_ai_context/downloads
     """
     project_name = extract_repo_name(github_zip_url)
     if should_include_suffixes is None:
         should_include_suffixes = [".py", ".java", ".go", ".md", ".html"]
 
-    with NbPath.tempdir() as temp_dir:
-        # Download zip file
-        zip_file = temp_dir / "repo.zip"
-        zip_file.download_from_url(github_zip_url)
-
-        # Unzip the file
-        unzip_dir = zip_file.unzip_to(temp_dir / "unzip")
-        project_root = list(unzip_dir.iterdir())[
-            0
-        ]  # Get the project root directory after extraction
+    with downloaded_archive(github_zip_url, use_download_cache, download_cache_dir) as zip_file:
+        return build_docs_and_codes_ai_md_from_archive(
+            zip_file, project_name, output_md_path, docs_dir_name, codes_dir_name, readme_file,
+            should_include_suffixes, excluded_dir_name_list, excluded_file_name_list,
+        )
 
-        print(f"tempdir github project_root: {project_root}")
 
-        # Create AiMdGenerator instance and chain calls
+def build_docs_and_codes_ai_md_from_archive(
+    archive: typing.Union[os.PathLike, str, bytes],
+    project_name: str,
+    output_md_path: str,
+    docs_dir_name: str,
+    codes_dir_name: str,
+    readme_file: str,
+    should_include_suffixes: typing.List[str],
+    excluded_dir_name_list: typing.List[str] = [],
+    excluded_file_name_list: typing.List[str] = [],
+) -> AiMdGenerator:
+    """
+    gen_github_proj_docs_and_codes_ai_md 下载之后的部分：直接从归档（.zip / .tar.gz）读取 README、文档和源码目录
 
-        md_generator = (
+    只有这两个目录中后缀匹配的成员和 README 会被解压，归档的顶层目录（repo-main/）被去掉
+    """
+    # 归档的内容对应这个虚拟的项目根目录，它不需要存在
+    project_root = NbPath(os.path.abspath(f"{project_name}@archive"))
+    source = ArchiveSource(
+        archive,
+        project_root,
+        include_dirs=[docs_dir_name, codes_dir_name],
+        include_files=[readme_file],
+        should_include_suffixes=should_include_suffixes,
+    )
+    print(f"archive {source.archive_name}: {source.stats()}")
+    try:
+        return (
             AiMdGenerator(output_md_path)
-            .set_project_propery(project_name=project_name, project_root=project_root)
+            .set_project_propery(project_name=project_name, project_root=project_root, archive=source)
             .clear_text()
             .merge_from_files(
                 relative_file_name_list=[readme_file],
@@ -92,8 +140,8 @@ def gen_github_proj_docs_and_codes_ai_md(
             )
             .show_textfile_info()
         )
-
-        return md_generator
+    finally:
+        source.close()
 
 
 def gen_github_proj_all_dirs_ai_md(
@@ -102,32 +150,40 @@ def gen_github_proj_all_dirs_ai_md(
     should_include_suffixes: list = None,
     excluded_dir_name_list: typing.List[str] = [],
     excluded_file_name_list: typing.List[str] = [],
+    use_download_cache: bool = True,
+    download_cache_dir: str = None,
 ):
     """
     生成github的项目根目录下所有文件到markdown，
+
+    use_download_cache / download_cache_dir: 见 downloaded_archive
     """
     project_name = extract_repo_name(github_zip_url)
     if should_include_suffixes is None:
         should_include_suffixes = [".py", ".java", ".go", ".md", ".html"]
 
-    with NbPath.tempdir() as temp_dir:
-        # Download zip file
-        zip_file = temp_dir / "repo.zip"
-        zip_file.download_from_url(github_zip_url)
-
-        # Unzip the file
-        unzip_dir = zip_file.unzip_to(temp_dir / "unzip")
-        project_root = list(unzip_dir.iterdir())[
-            0
-        ]  # Get the project root directory after extraction
-
-        print(f"tempdir github project_root: {project_root}")
+    with downloaded_archive(github_zip_url, use_download_cache, download_cache_dir) as zip_file:
+        return build_all_dirs_ai_md_from_archive(
+            zip_file, project_name, output_md_path, should_include_suffixes, excluded_dir_name_list, excluded_file_name_list,
+        )
 
-        # Create AiMdGenerator instance and chain calls
 
-        md_generator = (
+def build_all_dirs_ai_md_from_archive(
+    archive: typing.Union[os.PathLike, str, bytes],
+    project_name: str,
+    output_md_path: str,
+    should_include_suffixes: typing.List[str],
+    excluded_dir_name_list: typing.List[str] = [],
+    excluded_file_name_list: typing.List[str] = [],
+) -> AiMdGenerator:
+    """gen_github_proj_all_dirs_ai_md 下载之后的部分：直接从归档读取所有后缀匹配的文件"""
+    project_root = NbPath(os.path.abspath(f"{project_name}@archive"))
+    source = ArchiveSource(archive, project_root, should_include_suffixes=should_include_suffixes)
+    print(f"archive {source.archive_name}: {source.stats()}")
+    try:
+        return (
             AiMdGenerator(output_md_path)
-            .set_project_propery(project_name=project_name, project_root=project_root)
+            .set_project_propery(project_name=project_name, project_root=project_root, archive=source)
             .clear_text()
             .merge_from_dir(
                 relative_dir_name=".",
@@ -139,8 +195,131 @@ def gen_github_proj_all_dirs_ai_md(
             )
             .show_textfile_info()
         )
+    finally:
+        source.close()
+
+
+class GithubProjectResult(typing.NamedTuple):
+    github_zip_url: str
+    output_md_path: str
+    error: typing.Optional[str]  # None 表示成功，否则是异常的 traceback
+    download_seconds: float
+    build_seconds: float
+
+
+def _build_github_project(
+    zip_file: str,
+    github_zip_url: str,
+    output_md_path: str,
+    project_name: str = None,
+    should_include_suffixes: list = None,
+    **kwargs,
+) -> AiMdGenerator:
+    """按 spec 调用 build_docs_and_codes_ai_md_from_archive（有 codes_dir_name 时）或者 build_all_dirs_ai_md_from_archive"""
+    project_name = project_name or extract_repo_name(github_zip_url)
+    if should_include_suffixes is None:
+        should_include_suffixes = [".py", ".java", ".go", ".md", ".html"]
+    if "codes_dir_name" in kwargs:
+        kwargs.setdefault("readme_file", "README.md")
+        return build_docs_and_codes_ai_md_from_archive(
+            zip_file, project_name, output_md_path, should_include_suffixes=should_include_suffixes, **kwargs)
+    return build_all_dirs_ai_md_from_archive(
+        zip_file, project_name, output_md_path, should_include_suffixes=should_include_suffixes, **kwargs)
+
+
+def _build_github_project_timed(zip_file: str, spec: dict) -> float:
+    """在子进程中执行：生成一个项目，返回耗时"""
+    start = time.perf_counter()
+    _build_github_project(zip_file, **spec)
+    return time.perf_counter() - start
+
+
+def gen_github_projects_batch(
+    specs: typing.List[dict],
+    max_parallel: int = 4,
+    use_download_cache: bool = True,
+    download_cache_dir: str = None,
+) -> typing.List[GithubProjectResult]:
+    """
+    批量生成多个 GitHub 项目，代替每个项目一个串行运行的脚本
+
+    每个 spec 是一个 dict，键与 gen_github_proj_docs_and_codes_ai_md（有 codes_dir_name 时）
+    或者 gen_github_proj_all_dirs_ai_md 的参数相同，另外可以用 project_name 指定项目名称，例如：
+
+        gen_github_projects_batch([
+            dict(github_zip_url="https://codeload.github.com/fastapi/sqlmodel/zip/refs/tags/0.0.25",
+                 output_md_path="sqlmodel.md", docs_dir_name="docs", codes_dir_name="sqlmodel"),
+            dict(github_zip_url="https://codeload.github.com/celery/celery/zip/refs/heads/main",
+                 output_md_path="celery.md", should_include_suffixes=[".py"]),
+        ], max_parallel=4)
+
+    下载和生成是两个阶段：max_parallel 个线程下载，max_parallel 个进程生成（读取归档、解析和渲染是 CPU 密集的），
+    一个项目下载完成后立即开始生成，同时其他项目继续下载。生成进程用 spawn 启动（下载线程运行时 fork 不安全），
+    所以调用脚本需要 if __name__ == "__main__": 保护。一个项目失败（下载出错、目录不存在等）不影响其他项目，结果按 specs 的顺序返回，最后打印汇总。
+
+    Raises:
+        ValueError: 多个 spec 使用同一个 output_md_path
+    """
+    output_paths = [os.fspath(spec.get("output_md_path", "")) for spec in specs]
+    duplicates = {path for path in output_paths if path and output_paths.count(path) > 1}
+    if duplicates:
+        raise ValueError(f"output_md_path is used by more than one spec: {sorted(duplicates)}")
+
+    results: typing.List[typing.Optional[GithubProjectResult]] = [None] * len(specs)
+    with ExitStack() as stack:
+        if not use_download_cache:
+            download_cache_dir = stack.enter_context(NbPath.tempdir())
+        # 同一个缓存对象，多个 spec 使用同一个 URL 时只下载一次
+        cache = DownloadCache(download_cache_dir)
+        download_pool = stack.enter_context(ThreadPoolExecutor(max_parallel, thread_name_prefix="gh_download"))
+        build_pool = stack.enter_context(ProcessPoolExecutor(max_parallel, mp_context=multiprocessing.get_context("spawn")))
+
+        def download(spec: dict) -> typing.Tuple[str, float]:
+            start = time.perf_counter()
+            # 其他项目下载后的淘汰不能删除还在排队、正在生成的归档，生成结束后 unpin
+            return cache.fetch(spec["github_zip_url"], pin=True), time.perf_counter() - start
+
+        def failed(index: int, download_seconds: float = 0.0, build_seconds: float = 0.0) -> GithubProjectResult:
+            spec = specs[index]
+            return GithubProjectResult(spec.get("github_zip_url"), output_paths[index], traceback.format_exc(),
+                                       download_seconds, build_seconds)
+
+        download_futures = {download_pool.submit(download, spec): index for index, spec in enumerate(specs)}
+        build_futures = {}
+        for future in as_completed(download_futures):
+            index = download_futures[future]
+            try:
+                zip_file, download_seconds = future.result()
+            except Exception:
+                results[index] = failed(index)
+                continue
+            try:
+                build_future = build_pool.submit(_build_github_project_timed, zip_file, specs[index])
+            except Exception:
+                # 例如一个生成进程崩溃之后的 BrokenProcessPool，这个项目不会再生成
+                results[index] = failed(index, download_seconds)
+                cache.unpin(specs[index]["github_zip_url"])
+                continue
+            build_futures[build_future] = (index, download_seconds)
+        for future in as_completed(build_futures):
+            index, download_seconds = build_futures[future]
+            try:
+                build_seconds = future.result()
+            except Exception:
+                results[index] = failed(index, download_seconds)
+                continue
+            finally:
+                cache.unpin(specs[index]["github_zip_url"])
+            results[index] = GithubProjectResult(
+                specs[index]["github_zip_url"], output_paths[index], None, download_seconds, build_seconds)
 
-        return md_generator
+    failures = [result for result in results if result.error is not None]
+    print(f"gen_github_projects_batch: {len(results) - len(failures)} succeeded, {len(failures)} failed")
+    for result in results:
+        status = "ok" if result.error is None else "FAILED: " + result.error.strip().splitlines()[-1]
+        print(f"  {result.github_zip_url}  download {result.download_seconds:.2f}s  "
+              f"build {result.build_seconds:.2f}s  {status}")
+    return results
 
 
 if __name__ == "__main__":
@@ -0,0 +1,243 @@
+"""
+基于 os.scandir 的剪枝目录遍历器
+
+`merge_from_dir` 原来用 `rglob("*")` 把整个目录树全部遍历一遍（包括 node_modules、.venv、被排除或被 gitignore 的目录），
+再对每个路径逐个过滤。这里改为自顶向下遍历，被排除或被忽略的目录根本不会进入。
+
+- 直接复用 os.DirEntry 的类型信息和 stat 结果做 is_file、后缀、文件大小判断，不再对每个路径重复 stat
+- 先做后缀判断，再读取文件头判断是否文本文件，避免无意义的 I/O
+- 遍历顺序固定：每个目录先输出文件、再进入子目录，同一目录内按名称排序，输出结果可复现
+- 统计剪掉的目录数和跳过的文件数，见 `WalkStats`
+"""
+
+import os
+import typing
+from collections import namedtuple
+
+from nb_ai_context.gitignore_matcher import GitIgnoreMatcher
+from nb_ai_context.path_exclusions import PathExclusions
+
+WalkedFile = namedtuple("WalkedFile", ["relative_path", "path", "size"])
+
+
+def path_suffix(name: str) -> str:
+    """与 pathlib.PurePath.suffix 相同的规则取文件后缀"""
+    i = name.rfind(".")
+    if 0 < i < len(name) - 1:
+        return name[i:]
+    return ""
+
+
+def is_text_file(path: str) -> bool:
+    """与 NbPath.is_text 相同的启发式判断：前 1KB 中没有空字节就认为是文本文件"""
+    try:
+        with open(path, "rb") as f:
+            return b"\x00" not in f.read(1024)
+    except Exception:
+        # NbPath.is_binary 在读取失败时返回 False，即视为文本文件
+        return True
+
+
+class WalkStats:
+    """一次遍历的统计信息"""
+
+    def __init__(self):
+        self.dirs_visited = 0
+        self.dirs_pruned_excluded = 0
+        self.dirs_pruned_gitignore = 0
+        self.files_seen = 0
+        self.files_included = 0
+        self.files_skipped_excluded = 0
+        self.files_skipped_gitignore = 0
+        self.files_skipped_suffix = 0
+        self.files_skipped_binary = 0
+
+    @property
+    def dirs_pruned(self) -> int:
+        return self.dirs_pruned_excluded + self.dirs_pruned_gitignore
+
+    @property
+    def files_pruned(self) -> int:
+        return self.files_seen - self.files_included
+
+    def to_dict(self) -> dict:
+        d = dict(self.__dict__)
+        d["dirs_pruned"] = self.dirs_pruned
+        d["files_pruned"] = self.files_pruned
+        return d
+
+    def __repr__(self):
+        return f"WalkStats({self.to_dict()})"
+
+
+class PruningDirWalker:
+    """
+    遍历 project_root 下的某个目录，返回需要合并的文本文件
+
+    Args:
+        project_root: 项目根目录，返回的 relative_path 相对于它
+        gitignore_matcher: .gitignore 匹配器，为 None 时不做 gitignore 过滤
+        git_root_prefix: project_root 相对 git 根目录的前缀（见 AiMdGenerator._get_gitignore_matcher）
+        excluded_dir_paths: 需要排除的目录（绝对路径、相对 project_root 的路径或通配符）
+        excluded_file_paths: 需要排除的文件（同上）
+        should_include_suffixes: 只包含这些后缀的文件，为空时包含全部
+        exclusions: 编译好的排除规则，给出时忽略 excluded_dir_paths / excluded_file_paths，见 path_exclusions.PathExclusions
+        check_text: 是否读取文件头排除二进制文件，False 时返回所有没有被过滤的文件（scan_index 之后按需判断）
+
+    visited_dirs 不为 None 时 walk 把进入的每个目录追加到这个列表中（scan_index 用来检查目录是否有变化），
+    pruned_dirs 不为 None 时把被排除规则剪掉的目录（相对 project_root 的 posix 路径）追加到这个列表中
+    """
+
+    def __init__(
+        self,
+        project_root: typing.Union[os.PathLike, str],
+        gitignore_matcher: typing.Optional[GitIgnoreMatcher] = None,
+        git_root_prefix: str = "",
+        excluded_dir_paths: typing.Iterable[typing.Union[os.PathLike, str]] = (),
+        excluded_file_paths: typing.Iterable[typing.Union[os.PathLike, str]] = (),
+        should_include_suffixes: typing.Optional[typing.List[str]] = None,
+        exclusions: typing.Optional[PathExclusions] = None,
+        check_text: bool = True,
+    ):
+        self.project_root = os.fspath(project_root)
+        self.gitignore_matcher = gitignore_matcher
+        self.git_root_prefix = git_root_prefix
+        if exclusions is None:
+            exclusions = PathExclusions.for_root(self.project_root, excluded_dir_paths, excluded_file_paths)
+        self.exclusions = exclusions
+        self.should_include_suffixes = set(should_include_suffixes or [])
+        self.check_text = check_text
+        self.visited_dirs: typing.Optional[typing.List[str]] = None
+        self.pruned_dirs: typing.Optional[typing.List[str]] = None
+        self.stats = WalkStats()
+
+    def _is_gitignored(self, relative_path: str, is_dir: bool) -> bool:
+        if self.gitignore_matcher is None:
+            return False
+        # 父目录都已经检查过（被忽略的目录不会进入），这里只需要判断路径本身
+        return self.gitignore_matcher.match_entry(self.git_root_prefix + relative_path, is_dir=is_dir)
+
+    def walk(self, target_dir: typing.Union[os.PathLike, str]) -> typing.Iterator[WalkedFile]:
+        stats = self.stats
+        target_dir = os.fspath(target_dir)
+        target_relative = os.path.relpath(target_dir, self.project_root).replace(os.sep, "/")
+        if self.gitignore_matcher is not None and target_relative != ".":
+            if self.gitignore_matcher.is_ignored(self.git_root_prefix + target_relative, is_dir=True):
+                stats.dirs_pruned_gitignore += 1
+                return
+        if self.exclusions.is_excluded_dir(target_relative):
+            stats.dirs_pruned_excluded += 1
+            if self.pruned_dirs is not None:
+                self.pruned_dirs.append(target_relative)
+            return
+
+        exclusions = self.exclusions or None
+        stack = [(target_dir, "" if target_relative == "." else target_relative + "/")]
+        while stack:
+            current_dir, relative_prefix = stack.pop()
+            stats.dirs_visited += 1
+            if self.visited_dirs is not None:
+                self.visited_dirs.append(current_dir)
+            try:
+                with os.scandir(current_dir) as it:
+                    entries = sorted(it, key=lambda e: e.name)
+            except OSError:
+                continue
+
+            sub_dirs = []
+            for entry in entries:
+                relative_path = relative_prefix + entry.name
+                if entry.is_dir(follow_symlinks=False):
+                    if exclusions is not None and exclusions.is_excluded_dir(relative_path):
+                        stats.dirs_pruned_excluded += 1
+                        if self.pruned_dirs is not None:
+                            self.pruned_dirs.append(relative_path)
+                        continue
+                    if self._is_gitignored(relative_path, is_dir=True):
+                        stats.dirs_pruned_gitignore += 1
+                        continue
+                    sub_dirs.append((entry.path, relative_path + "/"))
+                    continue
+                if not entry.is_file():
+                    continue
+                stats.files_seen += 1
+                if self._is_gitignored(relative_path, is_dir=False):
+                    stats.files_skipped_gitignore += 1
+                    continue
+                if exclusions is not None and exclusions.is_excluded_file(relative_path):
+                    stats.files_skipped_excluded += 1
+                    continue
+                if self.should_include_suffixes and path_suffix(entry.name) not in self.should_include_suffixes:
+                    stats.files_skipped_suffix += 1
+                    continue
+                if self.check_text and not is_text_file(entry.path):
+                    stats.files_skipped_binary += 1
+                    continue
+                try:
+                    size = entry.stat().st_size
+                except OSError:
+                    size = 0
+                stats.files_included += 1
+                yield WalkedFile(relative_path, entry.path, size)
+
+            # 倒序入栈，保证子目录按名称顺序被处理（先序遍历）
+            stack.extend(reversed(sub_dirs))
+
+    def _is_pruned_dir(self, path: str, relative_path: str) -> bool:
+        return self.exclusions.is_excluded_dir(relative_path) or self._is_gitignored(relative_path, is_dir=True)
+
+    def iter_dirs(self, target_dir: typing.Union[os.PathLike, str]) -> typing.Iterator[str]:
+        """walk(target_dir) 会进入的所有目录（监视模式需要监视这些目录，见 watcher）"""
+        target_dir = os.fspath(target_dir)
+        target_relative = os.path.relpath(target_dir, self.project_root).replace(os.sep, "/")
+        if target_relative != "." and self.gitignore_matcher is not None and \
+                self.gitignore_matcher.is_ignored(self.git_root_prefix + target_relative, is_dir=True):
+            return
+        if self.exclusions.is_excluded_dir(target_relative):
+            return
+        stack = [(target_dir, "" if target_relative == "." else target_relative + "/")]
+        while stack:
+            current_dir, relative_prefix = stack.pop()
+            yield current_dir
+            try:
+                with os.scandir(current_dir) as it:
+                    sub_dirs = [e for e in it if e.is_dir(follow_symlinks=False)]
+            except OSError:
+                continue
+            for entry in sub_dirs:
+                relative_path = relative_prefix + entry.name
+                if not self._is_pruned_dir(entry.path, relative_path):
+                    stack.append((entry.path, relative_path + "/"))
+
+    def is_included_path(self, target_dir: typing.Union[os.PathLike, str], path: typing.Union[os.PathLike, str], is_dir: bool) -> bool:
+        """
+        path 的变化是否会影响 walk(target_dir) 的结果：与 walk 相同的排除、gitignore、后缀规则（不读取文件判断是否文本文件，
+        被删除的文件已经无法读取）。目录只要没有被剪掉就返回 True，其中的文件可能被新增或删除
+        """
+        target_dir = os.fspath(target_dir)
+        path = os.fspath(path)
+        relative_to_target = os.path.relpath(path, target_dir)
+        if relative_to_target == os.curdir:
+            return is_dir
+        if relative_to_target.startswith(os.pardir + os.sep) or relative_to_target == os.pardir:
+            return False
+        target_relative = os.path.relpath(target_dir, self.project_root).replace(os.sep, "/")
+        relative_prefix = "" if target_relative == "." else target_relative + "/"
+        parts = relative_to_target.split(os.sep)
+        current = target_dir
+        if relative_prefix and self._is_pruned_dir(current, relative_prefix[:-1]):
+            return False
+        for part in parts[:-1]:
+            current = os.path.join(current, part)
+            relative_prefix += part
+            if self._is_pruned_dir(current, relative_prefix):
+                return False
+            relative_prefix += "/"
+        relative_path = relative_prefix + parts[-1]
+        if is_dir:
+            return not self._is_pruned_dir(path, relative_path)
+        if self._is_gitignored(relative_path, is_dir=False):
+            return False
+        if self.exclusions.is_excluded_file(relative_path):
+            return False
+        return not self.should_include_suffixes or path_suffix(parts[-1]) in self.should_include_suffixes
@@ -0,0 +1,271 @@
+"""
+下载缓存：gen_github_proj_* 下载 GitHub codeload 归档时不再每次重新下载整个仓库
+
+- 不可变的 URL（refs/tags/... 或者 40 位 commit）命中缓存后直接使用，不访问网络
+- 分支的 URL（refs/heads/main）用 ETag / Last-Modified 发送条件请求（If-None-Match / If-Modified-Since），
+  服务器返回 304 时使用缓存，返回 200 时替换缓存
+- 下载中断时保留 .part 文件和它的 ETag，下一次（或者本次的重试）用 Range + If-Range 从断点继续；
+  服务器上的内容已经变化时 If-Range 不成立，服务器返回完整内容，从头开始
+- 缓存总大小超过 max_bytes 时按最近使用时间淘汰；fetch(url, pin=True) 返回的条目在 unpin(url) 之前不会被淘汰，
+  批量生成时还在排队或者正在读取的归档不会被其他项目的下载删除
+
+缓存目录的布局：<sha256(url)>.bin 是内容，<key>.json 是元数据（url、etag、last_modified、大小、最近使用时间），
+下载中的内容写在 <key>.part，完成后用 os.replace 原子替换。只使用标准库的 urllib，遵循 HTTP(S)_PROXY 环境变量。
+"""
+
+import hashlib
+import http.client
+import json
+import os
+import re
+import threading
+import time
+import typing
+import urllib.error
+import urllib.request
+
+DEFAULT_MAX_BYTES = 2 * 1024 * 1024 * 1024
+CHUNK_SIZE = 1024 * 1024
+
+_IMMUTABLE_URL = re.compile(
+    r"/(?:zip|tar\.gz|zipball|tarball|archive)/(?:refs/tags/[^/?#]+|[0-9a-f]{40})(?:\.zip|\.tar\.gz)?(?:[?#].*)?$"
+)
+
+
+class DownloadError(RuntimeError):
+    pass
+
+
+def is_immutable_url(url: str) -> bool:
+    """tag 或 commit 的归档 URL 内容不会变化，例如 https://codeload.github.com/fastapi/sqlmodel/zip/refs/tags/0.0.25"""
+    return _IMMUTABLE_URL.search(url) is not None
+
+
+def default_cache_dir() -> str:
+    """环境变量 NB_AI_CONTEXT_DOWNLOAD_CACHE，默认 ~/.cache/nb_ai_context/downloads"""
+    return os.environ.get("NB_AI_CONTEXT_DOWNLOAD_CACHE") or os.path.join(
+        os.path.expanduser("~"), ".cache", "nb_ai_context", "downloads"
+    )
+
+
+def _read_json(path: str) -> typing.Optional[dict]:
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _write_json(path: str, data: dict):
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(json.dumps(data))
+    os.replace(tmp_path, path)
+
+
+def _remove(path: str):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+class DownloadCache:
+    """
+    URL 内容的本地缓存，线程安全（同一个 URL 同时只有一个下载）
+
+    Args:
+        cache_dir: 缓存目录，默认见 default_cache_dir()
+        max_bytes: 缓存大小上限，超过后按最近使用时间淘汰
+        timeout: 每次请求的超时时间（秒）
+        retries: 下载中断后从断点继续的最多次数
+    """
+
+    def __init__(
+        self,
+        cache_dir: typing.Union[os.PathLike, str] = None,
+        max_bytes: int = DEFAULT_MAX_BYTES,
+        timeout: float = 60,
+        retries: int = 3,
+        logger=None,
+    ):
+        self.cache_dir = os.fspath(cache_dir or default_cache_dir())
+        os.makedirs(self.cache_dir, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.timeout = timeout
+        self.retries = retries
+        self.logger = logger
+        self._locks: typing.Dict[str, threading.Lock] = {}
+        self._locks_lock = threading.Lock()
+        # {key: 引用次数}，被引用的条目不会被淘汰
+        self._pins: typing.Dict[str, int] = {}
+        self.hits = 0
+        self.not_modified = 0
+        self.downloads = 0
+        self.resumed = 0
+        self.bytes_downloaded = 0
+
+    def _path(self, key: str, suffix: str) -> str:
+        return os.path.join(self.cache_dir, key + suffix)
+
+    def _lock(self, key: str) -> threading.Lock:
+        with self._locks_lock:
+            return self._locks.setdefault(key, threading.Lock())
+
+    def _log(self, message: str):
+        if self.logger is not None:
+            self.logger.info(message)
+
+    @staticmethod
+    def _key(url: str) -> str:
+        return hashlib.sha256(url.encode("utf-8")).hexdigest()
+
+    def fetch(self, url: str, immutable: bool = None, pin: bool = False) -> str:
+        """
+        返回 url 内容在缓存中的文件路径，需要时下载或者重新验证
+
+        Args:
+            immutable: URL 的内容是否不会变化，默认按 is_immutable_url 判断
+            pin: 返回的文件在调用 unpin(url) 之前不会被淘汰（同一个 URL 可以 pin 多次，每次对应一次 unpin）
+        """
+        if immutable is None:
+            immutable = is_immutable_url(url)
+        key = self._key(url)
+        path = self._path(key, ".bin")
+        with self._lock(key):
+            meta = _read_json(self._path(key, ".json"))
+            cached = meta is not None and meta.get("url") == url and os.path.exists(path)
+            if cached and immutable:
+                self.hits += 1
+                self._log(f"download cache hit (immutable): {url}")
+            elif self._download(url, key, meta if cached else None) == "not_modified":
+                self.not_modified += 1
+                self._log(f"download cache revalidated (304 Not Modified): {url}")
+            else:
+                meta = _read_json(self._path(key, ".json"))
+            meta["last_used"] = time.time()
+            meta["immutable"] = immutable
+            _write_json(self._path(key, ".json"), meta)
+            if pin:
+                with self._locks_lock:
+                    self._pins[key] = self._pins.get(key, 0) + 1
+        self._evict(keep=key)
+        return path
+
+    def unpin(self, url: str) -> "DownloadCache":
+        """释放 fetch(url, pin=True) 的引用，没有引用之后缓存超过上限时淘汰"""
+        key = self._key(url)
+        with self._locks_lock:
+            count = self._pins.get(key, 0) - 1
+            if count > 0:
+                self._pins[key] = count
+                return self
+            self._pins.pop(key, None)
+        self._evict()
+        return self
+
+    def _download(self, url: str, key: str, cached_meta: typing.Optional[dict]) -> str:
+        """下载到 .part 再替换 .bin，返回 "downloaded" 或者 "not_modified"（只有 cached_meta 不为 None 时）"""
+        part_path, part_meta_path = self._path(key, ".part"), self._path(key, ".part.json")
+        for attempt in range(self.retries + 1):
+            part_meta = _read_json(part_meta_path)
+            offset = os.path.getsize(part_path) if os.path.exists(part_path) else 0
+            validator = part_meta and part_meta.get("url") == url and (part_meta.get("etag") or part_meta.get("last_modified"))
+            if offset and not validator:
+                # 没有验证器就无法确认断点前的内容仍然有效
+                _remove(part_path)
+                offset = 0
+            headers = {"User-Agent": "nb_ai_context", "Accept-Encoding": "identity"}
+            if offset:
+                headers["Range"] = f"bytes={offset}-"
+                headers["If-Range"] = validator
+            elif cached_meta is not None:
+                if cached_meta.get("etag"):
+                    headers["If-None-Match"] = cached_meta["etag"]
+                if cached_meta.get("last_modified"):
+                    headers["If-Modified-Since"] = cached_meta["last_modified"]
+            try:
+                response = urllib.request.urlopen(urllib.request.Request(url, headers=headers), timeout=self.timeout)
+            except urllib.error.HTTPError as e:
+                if e.code == 304 and cached_meta is not None and not offset:
+                    return "not_modified"
+                if e.code == 416 and offset:
+                    # 断点已经超出了服务器上的内容，从头开始
+                    _remove(part_path)
+                    continue
+                raise DownloadError(f"failed to download {url}: HTTP {e.code} {e.reason}") from e
+            except (urllib.error.URLError, OSError) as e:
+                if attempt < self.retries:
+                    continue
+                raise DownloadError(f"failed to download {url}: {e}") from e
+
+            with response:
+                resumed = response.status == 206 and offset > 0
+                if not resumed:
+                    offset = 0
+                else:
+                    self.resumed += 1
+                    self._log(f"resuming download of {url} at byte {offset}")
+                etag, last_modified = response.headers.get("ETag"), response.headers.get("Last-Modified")
+                # 先写验证器，下载中断后可以从断点继续
+                _write_json(part_meta_path, {"url": url, "etag": etag, "last_modified": last_modified})
+                length = response.headers.get("Content-Length")
+                expected_size = offset + int(length) if length is not None else None
+                try:
+                    with open(part_path, "ab" if resumed else "wb") as f:
+                        while True:
+                            chunk = response.read(CHUNK_SIZE)
+                            if not chunk:
+                                break
+                            f.write(chunk)
+                            self.bytes_downloaded += len(chunk)
+                except (OSError, http.client.HTTPException) as e:
+                    if attempt < self.retries:
+                        continue
+                    raise DownloadError(f"download of {url} was interrupted: {e}") from e
+            size = os.path.getsize(part_path)
+            if expected_size is not None and size < expected_size:
+                if attempt < self.retries:
+                    continue
+                raise DownloadError(f"download of {url} was interrupted at {size} of {expected_size} bytes")
+            os.replace(part_path, self._path(key, ".bin"))
+            _remove(part_meta_path)
+            _write_json(self._path(key, ".json"), {"url": url, "etag": etag, "last_modified": last_modified, "size": size})
+            self.downloads += 1
+            self._log(f"downloaded {url} ({size} bytes)")
+            return "downloaded"
+        raise DownloadError(f"failed to download {url} after {self.retries + 1} attempts")
+
+    def _evict(self, keep: str = None):
+        """缓存总大小超过 max_bytes 时按最近使用时间删除，keep 是刚刚使用的条目，被 pin 的条目也不删除"""
+        entries, total = [], 0
+        for name in os.listdir(self.cache_dir):
+            if not name.endswith(".bin"):
+                continue
+            key = name[:-4]
+            meta = _read_json(self._path(key, ".json")) or {}
+            try:
+                size = os.path.getsize(self._path(key, ".bin"))
+            except OSError:
+                continue
+            total += size
+            entries.append((meta.get("last_used", 0), key, size))
+        for _, key, size in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            if key == keep or key in self._pins:
+                continue
+            with self._lock(key):
+                if key in self._pins:
+                    # 等待锁的时候被 fetch(pin=True) 引用了
+                    continue
+                _remove(self._path(key, ".bin"))
+                _remove(self._path(key, ".json"))
+            total -= size
+            self._log(f"evicted {key} ({size} bytes) from the download cache")
+
+    def stats(self) -> dict:
+        return {
+            "hits": self.hits, "not_modified": self.not_modified, "downloads": self.downloads,
+            "resumed": self.resumed, "bytes_downloaded": self.bytes_downloaded,
+        }
@@ -0,0 +1,148 @@
+"""
+两个 git 版本之间的变化：AiMdGenerator.merge_changed_since 的数据来源
+
+只调用一次 git：
+
+    git diff --patch-with-raw -U<n> --no-renames --relative <base> [<head>] -- .
+
+raw 部分给出每个文件的状态（A 新增、M 修改、D 删除、T 类型变化），随后的补丁部分给出每个文件的 unified diff。
+补丁按 diff --git 头中的路径对应到文件：类型变化（例如普通文件变成符号链接）有删除、新增两个补丁，冲突中的文件没有补丁。
+不传 head 时比较 base 和工作区（只包括被跟踪的文件，未跟踪的新文件需要先 git add -N）。
+路径相对于 git 命令的工作目录（project_root），project_root 之外的变化不会列出。
+
+grep_files 用 git grep 在项目中查找可能 import 了变化模块的文件，不需要在 Python 中读取每个文件。
+"""
+
+import os
+import re
+import shutil
+import subprocess
+import typing
+
+from nb_ai_context.git_revision import GitRevisionError
+
+_RAW_LINE = re.compile(r"^:\d+ \d+ \w+ \w+ ([A-Z])\d*\t(.*)$")
+_QUOTED_PATH = re.compile(r'"(?:[^"\\]|\\.)*"')
+_C_ESCAPES = {"a": "\a", "b": "\b", "t": "\t", "n": "\n", "v": "\v", "f": "\f", "r": "\r", '"': '"', "\\": "\\"}
+
+
+class ChangedFile(typing.NamedTuple):
+    status: str  # A M D T U
+    path: str  # 相对 project_root 的 posix 路径
+    patch: str  # 这个文件的 unified diff，从 "diff --git" 开始
+
+
+def unquote_path(path: str) -> str:
+    """还原 git 对特殊路径的 C 风格引号（core.quotePath=false 时只有控制字符、引号和反斜杠会被转义）"""
+    if not (path.startswith('"') and path.endswith('"')):
+        return path
+    data, i, body = bytearray(), 0, path[1:-1]
+    while i < len(body):
+        char = body[i]
+        if char != "\\":
+            data += char.encode("utf-8")
+            i += 1
+        elif body[i + 1] in _C_ESCAPES:
+            data += _C_ESCAPES[body[i + 1]].encode()
+            i += 2
+        else:
+            data.append(int(body[i + 1:i + 4], 8))
+            i += 4
+    return data.decode("utf-8", "surrogateescape")
+
+
+def patch_path(patch: str) -> str:
+    """补丁的 diff --git a/<path> b/<path> 头中的路径（--no-renames 时两个路径相同）"""
+    header = patch.split("\n", 1)[0].rstrip("\r")[len("diff --git "):]
+    if header.startswith('"'):
+        match = _QUOTED_PATH.match(header)
+        return unquote_path(match.group(0))[len("a/"):] if match else header
+    # "a/<path> b/<path>"，路径中可能有空格，按长度取前一半
+    return header[len("a/"):len("a/") + (len(header) - len("a/ b/")) // 2]
+
+
+def parse_diff_output(output: str) -> typing.List[ChangedFile]:
+    """解析 git diff --patch-with-raw 的输出"""
+    entries, patch_start = [], len(output)
+    position = 0
+    for line in output.splitlines(keepends=True):
+        match = _RAW_LINE.match(line.rstrip("\n"))
+        if match is None:
+            patch_start = position
+            break
+        entries.append((match.group(1), unquote_path(match.group(2))))
+        position += len(line)
+    patches = re.split(r"^(?=diff --git )", output[patch_start:], flags=re.M)
+    patches_by_path: typing.Dict[str, typing.List[str]] = {}
+    for patch in patches:
+        if patch.startswith("diff --git "):
+            patches_by_path.setdefault(patch_path(patch), []).append(patch)
+    # 冲突中的文件（U）在补丁部分没有 diff --git 头
+    return [ChangedFile(status, path, "" if status == "U" else "".join(patches_by_path.get(path, [])))
+            for status, path in entries]
+
+
+def diff_changed_files(
+    project_root: typing.Union[os.PathLike, str],
+    base_rev: str,
+    head_rev: str = None,
+    context_lines: int = 3,
+    git_executable: str = None,
+) -> typing.List[ChangedFile]:
+    """
+    base_rev 到 head_rev（None 表示工作区）之间 project_root 下变化的文件
+
+    Raises:
+        GitRevisionError: git 不可用、版本不存在或者 project_root 不在 git 仓库中
+    """
+    git_executable = git_executable or shutil.which("git")
+    if git_executable is None:
+        raise GitRevisionError("git executable not found")
+    command = [
+        git_executable, "-C", os.fspath(project_root), "-c", "core.quotePath=false",
+        "diff", "--patch-with-raw", f"-U{context_lines}", "--no-color", "--no-ext-diff", "--no-renames",
+        "--relative", "--src-prefix=a/", "--dst-prefix=b/", base_rev, *([head_rev] if head_rev else []), "--", ".",
+    ]
+    try:
+        result = subprocess.run(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    except OSError as e:
+        raise GitRevisionError(f"failed to run git in {project_root}: {e}") from e
+    if result.returncode != 0:
+        raise GitRevisionError(f"git diff {base_rev} {head_rev or ''} failed in {project_root}: "
+                               f"{result.stderr.decode(errors='replace').strip()}")
+    return parse_diff_output(result.stdout.decode("utf-8", "replace"))
+
+
+def grep_files(
+    project_root: typing.Union[os.PathLike, str],
+    patterns: typing.List[str],
+    pathspec: str = "*.py",
+    rev: str = None,
+    git_executable: str = None,
+) -> typing.List[str]:
+    """
+    project_root 下内容匹配任何一个 patterns（POSIX 扩展正则，按整词匹配）的文件，返回相对 project_root 的 posix 路径
+
+    rev 为 None 时搜索工作区，包括未跟踪、没有被忽略的文件；否则搜索该版本中的文件。二进制文件不会匹配。
+
+    Raises:
+        GitRevisionError: git 不可用或者执行失败
+    """
+    git_executable = git_executable or shutil.which("git")
+    if git_executable is None:
+        raise GitRevisionError("git executable not found")
+    command = [git_executable, "-C", os.fspath(project_root), "grep", "-l", "-z", "-I", "-w", "-E"]
+    for pattern in patterns:
+        command += ["-e", pattern]
+    command += ["--untracked"] if rev is None else [rev]
+    command += ["--", pathspec]
+    try:
+        result = subprocess.run(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    except OSError as e:
+        raise GitRevisionError(f"failed to run git in {project_root}: {e}") from e
+    # 1 表示没有匹配
+    if result.returncode not in (0, 1):
+        raise GitRevisionError(f"git grep failed in {project_root}: {result.stderr.decode(errors='replace').strip()}")
+    prefix = f"{rev}:" if rev is not None else ""
+    return [path[len(prefix):] for path in result.stdout.decode("utf-8", "surrogateescape").split("\0")
+            if path.startswith(prefix) and len(path) > len(prefix)]
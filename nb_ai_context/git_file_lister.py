@@ -0,0 +1,196 @@
+"""
+基于 git 索引的文件枚举：merge_from_dir(use_gitignore=True) 在 git 仓库中的快速路径
+
+git 仓库里被跟踪的文件列表已经在 .git/index 中，PruningDirWalker 仍然要 scandir 每个目录、
+对每个路径逐条匹配 .gitignore 规则。GitFileLister 改为调用本地的 git：
+
+    git ls-files -z --cached --others --exclude-standard -- <dir>     被跟踪的文件和没有被忽略的新文件
+    git ls-files -z --cached --ignored --exclude-standard -- <dir>    被跟踪、但是匹配 .gitignore 规则的文件
+
+第二个列表从第一个中去掉，结果与 PruningDirWalker + GitIgnoreMatcher 相同（GitIgnoreMatcher 不区分文件是否被跟踪），
+全局的 core.excludesFile 被禁用（GitIgnoreMatcher 不读取它）。之后按 PruningDirWalker 的顺序
+（每个目录先文件、再子目录，同一目录内按名称排序）排序，再做排除目录、排除文件、后缀和文本文件过滤。
+
+git 不可用、不是 git 仓库（只有 .gitignore 没有 .git）或者 git 执行失败时 GitFileLister.available() 返回 False 或抛出
+GitListError，调用方退回 PruningDirWalker。
+
+与遍历器的差别：子模块和未跟踪的嵌套 git 仓库里的文件不会被列出（git 把它们当作一个条目）。
+"""
+
+import os
+import shutil
+import stat
+import subprocess
+import typing
+
+from nb_ai_context.dir_walker import WalkedFile, WalkStats, path_suffix
+from nb_ai_context.path_exclusions import PathExclusions
+
+
+class GitListError(RuntimeError):
+    pass
+
+
+def walk_order_key(relative_path: str) -> str:
+    """
+    PruningDirWalker 的遍历顺序：同一目录内文件在子目录之前，各自按名称排序
+
+    目录名编码为 \\x01name\\x00、文件名编码为 \\x00name，按字符串比较即可（文件名中不会出现 \\x00），
+    比按路径分段构造元组快得多
+    """
+    directory, _, name = relative_path.rpartition("/")
+    if not directory:
+        return "\x00" + name
+    return "\x01" + directory.replace("/", "\x00\x01") + "\x00\x00" + name
+
+
+def _read_head_and_size(path: str) -> typing.Optional[typing.Tuple[bytes, int]]:
+    """
+    读取普通文件的前 1KB 和大小，不是普通文件（子模块、指向目录的符号链接）或者已经被删除时返回 None
+
+    打开文件后用 fstat 取大小，比先 stat 路径再打开少一次路径解析
+    """
+    try:
+        fd = os.open(path, os.O_RDONLY | getattr(os, "O_NONBLOCK", 0) | getattr(os, "O_BINARY", 0))
+    except OSError:
+        try:
+            st = os.stat(path)
+        except OSError:
+            # 被跟踪但在工作区中被删除的文件
+            return None
+        # 无法读取的文件与 is_text_file 相同，视为文本文件
+        return (b"", st.st_size) if stat.S_ISREG(st.st_mode) else None
+    try:
+        st = os.fstat(fd)
+        if not stat.S_ISREG(st.st_mode):
+            return None
+        return os.read(fd, 1024), st.st_size
+    except OSError:
+        return b"", 0
+    finally:
+        os.close(fd)
+
+
+def _stat_size(path: str) -> typing.Optional[typing.Tuple[bytes, int]]:
+    """不读取文件头的 _read_head_and_size，文件头为空"""
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return (b"", st.st_size) if stat.S_ISREG(st.st_mode) else None
+
+
+class GitFileLister:
+    """
+    用 git ls-files 列出 project_root 下某个目录中需要合并的文本文件，接口与 PruningDirWalker.walk 相同
+
+    Args:
+        project_root: 项目根目录，返回的 relative_path 相对于它
+        git_root: git 仓库根目录（包含 .git 的目录）
+        git_root_prefix: project_root 相对 git 根目录的前缀（见 AiMdGenerator._get_gitignore_matcher）
+        excluded_dir_paths: 需要排除的目录（绝对路径、相对 project_root 的路径或通配符）
+        excluded_file_paths: 需要排除的文件（同上）
+        should_include_suffixes: 只包含这些后缀的文件，为空时包含全部
+        exclusions: 编译好的排除规则，给出时忽略 excluded_dir_paths / excluded_file_paths，见 path_exclusions.PathExclusions
+        git_executable: git 可执行文件，默认在 PATH 中查找
+        check_text: 是否读取文件头排除二进制文件，False 时只取文件大小（scan_index 之后按需判断）
+    """
+
+    def __init__(
+        self,
+        project_root: typing.Union[os.PathLike, str],
+        git_root: typing.Union[os.PathLike, str],
+        git_root_prefix: str = "",
+        excluded_dir_paths: typing.Iterable[typing.Union[os.PathLike, str]] = (),
+        excluded_file_paths: typing.Iterable[typing.Union[os.PathLike, str]] = (),
+        should_include_suffixes: typing.Optional[typing.List[str]] = None,
+        exclusions: typing.Optional[PathExclusions] = None,
+        git_executable: str = None,
+        check_text: bool = True,
+    ):
+        self.project_root = os.fspath(project_root)
+        self.git_root = os.fspath(git_root)
+        self.git_root_prefix = git_root_prefix
+        if exclusions is None:
+            exclusions = PathExclusions.for_root(self.project_root, excluded_dir_paths, excluded_file_paths)
+        self.exclusions = exclusions
+        self.should_include_suffixes = set(should_include_suffixes or [])
+        self.git_executable = git_executable or shutil.which("git")
+        self.check_text = check_text
+        self.stats = WalkStats()
+
+    @staticmethod
+    def available(git_root: typing.Union[os.PathLike, str], git_executable: str = None) -> bool:
+        """git_root 是 git 仓库的工作目录并且能找到 git 可执行文件"""
+        return (git_executable or shutil.which("git")) is not None and os.path.exists(os.path.join(os.fspath(git_root), ".git"))
+
+    def _start_ls_files(self, pathspec: str, *options: str) -> subprocess.Popen:
+        command = [
+            self.git_executable, "-C", self.git_root, "-c", f"core.excludesFile={os.devnull}",
+            "ls-files", "-z", "--exclude-standard", *options, "--", pathspec,
+        ]
+        try:
+            return subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        except OSError as e:
+            raise GitListError(f"failed to run git in {self.git_root}: {e}") from e
+
+    def _finish_ls_files(self, process: subprocess.Popen) -> typing.List[str]:
+        stdout, stderr = process.communicate()
+        if process.returncode != 0:
+            raise GitListError(f"git ls-files failed in {self.git_root} (exit code {process.returncode}): "
+                               f"{stderr.decode(errors='replace').strip()}")
+        return [os.fsdecode(path) for path in stdout.split(b"\x00") if path]
+
+    def list_paths(self, target_dir: typing.Union[os.PathLike, str]) -> typing.List[str]:
+        """target_dir 下 git 认为没有被忽略的文件，相对 git 根目录的 posix 路径（还没有做后缀等过滤）"""
+        target_relative = os.path.relpath(os.fspath(target_dir), self.git_root).replace(os.sep, "/")
+        pathspec = ":(top,literal)" + ("" if target_relative == "." else target_relative)
+        if target_relative.startswith("../") or target_relative == "..":
+            raise GitListError(f"{target_dir} is outside of the git repository {self.git_root}")
+        # 两个 git 进程同时运行
+        listed_process = self._start_ls_files(pathspec, "--cached", "--others")
+        try:
+            ignored_process = self._start_ls_files(pathspec, "--cached", "--ignored")
+        except GitListError:
+            listed_process.kill()
+            listed_process.communicate()
+            raise
+        try:
+            listed = self._finish_ls_files(listed_process)
+        finally:
+            ignored = set(self._finish_ls_files(ignored_process))
+        # 冲突中的文件在索引中有多个条目，嵌套的 git 仓库以 / 结尾
+        return list(dict.fromkeys(p for p in listed if p not in ignored and not p.endswith("/")))
+
+    def walk(self, target_dir: typing.Union[os.PathLike, str]) -> typing.Iterator[WalkedFile]:
+        stats = self.stats
+        prefix_length = len(self.git_root_prefix)
+        exclusions = self.exclusions or None
+        relative_paths = [
+            git_path[prefix_length:] for git_path in self.list_paths(target_dir) if git_path.startswith(self.git_root_prefix)
+        ]
+        relative_paths.sort(key=walk_order_key)
+        root_prefix = os.path.join(self.project_root, "")
+        dirs = set()
+        for relative_path in relative_paths:
+            # 不需要 I/O 的过滤在前面；被删除的文件在读取时才发现，和被过滤的文件一样计入 files_seen
+            stats.files_seen += 1
+            if exclusions is not None and exclusions.is_excluded_file(relative_path):
+                stats.files_skipped_excluded += 1
+                continue
+            if self.should_include_suffixes and path_suffix(relative_path.rpartition("/")[2]) not in self.should_include_suffixes:
+                stats.files_skipped_suffix += 1
+                continue
+            path = root_prefix + (relative_path if os.sep == "/" else relative_path.replace("/", os.sep))
+            head_and_size = _read_head_and_size(path) if self.check_text else _stat_size(path)
+            if head_and_size is None:
+                stats.files_seen -= 1
+                continue
+            # 与 dir_walker.is_text_file 相同的判断
+            if b"\x00" in head_and_size[0]:
+                stats.files_skipped_binary += 1
+                continue
+            dirs.add(relative_path.rpartition("/")[0])
+            stats.files_included += 1
+            yield WalkedFile(relative_path, path, head_and_size[1])
+        stats.dirs_visited = len(dirs)
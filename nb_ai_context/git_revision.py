@@ -0,0 +1,348 @@
+"""
+从 git 的某个版本（tag、分支、commit）生成上下文，不需要检出
+
+set_project_propery(..., git_rev="v1.7") 之后，AiMdGenerator 不再读取工作区，
+而是通过一个常驻的 `git cat-file --batch` 进程读取该版本的对象：
+
+- GitCatFile：一个 git 进程，按对象名请求、按头部的大小读取内容，每个文件不再启动一个子进程
+- GitRevisionSource：从 commit 的根 tree 开始按需读取子 tree（merge_from_dir 某个子目录时只读取这个子目录），
+  列出文件、判断文本文件、读取文件内容；最近读取的 blob 放在有大小上限的缓存中，
+  文本文件判断和随后的内容读取只请求一次
+
+AST 元数据直接从 blob 内容提取（见 module_registry.ModuleRegistry 的 source 参数），不会写出临时文件。
+
+与工作区的差别：版本中只有被跟踪的文件，所以不再应用 .gitignore（被跟踪、但匹配 .gitignore 的文件也会包含）；
+符号链接和子模块不算文件。
+"""
+
+import os
+import shutil
+import subprocess
+import threading
+import typing
+from collections import OrderedDict
+
+from nb_ai_context.dir_walker import WalkedFile, WalkStats, path_suffix
+from nb_ai_context.git_file_lister import walk_order_key
+from nb_ai_context.path_exclusions import PathExclusions
+
+MODE_TREE = "40000"
+BLOB_MODES = ("100644", "100755")
+
+DEFAULT_BLOB_CACHE_BYTES = 64 * 1024 * 1024
+
+
+class GitRevisionError(RuntimeError):
+    pass
+
+
+def decode_text(data: bytes, encoding: str = "utf-8", errors: str = None) -> str:
+    """与文本模式 open 相同的解码：换行符统一为 \\n"""
+    text = data.decode(encoding, errors or "strict")
+    if "\r" in text:
+        text = text.replace("\r\n", "\n").replace("\r", "\n")
+    return text
+
+
+class GitCatFile:
+    """
+    常驻的 git cat-file --batch 进程，线程安全
+
+    Args:
+        git_root: git 仓库根目录
+        git_executable: git 可执行文件，默认在 PATH 中查找
+    """
+
+    def __init__(self, git_root: typing.Union[os.PathLike, str], git_executable: str = None):
+        self.git_root = os.fspath(git_root)
+        git_executable = git_executable or shutil.which("git")
+        if git_executable is None:
+            raise GitRevisionError("git executable not found")
+        try:
+            self._process = subprocess.Popen(
+                [git_executable, "-C", self.git_root, "cat-file", "--batch"],
+                stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+            )
+        except OSError as e:
+            raise GitRevisionError(f"failed to run git cat-file in {self.git_root}: {e}") from e
+        self._lock = threading.Lock()
+        self.requests = 0
+
+    def read(self, name: str) -> typing.Tuple[str, str, bytes]:
+        """读取对象，返回 (对象 id, 类型, 内容)；对象不存在时抛出 KeyError"""
+        if "\n" in name:
+            raise KeyError(name)
+        with self._lock:
+            if self._process is None:
+                raise GitRevisionError("git cat-file process is closed")
+            stdin, stdout = self._process.stdin, self._process.stdout
+            try:
+                stdin.write(name.encode("utf-8") + b"\n")
+                stdin.flush()
+                header = stdout.readline()
+            except OSError as e:
+                raise GitRevisionError(f"git cat-file in {self.git_root} exited: {e}") from e
+            if not header:
+                raise GitRevisionError(f"git cat-file in {self.git_root} exited unexpectedly")
+            fields = header.split()
+            if len(fields) != 3:
+                # "<name> missing" 或者 "<name> ambiguous"
+                raise KeyError(name)
+            object_id, object_type, size = fields[0].decode(), fields[1].decode(), int(fields[2])
+            data = stdout.read(size)
+            stdout.read(1)  # 内容后面的换行
+            self.requests += 1
+        return object_id, object_type, data
+
+    def close(self):
+        with self._lock:
+            process, self._process = self._process, None
+        if process is not None:
+            process.stdin.close()
+            process.wait()
+            process.stdout.close()
+
+    def __del__(self):
+        if getattr(self, "_process", None) is not None:
+            self.close()
+
+
+class GitRevisionSource:
+    """
+    git 仓库某个版本的只读文件视图，路径使用工作区中对应的绝对路径
+
+    Args:
+        git_root: git 仓库根目录
+        rev: 版本，任何 git rev-parse 能识别的写法（tag、分支、commit、HEAD~3 ...）
+        blob_cache_bytes: 最近读取的 blob 缓存上限
+    """
+
+    def __init__(
+        self,
+        git_root: typing.Union[os.PathLike, str],
+        rev: str,
+        git_executable: str = None,
+        blob_cache_bytes: int = DEFAULT_BLOB_CACHE_BYTES,
+    ):
+        self.git_root = os.path.abspath(os.fspath(git_root))
+        self._root_prefix = os.path.join(self.git_root, "")
+        self.rev = rev
+        self.cat_file = GitCatFile(self.git_root, git_executable)
+        try:
+            self.commit, object_type, data = self.cat_file.read(f"{rev}^{{commit}}")
+        except KeyError:
+            self.cat_file.close()
+            raise GitRevisionError(f"revision {rev!r} not found in {self.git_root}") from None
+        root_tree = data.split(b"\n", 1)[0].split()
+        if object_type != "commit" or root_tree[0] != b"tree":
+            self.cat_file.close()
+            raise GitRevisionError(f"unexpected commit object for {rev!r}: {object_type}")
+        self._id_bytes = len(self.commit) // 2  # sha1 为 20 字节，sha256 为 32 字节
+        self._trees: typing.Dict[str, typing.Dict[str, typing.Tuple[str, str]]] = {}
+        self._tree_ids = {"": root_tree[1].decode()}
+        self._blob_cache_bytes = blob_cache_bytes
+        self._blob_cache: "OrderedDict[str, bytes]" = OrderedDict()
+        self._blob_cache_size = 0
+        self._blob_sizes: typing.Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def close(self):
+        self.cat_file.close()
+
+    # ---- 路径 ----
+
+    def inner_path(self, path: typing.Union[os.PathLike, str]) -> typing.Optional[str]:
+        """工作区绝对路径转换为仓库内的 posix 路径，仓库根目录为空字符串，不在仓库内时返回 None"""
+        # 每个文件会调用多次，用前缀比较代替 os.path.relpath
+        path = os.path.abspath(os.fspath(path))
+        if path == self.git_root:
+            return ""
+        if not path.startswith(self._root_prefix):
+            return None
+        relative = path[len(self._root_prefix):]
+        return relative if os.sep == "/" else relative.replace(os.sep, "/")
+
+    def abs_path(self, inner_path: str) -> str:
+        return os.path.join(self.git_root, *inner_path.split("/")) if inner_path else self.git_root
+
+    # ---- tree ----
+
+    def _read_tree(self, tree_id: str) -> typing.Dict[str, typing.Tuple[str, str]]:
+        _, object_type, data = self.cat_file.read(tree_id)
+        if object_type != "tree":
+            raise GitRevisionError(f"{tree_id} is a {object_type}, not a tree")
+        entries = {}
+        offset, length, id_bytes = 0, len(data), self._id_bytes
+        while offset < length:
+            space = data.index(b" ", offset)
+            nul = data.index(b"\x00", space)
+            mode = data[offset:space].decode()
+            name = os.fsdecode(data[space + 1:nul])
+            entries[name] = (mode, data[nul + 1:nul + 1 + id_bytes].hex())
+            offset = nul + 1 + id_bytes
+        return entries
+
+    def _dir_entries(self, git_dir: str) -> typing.Optional[typing.Dict[str, typing.Tuple[str, str]]]:
+        """目录的条目 {名称: (mode, 对象 id)}，目录不存在时返回 None"""
+        entries = self._trees.get(git_dir)
+        if entries is not None:
+            return entries
+        tree_id = self._tree_ids.get(git_dir)
+        if tree_id is None:
+            if not git_dir:
+                return None
+            parent, _, name = git_dir.rpartition("/")
+            parent_entries = self._dir_entries(parent)
+            if parent_entries is None or parent_entries.get(name, ("",))[0] != MODE_TREE:
+                return None
+            tree_id = parent_entries[name][1]
+        entries = self._read_tree(tree_id)
+        with self._lock:
+            self._trees[git_dir] = entries
+            for name, (mode, object_id) in entries.items():
+                if mode == MODE_TREE:
+                    self._tree_ids[f"{git_dir}/{name}" if git_dir else name] = object_id
+        return entries
+
+    def _entry(self, git_path: typing.Optional[str]) -> typing.Optional[typing.Tuple[str, str]]:
+        if git_path is None:
+            return None
+        if git_path == "":
+            return MODE_TREE, self._tree_ids[""]
+        parent, _, name = git_path.rpartition("/")
+        entries = self._dir_entries(parent)
+        return None if entries is None else entries.get(name)
+
+    def exists(self, path: typing.Union[os.PathLike, str]) -> bool:
+        return self._entry(self.inner_path(path)) is not None
+
+    def is_dir(self, path: typing.Union[os.PathLike, str]) -> bool:
+        entry = self._entry(self.inner_path(path))
+        return entry is not None and entry[0] == MODE_TREE
+
+    def is_file(self, path: typing.Union[os.PathLike, str]) -> bool:
+        entry = self._entry(self.inner_path(path))
+        return entry is not None and entry[0] in BLOB_MODES
+
+    def iter_files(self, path: typing.Union[os.PathLike, str]) -> typing.Iterator[str]:
+        """目录下所有文件的仓库内路径（包括子目录），按 tree 的顺序"""
+        git_dir = self.inner_path(path)
+        if git_dir is None:
+            return
+        stack = [git_dir]
+        while stack:
+            current = stack.pop()
+            entries = self._dir_entries(current)
+            if entries is None:
+                continue
+            sub_dirs = []
+            for name, (mode, _) in entries.items():
+                child = f"{current}/{name}" if current else name
+                if mode == MODE_TREE:
+                    sub_dirs.append(child)
+                elif mode in BLOB_MODES:
+                    yield child
+            stack.extend(reversed(sub_dirs))
+
+    # ---- blob ----
+
+    def _blob_id(self, path: typing.Union[os.PathLike, str]) -> str:
+        entry = self._entry(self.inner_path(path))
+        if entry is None or entry[0] not in BLOB_MODES:
+            raise FileNotFoundError(f"{path} is not a file in git revision {self.rev}")
+        return entry[1]
+
+    def read_bytes(self, path: typing.Union[os.PathLike, str]) -> bytes:
+        blob_id = self._blob_id(path)
+        with self._lock:
+            data = self._blob_cache.get(blob_id)
+            if data is not None:
+                self._blob_cache.move_to_end(blob_id)
+                return data
+        _, _, data = self.cat_file.read(blob_id)
+        with self._lock:
+            self._blob_sizes[blob_id] = len(data)
+            if len(data) <= self._blob_cache_bytes // 4:
+                self._blob_cache[blob_id] = data
+                self._blob_cache_size += len(data)
+                while self._blob_cache_size > self._blob_cache_bytes:
+                    _, evicted = self._blob_cache.popitem(last=False)
+                    self._blob_cache_size -= len(evicted)
+        return data
+
+    def read_text(self, path: typing.Union[os.PathLike, str], encoding: str = "utf-8", errors: str = None) -> str:
+        return decode_text(self.read_bytes(path), encoding, errors)
+
+    def size(self, path: typing.Union[os.PathLike, str]) -> int:
+        blob_id = self._blob_id(path)
+        size = self._blob_sizes.get(blob_id)
+        return size if size is not None else len(self.read_bytes(path))
+
+    def is_text(self, path: typing.Union[os.PathLike, str]) -> bool:
+        """与 NbPath.is_text 相同的判断：是文件并且前 1KB 中没有空字节"""
+        return self.is_file(path) and b"\x00" not in self.read_bytes(path)[:1024]
+
+    def stats(self) -> dict:
+        return {"rev": self.rev, "commit": self.commit, "trees": len(self._trees), "git_requests": self.cat_file.requests}
+
+
+class SourceLister:
+    """
+    列出只读文件视图中 project_root 下某个目录里需要合并的文本文件，接口与 PruningDirWalker.walk 相同，顺序也相同
+
+    文件视图需要提供 inner_path / abs_path / iter_files / is_text / size，
+    例如 GitRevisionSource 和 archive_source.ArchiveSource
+
+    Args:
+        source: 只读文件视图
+        project_root: 项目根目录（工作区中的绝对路径），返回的 relative_path 相对于它
+        excluded_dir_paths: 需要排除的目录（绝对路径、相对 project_root 的路径或通配符）
+        excluded_file_paths: 需要排除的文件（同上）
+        should_include_suffixes: 只包含这些后缀的文件，为空时包含全部
+        exclusions: 编译好的排除规则，给出时忽略 excluded_dir_paths / excluded_file_paths，见 path_exclusions.PathExclusions
+    """
+
+    def __init__(
+        self,
+        source: GitRevisionSource,
+        project_root: typing.Union[os.PathLike, str],
+        excluded_dir_paths: typing.Iterable[typing.Union[os.PathLike, str]] = (),
+        excluded_file_paths: typing.Iterable[typing.Union[os.PathLike, str]] = (),
+        should_include_suffixes: typing.Optional[typing.List[str]] = None,
+        exclusions: typing.Optional[PathExclusions] = None,
+    ):
+        self.source = source
+        self.project_root = os.fspath(project_root)
+        if exclusions is None:
+            exclusions = PathExclusions.for_root(self.project_root, excluded_dir_paths, excluded_file_paths)
+        self.exclusions = exclusions
+        self.should_include_suffixes = set(should_include_suffixes or [])
+        self.stats = WalkStats()
+
+    def walk(self, target_dir: typing.Union[os.PathLike, str]) -> typing.Iterator[WalkedFile]:
+        stats = self.stats
+        source = self.source
+        project_prefix = source.inner_path(self.project_root)
+        project_prefix = project_prefix + "/" if project_prefix else ""
+        exclusions = self.exclusions or None
+        relative_paths = [
+            inner_path[len(project_prefix):] for inner_path in source.iter_files(target_dir) if inner_path.startswith(project_prefix)
+        ]
+        relative_paths.sort(key=walk_order_key)
+        dirs = set()
+        for relative_path in relative_paths:
+            stats.files_seen += 1
+            if exclusions is not None and exclusions.is_excluded_file(relative_path):
+                stats.files_skipped_excluded += 1
+                continue
+            if self.should_include_suffixes and path_suffix(relative_path.rpartition("/")[2]) not in self.should_include_suffixes:
+                stats.files_skipped_suffix += 1
+                continue
+            path = source.abs_path(project_prefix + relative_path)
+            if not source.is_text(path):
+                stats.files_skipped_binary += 1
+                continue
+            dirs.add(relative_path.rpartition("/")[0])
+            stats.files_included += 1
+            yield WalkedFile(relative_path, path, source.size(path))
+        stats.dirs_visited = len(dirs)
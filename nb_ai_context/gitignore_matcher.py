@@ -0,0 +1,257 @@
+"""
+编译型 .gitignore 匹配器
+
+按照 git 的真实规则判断路径是否被忽略：
+- 读取 `.git/info/exclude`、根目录 `.gitignore` 以及所有子目录中的 `.gitignore`
+- 支持 `!` 取反、以 `/` 结尾只匹配目录、包含 `/` 的模式相对所在 .gitignore 目录锚定、`**` 通配
+- 优先级：越深层目录的 .gitignore 优先级越高，同一个文件中后面的规则优先级更高，
+  `.git/info/exclude` 优先级最低
+- 父目录被忽略后，其中的文件无法再通过 `!` 重新包含（与 git 一致）
+
+每个 .gitignore 的所有规则会被编译成一个合并的大正则（规则倒序排列，第一个匹配上的分支就是
+优先级最高的规则），因此判断一个路径的代价只与目录深度有关，与规则数量基本无关。
+每个目录的规则集以及目录的忽略结果都会缓存。
+
+for_root 返回的共享匹配器记录读取过的每个规则文件（包括当时不存在的）的 mtime 和 size，
+再次获取时逐个检查，有变化就丢弃缓存重新读取，长时间运行的进程里修改 .gitignore 也能生效。
+"""
+
+import os
+import re
+import typing
+
+
+def _translate_glob(pattern: str) -> str:
+    """把 gitignore 的 glob 模式翻译成正则（不含锚定部分）"""
+    i, n = 0, len(pattern)
+    res = []
+    while i < n:
+        c = pattern[i]
+        if c == '*':
+            j = i
+            while j < n and pattern[j] == '*':
+                j += 1
+            at_segment_start = i == 0 or pattern[i - 1] == '/'
+            at_segment_end = j == n or pattern[j] == '/'
+            if j - i >= 2 and at_segment_start and at_segment_end:
+                if j == n:
+                    # 结尾的 /** 匹配目录内的一切
+                    res.append('.*')
+                else:
+                    # 开头或中间的 **/ 匹配零个或多个目录
+                    res.append('(?:.*/)?')
+                    j += 1
+            else:
+                # 其他连续星号与单个星号相同
+                res.append('[^/]*')
+            i = j
+        elif c == '?':
+            res.append('[^/]')
+            i += 1
+        elif c == '[':
+            j = i + 1
+            if j < n and pattern[j] in '!^':
+                j += 1
+            if j < n and pattern[j] == ']':
+                j += 1
+            while j < n and pattern[j] != ']':
+                j += 1
+            if j >= n:
+                res.append('\\[')
+                i += 1
+            else:
+                stuff = pattern[i + 1:j].replace('\\', '\\\\')
+                if stuff[0] in '!^':
+                    stuff = '^' + stuff[1:]
+                res.append(f'[{stuff}]')
+                i = j + 1
+        elif c == '\\' and i + 1 < n:
+            res.append(re.escape(pattern[i + 1]))
+            i += 2
+        else:
+            res.append(re.escape(c))
+            i += 1
+    return ''.join(res)
+
+
+def parse_gitignore_line(line: str) -> typing.Optional[typing.Tuple[str, bool, bool]]:
+    """
+    解析 .gitignore 的一行
+
+    Returns:
+        (regex, negated, dir_only)，空行和注释返回 None
+    """
+    line = line.rstrip('\n').rstrip('\r')
+    if not line or line.startswith('#'):
+        return None
+    # 行尾空格会被忽略，除非用反斜杠转义
+    while line.endswith(' ') and not line.endswith('\\ '):
+        line = line[:-1]
+    if not line:
+        return None
+    negated = False
+    if line.startswith('!'):
+        negated = True
+        line = line[1:]
+    dir_only = False
+    if line.endswith('/'):
+        dir_only = True
+        line = line.rstrip('/')
+    if not line:
+        return None
+    if '/' in line:
+        # 开头或中间包含 / 的模式，相对于 .gitignore 所在目录锚定
+        regex = _translate_glob(line.lstrip('/'))
+    else:
+        regex = '(?:.*/)?' + _translate_glob(line)
+    return regex, negated, dir_only
+
+
+class _RuleSet:
+    """一个目录下的全部规则，编译成两个合并正则：目录用一个，文件用一个（不含只匹配目录的规则）"""
+
+    def __init__(self, rules: typing.List[typing.Tuple[str, bool, bool]]):
+        self.rule_count = len(rules)
+        self.dir_regex, self.dir_negated = self._compile(rules)
+        self.file_regex, self.file_negated = self._compile([r for r in rules if not r[2]])
+
+    @staticmethod
+    def _compile(rules):
+        if not rules:
+            return None, []
+        # 倒序：后面的规则优先级更高，正则分支从左到右尝试，第一个完整匹配的分支即生效规则
+        rules = list(reversed(rules))
+        regex = re.compile('|'.join(f'({r[0]})' for r in rules), re.DOTALL)
+        return regex, [None] + [r[1] for r in rules]
+
+    def match(self, rel_path: str, is_dir: bool) -> typing.Optional[bool]:
+        """返回 True 表示忽略，False 表示被 ! 重新包含，None 表示没有规则匹配"""
+        regex, negated = (self.dir_regex, self.dir_negated) if is_dir else (self.file_regex, self.file_negated)
+        if regex is None:
+            return None
+        m = regex.fullmatch(rel_path)
+        if m is None:
+            return None
+        return not negated[m.lastindex]
+
+
+class GitIgnoreMatcher:
+    """
+    按 git 规则判断 root 下的路径是否被忽略。
+
+    路径参数一律使用相对 root 的 posix 风格字符串，例如 `pkg/sub/module.py`。
+
+    Example:
+        >>> matcher = GitIgnoreMatcher.for_root("/path/to/git_repo")
+        >>> matcher.is_ignored("build/lib/x.py")
+        True
+    """
+
+    _instances: typing.Dict[str, "GitIgnoreMatcher"] = {}
+
+    def __init__(self, root: typing.Union[os.PathLike, str], use_info_exclude: bool = True):
+        self.root = os.path.abspath(os.fspath(root))
+        self.use_info_exclude = use_info_exclude
+        self._rule_sets: typing.Dict[str, typing.Optional[_RuleSet]] = {}
+        self._dir_ignored_cache: typing.Dict[str, bool] = {}
+        # {规则文件路径: (mtime_ns, size)，读取时不存在为 None}
+        self._file_stamps: typing.Dict[str, typing.Optional[typing.Tuple[int, int]]] = {}
+        # 每次 invalidate 加一，ScanIndex 用它判断按旧规则得到的遍历结果是否还能用
+        self.generation = 0
+
+    @classmethod
+    def for_root(cls, root: typing.Union[os.PathLike, str]) -> "GitIgnoreMatcher":
+        """获取 root 对应的共享匹配器，规则文件没有变化时同一个 root 只会读取和编译一次 .gitignore"""
+        key = os.path.abspath(os.fspath(root))
+        matcher = cls._instances.get(key)
+        if matcher is None:
+            matcher = cls._instances[key] = cls(key)
+        elif matcher.is_stale():
+            matcher.invalidate()
+        return matcher
+
+    @staticmethod
+    def _stamp(file_path: str) -> typing.Optional[typing.Tuple[int, int]]:
+        try:
+            st = os.stat(file_path)
+        except OSError:
+            return None
+        return st.st_mtime_ns, st.st_size
+
+    def is_stale(self) -> bool:
+        """读取过的规则文件是否被修改、删除或者新建（每个文件一次 stat）"""
+        return any(self._stamp(path) != stamp for path, stamp in list(self._file_stamps.items()))
+
+    def invalidate(self) -> "GitIgnoreMatcher":
+        """丢弃所有缓存，.gitignore 文件被修改后调用"""
+        self._rule_sets.clear()
+        self._dir_ignored_cache.clear()
+        self._file_stamps.clear()
+        self.generation += 1
+        return self
+
+    def _read_rules(self, file_path: str) -> typing.List[typing.Tuple[str, bool, bool]]:
+        self._file_stamps[file_path] = self._stamp(file_path)
+        rules = []
+        try:
+            with open(file_path, 'r', encoding='utf-8', errors='replace') as f:
+                for line in f:
+                    parsed = parse_gitignore_line(line)
+                    if parsed:
+                        rules.append(parsed)
+        except (FileNotFoundError, NotADirectoryError, IsADirectoryError, PermissionError):
+            pass
+        return rules
+
+    def _get_rule_set(self, rel_dir: str) -> typing.Optional[_RuleSet]:
+        if rel_dir in self._rule_sets:
+            return self._rule_sets[rel_dir]
+        abs_dir = os.path.join(self.root, rel_dir) if rel_dir else self.root
+        rules = []
+        if not rel_dir and self.use_info_exclude:
+            rules.extend(self._read_rules(os.path.join(self.root, '.git', 'info', 'exclude')))
+        rules.extend(self._read_rules(os.path.join(abs_dir, '.gitignore')))
+        rule_set = _RuleSet(rules) if rules else None
+        self._rule_sets[rel_dir] = rule_set
+        return rule_set
+
+    def match_entry(self, rel_path: str, is_dir: bool = False) -> bool:
+        """
+        只根据规则判断这个路径本身是否被忽略，不检查父目录。
+
+        适合自顶向下遍历、并且已经剪掉被忽略目录的遍历器使用。
+        """
+        parts = rel_path.split('/')
+        if '.git' in parts:
+            return True
+        # 从最深的目录往上找，第一个有匹配的规则集决定结果
+        for depth in range(len(parts) - 1, -1, -1):
+            rule_set = self._get_rule_set('/'.join(parts[:depth]))
+            if rule_set is None:
+                continue
+            result = rule_set.match('/'.join(parts[depth:]), is_dir)
+            if result is not None:
+                return result
+        return False
+
+    def is_dir_ignored(self, rel_dir: str) -> bool:
+        """判断目录是否被忽略（包括因为父目录被忽略），结果会缓存"""
+        cached = self._dir_ignored_cache.get(rel_dir)
+        if cached is not None:
+            return cached
+        parent, _, _ = rel_dir.rpartition('/')
+        ignored = (bool(parent) and self.is_dir_ignored(parent)) or self.match_entry(rel_dir, is_dir=True)
+        self._dir_ignored_cache[rel_dir] = ignored
+        return ignored
+
+    def is_ignored(self, rel_path: str, is_dir: bool = False) -> bool:
+        """判断路径是否被忽略，父目录被忽略时其中的所有路径都视为被忽略"""
+        rel_path = rel_path.strip('/')
+        if not rel_path or rel_path == '.':
+            return False
+        if is_dir:
+            return self.is_dir_ignored(rel_path)
+        parent, _, _ = rel_path.rpartition('/')
+        if parent and self.is_dir_ignored(parent):
+            return True
+        return self.match_entry(rel_path, is_dir=False)
@@ -0,0 +1,241 @@
+"""
+增量生成：只重新生成有变化的文件块，没有变化的文件块直接从上一次的输出中复制
+
+大项目里只改了一个文件，完整重新生成仍然要读取、解析、渲染所有文件。
+open_output_session(incremental=True) 在输出文件旁边维护一个清单 output.md.manifest.json，
+记录每个文件块（--- start of file ... --- end of file，或者只有元数据的块）的：
+
+- 字节偏移和长度
+- 所在章节、渲染方式（merge_from_files / merge_from_files_with_metadata 的参数、token 预算选择的输出方式）
+- 源文件的 mtime、大小和内容哈希
+
+下一次增量生成时，章节、渲染方式都相同且源文件没有变化（mtime 和大小相同，或者内容哈希相同）的文件块，
+不再读取、解析源文件，直接从旧的输出文件中按偏移复制字节；新增、修改的文件正常渲染，删除的文件自然不再出现。
+章节标题、文件树、依赖分析等文件块之外的内容总是重新生成。所以增量生成的结果与完整生成逐字节相同。
+
+输出会话是原子模式，旧的输出文件在 commit 之前保持不变，复制时直接从旧文件读取。
+上一次的输出文件被修改过（大小或 mtime 与清单不一致）时清单作废，这一次按完整生成处理。
+
+监视模式（AiMdGenerator.watch）知道两次生成之间哪些路径有变化（changed_paths），
+merge_from_dir 的整个章节（标题、文件树、所有文件块）在目录下没有任何变化时整段复制，连目录也不再遍历。
+changed_paths 为 None（不知道变化了什么，例如第一次生成、.gitignore 被修改）时不复用章节。
+"""
+
+import hashlib
+import json
+import os
+import typing
+
+# 文件块的渲染格式变化时加 1，旧清单中的文件块全部作废
+FORMAT_VERSION = 1
+
+
+def manifest_path_of(output_path: typing.Union[os.PathLike, str]) -> str:
+    return os.fspath(output_path) + ".manifest.json"
+
+
+def file_content_hash(path: typing.Union[os.PathLike, str]) -> str:
+    with open(path, "rb") as f:
+        return hashlib.blake2b(f.read(), digest_size=16).hexdigest()
+
+
+class ReusedBlock:
+    """从上一次输出中复制的文件块，由 AiMdGenerator._write_parts 原样写入（已经包含前面的分隔符）"""
+
+    __slots__ = ("data", "tokens")
+
+    def __init__(self, data: bytes, tokens: float):
+        self.data = data
+        self.tokens = tokens
+
+
+class IncrementalBuild:
+    """
+    一次增量生成：读取上一次的清单，判断文件块能否复用，并记录这一次的清单
+
+    Args:
+        output_path: 输出文件路径
+        changed_paths: 上一次生成之后有变化的绝对路径，None 表示不知道（不复用整个章节）
+    """
+
+    def __init__(self, output_path: typing.Union[os.PathLike, str], changed_paths: typing.Iterable[str] = None):
+        self.output_path = os.path.abspath(os.fspath(output_path))
+        self.manifest_path = manifest_path_of(self.output_path)
+        self.changed_paths = None if changed_paths is None else {os.path.abspath(p) for p in changed_paths}
+        manifest = self._load_manifest()
+        self._previous_blocks = manifest["blocks"]
+        self.previous = {block["key"]: block for block in self._previous_blocks}  # block key -> record
+        self.previous_sections = {section["key"]: section for section in manifest["sections"]}
+        self.blocks = []
+        self.sections = []
+        self.reused = 0
+        self.rendered = 0
+        self.sections_reused = 0
+        self._old_output = None
+        self._current = None
+        self._current_section = None
+
+    def _load_manifest(self) -> dict:
+        empty = {"blocks": [], "sections": []}
+        try:
+            with open(self.manifest_path, encoding="utf-8") as f:
+                manifest = json.load(f)
+            st = os.stat(self.output_path)
+        except (OSError, ValueError):
+            return empty
+        if (manifest.get("format_version") != FORMAT_VERSION
+                or manifest.get("output_size") != st.st_size or manifest.get("output_mtime_ns") != st.st_mtime_ns):
+            return empty
+        manifest.setdefault("sections", [])
+        return manifest
+
+    @staticmethod
+    def block_key(section: str, render_key: str, relative_path: str) -> str:
+        return f"{section}\x00{render_key}\x00{relative_path}"
+
+    def _source_state(self, file, previous: dict = None) -> typing.Optional[dict]:
+        """源文件的 mtime、大小和内容哈希；mtime 和大小与 previous 相同时不读取文件"""
+        try:
+            st = os.stat(file)
+        except OSError:
+            return None
+        state = {"mtime_ns": st.st_mtime_ns, "size": st.st_size}
+        if previous is not None and previous["mtime_ns"] == st.st_mtime_ns and previous["size"] == st.st_size:
+            state["content_hash"] = previous["content_hash"]
+        else:
+            try:
+                state["content_hash"] = file_content_hash(file)
+            except OSError:
+                return None
+        return state
+
+    def lookup(self, key: str, file) -> typing.Optional[dict]:
+        """文件块可以复用时返回上一次的记录"""
+        previous = self.previous.get(key)
+        if previous is None:
+            return None
+        state = self._source_state(file, previous)
+        if state is None or state["content_hash"] != previous["content_hash"]:
+            return None
+        # mtime 变了但内容没变（例如 git checkout），记录新的 mtime，下次不用再计算哈希
+        previous.update(state)
+        return previous
+
+    def _read_old_output(self, offset: int, length: int) -> bytes:
+        if self._old_output is None:
+            self._old_output = open(self.output_path, "rb")
+        self._old_output.seek(offset)
+        data = self._old_output.read(length)
+        if len(data) != length:
+            raise RuntimeError(f"{self.output_path} is shorter than its manifest {self.manifest_path}")
+        return data
+
+    def read_block(self, record: dict) -> ReusedBlock:
+        data = self._read_old_output(record["offset"], record["length"])
+        self.reused += 1
+        return ReusedBlock(data, record["tokens"])
+
+    @staticmethod
+    def block_relative_path(record: dict) -> str:
+        return record["key"].rsplit("\x00", 1)[1]
+
+    @staticmethod
+    def section_key(*args) -> str:
+        """章节的 key：生成这个章节的全部参数，参数不同的章节不能复用"""
+        return json.dumps(args, ensure_ascii=False, default=str)
+
+    def lookup_section(self, key: str, dirs: typing.List[str]) -> typing.Optional[dict]:
+        """dirs 下面没有任何变化时返回上一次的章节记录，可以整段复制"""
+        if self.changed_paths is None:
+            return None
+        previous = self.previous_sections.get(key)
+        if previous is None:
+            return None
+        prefixes = [os.path.join(os.path.abspath(d), "") for d in dirs]
+        for path in self.changed_paths:
+            path_as_dir = os.path.join(path, "")
+            for prefix in prefixes:
+                # 变化的路径在目录下面，或者是目录本身及其上级目录（被删除、重命名）
+                if path_as_dir.startswith(prefix) or prefix.startswith(path_as_dir):
+                    return None
+        return previous
+
+    def reuse_section(self, record: dict, offset: int) -> typing.Tuple[bytes, typing.List[dict]]:
+        """
+        复制上一次的章节，返回章节的字节和其中的文件块记录（偏移已经换算到这一次的输出），
+        这一次的清单同时记录章节和其中的文件块
+        """
+        data = self._read_old_output(record["offset"], record["length"])
+        shift = offset - record["offset"]
+        start = len(self.blocks)
+        for block in self._previous_blocks[record["block_start"]:record["block_end"]]:
+            self.blocks.append(dict(block, offset=block["offset"] + shift))
+        self.sections.append(dict(record, offset=offset, block_start=start, block_end=len(self.blocks)))
+        self.sections_reused += 1
+        self.reused += record["block_end"] - record["block_start"]
+        return data, self.blocks[start:]
+
+    def begin_section(self, key: str, offset: int, tokens: float):
+        self._current_section = {"key": key, "offset": offset, "tokens": tokens, "block_start": len(self.blocks)}
+
+    def end_section(self, offset: int, tokens: float):
+        current, self._current_section = self._current_section, None
+        if current is None:
+            return
+        current.update(length=offset - current["offset"], tokens=tokens - current["tokens"], block_end=len(self.blocks))
+        self.sections.append(current)
+
+    def begin_block(self, key: str, file, offset: int, tokens: float, previous: dict = None):
+        state = previous if previous is not None else self._source_state(file, self.previous.get(key))
+        if previous is None:
+            self.rendered += 1
+        self._current = {"key": key, "offset": offset, "tokens": tokens, "state": state}
+
+    def end_block(self, offset: int, tokens: float):
+        current, self._current = self._current, None
+        if current is None or current["state"] is None:
+            return
+        self.blocks.append({
+            "key": current["key"],
+            "offset": current["offset"],
+            "length": offset - current["offset"],
+            "tokens": tokens - current["tokens"],
+            "mtime_ns": current["state"]["mtime_ns"],
+            "size": current["state"]["size"],
+            "content_hash": current["state"]["content_hash"],
+        })
+
+    def reset(self):
+        """输出被清空（clear_text）时丢弃这一次已经记录的文件块"""
+        self.blocks = []
+        self.sections = []
+        self._current = None
+        self._current_section = None
+
+    def close(self):
+        if self._old_output is not None:
+            self._old_output.close()
+            self._old_output = None
+
+    def save(self):
+        """输出文件提交之后写入清单"""
+        self.close()
+        st = os.stat(self.output_path)
+        manifest = {
+            "format_version": FORMAT_VERSION,
+            "output_size": st.st_size,
+            "output_mtime_ns": st.st_mtime_ns,
+            "blocks": self.blocks,
+            "sections": self.sections,
+        }
+        temp_path = self.manifest_path + ".tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            # json.dumps 使用 C 编码器，比 json.dump 逐块写入快几倍，监视模式下每次保存都要写清单
+            f.write(json.dumps(manifest, ensure_ascii=False))
+        os.replace(temp_path, self.manifest_path)
+
+    def stats(self) -> dict:
+        return {
+            "reused": self.reused, "rendered": self.rendered, "previous_blocks": len(self.previous),
+            "sections_reused": self.sections_reused,
+        }
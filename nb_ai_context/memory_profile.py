@@ -0,0 +1,236 @@
+"""
+内存分析：set_project_propery(..., profile_memory=True) 时按阶段、按章节记录 tracemalloc 的峰值内存
+
+构建在 CI 上 OOM 时需要知道是哪一步、哪些文件占用了内存。MemoryProfiler 挂在 BuildStats 上（generator.stats.memory），
+随 BuildStats 的阶段进出：
+
+- 每个方法阶段（merge_from_dir ...）和 scan：调用次数、阶段内的峰值（进程内 Python 分配的总量）、
+  相对进入时的峰值增量、阶段结束时仍然保留的增量
+- 每个章节（as_title）：从章节开始到下一个章节开始之间的峰值
+- 最外层的方法阶段结束时取一次快照，记录仍然持有内存最多的分配位置（文件:行号）
+- module_registry 中每个文件的源码、元数据、import 列表估算的大小，按大小列出最大的文件
+
+阶段嵌套时用 tracemalloc.reset_peak() 分段测量，重置前把当前峰值并入所有打开的阶段和章节，外层阶段的峰值不会丢失；
+Python 3.8 及更早没有 reset_peak，所有阶段的峰值都是开始分析以来的峰值。
+
+不开启时 BuildStats 只多一次 None 判断，tracemalloc 不会启动。tracemalloc 会让 Python 的内存分配变慢几倍，
+分析结束后调用 stop()（由本分析启动的 tracemalloc 会被停止）。
+"""
+
+import linecache
+import os
+import sys
+import threading
+import tracemalloc
+import typing
+
+_reset_peak = getattr(tracemalloc, "reset_peak", None)
+
+# 不计入分配位置的文件（tracemalloc 自己的快照等）。分组后再排除，Snapshot.filter_traces 逐条匹配，几十万条分配时要几十秒
+_IGNORED_SITE_FILES = frozenset((
+    tracemalloc.__file__, linecache.__file__,
+    "<frozen importlib._bootstrap>", "<frozen importlib._bootstrap_external>", "<unknown>",
+))
+
+
+def deep_sizeof(obj, seen: typing.Optional[set] = None) -> int:
+    """容器（dict、list、tuple、set）连同其中元素的 sys.getsizeof 之和，同一个对象只计一次"""
+    if seen is None:
+        seen = set()
+    if id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        size += sum(deep_sizeof(k, seen) + deep_sizeof(v, seen) for k, v in obj.items())
+    elif isinstance(obj, (list, tuple, set, frozenset)):
+        size += sum(deep_sizeof(item, seen) for item in obj)
+    return size
+
+
+class _Usage:
+    __slots__ = ("calls", "peak", "peak_delta", "retained")
+
+    def __init__(self):
+        self.calls = 0
+        self.peak = 0
+        self.peak_delta = 0
+        self.retained = 0
+
+    def to_dict(self) -> dict:
+        return {"calls": self.calls, "peak": self.peak, "peak_delta": self.peak_delta, "retained": self.retained}
+
+
+class _Frame:
+    """一个打开的阶段或章节"""
+
+    __slots__ = ("name", "start", "peak")
+
+    def __init__(self, name: str, start: int):
+        self.name = name
+        self.start = start
+        self.peak = start
+
+
+class MemoryProfiler:
+    """
+    tracemalloc 的分阶段峰值内存，见模块说明
+
+    Args:
+        top_n: 报告中分配位置和文件的数量
+        frames: tracemalloc 记录的调用栈深度（本分析启动 tracemalloc 时）
+    """
+
+    def __init__(self, top_n: int = 10, frames: int = 1):
+        self.top_n = top_n
+        self.started_tracing = not tracemalloc.is_tracing()
+        if self.started_tracing:
+            tracemalloc.start(frames)
+        self.stages: typing.Dict[str, _Usage] = {}
+        self.sections: typing.Dict[str, _Usage] = {}
+        # {最外层阶段名: 该阶段结束时持有内存最多的分配位置}，同名阶段保留保留量最大的一次
+        self.top_allocations: typing.Dict[str, typing.List[dict]] = {}
+        self._top_allocations_retained: typing.Dict[str, int] = {}
+        self.top_files: typing.List[dict] = []
+        self.peak = 0
+        self._open: typing.List[_Frame] = []
+        self._section: typing.Optional[_Frame] = None
+        self._lock = threading.Lock()
+
+    @property
+    def active(self) -> bool:
+        return tracemalloc.is_tracing()
+
+    def _fold(self) -> int:
+        """把当前峰值并入所有打开的阶段、章节，再重置峰值，返回当前分配量"""
+        current, peak = tracemalloc.get_traced_memory()
+        self.peak = max(self.peak, peak)
+        for frame in self._open:
+            frame.peak = max(frame.peak, peak)
+        if _reset_peak is not None:
+            _reset_peak()
+        return current
+
+    def enter(self, name: str) -> typing.Optional[_Frame]:
+        if not self.active:
+            return None
+        with self._lock:
+            frame = _Frame(name, self._fold())
+            self._open.append(frame)
+        return frame
+
+    def _close(self, frame: _Frame, usages: typing.Dict[str, _Usage]) -> int:
+        current = self._fold()
+        self._open.remove(frame)
+        usage = usages.get(frame.name)
+        if usage is None:
+            usage = usages[frame.name] = _Usage()
+        usage.calls += 1
+        usage.peak = max(usage.peak, frame.peak)
+        usage.peak_delta = max(usage.peak_delta, frame.peak - frame.start)
+        usage.retained += current - frame.start
+        return current
+
+    def exit(self, frame: typing.Optional[_Frame], snapshot: bool = False):
+        """阶段结束；snapshot=True 并且是最外层的阶段时记录持有内存最多的分配位置"""
+        if frame is None or not self.active:
+            return
+        with self._lock:
+            self._close(frame, self.stages)
+            outermost = not any(f is not self._section for f in self._open)
+        if snapshot and outermost:
+            self._record_top_allocations(frame)
+
+    def _record_top_allocations(self, frame: _Frame):
+        retained = tracemalloc.get_traced_memory()[0]
+        if retained < self._top_allocations_retained.get(frame.name, -1):
+            return
+        statistics = tracemalloc.take_snapshot().statistics("lineno")
+        self._top_allocations_retained[frame.name] = retained
+        self.top_allocations[frame.name] = [
+            {"site": f"{stat.traceback[0].filename}:{stat.traceback[0].lineno}", "size": stat.size, "count": stat.count}
+            for stat in statistics if stat.traceback[0].filename not in _IGNORED_SITE_FILES
+        ][:self.top_n]
+
+    def begin_section(self, title: str):
+        """开始一个章节，上一个章节在这里结束"""
+        if not self.active:
+            return
+        with self._lock:
+            if self._section is not None:
+                self._close(self._section, self.sections)
+            self._section = _Frame(title, self._fold())
+            self._open.append(self._section)
+
+    def measure_modules(self, modules: typing.Iterable) -> typing.List[dict]:
+        """
+        估算 module_registry 中每个文件的源码、元数据和 import 列表占用的内存，保留最大的 top_n 个
+
+        modules 是 module_registry.ParsedModule 的列表（见 ModuleRegistry.modules()）
+        """
+        sizes = []
+        for module in modules:
+            parsed = module.parsed_objects()
+            text_bytes = sys.getsizeof(parsed["text"]) if parsed["text"] is not None else 0
+            metadata_bytes = (deep_sizeof(parsed["metadata"]) + deep_sizeof(parsed["import_refs"])
+                              + deep_sizeof(parsed["nested_definitions"]))
+            sizes.append({
+                "path": module.path, "text_bytes": text_bytes, "metadata_bytes": metadata_bytes,
+                "total_bytes": text_bytes + metadata_bytes, "keeps_ast": parsed["tree"] is not None,
+            })
+        sizes.sort(key=lambda item: item["total_bytes"], reverse=True)
+        self.top_files = sizes[:self.top_n]
+        return self.top_files
+
+    def stop(self) -> "MemoryProfiler":
+        """结束当前章节，由本分析启动的 tracemalloc 会被停止，之后的阶段不再记录"""
+        if not self.active:
+            return self
+        with self._lock:
+            if self._section is not None:
+                self._close(self._section, self.sections)
+                self._section = None
+        if self.started_tracing:
+            tracemalloc.stop()
+        return self
+
+    def report(self) -> dict:
+        with self._lock:
+            sections = dict(self.sections)
+            if self._section is not None:
+                # 还没有结束的章节，峰值到目前为止
+                current, peak = tracemalloc.get_traced_memory() if self.active else (0, 0)
+                usage = _Usage()
+                usage.calls = 1
+                usage.peak = max(self._section.peak, peak)
+                usage.peak_delta = usage.peak - self._section.start
+                usage.retained = current - self._section.start
+                sections[self._section.name] = usage
+            return {
+                "peak": max(self.peak, tracemalloc.get_traced_memory()[1] if self.active else 0),
+                "stages": {name: usage.to_dict() for name, usage in self.stages.items()},
+                "sections": {name: usage.to_dict() for name, usage in sections.items()},
+                "top_allocations": dict(self.top_allocations),
+                "top_files": list(self.top_files),
+            }
+
+    def format_report(self) -> str:
+        report = self.report()
+        mb = 1024 * 1024
+        lines = [f"memory peak: {report['peak'] / mb:.2f} MB (tracemalloc, Python allocations only)"]
+        for kind in ("stages", "sections"):
+            lines.append(f"{kind[:-1]:<40} {'calls':>6} {'peak MB':>9} {'+peak MB':>9} {'retained MB':>12}")
+            rows = sorted(report[kind].items(), key=lambda item: -item[1]["peak"])
+            for name, usage in rows:
+                lines.append(f"{name[:40]:<40} {usage['calls']:>6} {usage['peak'] / mb:>9.2f} "
+                             f"{usage['peak_delta'] / mb:>9.2f} {usage['retained'] / mb:>12.2f}")
+        for stage, sites in report["top_allocations"].items():
+            lines.append(f"top allocation sites still held after {stage}:")
+            for site in sites:
+                lines.append(f"  {site['size'] / mb:>9.2f} MB {site['count']:>8} blocks  {site['site']}")
+        if report["top_files"]:
+            lines.append("largest files held by module_registry (text + metadata):")
+            for item in report["top_files"]:
+                lines.append(f"  {item['total_bytes'] / mb:>9.2f} MB (text {item['text_bytes'] / mb:.2f}, "
+                             f"metadata {item['metadata_bytes'] / mb:.2f})  {os.path.basename(item['path'])}  {item['path']}")
+        return "\n".join(lines)
@@ -0,0 +1,176 @@
+"""
+把 ast_extractor 提取的 Python 文件元数据渲染为 Markdown
+
+原来是 AiMdGenerator 的方法，挪成模块级函数后可以在 ProcessPoolExecutor 的子进程里直接调用（见 parallel_extract）。
+"""
+
+FILE_CONTENT_BACKQUOTES = "`````"  # 不用反三引号是为了避免与被合并的如果本身就是.md文件的里面的反三引号冲突，导致文件块提前判断结束
+
+
+def format_py_metadata_as_markdown(metadata: dict, relative_file_name: str) -> str:
+    """将 Python 文件元数据格式化为 Markdown"""
+    lines = []
+    lines.append(f"\n### 📄 Python File Metadata: `{relative_file_name}`\n")
+
+    # 模块文档字符串
+    if metadata.get("module_docstring"):
+        lines.append("#### 📝 Module Docstring\n")
+        lines.append(FILE_CONTENT_BACKQUOTES)
+        lines.append(metadata["module_docstring"])
+        lines.append(f"{FILE_CONTENT_BACKQUOTES}\n")
+
+    # 导入信息
+    if metadata.get("imports"):
+        lines.append("#### 📦 Imports\n")
+        for imp in metadata["imports"]:  # 显示所有 imports，不再限制数量
+            if imp["type"] == "import":
+                alias_str = f" as {imp['alias']}" if imp['alias'] else ""
+                lines.append(f"- `import {imp['module']}{alias_str}`")
+            else:
+                alias_str = f" as {imp['alias']}" if imp['alias'] else ""
+                lines.append(f"- `from {imp['module']} import {imp['name']}{alias_str}`")
+        lines.append("")
+
+    # 类信息
+    if metadata.get("classes"):
+        lines.append(f"#### 🏛️ Classes ({len(metadata['classes'])})\n")
+        for cls in metadata["classes"]:
+            # 只显示公有类或所有类（根据需要）
+            class_header = f"##### 📌 `class {cls['name']}"
+            if cls["bases"]:
+                class_header += f"({', '.join(cls['bases'])})"
+            class_header += "`"
+            lines.append(class_header)
+            lines.append(f"*Line: {cls['lineno']}*\n")
+
+            if cls["docstring"]:
+                # 显示完整的类文档字符串
+                docstring_lines = cls["docstring"].split("\n")
+                lines.append("**Docstring:**")
+                lines.append(FILE_CONTENT_BACKQUOTES)
+                lines.extend(docstring_lines)
+                lines.append(f"{FILE_CONTENT_BACKQUOTES}\n")
+
+            # 首先单独显示 __init__ 方法（非常重要）
+            init_method = None
+            for method in cls["methods"]:
+                if method["name"] == "__init__":
+                    init_method = method
+                    break
+
+            if init_method:
+                lines.append("**🔧 Constructor (`__init__`):**")
+                params_str = format_parameters(init_method["parameters"])
+                lines.append(f"- `def __init__({params_str})`")
+
+                # 显示 __init__ 的完整文档字符串
+                if init_method["docstring"]:
+                    lines.append("  - **Docstring:**")
+                    lines.append(f"  {FILE_CONTENT_BACKQUOTES}")
+                    for doc_line in init_method["docstring"].split("\n"):
+                        lines.append(f"  {doc_line}")
+                    lines.append(f"  {FILE_CONTENT_BACKQUOTES}")
+
+                # 显示每个参数的详细信息
+                if init_method["parameters"]:
+                    lines.append("  - **Parameters:**")
+                    for param in init_method["parameters"]:
+                        param_name = param["name"]
+                        param_type = f": {param['type']}" if param["type"] else ""
+                        param_default = f" = {param['default']}" if param["default"] else ""
+                        lines.append(f"    - `{param_name}{param_type}{param_default}`")
+                lines.append("")
+
+            # 公有方法（排除 __init__）
+            public_methods = [m for m in cls["methods"] if m["is_public"] and m["name"] != "__init__"]
+            if public_methods:
+                lines.append(f"**Public Methods ({len(public_methods)}):**")
+                for method in public_methods:
+                    params_str = format_parameters(method["parameters"])
+                    return_str = f" -> {method['return_type']}" if method["return_type"] else ""
+                    async_str = "async " if method["type"] == "async_function" else ""
+
+                    decorators_str = ""
+                    if method["decorators"]:
+                        decorators_str = " " + " ".join([f"`{d}`" for d in method["decorators"]])
+
+                    lines.append(f"- `{async_str}def {method['name']}({params_str}){return_str}`{decorators_str}")
+
+                    # 显示完整的文档字符串
+                    if method["docstring"]:
+                        # 如果文档字符串只有一行，用简短格式显示
+                        docstring_lines = method["docstring"].split("\n")
+                        if len(docstring_lines) == 1:
+                            lines.append(f"  - *{method['docstring'].strip()}*")
+                        else:
+                            # 多行文档字符串,用代码块格式显示
+                            lines.append("  - **Docstring:**")
+                            lines.append(f"  {FILE_CONTENT_BACKQUOTES}")
+                            for doc_line in docstring_lines:
+                                lines.append(f"  {doc_line}")
+                            lines.append(f"  {FILE_CONTENT_BACKQUOTES}")
+                lines.append("")
+
+            # Properties
+            if cls["properties"]:
+                lines.append(f"**Properties ({len(cls['properties'])}):**")
+                for prop in cls["properties"]:
+                    return_str = f" -> {prop['return_type']}" if prop["return_type"] else ""
+                    lines.append(f"- `@property {prop['name']}{return_str}`")
+                lines.append("")
+
+            # 类变量
+            if cls["class_variables"]:
+                lines.append(f"**Class Variables ({len(cls['class_variables'])}):**")
+                for var in cls["class_variables"]:
+                    type_str = f": {var['type']}" if var["type"] else ""
+                    value_str = f" = {var['value']}" if var.get("value") else ""
+                    lines.append(f"- `{var['name']}{type_str}{value_str}`")
+                lines.append("")
+
+    # 顶级函数
+    if metadata.get("functions"):
+        public_functions = [f for f in metadata["functions"] if f["is_public"]]
+        if public_functions:
+            lines.append(f"#### 🔧 Public Functions ({len(public_functions)})\n")
+            for func in public_functions:
+                params_str = format_parameters(func["parameters"])
+                return_str = f" -> {func['return_type']}" if func["return_type"] else ""
+                async_str = "async " if func["type"] == "async_function" else ""
+
+                decorators_str = ""
+                if func["decorators"]:
+                    decorators_str = " " + " ".join([f"`{d}`" for d in func["decorators"]])
+
+                lines.append(f"- `{async_str}def {func['name']}({params_str}){return_str}`{decorators_str}")
+                lines.append(f"  - *Line: {func['lineno']}*")
+
+                if func["docstring"]:
+                    # 如果文档字符串只有一行，用简短格式显示
+                    docstring_lines = func["docstring"].split("\n")
+                    if len(docstring_lines) == 1:
+                        lines.append(f"  - *{func['docstring'].strip()}*")
+                    else:
+                        # 多行文档字符串,用代码块格式显示
+                        lines.append("  - **Docstring:**")
+                        lines.append(f"  {FILE_CONTENT_BACKQUOTES}")
+                        for doc_line in docstring_lines:
+                            lines.append(f"  {doc_line}")
+                        lines.append(f"  {FILE_CONTENT_BACKQUOTES}")
+                lines.append("")
+
+    lines.append("\n---\n")
+    return "\n".join(lines)
+
+
+def format_parameters(parameters: list) -> str:
+    """格式化函数参数列表"""
+    param_strs = []
+    for param in parameters:
+        param_str = param["name"]
+        if param["type"]:
+            param_str += f": {param['type']}"
+        if param["default"]:
+            param_str += f" = {param['default']}"
+        param_strs.append(param_str)
+    return ", ".join(param_strs)
@@ -0,0 +1,374 @@
+"""
+一次构建内共享的 Python 模块解析结果
+
+同一个核心文件在一次链式构建里会被用到好几次：
+- add_project_summary 提取它的 AST 元数据
+- add_file_dependencies / _analyze_file_dependencies 分析它的 import
+- merge_from_files_with_metadata 再读一次源码、再解析一次元数据
+
+原来每一步都各自 read_text + ast.parse。ModuleRegistry 以解析后的绝对路径为 key 缓存 ParsedModule，
+每个文件在一次构建中只解析一次：
+- 源码文本在第一次 get 时读取，放进按字节数限制的 TextCache（LRU），ParsedModule 本身不持有源码；
+  被淘汰后再用到时重新读取，几千个文件的项目里内存不会随文件数增长
+- AST、元数据、import 列表在第一次用到时由 ast_extractor.ModuleAstExtractor 单次遍历一起生成，一直保留（比源码小得多）
+
+文件的 mtime / size 变化后缓存自动失效（例如 watch 模式下文件被修改）。
+
+传入 ast_cache（见 ast_cache.AstMetadataCache）时，元数据和 import 列表还会持久化到磁盘，
+未修改的文件在下一次构建中完全跳过 ast.parse。
+
+传入 source（见 git_revision.GitRevisionSource）时从 git 的某个版本读取源码而不是工作区，版本不会变化，缓存不会失效。
+
+传入 build_stats（见 build_stats.BuildStats）时读取和解析分别计入 read、parse 阶段。
+"""
+
+import ast
+import os
+import sys
+import threading
+import time
+import typing
+from collections import OrderedDict
+
+from nb_ai_context import ast_extractor
+from nb_ai_context import git_revision
+from nb_ai_context.ast_cache import AstMetadataCache
+from nb_ai_context.build_stats import PARSE, READ, BuildStats
+
+DEFAULT_TEXT_CACHE_BYTES = 64 * 1024 * 1024
+
+
+class TextCache:
+    """
+    ModuleRegistry 的源码缓存，按 sys.getsizeof 计算的总字节数做 LRU 淘汰，线程安全
+
+    Args:
+        max_bytes: 总字节数上限，单个超过上限的源码不缓存；None 表示不限制
+    """
+
+    def __init__(self, max_bytes: typing.Optional[int] = DEFAULT_TEXT_CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._texts: "OrderedDict[str, str]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, path: str) -> typing.Optional[str]:
+        with self._lock:
+            text = self._texts.get(path)
+            if text is None:
+                self.misses += 1
+                return None
+            self._texts.move_to_end(path)
+            self.hits += 1
+            return text
+
+    def put(self, path: str, text: str):
+        nbytes = sys.getsizeof(text)
+        with self._lock:
+            self._discard(path)
+            if self.max_bytes is not None and nbytes > self.max_bytes:
+                return
+            self._texts[path] = text
+            self.nbytes += nbytes
+            while self.max_bytes is not None and self.nbytes > self.max_bytes:
+                _, evicted = self._texts.popitem(last=False)
+                self.nbytes -= sys.getsizeof(evicted)
+                self.evictions += 1
+
+    def _discard(self, path: str):
+        text = self._texts.pop(path, None)
+        if text is not None:
+            self.nbytes -= sys.getsizeof(text)
+
+    def discard(self, path: str = None):
+        """删除一个文件的源码，path 为 None 时清空"""
+        with self._lock:
+            if path is None:
+                self._texts.clear()
+                self.nbytes = 0
+            else:
+                self._discard(path)
+
+    def peek(self, path: str) -> typing.Optional[str]:
+        """不改变 LRU 顺序、不计入命中的查询，内存分析用"""
+        return self._texts.get(path)
+
+    def __len__(self):
+        return len(self._texts)
+
+    def stats(self) -> dict:
+        return {"entries": len(self._texts), "bytes": self.nbytes, "max_bytes": self.max_bytes,
+                "hits": self.hits, "misses": self.misses, "evictions": self.evictions}
+
+
+class ParsedModule:
+    """
+    一个 Python 文件的解析结果
+
+    传入 text_cache 时源码只保存在 text_cache 中，被淘汰后访问 text 会重新读取文件；
+    不传时（单独使用 ParsedModule）源码由对象自己持有。
+
+    Attributes:
+        path: 解析后的绝对路径
+        text: 文件源码（读取失败时为 None，原样保留 BOM）
+        read_error: 读取失败时的异常
+        parse_error: 解析失败时的异常
+    """
+
+    def __init__(
+        self, path: str, keep_ast: bool = False, ast_cache: typing.Optional[AstMetadataCache] = None, source=None,
+        build_stats: typing.Optional[BuildStats] = None, text_cache: typing.Optional[TextCache] = None,
+    ):
+        self.path = path
+        self.keep_ast = keep_ast
+        self.ast_cache = ast_cache
+        self.source = source
+        self.build_stats = build_stats
+        self.text_cache = text_cache
+        self._text: typing.Optional[str] = None
+        self.reads = 0
+        self.read_error: typing.Optional[Exception] = None
+        self._parse_error: typing.Optional[Exception] = None
+        self.mtime_ns = None
+        self.size = None
+        self._parsed = False
+        self._tree: typing.Optional[ast.AST] = None
+        self._metadata: typing.Optional[dict] = None
+        self._import_refs: typing.List[typing.Tuple[str, int]] = []
+        self._nested_definitions: typing.List[dict] = []
+        self._load()
+
+    def _load(self):
+        try:
+            text, self.mtime_ns, self.size = self._read()
+        except Exception as e:
+            self.read_error = e
+            return
+        self._keep_text(text)
+
+    def _read(self) -> typing.Tuple[str, typing.Optional[int], int]:
+        """读取源码，返回 (text, mtime_ns, size)"""
+        start = time.perf_counter()
+        self.reads += 1
+        size = 0
+        try:
+            if self.source is not None:
+                data = self.source.read_bytes(self.path)
+                size = len(data)
+                # 版本中的文件没有 mtime，ast_cache 按内容哈希确认
+                return git_revision.decode_text(data), None, size
+            st = os.stat(self.path)
+            size = st.st_size
+            with open(self.path, "r", encoding="utf-8") as f:
+                return f.read(), st.st_mtime_ns, size
+        finally:
+            if self.build_stats is not None:
+                self.build_stats.record(READ, start, files=1, nbytes=size, detail=self.path)
+
+    def _keep_text(self, text: str):
+        if self.text_cache is None:
+            self._text = text
+        else:
+            self.text_cache.put(self.path, text)
+
+    @property
+    def text(self) -> typing.Optional[str]:
+        if self.read_error is not None:
+            return None
+        if self.text_cache is None:
+            return self._text
+        text = self.text_cache.get(self.path)
+        if text is None:
+            # 已被淘汰，重新读取；文件在这期间被修改时返回新的内容，ModuleRegistry.get 会发现变化并重新解析
+            try:
+                text = self._read()[0]
+            except Exception as e:
+                self.read_error = e
+                return None
+            self.text_cache.put(self.path, text)
+        return text
+
+    def cached_text(self) -> typing.Optional[str]:
+        """当前在内存中的源码，已被淘汰时为 None，不会读取文件"""
+        if self.text_cache is None:
+            return self._text
+        return self.text_cache.peek(self.path)
+
+    def is_stale(self, st: os.stat_result) -> bool:
+        return (st.st_mtime_ns, st.st_size) != (self.mtime_ns, self.size)
+
+    @property
+    def error(self) -> typing.Optional[Exception]:
+        """读取或解析失败的异常，没有出错时为 None"""
+        return self.read_error or self.parse_error
+
+    @property
+    def parse_error(self) -> typing.Optional[Exception]:
+        self._parse()
+        return self._parse_error
+
+    def _parse(self):
+        if self._parsed:
+            return
+        if self.read_error is not None:
+            self._parsed = True
+            self._metadata = ast_extractor.empty_error_metadata(str(self.read_error))
+            return
+        if self.load_cached():
+            return
+        start = time.perf_counter()
+        extraction = ast_extractor.extract_module_source(self.text, self.path)
+        if self.build_stats is not None:
+            self.build_stats.record(PARSE, start, files=1, nbytes=self.size or 0, detail=self.path)
+        self.set_parsed(extraction.metadata, extraction.import_refs, extraction.error, extraction.tree,
+                        extraction.nested_definitions)
+
+    def load_cached(self) -> bool:
+        """已经解析过或者能从 ast_cache 取到结果时返回 True，不会触发解析"""
+        if self._parsed:
+            return True
+        if self.read_error is not None or self.ast_cache is None or self.keep_ast:
+            return False
+        cached = self.ast_cache.get(self.path, self.mtime_ns, self.size, self.text)
+        if cached is None:
+            return False
+        self._parsed = True
+        self._metadata, self._import_refs, self._nested_definitions = cached
+        return True
+
+    def set_parsed(
+        self,
+        metadata: dict,
+        import_refs: typing.List[typing.Tuple[str, int]],
+        parse_error: typing.Optional[Exception] = None,
+        tree: typing.Optional[ast.AST] = None,
+        nested_definitions: typing.Optional[typing.List[dict]] = None,
+    ) -> "ParsedModule":
+        """写入解析结果（本进程解析，或者 parallel_extract 子进程返回的结果），成功的结果会写入 ast_cache"""
+        self._parsed = True
+        self._metadata = metadata
+        self._import_refs = import_refs
+        self._nested_definitions = nested_definitions or []
+        self._parse_error = parse_error
+        if parse_error is None and self.ast_cache is not None:
+            self.ast_cache.put(self.path, self.mtime_ns, self.size, self.text, metadata, import_refs,
+                               self._nested_definitions)
+        if self.keep_ast:
+            self._tree = tree
+        return self
+
+    @property
+    def tree(self) -> typing.Optional[ast.AST]:
+        """模块 AST，只有 keep_ast=True 时才会保留（AST 占用的内存是源码的十几倍）"""
+        self._parse()
+        return self._tree
+
+    @property
+    def metadata(self) -> dict:
+        """ast_extractor.extract_module_metadata 的结果，失败时是 empty_error_metadata"""
+        self._parse()
+        return self._metadata
+
+    @property
+    def import_refs(self) -> typing.List[typing.Tuple[str, int]]:
+        """依赖分析用的 (模块名, 相对导入层级) 列表，见 ModuleAstExtractor"""
+        self._parse()
+        return self._import_refs
+
+    @property
+    def nested_definitions(self) -> typing.List[dict]:
+        """非模块顶层的类和函数（含方法）及其限定名，见 ModuleAstExtractor.nested_definitions"""
+        self._parse()
+        return self._nested_definitions
+
+    def parsed_objects(self) -> dict:
+        """
+        已经得到的 text / metadata / import_refs / nested_definitions / tree（没有时为 None / None / [] / [] / None），
+        不会读取文件、不会触发解析，内存分析用
+        """
+        return {"text": self.cached_text(), "metadata": self._metadata, "import_refs": self._import_refs,
+                "nested_definitions": self._nested_definitions, "tree": self._tree}
+
+
+class ModuleRegistry:
+    """
+    ParsedModule 缓存，hits / misses 记录命中次数
+
+    Args:
+        keep_ast: 是否在 ParsedModule 里保留 AST（保留 AST 时不会从 ast_cache 读取，因为缓存里没有 AST）
+        ast_cache: 可选的持久化元数据缓存
+        source: 可选的 git_revision.GitRevisionSource，从 git 的某个版本读取源码
+        build_stats: 可选的 build_stats.BuildStats，记录读取和解析的耗时
+        text_cache_max_bytes: 内存中保留的源码总字节数上限（见 TextCache），None 表示全部保留
+    """
+
+    def __init__(
+        self, keep_ast: bool = False, ast_cache: typing.Optional[AstMetadataCache] = None, source=None,
+        build_stats: typing.Optional[BuildStats] = None,
+        text_cache_max_bytes: typing.Optional[int] = DEFAULT_TEXT_CACHE_BYTES,
+    ):
+        self.keep_ast = keep_ast
+        self.ast_cache = ast_cache
+        self.source = source
+        self.build_stats = build_stats
+        self.text_cache = TextCache(text_cache_max_bytes)
+        self.hits = 0
+        self.misses = 0
+        self._modules: typing.Dict[str, ParsedModule] = {}
+        self._lock = threading.Lock()
+
+    def get(self, path: typing.Union[os.PathLike, str]) -> ParsedModule:
+        """取文件的 ParsedModule，线程安全（concurrent_reader 会在线程池中调用）"""
+        key = os.path.realpath(os.fspath(path))
+        module = self._modules.get(key)
+        if module is not None and self.source is not None:
+            with self._lock:
+                self.hits += 1
+            return module
+        if module is not None:
+            try:
+                stale = module.is_stale(os.stat(key))
+            except OSError:
+                stale = module.read_error is None
+            if not stale:
+                with self._lock:
+                    self.hits += 1
+                return module
+        module = ParsedModule(key, keep_ast=self.keep_ast, ast_cache=self.ast_cache, source=self.source,
+                              build_stats=self.build_stats, text_cache=self.text_cache)
+        with self._lock:
+            self.misses += 1
+            self._modules[key] = module
+        return module
+
+    def invalidate(self, path: typing.Union[os.PathLike, str] = None) -> "ModuleRegistry":
+        """删除某个文件的缓存，path 为 None 时清空全部"""
+        if path is None:
+            self._modules.clear()
+            self.text_cache.discard()
+        else:
+            key = os.path.realpath(os.fspath(path))
+            self._modules.pop(key, None)
+            self.text_cache.discard(key)
+        return self
+
+    def modules(self) -> typing.List[ParsedModule]:
+        """当前缓存的所有 ParsedModule"""
+        with self._lock:
+            return list(self._modules.values())
+
+    def __len__(self):
+        return len(self._modules)
+
+    def __contains__(self, path) -> bool:
+        return os.path.realpath(os.fspath(path)) in self._modules
+
+    def stats(self) -> dict:
+        stats = {"modules": len(self._modules), "hits": self.hits, "misses": self.misses,
+                 "text_cache": self.text_cache.stats()}
+        if self.ast_cache is not None:
+            stats["ast_cache"] = self.ast_cache.stats()
+        return stats
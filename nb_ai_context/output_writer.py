@@ -0,0 +1,163 @@
+"""
+AiMdGenerator 的流式输出写入器
+
+原来每个 merge_* 方法都把所有文件的完整文本拼成一个 list，再 join 成一个大字符串，最后 append_text 写入，
+生成 300MB 的文档时峰值内存是输出文件大小的好几倍。
+
+OutputWriter 把每一块内容一产生就写入带缓冲的文件，内存只和最大的单个文件有关。
+
+两种模式：
+- 追加模式（默认）：直接追加写入目标文件，每次 merge 调用结束时关闭
+- 原子模式：写入同目录下的临时文件，整个链式调用结束时 commit，通过 os.replace 原子替换目标文件，
+  中途出错则 abort 丢弃临时文件，目标文件保持原样。mkstemp 创建的临时文件权限是 0600，
+  替换前改成目标文件原来的权限（目标不存在时按 umask 计算，与 open 新建文件相同）
+
+UTF-8 BOM 在文件创建（或被清空）后第一次写入时写一次，之后的追加不再检查、重写整个文件，
+N 个章节的总 I/O 与输出大小成线性关系（原来每个章节结束都调用 ensure_utf8_bom 读取整个文件）。
+"""
+
+import os
+import tempfile
+import typing
+
+UTF8_BOM = b'\xef\xbb\xbf'
+
+DEFAULT_BUFFER_SIZE = 1024 * 1024
+
+
+def encode_text(text: str) -> bytes:
+    """按输出文件的格式编码：UTF-8，换行符与文本模式 open 相同"""
+    if os.linesep != "\n":
+        text = text.replace("\n", os.linesep)
+    return text.encode("utf-8")
+
+
+def _default_file_mode() -> int:
+    # 没有只读取 umask 的接口，只能设置后再恢复
+    umask = os.umask(0)
+    os.umask(umask)
+    return 0o666 & ~umask
+
+
+def replace_file(temp_path: str, target_path: str):
+    """用 temp_path 原子替换 target_path，替换后的文件保留目标文件原来的权限"""
+    try:
+        mode = os.stat(target_path).st_mode & 0o7777
+    except OSError:
+        mode = _default_file_mode()
+    os.chmod(temp_path, mode)
+    os.replace(temp_path, target_path)
+
+
+class OutputWriter:
+    """
+    带缓冲的输出写入器
+
+    Args:
+        target_path: 最终输出文件路径
+        atomic: 是否使用 临时文件 + os.replace 的原子提交模式
+        write_bom: 新建文件时是否先写入 UTF-8 BOM
+        buffer_size: 写缓冲大小
+    """
+
+    def __init__(
+        self,
+        target_path: typing.Union[os.PathLike, str],
+        atomic: bool = False,
+        write_bom: bool = False,
+        buffer_size: int = DEFAULT_BUFFER_SIZE,
+    ):
+        self.target_path = os.path.abspath(os.fspath(target_path))
+        self.atomic = atomic
+        self.write_bom = write_bom
+        self.bytes_written = 0
+        self.closed = False
+        self.temp_path = None
+        directory = os.path.dirname(self.target_path)
+        os.makedirs(directory, exist_ok=True)
+        if atomic:
+            fd, self.temp_path = tempfile.mkstemp(
+                prefix=f".{os.path.basename(self.target_path)}.", suffix=".tmp", dir=directory
+            )
+            self._file = os.fdopen(fd, "wb", buffering=buffer_size)
+        else:
+            self._file = open(self.target_path, "ab", buffering=buffer_size)
+        if write_bom:
+            self._write_bom_if_empty()
+
+    def _write_bom_if_empty(self):
+        if self._file.tell() == 0:
+            self._file.write(UTF8_BOM)
+            self.bytes_written += len(UTF8_BOM)
+
+    def write(self, text: str) -> int:
+        """写入一段文本，换行符处理与文本模式 open 相同（Windows 下转换为 \\r\\n）"""
+        data = encode_text(text)
+        self._file.write(data)
+        self.bytes_written += len(data)
+        return len(data)
+
+    def write_bytes(self, data: bytes) -> int:
+        """写入已经编码好的字节（增量生成时从上一次输出复制的文件块）"""
+        self._file.write(data)
+        self.bytes_written += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        """当前写入位置（包括 BOM），即下一个字节在输出文件中的偏移"""
+        return self._file.tell()
+
+    def truncate(self) -> "OutputWriter":
+        """清空已经写入的内容，相当于 clear_text()"""
+        self._file.seek(0)
+        self._file.truncate()
+        if self.write_bom:
+            self._write_bom_if_empty()
+        return self
+
+    def flush(self) -> "OutputWriter":
+        self._file.flush()
+        return self
+
+    # 章节、文件边界的通知，分片写入器（sharded_writer.ShardedOutputWriter）只在文件边界切分，普通写入器忽略
+    def begin_section(self, title: str):
+        pass
+
+    def begin_file(self, relative_path: str):
+        pass
+
+    def end_file(self):
+        pass
+
+    def commit(self):
+        """写完所有内容，原子模式下用临时文件替换目标文件"""
+        if self.closed:
+            return
+        self._file.flush()
+        if self.atomic:
+            os.fsync(self._file.fileno())
+        self._file.close()
+        self.closed = True
+        if self.atomic:
+            replace_file(self.temp_path, self.target_path)
+
+    def abort(self):
+        """放弃写入，原子模式下删除临时文件，目标文件保持不变"""
+        if self.closed:
+            return
+        self._file.close()
+        self.closed = True
+        if self.atomic and os.path.exists(self.temp_path):
+            os.remove(self.temp_path)
+
+    def close(self):
+        self.commit()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        if exc_type is None:
+            self.commit()
+        else:
+            self.abort()
@@ -0,0 +1,85 @@
+"""
+多进程并行提取 Python 文件的 AST 元数据
+
+merge_from_files_with_metadata 原来在单核上逐个文件 ast.parse + 提取元数据 + 渲染 Markdown，
+几千个文件的包在多核构建机上大部分时间都花在这里。
+
+传入 workers > 1 时，主进程按原始顺序读取文件（经 ModuleRegistry，已经解析过或者 ast_cache 命中的文件直接用缓存），
+需要解析的文件把源码交给 ProcessPoolExecutor：子进程解析、提取元数据并渲染 Markdown 片段，返回可 pickle 的 ExtractResult。
+主进程按提交顺序取回结果，所以输出的顺序和字节与串行完全一致；同时在途的任务数有上限，内存不会随文件数增长。
+"""
+
+import typing
+from collections import deque, namedtuple
+from concurrent.futures import ProcessPoolExecutor
+
+from nb_ai_context import ast_extractor
+from nb_ai_context.metadata_markdown import format_py_metadata_as_markdown
+from nb_ai_context.module_registry import ModuleRegistry, ParsedModule
+
+ExtractResult = namedtuple("ExtractResult", ["metadata", "import_refs", "error", "markdown", "nested_definitions"])
+
+# 每个 worker 最多排队的任务数
+TASKS_PER_WORKER = 4
+
+
+def extract_and_render(path: str, source_code: str, relative_file_name: str) -> ExtractResult:
+    """在子进程中执行：解析源码、提取元数据、渲染 Markdown 片段"""
+    extraction = ast_extractor.extract_module_source(source_code, path)
+    markdown = format_py_metadata_as_markdown(extraction.metadata, relative_file_name)
+    return ExtractResult(extraction.metadata, extraction.import_refs, extraction.error, markdown,
+                         extraction.nested_definitions)
+
+
+def iter_metadata_markdown(
+    registry: ModuleRegistry,
+    files: typing.Iterable[typing.Tuple[str, str]],
+    workers: int,
+    on_error: typing.Callable[[str, Exception], None] = None,
+) -> typing.Iterator[str]:
+    """
+    按 files 的顺序产出每个文件的元数据 Markdown 片段
+
+    Args:
+        registry: 生成器的 module_registry，子进程返回的结果会写回这里，后续的依赖分析不会重复解析
+        files: (文件路径, 相对路径) 列表
+        workers: 进程数
+        on_error: 读取或解析失败时的回调 (文件路径, 异常)，用于记录日志
+    """
+    pool = None
+    pending = deque()  # (path, module, markdown 或 Future)
+    max_pending = max(1, workers) * TASKS_PER_WORKER
+
+    def finish(path: str, module: ParsedModule, item) -> str:
+        if isinstance(item, str):
+            markdown = item
+        else:
+            result = item.result()
+            module.set_parsed(result.metadata, result.import_refs, result.error,
+                              nested_definitions=result.nested_definitions)
+            markdown = result.markdown
+        if on_error is not None and module.error is not None:
+            on_error(path, module.error)
+        return markdown
+
+    try:
+        for path, relative_file_name in files:
+            module = registry.get(path)
+            if module.read_error is not None or module.load_cached():
+                item = format_py_metadata_as_markdown(module.metadata, relative_file_name)
+            else:
+                if pool is None:
+                    pool = ProcessPoolExecutor(max_workers=workers)
+                item = pool.submit(extract_and_render, module.path, module.text, relative_file_name)
+            pending.append((path, module, item))
+            while len(pending) > max_pending or (pending and isinstance(pending[0][2], str)):
+                yield finish(*pending.popleft())
+        while pending:
+            yield finish(*pending.popleft())
+    finally:
+        if pool is not None:
+            # 提前结束（例如写入出错）时取消还没开始的任务
+            for _, _, item in pending:
+                if not isinstance(item, str):
+                    item.cancel()
+            pool.shutdown(wait=True)
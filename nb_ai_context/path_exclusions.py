@@ -0,0 +1,194 @@
+"""
+merge_from_dir 的 excluded_dir_name_list / excluded_file_name_list 编译成的路径分段前缀树
+
+排除规则原来以绝对路径的集合传给遍历器：遍历器对每个目录比较完整路径，排除文件时对每个文件调用一次
+os.path.realpath，git ls-files、归档列出的文件再各自换算成前缀。PathExclusions 把规则按路径分段放进一棵树，
+判断一个相对路径时逐段在树上前进，耗时只和路径深度有关，与规则的数量无关，也不访问文件系统。
+
+规则都相对于项目根目录（绝对路径先换算成相对路径），按 / 分段，每一段可以是：
+
+- 普通名称：精确匹配，"tests"、"funboost/utils"
+- 通配符（fnmatch 规则，区分大小写，不跨越 /）："build_*"、"*.min.js"、"docs/v[12]"
+- "**"：匹配零个或多个分段，"**/migrations" 排除任何深度的 migrations 目录
+
+一个目录被排除时其中的所有文件也被排除。每条规则命中的路径数记录在 hits 中（目录规则以 / 结尾）：被排除的目录
+计一次，不管是遍历器剪掉它，还是从文件列表中逐个过滤掉它下面的文件；同一个路径被重复判断只计一次。
+merge_from_dir 每次创建新的 PathExclusions，把它们累计到 generator.stats.caches["exclusions"]。
+
+与原来的区别：规则不再经过 resolve()，排除的是项目中这个路径本身，而不是符号链接指向的目标。
+"""
+
+import fnmatch
+import os
+import re
+import typing
+
+_GLOB_CHARS = re.compile(r"[*?\[]")
+
+
+class _Node:
+    __slots__ = ("children", "globs", "recursive", "loop", "dir_pattern", "file_pattern")
+
+    def __init__(self, loop: bool = False):
+        self.children: typing.Dict[str, "_Node"] = {}
+        # [(通配符, 编译后的 match, 子节点)]
+        self.globs: typing.List[typing.Tuple[str, typing.Callable, "_Node"]] = []
+        # "**" 之后的节点
+        self.recursive: typing.Optional["_Node"] = None
+        # "**" 节点自身可以匹配任意多个分段
+        self.loop = loop
+        self.dir_pattern: typing.Optional[str] = None
+        self.file_pattern: typing.Optional[str] = None
+
+
+def normalize_pattern(project_root: typing.Union[os.PathLike, str], pattern: typing.Union[os.PathLike, str]) -> typing.Optional[str]:
+    """
+    规则换算成相对项目根目录的 posix 路径，"." 表示根目录本身；在项目之外的绝对路径返回 None
+    """
+    pattern = os.fspath(pattern)
+    if os.path.isabs(pattern):
+        pattern = os.path.relpath(pattern, os.fspath(project_root))
+    pattern = os.path.normpath(pattern).replace(os.sep, "/")
+    if pattern == ".." or pattern.startswith("../"):
+        return None
+    return pattern
+
+
+class PathExclusions:
+    """
+    排除目录、排除文件的规则，见模块说明
+
+    Args:
+        dir_patterns: 排除的目录，相对项目根目录的 posix 路径或通配符
+        file_patterns: 排除的文件，相对项目根目录的 posix 路径或通配符
+    """
+
+    def __init__(self, dir_patterns: typing.Iterable[str] = (), file_patterns: typing.Iterable[str] = ()):
+        self._root = _Node()
+        self.dir_patterns = sorted(set(dir_patterns))
+        self.file_patterns = sorted(set(file_patterns))
+        self.hits: typing.Dict[str, int] = {}
+        # 已经计入 hits 的 (是否目录, 路径)
+        self._counted: typing.Set[typing.Tuple[bool, str]] = set()
+        self._has_globs = False
+        for pattern in self.dir_patterns:
+            self._add(pattern).dir_pattern = pattern + "/"
+        for pattern in self.file_patterns:
+            self._add(pattern).file_pattern = pattern
+
+    @classmethod
+    def for_root(
+        cls,
+        project_root: typing.Union[os.PathLike, str],
+        excluded_dirs: typing.Iterable[typing.Union[os.PathLike, str]] = (),
+        excluded_files: typing.Iterable[typing.Union[os.PathLike, str]] = (),
+    ) -> "PathExclusions":
+        """由相对项目根目录的名称、通配符或者绝对路径创建"""
+        dir_patterns = (normalize_pattern(project_root, p) for p in excluded_dirs)
+        file_patterns = (normalize_pattern(project_root, p) for p in excluded_files)
+        return cls([p for p in dir_patterns if p is not None], [p for p in file_patterns if p is not None])
+
+    def _add(self, pattern: str) -> _Node:
+        node = self._root
+        for part in ([] if pattern == "." else pattern.split("/")):
+            if part == "**":
+                if node.recursive is None:
+                    node.recursive = _Node(loop=True)
+                node = node.recursive
+                self._has_globs = True
+            elif _GLOB_CHARS.search(part):
+                for glob, _, child in node.globs:
+                    if glob == part:
+                        node = child
+                        break
+                else:
+                    child = _Node()
+                    node.globs.append((part, re.compile(fnmatch.translate(part)).match, child))
+                    node = child
+                self._has_globs = True
+            else:
+                node = node.children.setdefault(part, _Node())
+        return node
+
+    def __bool__(self) -> bool:
+        return bool(self.dir_patterns or self.file_patterns)
+
+    def key(self) -> list:
+        """规则本身，增量生成的章节键使用"""
+        return [self.dir_patterns, self.file_patterns]
+
+    @staticmethod
+    def _closure(nodes: typing.Iterable[_Node]) -> typing.List[_Node]:
+        result = []
+        for node in nodes:
+            while node is not None and node not in result:
+                result.append(node)
+                node = node.recursive
+        return result
+
+    def _step(self, nodes: typing.List[_Node], part: str) -> typing.List[_Node]:
+        if not self._has_globs:
+            # 只有普通名称时最多一个节点
+            child = nodes[0].children.get(part)
+            return [child] if child is not None else []
+        next_nodes = []
+        for node in nodes:
+            child = node.children.get(part)
+            if child is not None:
+                next_nodes.append(child)
+            for _, match, glob_child in node.globs:
+                if match(part):
+                    next_nodes.append(glob_child)
+            if node.loop:
+                next_nodes.append(node)
+        return self._closure(next_nodes)
+
+    def _hit(self, pattern: str, is_dir: bool, relative_path: str) -> str:
+        counted = (is_dir, relative_path)
+        if counted not in self._counted:
+            self._counted.add(counted)
+            self.hits[pattern] = self.hits.get(pattern, 0) + 1
+        return pattern
+
+    def _match_dirs(self, parts: typing.List[str]) -> typing.Tuple[typing.Optional[str], int, typing.List[_Node]]:
+        """parts 依次经过的目录中第一个被排除的规则和这个目录的深度，以及走完 parts 之后的节点"""
+        nodes = self._closure([self._root])
+        for node in nodes:
+            if node.dir_pattern is not None:
+                return node.dir_pattern, 0, nodes
+        for depth, part in enumerate(parts, 1):
+            nodes = self._step(nodes, part)
+            if not nodes:
+                return None, depth, nodes
+            for node in nodes:
+                if node.dir_pattern is not None:
+                    return node.dir_pattern, depth, nodes
+        return None, len(parts), nodes
+
+    def match_dir(self, relative_path: str) -> typing.Optional[str]:
+        """目录（相对项目根目录的 posix 路径，"" 或 "." 表示根目录）或者它的上级目录被排除时返回命中的规则"""
+        parts = [] if relative_path in ("", ".") else relative_path.split("/")
+        pattern, depth, _ = self._match_dirs(parts)
+        return self._hit(pattern, True, "/".join(parts[:depth])) if pattern is not None else None
+
+    def match_file(self, relative_path: str) -> typing.Optional[str]:
+        """文件被排除（文件规则，或者所在的目录被排除）时返回命中的规则"""
+        parts = relative_path.split("/")
+        pattern, depth, nodes = self._match_dirs(parts[:-1])
+        if pattern is not None:
+            # 计入被排除的目录，而不是其中的每个文件
+            return self._hit(pattern, True, "/".join(parts[:depth]))
+        if nodes and self.file_patterns:
+            for node in self._step(nodes, parts[-1]):
+                if node.file_pattern is not None:
+                    return self._hit(node.file_pattern, False, relative_path)
+        return None
+
+    def is_excluded_dir(self, relative_path: str) -> bool:
+        return self.match_dir(relative_path) is not None
+
+    def is_excluded_file(self, relative_path: str) -> bool:
+        return self.match_file(relative_path) is not None
+
+    def __repr__(self):
+        return f"PathExclusions(dirs={self.dir_patterns}, files={self.file_patterns})"
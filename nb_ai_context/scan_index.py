@@ -0,0 +1,236 @@
+"""
+同一个项目根目录的扫描索引：多次 merge_from_dir 只遍历一次目录
+
+生成脚本经常对同一个项目多次调用 merge_from_dir（先 funboost/md_for_ai、再 funboost，或者另一个生成器再合并一遍），
+每次都要重新 scandir 整个目录树、逐个路径匹配 .gitignore（规则本身由 GitIgnoreMatcher.for_root 按根目录共享，没有修改时只读取一次）。
+
+ScanIndex 按（遍历方式、项目根目录、gitignore 设置）缓存一次遍历得到的文件列表：只应用 .gitignore 和这次调用的
+排除目录（被排除的目录和遍历器一样不会进入，node_modules、.venv 不会因为索引而被完整遍历），不应用排除文件、后缀，
+也不读取文件头判断是否文本文件。之后对同一个目录或者它的子目录的查询，如果排除目录包含遍历时的排除目录
+（遍历结果中有它需要的所有文件），由 IndexedLister 在内存中过滤，结果和顺序与 PruningDirWalker / GitFileLister 相同；
+否则重新遍历。是否文本文件在第一次需要时判断并记住。
+
+目录中新增、删除、重命名文件会改变目录的 mtime。命中时检查查询范围内的目录 mtime（每个目录一次 stat），
+有变化时重新遍历查询的目录。只修改文件内容不会被发现：列出的文件大小是遍历时的值（只用于打印最大的文件），
+文件内容总是重新读取。git ls-files 列出的文件只记录包含文件的目录，在只有被忽略文件的目录中新增文件不会被发现，
+需要调用 invalidate()。
+
+每个 AiMdGenerator 默认有自己的索引；多个生成器可以通过 set_project_propery(..., scan_index=index) 共享同一个索引。
+"""
+
+import os
+import threading
+import typing
+
+from nb_ai_context.dir_walker import PruningDirWalker, WalkedFile, WalkStats, is_text_file, path_suffix
+from nb_ai_context.git_file_lister import GitFileLister
+from nb_ai_context.path_exclusions import PathExclusions
+
+
+class _Listing:
+    """一次遍历的结果"""
+
+    __slots__ = ("target_dir", "files", "dir_mtimes", "dir_patterns", "pruned_dirs", "text_files")
+
+    def __init__(self, target_dir: str, files: typing.List[WalkedFile], dir_mtimes: typing.Dict[str, int],
+                 dir_patterns: typing.FrozenSet[str] = frozenset(), pruned_dirs: typing.List[str] = ()):
+        self.target_dir = target_dir
+        self.files = files
+        self.dir_mtimes = dir_mtimes
+        # 遍历时应用的排除目录，以及被它们剪掉的目录（相对项目根目录）
+        self.dir_patterns = dir_patterns
+        self.pruned_dirs = list(pruned_dirs)
+        # {路径: 是否文本文件}，按需填充
+        self.text_files: typing.Dict[str, bool] = {}
+
+
+def _dir_mtimes(dirs: typing.Iterable[str]) -> typing.Dict[str, int]:
+    mtimes = {}
+    for d in dirs:
+        try:
+            mtimes[d] = os.stat(d).st_mtime_ns
+        except OSError:
+            mtimes[d] = None
+    return mtimes
+
+
+def _is_under(path: str, target_dir: str) -> bool:
+    return path == target_dir or path.startswith(os.path.join(target_dir, ""))
+
+
+class ScanIndex:
+    """
+    按项目根目录缓存的目录扫描结果，线程安全
+
+    Args:
+        revalidate: 命中时是否检查目录的 mtime，False 时直到 invalidate() 都使用第一次遍历的结果
+    """
+
+    def __init__(self, revalidate: bool = True):
+        self.revalidate = revalidate
+        self.walks = 0
+        self.hits = 0
+        self.stale = 0
+        self._listings: typing.Dict[tuple, _Listing] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _raw_lister(lister: typing.Union[PruningDirWalker, GitFileLister]) -> typing.Tuple[tuple, typing.Any]:
+        """与 lister 相同的根目录、gitignore 设置和排除目录、但不做其他过滤的遍历器，以及它的缓存键"""
+        if isinstance(lister, GitFileLister):
+            raw = GitFileLister(lister.project_root, lister.git_root, git_root_prefix=lister.git_root_prefix,
+                                git_executable=lister.git_executable, check_text=False)
+            return ("git", raw.project_root, raw.git_root, raw.git_root_prefix), raw
+        raw = PruningDirWalker(lister.project_root, gitignore_matcher=lister.gitignore_matcher,
+                               git_root_prefix=lister.git_root_prefix,
+                               exclusions=PathExclusions(lister.exclusions.dir_patterns), check_text=False)
+        matcher = raw.gitignore_matcher
+        # 匹配器因为 .gitignore 修改而重新读取规则后，旧的遍历结果不再命中
+        matcher_key = (matcher.root, matcher.generation) if matcher is not None else None
+        return ("walk", raw.project_root, matcher_key, raw.git_root_prefix), raw
+
+    def wrap(self, lister: typing.Union[PruningDirWalker, GitFileLister]) -> "IndexedLister":
+        """用索引代替 lister 遍历，排除、后缀、文本文件过滤与 lister 相同"""
+        key, raw = self._raw_lister(lister)
+        return IndexedLister(self, key, raw, lister)
+
+    def _find(self, key: tuple, target_dir: str, dir_patterns: typing.FrozenSet[str]) -> typing.Optional[_Listing]:
+        """target_dir 或者离它最近的祖先目录的遍历结果，遍历时的排除目录需要是 dir_patterns 的子集"""
+        current = target_dir
+        while True:
+            listing = self._listings.get((key, current))
+            if listing is not None and listing.dir_patterns <= dir_patterns:
+                return listing
+            parent = os.path.dirname(current)
+            if parent == current:
+                return None
+            current = parent
+
+    def _is_fresh(self, listing: _Listing, target_dir: str) -> bool:
+        if not self.revalidate:
+            return True
+        whole = listing.target_dir == target_dir
+        for d, mtime in listing.dir_mtimes.items():
+            if whole or _is_under(d, target_dir):
+                try:
+                    current = os.stat(d).st_mtime_ns
+                except OSError:
+                    current = None
+                if current != mtime:
+                    return False
+        return True
+
+    def listing(self, key: tuple, raw_lister, target_dir: str) -> typing.Tuple[_Listing, bool]:
+        """
+        target_dir 所在的遍历结果和是否命中，没有或者已经变化时用 raw_lister 遍历 target_dir
+
+        遍历失败时（例如 GitListError）异常直接抛出，不记录结果
+        """
+        dir_patterns = frozenset(raw_lister.exclusions.dir_patterns)
+        with self._lock:
+            listing = self._find(key, target_dir, dir_patterns)
+            if listing is not None:
+                if self._is_fresh(listing, target_dir):
+                    self.hits += 1
+                    return listing, True
+                self.stale += 1
+        if isinstance(raw_lister, PruningDirWalker):
+            raw_lister.visited_dirs = []
+            raw_lister.pruned_dirs = []
+        files = list(raw_lister.walk(target_dir))
+        pruned_dirs = ()
+        if isinstance(raw_lister, PruningDirWalker):
+            dirs = raw_lister.visited_dirs
+            pruned_dirs = raw_lister.pruned_dirs
+        else:
+            dirs = {target_dir}
+            for f in files:
+                d = os.path.dirname(f.path)
+                while d not in dirs and _is_under(d, target_dir):
+                    dirs.add(d)
+                    d = os.path.dirname(d)
+        listing = _Listing(target_dir, files, _dir_mtimes(dirs), dir_patterns, pruned_dirs)
+        with self._lock:
+            self.walks += 1
+            self._listings[(key, target_dir)] = listing
+        return listing, False
+
+    def invalidate(self) -> "ScanIndex":
+        """丢弃所有遍历结果（例如 .gitignore 被修改后）"""
+        with self._lock:
+            self._listings.clear()
+        return self
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "listings": len(self._listings), "files": sum(len(l.files) for l in self._listings.values()),
+                "walks": self.walks, "hits": self.hits, "stale": self.stale,
+            }
+
+
+class IndexedLister:
+    """
+    从 ScanIndex 列出 project_root 下某个目录中需要合并的文本文件，接口与 PruningDirWalker.walk 相同
+
+    由 ScanIndex.wrap(lister) 创建，排除目录、排除文件、后缀过滤取自 lister。被排除的目录和遍历器一样每个计一次
+    （stats.dirs_pruned_excluded、exclusions.hits），不管它是遍历时被剪掉，还是在内存中从文件列表里过滤掉
+    """
+
+    def __init__(self, index: ScanIndex, key: tuple, raw_lister, lister: typing.Union[PruningDirWalker, GitFileLister]):
+        self.index = index
+        self.key = key
+        self.raw_lister = raw_lister
+        self.lister = lister
+        self.project_root = lister.project_root
+        self.stats = WalkStats()
+        self.hit = False
+
+    def walk(self, target_dir: typing.Union[os.PathLike, str]) -> typing.Iterator[WalkedFile]:
+        stats = self.stats
+        target_dir = os.fspath(target_dir)
+        exclusions = self.lister.exclusions or None
+        target_relative = os.path.relpath(target_dir, self.project_root).replace(os.sep, "/")
+        if exclusions is not None and exclusions.is_excluded_dir(target_relative):
+            # 与遍历器相同，被排除的目录本身不列出
+            stats.dirs_pruned_excluded += 1
+            return
+        listing, self.hit = self.index.listing(self.key, self.raw_lister, target_dir)
+        if not self.hit:
+            raw_stats = self.raw_lister.stats
+            stats.dirs_visited = raw_stats.dirs_visited
+            stats.dirs_pruned_gitignore = raw_stats.dirs_pruned_gitignore
+            stats.files_seen = raw_stats.files_skipped_gitignore
+            stats.files_skipped_gitignore = raw_stats.files_skipped_gitignore
+        files = listing.files
+        pruned_dirs = listing.pruned_dirs
+        if listing.target_dir != target_dir:
+            prefix = os.path.join(target_dir, "")
+            files = [f for f in files if f.path.startswith(prefix)]
+            relative_prefix = "" if target_relative == "." else target_relative + "/"
+            pruned_dirs = [d for d in pruned_dirs if d.startswith(relative_prefix)]
+        for relative_path in pruned_dirs:
+            # 遍历时剪掉的目录也被这次的排除目录排除（遍历时的排除目录是它的子集）
+            if exclusions is not None and exclusions.is_excluded_dir(relative_path):
+                stats.dirs_pruned_excluded += 1
+
+        suffixes = self.lister.should_include_suffixes
+        check_text = self.lister.check_text
+        text_files = listing.text_files
+        for f in files:
+            stats.files_seen += 1
+            if exclusions is not None and exclusions.is_excluded_file(f.relative_path):
+                stats.files_skipped_excluded += 1
+                continue
+            if suffixes and path_suffix(f.relative_path.rpartition("/")[2]) not in suffixes:
+                stats.files_skipped_suffix += 1
+                continue
+            if check_text:
+                is_text = text_files.get(f.path)
+                if is_text is None:
+                    is_text = text_files[f.path] = is_text_file(f.path)
+                if not is_text:
+                    stats.files_skipped_binary += 1
+                    continue
+            stats.files_included += 1
+            yield f
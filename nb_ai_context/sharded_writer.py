@@ -0,0 +1,349 @@
+"""
+把输出按大小切分成多个文件（分片）
+
+有些模型和知识库上传工具限制单个文件的大小，funboost_all_docs_and_codes.md 这样的文档一个文件放不下。
+ShardedOutputWriter 作为 AiMdGenerator 的输出会话（open_output_session(shard_max_tokens=..., shard_max_bytes=...)），
+把输出写成 name.part001.md、name.part002.md ...，并写出 name.manifest.json：
+
+- 只在文件块（--- start of file ... --- end of file）之间切分，一个文件块永远不会被切开；
+  两个文件块之间的其他内容（章节标题 + 文件树、依赖分析等，可能跨多次 write 的围栏代码块）也作为一个整体，
+  分片永远不会从围栏代码块的中间开始
+- 每个分片开头都重复 AI 阅读指南和分片索引（共几个分片、每个分片的文件数和 token 数、本分片包含的文件）
+- 在章节中间切分时，新分片先写一行 "(continued)" 的章节标题，AI 仍然知道后面的文件属于哪个章节
+- 流式写入：分片正文先写入同目录的临时文件，内存里只缓存当前的一个文件块；commit 时总分片数已知，
+  再逐个写出 BOM + 阅读指南 + 分片索引 + 正文（分块复制），用 os.replace 替换目标文件
+
+上限包括阅读指南和分片索引，上限小于阅读指南 + 分片索引时抛出 ValueError。单个文件块本身就超过上限时独占一个分片，并输出警告。
+"""
+
+import json
+import logging
+import os
+import re
+import shutil
+import tempfile
+import typing
+
+from nb_ai_context.output_writer import UTF8_BOM, DEFAULT_BUFFER_SIZE, encode_text, replace_file
+from nb_ai_context.token_estimator import estimate_tokens_float
+
+# 分片索引里为分片列表预留的行数，超过后分片可能略微超过上限（会输出警告）
+INDEX_RESERVED_PARTS = 100
+
+
+class _Shard:
+    def __init__(self, number: int, temp_path: str):
+        self.number = number
+        self.temp_path = temp_path
+        self.body_bytes = 0
+        self.body_tokens = 0.0
+        self.files = []  # [(relative_path, section_title, tokens)]
+        self.index_file_bytes = 0
+        self.index_file_tokens = 0.0
+        self.bytes = 0
+        self.tokens = 0
+
+
+class ShardedOutputWriter:
+    """
+    分片输出写入器，接口与 OutputWriter 相同
+
+    Args:
+        target_path: 不分片时的输出文件路径，例如 out/name.md，分片为 out/name.part001.md ...，清单为 out/name.manifest.json
+        max_tokens: 每个分片的 token 上限（估算值，见 token_estimator）
+        max_bytes: 每个分片的字节数上限
+        atomic: commit 之前不改动已有的分片文件
+        logger: 输出警告用的 logger，AiMdGenerator 传入自己的 logger
+    """
+
+    def __init__(
+        self,
+        target_path: typing.Union[os.PathLike, str],
+        max_tokens: int = None,
+        max_bytes: int = None,
+        atomic: bool = True,
+        buffer_size: int = DEFAULT_BUFFER_SIZE,
+        logger: logging.Logger = None,
+    ):
+        if max_tokens is None and max_bytes is None:
+            raise ValueError("max_tokens or max_bytes is required for a sharded output.")
+        self.target_path = os.path.abspath(os.fspath(target_path))
+        self.max_tokens = max_tokens
+        self.max_bytes = max_bytes
+        self.atomic = atomic
+        self.buffer_size = buffer_size
+        self.logger = logger or logging.getLogger(__name__)
+        self.directory = os.path.dirname(self.target_path)
+        self.stem, self.suffix = os.path.splitext(os.path.basename(self.target_path))
+        self.manifest_path = os.path.join(self.directory, f"{self.stem}.manifest.json")
+        self.bytes_written = 0
+        self.closed = False
+        self.shard_paths = []
+        os.makedirs(self.directory, exist_ok=True)
+        self._reset()
+        self._fixed_reserved()
+
+    def _reset(self):
+        self._preamble = ""
+        self._shards: typing.List[_Shard] = []
+        self._shard = None
+        self._body = None
+        self._section = None
+        self._section_started = False
+        # 当前缓存的单元：一个文件块（_block_file 为文件路径），或者文件块之间的其他内容（_block_file 为 None）
+        self._block_file = None
+        self._block: typing.List[bytes] = []
+        self._block_tokens = 0.0
+        self._reserved_cache = None
+
+    def shard_name(self, number: int) -> str:
+        return f"{self.stem}.part{number:03d}{self.suffix}"
+
+    # ---- 写入 ----
+
+    def set_preamble(self, text: str) -> "ShardedOutputWriter":
+        """每个分片开头都重复的内容（AI 阅读指南），加上分片索引超过上限时抛出 ValueError"""
+        self._preamble = text
+        self._fixed_reserved()
+        return self
+
+    def begin_section(self, title: str):
+        self._flush_block()
+        self._section = title
+        self._section_started = False
+
+    def begin_file(self, relative_path: str):
+        self._flush_block()
+        self._block_file = relative_path
+
+    def end_file(self):
+        self._flush_block()
+
+    def write(self, text: str) -> int:
+        """缓存到当前单元，返回编码后的字节数"""
+        data = encode_text(text)
+        self._block.append(data)
+        self._block_tokens += estimate_tokens_float(text)
+        return len(data)
+
+    def _flush_block(self):
+        relative_path, data, tokens = self._block_file, b"".join(self._block), self._block_tokens
+        self._block_file = None
+        self._block = []
+        self._block_tokens = 0.0
+        self._write_unit(data, tokens, relative_path)
+
+    def _write_unit(self, data: bytes, tokens: float, relative_path: typing.Optional[str]):
+        if not data and relative_path is None:
+            return
+        index_line = self._index_file_line(relative_path) if relative_path is not None else ""
+        index_line_data = encode_text(index_line)
+        index_line_tokens = estimate_tokens_float(index_line)
+
+        shard = self._shard
+        if shard is None or (shard.files or shard.body_bytes) and not self._fits(
+            shard, len(data) + len(index_line_data), tokens + index_line_tokens
+        ):
+            shard = self._new_shard()
+            if self._section_started and self._section is not None:
+                # 章节在上一个分片中已经开始，重复章节标题
+                self._write_body(shard, encode_text(f"# markdown content namespace: {self._section} (continued) \n\n"))
+        if not self._fits(shard, len(data) + len(index_line_data), tokens + index_line_tokens):
+            self.logger.warning(f"{relative_path or 'a section block'} (~{int(tokens)} tokens, {len(data)} bytes) "
+                                f"alone exceeds the shard limit, it is written to {self.shard_name(shard.number)} on its own")
+        self._write_body(shard, data, tokens)
+        self._section_started = True
+        if relative_path is not None:
+            shard.files.append((relative_path, self._section, int(tokens + 0.5)))
+            shard.index_file_bytes += len(index_line_data)
+            shard.index_file_tokens += index_line_tokens
+
+    def _write_body(self, shard: _Shard, data: bytes, tokens: float = None):
+        self._body.write(data)
+        shard.body_bytes += len(data)
+        shard.body_tokens += estimate_tokens_float(data.decode("utf-8")) if tokens is None else tokens
+        self.bytes_written += len(data)
+
+    def _new_shard(self) -> _Shard:
+        if self._body is not None:
+            self._body.close()
+        fd, temp_path = tempfile.mkstemp(prefix=f".{self.stem}.body.", suffix=".tmp", dir=self.directory)
+        self._body = os.fdopen(fd, "wb", buffering=self.buffer_size)
+        self._shard = _Shard(len(self._shards) + 1, temp_path)
+        self._shards.append(self._shard)
+        return self._shard
+
+    # ---- 分片索引 ----
+
+    def _index_file_line(self, relative_path: str) -> str:
+        return f"- `{relative_path}`\n"
+
+    def _index_part_line(self, shard_name: str, number: int, total: int, files: int, tokens: int, current: bool) -> str:
+        line = f"part {number}/{total}: `{shard_name}` ({files} files, ~{tokens} content tokens)"
+        return f"- **{line} ← this part**\n" if current else f"- {line}\n"
+
+    def _index_text(self, shard: _Shard, parts: typing.List[str]) -> str:
+        lines = [
+            f"# shard index: part {shard.number} of {len(parts)} of `{self.stem}{self.suffix}`\n\n",
+            f"This document is split into {len(parts)} parts at file boundaries. "
+            f"Every part repeats the reading guide and this index; `{self.stem}.manifest.json` lists every file of every part.\n\n",
+        ]
+        lines.extend(parts)
+        lines.append("\nfiles in this part:\n")
+        lines.extend(self._index_file_line(relative_path) for relative_path, _, _ in shard.files)
+        lines.append("\n---\n\n")
+        return "".join(lines)
+
+    def _fixed_reserved(self) -> typing.Tuple[int, float]:
+        """和分片无关的 BOM + 阅读指南 + 分片索引最多占用的字节数和 token 数，超过上限时抛出 ValueError"""
+        cached = self._reserved_cache
+        if cached is None or cached[0] != self._preamble:
+            # 只计算一次，分片列表按 INDEX_RESERVED_PARTS 行、最大的数字估算
+            widest_parts = [
+                self._index_part_line(self.shard_name(999), 999, 999, 99999, 99999999, i == 0)
+                for i in range(INDEX_RESERVED_PARTS)
+            ]
+            fixed_text = self._preamble + self._index_text(_Shard(999, ""), widest_parts)
+            fixed_bytes, fixed_tokens = len(UTF8_BOM) + len(encode_text(fixed_text)), estimate_tokens_float(fixed_text)
+            # 否则每个分片只能放下一个单元，每个单元都会超过上限
+            if self.max_bytes is not None and fixed_bytes >= self.max_bytes:
+                raise ValueError(f"shard_max_bytes={self.max_bytes} is too small: the reading guide and shard index "
+                                 f"of every part take up to {fixed_bytes} bytes.")
+            if self.max_tokens is not None and fixed_tokens >= self.max_tokens:
+                raise ValueError(f"shard_max_tokens={self.max_tokens} is too small: the reading guide and shard index "
+                                 f"of every part take up to ~{int(fixed_tokens + 0.5)} tokens.")
+            cached = self._reserved_cache = (self._preamble, fixed_bytes, fixed_tokens)
+        return cached[1], cached[2]
+
+    def _reserved(self, shard: _Shard) -> typing.Tuple[int, float]:
+        """分片的 BOM + 阅读指南 + 分片索引最多占用的字节数和 token 数"""
+        fixed_bytes, fixed_tokens = self._fixed_reserved()
+        return fixed_bytes + shard.index_file_bytes, fixed_tokens + shard.index_file_tokens
+
+    def _fits(self, shard: _Shard, extra_bytes: int, extra_tokens: float) -> bool:
+        reserved_bytes, reserved_tokens = self._reserved(shard)
+        if self.max_bytes is not None and reserved_bytes + shard.body_bytes + extra_bytes > self.max_bytes:
+            return False
+        if self.max_tokens is not None and reserved_tokens + shard.body_tokens + extra_tokens > self.max_tokens:
+            return False
+        return True
+
+    # ---- 提交 ----
+
+    def truncate(self) -> "ShardedOutputWriter":
+        """清空已经写入的内容，相当于 clear_text()"""
+        self._remove_temp_bodies()
+        self._reset()
+        return self
+
+    def flush(self) -> "ShardedOutputWriter":
+        if self._body is not None:
+            self._body.flush()
+        return self
+
+    def commit(self):
+        """写出所有分片和清单，删除上一次生成留下的多余分片"""
+        if self.closed:
+            return
+        self._flush_block()
+        if self._body is not None:
+            self._body.close()
+        self.closed = True
+        try:
+            shards = self._shards
+            parts = [self._index_part_line(self.shard_name(s.number), s.number, len(shards), len(s.files),
+                                           int(s.body_tokens + 0.5), False) for s in shards]
+            if len(shards) > INDEX_RESERVED_PARTS:
+                self.logger.warning(f"{len(shards)} shards, more than {INDEX_RESERVED_PARTS}: the shard index may push a part over the limit")
+            for i, shard in enumerate(shards):
+                current_parts = list(parts)
+                current_parts[i] = self._index_part_line(self.shard_name(shard.number), shard.number, len(shards),
+                                                         len(shard.files), int(shard.body_tokens + 0.5), True)
+                header = self._preamble + self._index_text(shard, current_parts)
+                header_data = UTF8_BOM + encode_text(header)
+                shard.bytes = len(header_data) + shard.body_bytes
+                shard.tokens = int(estimate_tokens_float(header) + shard.body_tokens + 0.5)
+                self.shard_paths.append(self._write_shard(shard, header_data))
+            self._write_manifest(shards)
+            self._remove_stale_shards(len(shards))
+        finally:
+            self._remove_temp_bodies()
+
+    def _replace(self, path: str, write: typing.Callable[[typing.BinaryIO], None]):
+        if not self.atomic:
+            with open(path, "wb") as f:
+                write(f)
+            return
+        fd, temp_path = tempfile.mkstemp(prefix=f".{os.path.basename(path)}.", suffix=".tmp", dir=self.directory)
+        try:
+            with os.fdopen(fd, "wb") as f:
+                write(f)
+                f.flush()
+                os.fsync(f.fileno())
+            replace_file(temp_path, path)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+
+    def _write_shard(self, shard: _Shard, header_data: bytes) -> str:
+        path = os.path.join(self.directory, self.shard_name(shard.number))
+
+        def write(f):
+            f.write(header_data)
+            with open(shard.temp_path, "rb") as body:
+                shutil.copyfileobj(body, f, self.buffer_size)
+
+        self._replace(path, write)
+        return path
+
+    def _write_manifest(self, shards: typing.List[_Shard]):
+        manifest = {
+            "target": os.path.basename(self.target_path),
+            "max_tokens": self.max_tokens,
+            "max_bytes": self.max_bytes,
+            "parts": [
+                {
+                    "path": self.shard_name(shard.number),
+                    "bytes": shard.bytes,
+                    "tokens": shard.tokens,
+                    "files": [{"path": path, "section": section, "tokens": tokens} for path, section, tokens in shard.files],
+                }
+                for shard in shards
+            ],
+        }
+        data = json.dumps(manifest, ensure_ascii=False, indent=2).encode("utf-8")
+        self._replace(self.manifest_path, lambda f: f.write(data))
+
+    def _remove_stale_shards(self, count: int):
+        pattern = re.compile(re.escape(self.stem) + r"\.part(\d{3,})" + re.escape(self.suffix) + "$")
+        for name in os.listdir(self.directory):
+            match = pattern.match(name)
+            if match and int(match.group(1)) > count:
+                os.remove(os.path.join(self.directory, name))
+
+    def _remove_temp_bodies(self):
+        if self._body is not None and not self._body.closed:
+            self._body.close()
+        for shard in self._shards:
+            if os.path.exists(shard.temp_path):
+                os.remove(shard.temp_path)
+
+    def abort(self):
+        """放弃写入，已有的分片文件保持不变"""
+        if self.closed:
+            return
+        self.closed = True
+        self._remove_temp_bodies()
+
+    def close(self):
+        self.commit()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        if exc_type is None:
+            self.commit()
+        else:
+            self.abort()
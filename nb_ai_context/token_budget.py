@@ -0,0 +1,138 @@
+"""
+按 token 预算决定每个文件的输出方式
+
+以前为了不超过模型的上下文长度，只能在生成脚本里手动注释掉 .html 之类的后缀。
+TokenBudgetPlanner 在写入之前为每个文件选择一种输出方式，一次写完就能保证整段内容不超过预算：
+
+- full: 完整源码（Python 文件带 AST 元数据）
+- metadata: 只输出 AST 元数据（仅 Python 文件）
+- stub: 一行占位说明，告诉 AI 这个文件存在但因为预算被省略
+
+文件按优先级从高到低依次选择 full -> metadata -> stub 中第一个放得下的方式。优先级依次比较：
+1. 是否是 add_project_summary 中指定的核心文件
+2. 后缀权重（源码 > 文档 > 配置 > 其他，例如 .html）
+3. 依赖中心度：项目内有多少个文件 import 了它（见 AiMdGenerator._analyze_file_dependencies）
+4. token 数更少的优先，同样的预算可以放下更多文件
+"""
+
+import typing
+
+MODE_FULL = "full"
+MODE_METADATA = "metadata"
+MODE_STUB = "stub"
+
+SUFFIX_WEIGHTS = {
+    ".py": 3, ".pyi": 3,
+    ".md": 2, ".rst": 2, ".txt": 2,
+    ".toml": 1, ".cfg": 1, ".ini": 1, ".yaml": 1, ".yml": 1, ".json": 1, ".sh": 1, ".bat": 1,
+}
+
+
+class BudgetEntry:
+    """
+    一个文件在各种输出方式下的 token 数
+
+    Args:
+        relative_path: 相对路径
+        suffix: 文件后缀
+        full_tokens: 完整输出的 token 数，None 表示没有这种方式（include_file_text=False）
+        metadata_tokens: 只输出元数据的 token 数，None 表示没有这种方式（非 Python 文件）
+        stub_tokens: 占位行的 token 数
+        is_core: 是否核心文件
+        centrality: 被多少个项目内文件依赖
+    """
+
+    def __init__(
+        self,
+        relative_path: str,
+        suffix: str,
+        full_tokens: typing.Optional[int],
+        metadata_tokens: typing.Optional[int],
+        stub_tokens: int,
+        is_core: bool = False,
+        centrality: int = 0,
+    ):
+        self.relative_path = relative_path
+        self.suffix = suffix
+        self.full_tokens = full_tokens
+        self.metadata_tokens = metadata_tokens
+        self.stub_tokens = stub_tokens
+        self.is_core = is_core
+        self.centrality = centrality
+        self.mode = MODE_STUB
+
+    @property
+    def omitted_tokens(self) -> int:
+        """被省略的内容的 token 数，写在占位说明里"""
+        if self.full_tokens is not None:
+            return self.full_tokens
+        return self.metadata_tokens or 0
+
+    @property
+    def tokens(self) -> int:
+        if self.mode == MODE_FULL:
+            return self.full_tokens
+        if self.mode == MODE_METADATA:
+            return self.metadata_tokens
+        return self.stub_tokens
+
+    def priority_key(self) -> tuple:
+        return (
+            not self.is_core,
+            -SUFFIX_WEIGHTS.get(self.suffix, 0),
+            -self.centrality,
+            self.omitted_tokens,
+            self.relative_path,
+        )
+
+    def __repr__(self):
+        return f"BudgetEntry({self.relative_path!r}, mode={self.mode!r}, tokens={self.tokens})"
+
+
+class TokenBudgetPlanner:
+    """
+    Args:
+        max_tokens: 整段内容的 token 预算
+        fixed_tokens: 不随文件选择变化的部分（标题、文件树等）的 token 数
+    """
+
+    def __init__(self, max_tokens: int, fixed_tokens: int = 0):
+        self.max_tokens = max_tokens
+        self.fixed_tokens = fixed_tokens
+
+    def plan(self, entries: typing.List[BudgetEntry]) -> "BudgetPlan":
+        """为每个文件选择输出方式（设置 entry.mode）"""
+        for entry in entries:
+            entry.mode = MODE_STUB
+        remaining = self.max_tokens - self.fixed_tokens - sum(e.stub_tokens for e in entries)
+        for entry in sorted(entries, key=BudgetEntry.priority_key):
+            if entry.full_tokens is not None and entry.full_tokens - entry.stub_tokens <= remaining:
+                entry.mode = MODE_FULL
+                remaining -= entry.full_tokens - entry.stub_tokens
+            elif entry.metadata_tokens is not None and entry.metadata_tokens - entry.stub_tokens <= remaining:
+                entry.mode = MODE_METADATA
+                remaining -= entry.metadata_tokens - entry.stub_tokens
+        return BudgetPlan(self.max_tokens, self.fixed_tokens + sum(e.tokens for e in entries), entries)
+
+
+class BudgetPlan:
+    """TokenBudgetPlanner.plan 的结果"""
+
+    def __init__(self, max_tokens: int, planned_tokens: int, entries: typing.List[BudgetEntry]):
+        self.max_tokens = max_tokens
+        self.planned_tokens = planned_tokens
+        self.entries = {entry.relative_path: entry for entry in entries}
+
+    def mode_of(self, relative_path: str) -> str:
+        return self.entries[relative_path].mode
+
+    def mode_counts(self) -> typing.Dict[str, int]:
+        counts = {MODE_FULL: 0, MODE_METADATA: 0, MODE_STUB: 0}
+        for entry in self.entries.values():
+            counts[entry.mode] += 1
+        return counts
+
+    def summary(self) -> str:
+        counts = self.mode_counts()
+        return (f"token budget: {self.max_tokens}, estimated tokens: {self.planned_tokens}; "
+                f"full source: {counts[MODE_FULL]}, metadata only: {counts[MODE_METADATA]}, omitted: {counts[MODE_STUB]}")
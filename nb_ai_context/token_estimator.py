@@ -0,0 +1,190 @@
+"""
+离线 token 数估算（不依赖任何分词器）
+
+字节数不能代表 token 数：英文单词通常一个词一个 token，代码里的标点、缩进各有各的切分方式，
+中文基本一个字一个 token。这里用一个线性模型估算 BPE 分词器（cl100k_base 这一类）的 token 数：
+
+1. 把文本编码为 UTF-8，用 bytes.translate 把每个字符映射为一个类别字节（字母、数字、标点、空白、换行、
+   中日韩文字、符号、emoji），UTF-8 的后续字节直接删除
+2. 用 bytes.count 统计各类别字符数和"连续段"数（例如字母段数约等于单词数）
+3. 按校准好的系数加权求和
+
+全部是 C 实现的字节操作，没有逐字符的 Python 循环和正则，单线程约 20~40 MB/s，300MB 的文档十几秒内就能算完。
+系数由 benchmarks/bench_token_estimator.py 用参考分词器的结果（benchmarks/fixtures/token_reference_cl100k.json）拟合，
+在本项目生成的中英文混合文档上平均误差约 4%，总量误差小于 1%。
+
+TokenAccounting 在写入输出文件时逐块累计 token 数，按章节（as_title）和文件统计，见 AiMdGenerator.show_token_report。
+"""
+
+import typing
+from collections import OrderedDict
+
+_CLASS_TABLE = bytearray(range(256))
+for _b in range(128):
+    _ch = chr(_b)
+    if _ch.isalpha():
+        _CLASS_TABLE[_b] = ord("a")
+    elif _ch.isdigit():
+        _CLASS_TABLE[_b] = ord("d")
+    elif _ch == "\n":
+        _CLASS_TABLE[_b] = ord("\n")
+    elif _ch in " \t\r\x0b\x0c":
+        _CLASS_TABLE[_b] = ord(" ")
+    else:
+        _CLASS_TABLE[_b] = ord("p")
+for _b in range(0xC0, 0xF0):
+    # 2 字节字符（拉丁扩展、西里尔等）和 3 字节的中日韩文字、全角标点按"文字"统计
+    _CLASS_TABLE[_b] = ord("c")
+# U+2000-U+2FFF（标点、箭头、制表符）和 U+F000-U+FFFF（全角形式等），连续的一段常被合并成少数几个 token
+_CLASS_TABLE[0xE2] = ord("s")
+_CLASS_TABLE[0xEF] = ord("s")
+for _b in range(0xF0, 0x100):
+    _CLASS_TABLE[_b] = ord("e")
+_CLASS_TABLE = bytes(_CLASS_TABLE)
+_CONTINUATION_BYTES = bytes(range(0x80, 0xC0))
+# 计算连续段数用的表：字母、标点、符号分别映射为 1，其他类别映射为 0，
+# 连续段数 = 开头的一段 + b"\x00\x01" 出现的次数（不会重叠，bytes.count 的结果是准确的）
+_LETTER_RUN_TABLE, _PUNCT_RUN_TABLE, _SYMBOL_RUN_TABLE = (
+    bytes(1 if b == cls else 0 for b in range(256)) for cls in b"aps"
+)
+
+
+# (特征, 系数)，由 benchmarks/bench_token_estimator.py --fit 拟合
+_COEFFICIENTS = (
+    ("letter_runs", 0.118),
+    ("letters", 0.105),
+    ("digits", 0.83),
+    ("punct_runs", 0.546),
+    ("punct", 0.244),
+    ("cjk", 1.048),
+    ("symbols", 0.063),
+    ("symbol_runs", 1.799),
+    ("emoji", 2.463),
+    ("newlines", 0.528),
+    ("spaces", 0.495),
+    ("double_spaces", -0.895),
+)
+_FEATURE_NAMES = tuple(name for name, _ in _COEFFICIENTS)
+_WEIGHTS = tuple(weight for _, weight in _COEFFICIENTS)
+
+
+def _features(text: str) -> tuple:
+    """按 _COEFFICIENTS 的顺序返回特征计数；每个特征都是对整段字节的一次 C 实现的扫描"""
+    classes = text.encode("utf-8", "surrogatepass").translate(_CLASS_TABLE, _CONTINUATION_BYTES)
+    count = classes.count
+    letters = count(b"a")
+    digits = count(b"d")
+    cjk = count(b"c")
+    symbols = count(b"s")
+    emoji = count(b"e")
+    newlines = count(b"\n")
+    spaces = count(b" ")
+    # 剩下的都是 ASCII 标点，少扫描一次
+    punct = len(classes) - letters - digits - cjk - symbols - emoji - newlines - spaces
+    first = classes[:1]
+    letter_runs = (first == b"a") + classes.translate(_LETTER_RUN_TABLE).count(b"\x00\x01")
+    punct_runs = (first == b"p") + classes.translate(_PUNCT_RUN_TABLE).count(b"\x00\x01")
+    # 源码里通常没有符号类字符，跳过这次扫描
+    symbol_runs = (first == b"s") + classes.translate(_SYMBOL_RUN_TABLE).count(b"\x00\x01") if symbols else 0
+    return (
+        letter_runs, letters,
+        digits,
+        punct_runs, punct,
+        cjk,
+        symbols, symbol_runs,
+        emoji,
+        newlines,
+        spaces, count(b"  "),
+    )
+
+
+def token_features(text: str) -> typing.Dict[str, int]:
+    """估算用的特征计数"""
+    return dict(zip(_FEATURE_NAMES, _features(text)))
+
+
+def estimate_tokens_float(text: str) -> float:
+    if not text:
+        return 0.0
+    return max(0.0, sum(count * weight for count, weight in zip(_features(text), _WEIGHTS)))
+
+
+def estimate_tokens(text: str) -> int:
+    """估算文本的 token 数"""
+    return int(estimate_tokens_float(text) + 0.5)
+
+
+class TokenAccounting:
+    """
+    按章节和文件累计输出的 token 数
+
+    生成器每写入一块文本就调用 add()，写入的内容归属于当前章节（begin_section）和当前文件（begin_file / end_file）。
+    """
+
+    def __init__(self):
+        self.total = 0.0
+        self.sections: "OrderedDict[str, dict]" = OrderedDict()
+        self._section = None
+        self._file = None
+
+    def begin_section(self, title: str) -> "TokenAccounting":
+        section = self.sections.get(title)
+        if section is None:
+            section = self.sections[title] = {"tokens": 0.0, "files": OrderedDict()}
+        self._section = section
+        self._file = None
+        return self
+
+    def begin_file(self, relative_path: str) -> "TokenAccounting":
+        if self._section is None:
+            self.begin_section("")
+        self._file = relative_path
+        self._section["files"].setdefault(relative_path, 0.0)
+        return self
+
+    def end_file(self) -> "TokenAccounting":
+        self._file = None
+        return self
+
+    def add(self, text: str) -> "TokenAccounting":
+        return self.add_tokens(estimate_tokens_float(text))
+
+    def add_tokens(self, tokens: float) -> "TokenAccounting":
+        """累计已经估算好的 token 数（增量生成时复用的文件块）"""
+        self.total += tokens
+        if self._section is None:
+            self.begin_section("")
+        self._section["tokens"] += tokens
+        if self._file is not None:
+            self._section["files"][self._file] += tokens
+        return self
+
+    def reset(self) -> "TokenAccounting":
+        self.__init__()
+        return self
+
+    def report(self) -> dict:
+        """{"total": int, "sections": [{"title", "tokens", "files": [(relative_path, tokens), ...]}]}"""
+        return {
+            "total": int(self.total + 0.5),
+            "sections": [
+                {
+                    "title": title,
+                    "tokens": int(section["tokens"] + 0.5),
+                    "files": [(path, int(tokens + 0.5)) for path, tokens in section["files"].items()],
+                }
+                for title, section in self.sections.items()
+            ],
+        }
+
+    def format_report(self, top_n: int = 20) -> str:
+        report = self.report()
+        lines = [f"estimated tokens: {report['total']}"]
+        for section in report["sections"]:
+            lines.append(f"  [{section['title'] or '-'}] {section['tokens']} tokens, {len(section['files'])} files")
+        all_files = [(tokens, section["title"], path) for section in report["sections"] for path, tokens in section["files"]]
+        if all_files:
+            lines.append(f"  top {min(top_n, len(all_files))} files by tokens:")
+            for tokens, title, path in sorted(all_files, key=lambda x: -x[0])[:top_n]:
+                lines.append(f"    {tokens:>9}  {path}  [{title}]")
+        return "\n".join(lines)
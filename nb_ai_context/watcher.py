@@ -0,0 +1,285 @@
+"""
+监视模式（AiMdGenerator.watch）的文件变化监视器
+
+- WatchTargets：一次生成用到的目录（merge_from_dir 的目录和它的遍历规则）和文件（merge_from_files 等），
+  判断一个变化的路径会不会影响输出：与 merge_from_dir 相同的排除、gitignore、后缀规则，忽略输出文件自身
+- InotifyWatcher：Linux 下通过 ctypes 调用 libc 的 inotify（标准库没有 inotify 模块），事件驱动，没有轮询延迟
+- PollingWatcher：其他平台或者 inotify 不可用（例如 watch 数量超过 fs.inotify.max_user_watches）时，
+  定时 scandir 比较 mtime 和大小。监视过程中（重新生成后加入目录、自动监视新建的目录）才超过限制时，
+  InotifyWatcher 抛出 WatchLimitError，AiMdGenerator.watch 换成轮询继续监视
+
+两种监视器的接口相同：wait(timeout) 返回 timeout 秒内的变化 [(path, is_dir)]，update(targets) 更新监视范围，close()。
+"""
+
+import ctypes
+import ctypes.util
+import errno
+import logging
+import os
+import select
+import struct
+import sys
+import time
+import typing
+
+from nb_ai_context.dir_walker import PruningDirWalker
+
+# wait() 返回的特殊路径：事件队列溢出，不知道哪些路径有变化
+OVERFLOW = "<overflow>"
+
+Change = typing.Tuple[str, bool]
+
+
+class WatchLimitError(OSError):
+    """超过 inotify 的 watch 数量限制（fs.inotify.max_user_watches）"""
+
+
+class WatchTargets:
+    """
+    一次生成用到的输入，由 AiMdGenerator 在生成过程中记录
+
+    Args:
+        ignored_prefixes: 以这些前缀开头的路径不算输入（输出文件、清单和原子写入的临时文件）
+    """
+
+    def __init__(self, ignored_prefixes: typing.Iterable[str] = ()):
+        self.dirs: typing.List[typing.Tuple[str, PruningDirWalker]] = []
+        self.files: typing.Set[str] = set()
+        self.ignored_prefixes = tuple(os.path.abspath(p) for p in ignored_prefixes)
+
+    def add_dir(self, target_dir: typing.Union[os.PathLike, str], walker: PruningDirWalker) -> "WatchTargets":
+        self.dirs.append((os.path.abspath(os.fspath(target_dir)), walker))
+        return self
+
+    def add_files(self, files: typing.Iterable[typing.Union[os.PathLike, str]]) -> "WatchTargets":
+        self.files.update(os.path.abspath(os.fspath(f)) for f in files)
+        return self
+
+    def watch_dirs(self) -> typing.Set[str]:
+        """需要监视的所有目录：每个目录目标遍历时会进入的目录，以及文件目标所在的目录"""
+        dirs = {os.path.dirname(f) for f in self.files}
+        for target_dir, walker in self.dirs:
+            dirs.update(walker.iter_dirs(target_dir))
+        return dirs
+
+    def is_relevant(self, path: str, is_dir: bool) -> bool:
+        """path 的变化会不会影响输出"""
+        if path == OVERFLOW:
+            return True
+        if path.startswith(self.ignored_prefixes):
+            return False
+        if os.path.basename(path) == ".gitignore":
+            return True
+        if path in self.files:
+            return True
+        return any(walker.is_included_path(target_dir, path, is_dir) for target_dir, walker in self.dirs)
+
+
+class PollingWatcher:
+    """
+    轮询监视器：每 interval 秒 scandir 一遍所有监视的目录，比较文件的 mtime 和大小
+
+    Args:
+        targets: 监视范围
+        interval: 轮询间隔（秒）
+    """
+
+    def __init__(self, targets: WatchTargets, interval: float = 0.5):
+        self.interval = interval
+        self.update(targets)
+
+    def update(self, targets: WatchTargets) -> "PollingWatcher":
+        self.targets = targets
+        self._snapshot = self._scan()
+        return self
+
+    def _scan(self) -> typing.Dict[str, tuple]:
+        snapshot = {}
+        for directory in self.targets.watch_dirs():
+            try:
+                with os.scandir(directory) as it:
+                    for entry in it:
+                        try:
+                            is_dir = entry.is_dir(follow_symlinks=False)
+                            st = entry.stat(follow_symlinks=False)
+                        except OSError:
+                            continue
+                        # 目录的 mtime 只反映直接子项的增删，子项本身也在快照里，所以目录只记录存在
+                        snapshot[entry.path] = (True, 0, 0) if is_dir else (False, st.st_mtime_ns, st.st_size)
+            except OSError:
+                continue
+        return snapshot
+
+    def wait(self, timeout: float = None) -> typing.List[Change]:
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            snapshot = self._scan()
+            old, self._snapshot = self._snapshot, snapshot
+            changes = [(path, state[0]) for path, state in snapshot.items() if old.get(path) != state]
+            changes.extend((path, state[0]) for path, state in old.items() if path not in snapshot)
+            if changes:
+                return changes
+            if deadline is not None:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return []
+                time.sleep(min(self.interval, remaining))
+            else:
+                time.sleep(self.interval)
+
+    def close(self):
+        pass
+
+
+class InotifyWatcher:
+    """
+    inotify 监视器（仅 Linux）：每个监视的目录一个 watch，新建的目录自动加入监视
+
+    Args:
+        targets: 监视范围
+    """
+
+    IN_MODIFY = 0x00000002
+    IN_CLOSE_WRITE = 0x00000008
+    IN_MOVED_FROM = 0x00000040
+    IN_MOVED_TO = 0x00000080
+    IN_CREATE = 0x00000100
+    IN_DELETE = 0x00000200
+    IN_DELETE_SELF = 0x00000400
+    IN_MOVE_SELF = 0x00000800
+    IN_Q_OVERFLOW = 0x00004000
+    IN_IGNORED = 0x00008000
+    IN_ONLYDIR = 0x01000000
+    IN_ISDIR = 0x40000000
+    IN_NONBLOCK = os.O_NONBLOCK if hasattr(os, "O_NONBLOCK") else 0o4000
+    IN_CLOEXEC = 0o2000000
+
+    WATCH_MASK = (IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+                  | IN_DELETE_SELF | IN_MOVE_SELF | IN_ONLYDIR)
+
+    _EVENT_HEADER = struct.Struct("iIII")
+
+    def __init__(self, targets: WatchTargets):
+        if not sys.platform.startswith("linux"):
+            raise OSError(errno.ENOSYS, "inotify is only available on Linux")
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        self._inotify_add_watch = libc.inotify_add_watch
+        self._inotify_add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+        self._inotify_add_watch.restype = ctypes.c_int
+        self._fd = libc.inotify_init1(self.IN_NONBLOCK | self.IN_CLOEXEC)
+        if self._fd < 0:
+            err = ctypes.get_errno()
+            raise OSError(err, f"inotify_init1 failed: {os.strerror(err)}")
+        self._wd_to_dir: typing.Dict[int, str] = {}
+        self._dir_to_wd: typing.Dict[str, int] = {}
+        try:
+            self.update(targets)
+        except BaseException:
+            self.close()
+            raise
+
+    def _add_watch(self, directory: str) -> bool:
+        if directory in self._dir_to_wd:
+            return False
+        wd = self._inotify_add_watch(self._fd, os.fsencode(directory), self.WATCH_MASK)
+        if wd < 0:
+            err = ctypes.get_errno()
+            if err == errno.ENOSPC:
+                # 超过 fs.inotify.max_user_watches，由 create_watcher / AiMdGenerator.watch 退回轮询
+                raise WatchLimitError(err, f"inotify watch limit reached while watching {directory}")
+            return False  # 目录已经被删除等
+        self._wd_to_dir[wd] = directory
+        self._dir_to_wd[directory] = wd
+        return True
+
+    def update(self, targets: WatchTargets) -> "InotifyWatcher":
+        """加入新的监视目录；不再需要的目录保留 watch，它们的事件会被 targets.is_relevant 过滤"""
+        self.targets = targets
+        for directory in targets.watch_dirs():
+            self._add_watch(directory)
+        return self
+
+    def _watch_new_dir(self, directory: str, changes: typing.List[Change]):
+        """
+        新建的目录加入监视。加入之前已经写入其中的文件不会产生事件，扫描一遍当作变化
+        """
+        stack = [directory]
+        while stack:
+            current = stack.pop()
+            if not self.targets.is_relevant(current, True) or not self._add_watch(current):
+                continue
+            try:
+                with os.scandir(current) as it:
+                    for entry in it:
+                        is_dir = entry.is_dir(follow_symlinks=False)
+                        changes.append((entry.path, is_dir))
+                        if is_dir:
+                            stack.append(entry.path)
+            except OSError:
+                continue
+
+    def _read_events(self) -> typing.List[Change]:
+        changes = []
+        while True:
+            try:
+                data = os.read(self._fd, 65536)
+            except BlockingIOError:
+                break
+            if not data:
+                break
+            offset = 0
+            header_size = self._EVENT_HEADER.size
+            while offset + header_size <= len(data):
+                wd, mask, _, name_len = self._EVENT_HEADER.unpack_from(data, offset)
+                name = data[offset + header_size:offset + header_size + name_len].rstrip(b"\x00")
+                offset += header_size + name_len
+                if mask & self.IN_Q_OVERFLOW:
+                    changes.append((OVERFLOW, False))
+                    continue
+                directory = self._wd_to_dir.get(wd)
+                if directory is None:
+                    continue
+                if mask & self.IN_IGNORED:
+                    # 目录被删除或者所在的文件系统被卸载，watch 已经自动移除
+                    del self._wd_to_dir[wd]
+                    self._dir_to_wd.pop(directory, None)
+                    continue
+                is_dir = bool(mask & self.IN_ISDIR)
+                path = os.path.join(directory, os.fsdecode(name)) if name else directory
+                if mask & (self.IN_DELETE_SELF | self.IN_MOVE_SELF):
+                    is_dir = True
+                changes.append((path, is_dir))
+                if is_dir and name and mask & (self.IN_CREATE | self.IN_MOVED_TO):
+                    self._watch_new_dir(path, changes)
+        return changes
+
+    def wait(self, timeout: float = None) -> typing.List[Change]:
+        readable, _, _ = select.select([self._fd], [], [], timeout)
+        if not readable:
+            return []
+        return self._read_events()
+
+    def close(self):
+        if self._fd >= 0:
+            os.close(self._fd)
+            self._fd = -1
+
+    def __del__(self):
+        if getattr(self, "_fd", -1) >= 0:
+            self.close()
+
+
+def create_watcher(
+    targets: WatchTargets,
+    use_inotify: bool = True,
+    poll_interval: float = 0.5,
+    logger: logging.Logger = None,
+) -> typing.Union[InotifyWatcher, PollingWatcher]:
+    """优先使用 inotify，不可用时退回轮询"""
+    if use_inotify:
+        try:
+            return InotifyWatcher(targets)
+        except (OSError, AttributeError) as e:
+            if logger is not None:
+                logger.warning(f"inotify is not available ({e}), falling back to polling every {poll_interval}s")
+    return PollingWatcher(targets, poll_interval)
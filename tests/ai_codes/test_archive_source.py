@@ -0,0 +1,105 @@
+"""
+测试直接从 .zip / .tar.gz 归档生成：结果与解压后生成的相同，过滤掉的成员不会被读取
+"""
+import io
+import os
+import tarfile
+import tempfile
+import zipfile
+
+import pytest
+
+from nb_ai_context import AiMdGenerator
+from nb_ai_context.archive_source import ArchiveError, ArchiveSource
+from nb_ai_context.contrib.gen_github_proj_ai_md import build_docs_and_codes_ai_md_from_archive
+
+FILES = {
+    "README.md": b"# demo\n",
+    "docs/guide.md": b"guide\r\nline 2\n",
+    "docs/img/logo.png": b"\x89PNG\x00\x00",
+    "demo/__init__.py": b"from demo.core import run\n",
+    "demo/core.py": b"import os\r\n\r\n\r\ndef run(x):\r\n    '''run it'''\r\n    return os.path.join(x)\r\n",
+    "demo/data.bin": b"\x00\x01binary",
+    "demo/sub/util.py": b"from ..core import run\n",
+    "node_modules/dep/index.js": b"module.exports = 1\n",
+}
+
+
+def _make_tree(root):
+    for rel, data in FILES.items():
+        path = os.path.join(root, "demo-main", *rel.split("/"))
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "wb") as f:
+            f.write(data)
+    return os.path.join(root, "demo-main")
+
+
+def _make_zip(path):
+    with zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED) as zf:
+        zf.writestr("demo-main/", b"")
+        for rel, data in FILES.items():
+            zf.writestr(f"demo-main/{rel}", data)
+        link = zipfile.ZipInfo("demo-main/demo/link.py")
+        link.external_attr = (0o120777 << 16)
+        zf.writestr(link, b"core.py")
+        zf.writestr("../evil.py", b"x = 1\n")
+
+
+def _make_tar_gz(path):
+    with tarfile.open(path, "w:gz") as tf:
+        for rel, data in FILES.items():
+            info = tarfile.TarInfo(f"demo-main/{rel}")
+            info.size = len(data)
+            tf.addfile(info, io.BytesIO(data))
+
+
+def _build_docs_and_codes(project_root, output, archive=None):
+    generator = AiMdGenerator(output).set_project_propery("demo", project_root, archive=archive)
+    generator.clear_text().merge_from_files(["README.md"], as_title="demo  README")
+    for name, title in [("docs", "Documentation"), ("demo", "Source Code")]:
+        generator.merge_from_dir(name, as_title=f"demo  {title}", should_include_suffixes=[".py", ".md"], use_gitignore=False)
+    return generator.add_file_dependencies()
+
+
+@pytest.mark.parametrize("make_archive,name", [(_make_zip, "repo.zip"), (_make_tar_gz, "repo.tar.gz")])
+def test_archive_build_equals_extracted(make_archive, name):
+    with tempfile.TemporaryDirectory() as root:
+        extracted = _make_tree(root)
+        archive = os.path.join(root, name)
+        make_archive(archive)
+        expected = _build_docs_and_codes(extracted, os.path.join(root, "extracted.md")).read_bytes()
+        virtual_root = os.path.join(root, "not-extracted")
+        assert _build_docs_and_codes(virtual_root, os.path.join(root, "archive.md"), archive=archive).read_bytes() == expected
+        assert not os.path.exists(virtual_root)
+
+        with open(archive, "rb") as f:
+            data = f.read()
+        contrib = build_docs_and_codes_ai_md_from_archive(
+            data, "demo", os.path.join(root, "contrib.md"), "docs", "demo", "README.md", [".py", ".md"],
+        )
+        assert "run it" in contrib.read_text(encoding="utf-8-sig")
+
+
+def test_archive_source_filters_before_reading():
+    with tempfile.TemporaryDirectory() as root:
+        archive = os.path.join(root, "repo.zip")
+        _make_zip(archive)
+        source = ArchiveSource(archive, os.path.join(root, "proj"), include_dirs=["demo"], include_files=["README.md"],
+                               should_include_suffixes=[".py"])
+        try:
+            proj = os.path.realpath(os.path.join(root, "proj"))
+            assert sorted(source.iter_files(proj)) == ["README.md", "demo/__init__.py", "demo/core.py", "demo/sub/util.py"]
+            assert source.is_dir(os.path.join(proj, "demo", "sub")) and not source.exists(os.path.join(proj, "docs"))
+            assert source.size(os.path.join(proj, "demo", "core.py")) == len(FILES["demo/core.py"])
+            assert source.reads == 0
+            assert source.read_text(os.path.join(proj, "demo", "core.py")).startswith("import os\n\n\ndef run")
+            with pytest.raises(FileNotFoundError):
+                source.read_bytes(os.path.join(proj, "docs", "guide.md"))
+        finally:
+            source.close()
+
+        not_archive = os.path.join(root, "plain.txt")
+        with open(not_archive, "w") as f:
+            f.write("hello")
+        with pytest.raises(ArchiveError):
+            ArchiveSource(not_archive, root)
@@ -0,0 +1,133 @@
+"""
+测试 SQLite AST 元数据缓存：热重建跳过所有 AST 解析，版本号、内容变化会失效，超出大小按 LRU 淘汰
+"""
+import os
+import tempfile
+
+from nb_ai_context import AiMdGenerator
+from nb_ai_context import ast_cache, module_registry
+from nb_ai_context.ast_cache import AstMetadataCache
+from nb_ai_context.module_registry import ModuleRegistry
+
+files = {
+    "pkg/__init__.py": "from .core import Core\n",
+    "pkg/core.py": '"""core"""\nimport os\n\nMAX = 3\n\nclass Core:\n    """核心类"""\n    def run(self, x: int = 1) -> int:\n        return x\n',
+}
+
+
+def _make_project(root):
+    for rel, content in files.items():
+        path = os.path.join(root, *rel.split("/"))
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(content)
+
+
+def _build(root, cache_dir, name):
+    generator = AiMdGenerator(os.path.join(root, name)).set_project_propery("demo", root, cache_dir=cache_dir)
+    generator.clear_text().add_project_summary("summary", sorted(files)).merge_from_files_with_metadata(
+        sorted(files), as_title="codes"
+    )
+    return generator
+
+
+def _count_parses(monkeypatch):
+    counter = []
+    real_parse = module_registry.ast_extractor.parse_python_source
+
+    def counting_parse(source_code, filename="<unknown>"):
+        counter.append(filename)
+        return real_parse(source_code, filename)
+
+    monkeypatch.setattr(module_registry.ast_extractor, "parse_python_source", counting_parse)
+    return counter
+
+
+def test_warm_rebuild_skips_ast_work(monkeypatch):
+    with tempfile.TemporaryDirectory() as root:
+        _make_project(root)
+        cache_dir = os.path.join(root, ".cache")
+        parses = _count_parses(monkeypatch)
+
+        cold = _build(root, cache_dir, "cold.md")
+        assert len(parses) == len(files)
+
+        del parses[:]
+        warm = _build(root, cache_dir, "warm.md")
+        assert parses == []
+        assert warm.module_registry.stats()["ast_cache"]["entries"] == len(files)
+        assert warm.read_text().split("\n", 4)[4] == cold.read_text().split("\n", 4)[4]
+        # 嵌套定义也从缓存取回
+        core = warm.module_registry.get(os.path.join(root, "pkg", "core.py"))
+        assert [d["qualname"] for d in core.nested_definitions] == ["Core.run"]
+        AstMetadataCache.for_dir(cache_dir).close()
+
+
+def test_touch_hash_and_version_invalidation(monkeypatch):
+    with tempfile.TemporaryDirectory() as root:
+        _make_project(root)
+        path = os.path.join(root, "pkg", "core.py")
+        cache = AstMetadataCache(os.path.join(root, ".cache"))
+        parses = _count_parses(monkeypatch)
+
+        first = ModuleRegistry(ast_cache=cache).get(path).metadata
+        # 只改 mtime，内容哈希相同，仍然命中
+        os.utime(path, ns=(0, 10 ** 9))
+        assert ModuleRegistry(ast_cache=cache).get(path).metadata == first
+        assert len(parses) == 1
+
+        # 内容变化（大小相同）
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(files["pkg/core.py"].replace("x: int = 1", "x: int = 2"))
+        os.utime(path, ns=(0, 2 * 10 ** 9))
+        assert ModuleRegistry(ast_cache=cache).get(path).metadata["classes"] != first["classes"]
+        assert len(parses) == 2
+
+        # 提取器版本升级后旧记录失效
+        monkeypatch.setattr(ast_cache, "EXTRACTOR_VERSION", ast_cache.EXTRACTOR_VERSION + 1)
+        ModuleRegistry(ast_cache=cache).get(path).metadata
+        assert len(parses) == 3
+        cache.close()
+
+
+def test_lru_eviction():
+    with tempfile.TemporaryDirectory() as root:
+        cache = AstMetadataCache(root, max_bytes=10 ** 9)
+        for i in range(5):
+            cache.put(f"/p/{i}.py", i, 10, "x", {"classes": [], "n": "x" * 100}, [("os", 0)])
+        cache.get("/p/0.py", 0, 10, "x")  # 0 变成最近使用
+        cache.max_bytes = cache.total_bytes() - 1
+        cache.put("/p/5.py", 5, 10, "x", {"classes": [], "n": "x" * 100}, [])
+        assert cache.get("/p/0.py", 0, 10, "x") == ({"classes": [], "n": "x" * 100}, [("os", 0)], [])
+        # 只淘汰最久没用到的 1
+        assert cache.get("/p/1.py", 1, 10, "x") is None
+        assert len(cache) == 5
+        assert cache.total_bytes() <= cache.max_bytes
+        cache.close()
+
+
+def test_running_total_without_table_scans():
+    with tempfile.TemporaryDirectory() as root:
+        cache = AstMetadataCache(root, max_bytes=10 ** 9)
+        statements = []
+        cache._conn.set_trace_callback(statements.append)
+        for i in range(50):
+            cache.put(f"/p/{i}.py", i, 10, "x", {"n": "x" * (i % 7)}, [])
+        # 覆盖已有的记录时减去旧的大小
+        cache.put("/p/0.py", 0, 10, "x", {"n": "y" * 300}, [])
+        cache.max_bytes = cache.total_bytes() // 2
+        cache.put("/p/50.py", 50, 10, "x", {"n": ""}, [])
+        assert not any("SUM(" in s for s in statements)
+        cache._conn.set_trace_callback(None)
+
+        actual = cache._conn.execute("SELECT SUM(nbytes) FROM ast_metadata").fetchone()[0]
+        assert cache.total_bytes() == actual <= cache.max_bytes
+        assert cache.get("/p/0.py", 0, 10, "x") is not None and cache.get("/p/1.py", 1, 10, "x") is None
+        assert cache.clear().total_bytes() == 0 and len(cache) == 0
+        cache.close()
+
+        # 重新打开时总大小从表中读取
+        cache = AstMetadataCache(root)
+        cache.put("/p/a.py", 1, 10, "x", {}, [])
+        assert AstMetadataCache(root).total_bytes() == cache.total_bytes() > 0
+        cache.close()
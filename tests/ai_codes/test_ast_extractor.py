@@ -0,0 +1,129 @@
+"""
+测试单次遍历的 AST 元数据提取引擎，结果必须与旧版嵌套 ast.walk 的实现完全一致
+"""
+import ast
+import tempfile
+import os
+
+from nb_path import NbPath
+
+from nb_ai_context import AiMdGenerator
+from nb_ai_context.ast_extractor import (
+    ModuleAstExtractor,
+    extract_class_metadata,
+    extract_function_metadata,
+    extract_import_records,
+    extract_module_metadata,
+)
+
+test_code = '''
+"""模块文档"""
+import os
+import sys as system
+from typing import List, Optional
+
+
+class Outer(object):
+    """外层类"""
+    x: int = 1
+    y = "abc"
+
+    class Inner:
+        def inner_method(self):
+            class DeepInMethod:
+                pass
+
+    def method(self, a: int, b: str = "b", *args, **kwargs) -> bool:
+        import json
+
+        def helper_in_method():
+            pass
+        return True
+
+    @property
+    def prop(self) -> int:
+        return 1
+
+
+def top_func(a, b=2):
+    """顶级函数"""
+    from collections import OrderedDict
+
+    def nested_func():
+        class ClassInFunc:
+            def method_of_class_in_func(self):
+                pass
+        return ClassInFunc
+
+    return nested_func
+
+
+async def async_top(x: Optional[List[str]] = None):
+    pass
+
+
+if sys.version_info > (3,):
+    def conditional_func():
+        pass
+'''
+
+
+def _legacy_extract(tree, file):
+    """旧版 _parse_python_file_ast 的遍历逻辑，用作对照"""
+    metadata = {
+        "file": str(file),
+        "module_docstring": ast.get_docstring(tree) or "",
+        "classes": [],
+        "functions": [],
+        "imports": [],
+        "constants": [],
+    }
+    for node in ast.walk(tree):
+        if isinstance(node, ast.ClassDef):
+            parent = None
+            for potential_parent in ast.walk(tree):
+                if isinstance(potential_parent, ast.ClassDef) and node in ast.walk(potential_parent) and node != potential_parent:
+                    parent = potential_parent
+                    break
+            if parent is None:
+                metadata["classes"].append(extract_class_metadata(node))
+        elif isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)):
+            parent_class = None
+            for potential_parent in ast.walk(tree):
+                if isinstance(potential_parent, ast.ClassDef) and node in ast.walk(potential_parent):
+                    parent_class = potential_parent
+                    break
+            if parent_class is None:
+                metadata["functions"].append(extract_function_metadata(node))
+        elif isinstance(node, (ast.Import, ast.ImportFrom)):
+            metadata["imports"].extend(extract_import_records(node))
+    return metadata
+
+
+def test_metadata_identical_to_legacy():
+    tree = ast.parse(test_code)
+    assert extract_module_metadata(tree, "demo.py") == _legacy_extract(tree, "demo.py")
+
+
+def test_nested_definitions_qualnames():
+    extractor = ModuleAstExtractor(ast.parse(test_code), "demo.py")
+    extractor.extract()
+    qualnames = {d["qualname"] for d in extractor.nested_definitions}
+    assert "Outer.Inner" in qualnames
+    assert "Outer.Inner.inner_method.<locals>.DeepInMethod" in qualnames
+    assert "Outer.method.<locals>.helper_in_method" in qualnames
+    assert "top_func.<locals>.nested_func" in qualnames
+    assert "top_func.<locals>.nested_func.<locals>.ClassInFunc.method_of_class_in_func" in qualnames
+    # 模块顶层定义（包括 if 块里的）不算嵌套定义
+    assert "top_func" not in qualnames
+    assert "conditional_func" not in qualnames
+
+
+def test_parse_python_file_ast_uses_extractor():
+    with tempfile.TemporaryDirectory() as temp_dir:
+        py_file = NbPath(temp_dir) / "demo.py"
+        py_file.write_bytes(b"\xef\xbb\xbf" + test_code.encode("utf-8"))
+        generator = AiMdGenerator(os.path.join(temp_dir, "out.md"))
+        metadata = generator._parse_python_file_ast(py_file)
+        assert metadata == _legacy_extract(ast.parse(test_code), py_file)
+        assert [c["name"] for c in metadata["classes"]] == ["Outer", "ClassInFunc"]
@@ -0,0 +1,66 @@
+"""
+测试 generator.stats：分阶段的耗时、文件数、字节数和 Chrome trace 导出
+"""
+import json
+import os
+import tempfile
+
+from nb_ai_context import AiMdGenerator
+
+
+def _make_project(root):
+    files = {
+        "pkg/__init__.py": "from .core import Core\n",
+        "pkg/core.py": "import os\n\nclass Core:\n    def run(self):\n        return os.getcwd()\n",
+        "pkg/util.py": "from .core import Core\n\ndef make():\n    return Core()\n",
+        "pkg/README.md": "# pkg\n\n中文说明\n",
+    }
+    for rel, content in files.items():
+        path = os.path.join(root, *rel.split("/"))
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(content)
+
+
+def test_stage_stats_and_chrome_trace():
+    with tempfile.TemporaryDirectory() as root:
+        _make_project(root)
+        generator = AiMdGenerator(os.path.join(root, "out.md")).set_project_propery("demo", root, trace=True)
+        generator.clear_text().merge_from_dir("pkg", as_title="pkg", use_gitignore=False).add_file_dependencies()
+
+        stats = generator.stats.to_dict()
+        stages = stats["stages"]
+        assert stages["merge_from_dir"]["calls"] == 1
+        assert stages["merge_from_files_with_metadata"]["calls"] == 1
+        assert stages["add_file_dependencies"]["calls"] == 1
+        assert stages["scan"]["files"] == 4
+        assert stages["is_text"]["files"] == 4
+        # 每个 .py 文件只读取、解析一次，README.md 单独读取
+        assert stages["read"]["files"] == 4
+        assert stages["parse"]["files"] == 3
+        assert stages["render"]["files"] == 3
+        # 输出文件开头的 BOM 之外的所有字节都经过 write 阶段
+        assert stages["write"]["bytes"] == os.path.getsize(os.path.join(root, "out.md")) - 3
+        assert stats["caches"]["module_registry"]["misses"] == 3
+        assert stats["caches"]["module_registry"]["hits"] > 0
+
+        trace_path = generator.stats.export_chrome_trace(os.path.join(root, "out.trace.json"))
+        with open(trace_path, encoding="utf-8") as f:
+            events = json.load(f)["traceEvents"]
+        names = [e["name"] for e in events]
+        assert {"merge_from_dir", "scan", "is_text", "read", "parse", "render"} <= set(names)
+        assert all(e["ph"] == "X" and e["dur"] >= 0 for e in events)
+        merge_event = events[names.index("merge_from_dir")]
+        parse_event = events[names.index("parse")]
+        assert merge_event["ts"] <= parse_event["ts"] <= merge_event["ts"] + merge_event["dur"]
+        assert "merge_from_dir" in generator.stats.format_report()
+
+
+def test_file_events_only_with_trace():
+    with tempfile.TemporaryDirectory() as root:
+        _make_project(root)
+        generator = AiMdGenerator(os.path.join(root, "out.md")).set_project_propery("demo", root)
+        generator.clear_text().merge_from_dir("pkg", as_title="pkg", use_gitignore=False)
+        names = {e["name"] for e in generator.stats.to_chrome_trace()["traceEvents"]}
+        assert names == {"merge_from_dir", "merge_from_files_with_metadata", "scan"}
+        assert generator.stats.to_dict()["stages"]["parse"]["files"] == 3
@@ -0,0 +1,75 @@
+"""
+测试并发读取：结果按原始顺序产出，在途字节数有上限，异常按顺序抛出，输出与串行读取一致
+"""
+import os
+import random
+import tempfile
+import threading
+import time
+
+import pytest
+
+from nb_ai_context import AiMdGenerator
+from nb_ai_context.concurrent_reader import ordered_map
+
+
+def test_ordered_map_keeps_order_and_bounds_inflight_bytes():
+    lock = threading.Lock()
+    state = {"inflight": 0, "max_inflight": 0}
+
+    def slow_read(item):
+        time.sleep(random.random() / 200)
+        with lock:
+            state["inflight"] += item[1]
+            state["max_inflight"] = max(state["max_inflight"], state["inflight"])
+        return item
+
+    items = [(i, 10) for i in range(60)]
+    results = []
+    for item in ordered_map(slow_read, items, concurrency=8, max_inflight_bytes=35, size_func=lambda x: x[1]):
+        results.append(item[0])
+        with lock:
+            state["inflight"] -= item[1]
+    assert results == list(range(60))
+    assert state["max_inflight"] <= 30
+
+    # 单个超过上限的任务也能被处理
+    assert list(ordered_map(lambda x: x, [100, 1], 4, max_inflight_bytes=10, size_func=lambda x: x)) == [100, 1]
+
+
+def test_ordered_map_raises_in_order():
+    def read(i):
+        if i in (3, 7):
+            raise ValueError(i)
+        return i
+
+    results = []
+    with pytest.raises(ValueError) as exc_info:
+        for r in ordered_map(read, range(10), concurrency=4):
+            results.append(r)
+    assert results == [0, 1, 2]
+    assert exc_info.value.args == (3,)
+
+
+def test_concurrent_merge_matches_serial():
+    with tempfile.TemporaryDirectory() as root:
+        names = []
+        for i in range(30):
+            name = f"f{i:02d}.{'py' if i % 2 else 'md'}"
+            with open(os.path.join(root, name), "w", encoding="utf-8") as f:
+                f.write(f"x{i} = {'1' * (i * 50)}\n")
+            names.append(name)
+
+        outputs = []
+        for read_concurrency in (1, 6):
+            generator = AiMdGenerator(os.path.join(root, "out", f"{read_concurrency}.md"))
+            generator.set_project_propery("demo", root, read_concurrency=read_concurrency, read_max_inflight_bytes=500)
+            with generator.ensure_parent().clear_text().output_session():
+                generator.merge_from_files(names, as_title="plain")
+                generator.merge_from_files_with_metadata(list(reversed(names)), as_title="meta")
+            outputs.append(generator.read_bytes())
+        assert outputs[0] == outputs[1]
+
+        generator = AiMdGenerator(os.path.join(root, "out", "missing.md")).set_project_propery("demo", root)
+        with pytest.raises(FileNotFoundError):
+            generator.merge_from_files(names[:5] + ["missing.py"] + names[5:], as_title="x", read_concurrency=4)
@@ -0,0 +1,70 @@
+"""
+测试 PruningDirWalker：被排除和被 gitignore 的目录不会被进入，过滤结果与统计信息正确
+"""
+import os
+import tempfile
+
+from nb_ai_context import dir_walker
+from nb_ai_context.dir_walker import PruningDirWalker
+from nb_ai_context.gitignore_matcher import GitIgnoreMatcher
+
+tree_files = {
+    "src/a.py": "print(1)",
+    "src/b.md": "# b",
+    "src/c.txt": "c",
+    "src/bin.py": "\x00\x01",
+    "src/pkg/d.py": "d = 1",
+    "src/pkg/__pycache__/d.cpython-311.pyc": "x",
+    "src/node_modules/lib/e.py": "e",
+    "src/vendor/f.py": "f",
+    "src/vendor/deep/g.py": "g",
+    "src/skip_me.py": "skip",
+}
+
+
+def _make_tree(root):
+    for rel, content in tree_files.items():
+        abs_path = os.path.join(root, *rel.split("/"))
+        os.makedirs(os.path.dirname(abs_path), exist_ok=True)
+        with open(abs_path, "w", encoding="utf-8") as f:
+            f.write(content)
+    with open(os.path.join(root, ".gitignore"), "w", encoding="utf-8") as f:
+        f.write("__pycache__/\nnode_modules/\n")
+
+
+def test_walker_prunes_and_filters(monkeypatch):
+    with tempfile.TemporaryDirectory() as root:
+        root = os.path.realpath(root)
+        _make_tree(root)
+        scanned_dirs = []
+        real_scandir = os.scandir
+
+        def recording_scandir(path):
+            if isinstance(path, str):
+                scanned_dirs.append(os.path.relpath(path, root).replace(os.sep, "/"))
+            return real_scandir(path)
+
+        monkeypatch.setattr(dir_walker.os, "scandir", recording_scandir)
+
+        walker = PruningDirWalker(
+            root,
+            gitignore_matcher=GitIgnoreMatcher(root),
+            excluded_dir_paths=[os.path.join(root, "src", "vendor")],
+            excluded_file_paths=[os.path.join(root, "src", "skip_me.py")],
+            should_include_suffixes=[".py", ".md"],
+        )
+        walked = list(walker.walk(os.path.join(root, "src")))
+
+        assert [f.relative_path for f in walked] == ["src/a.py", "src/b.md", "src/pkg/d.py"]
+        assert walked[0].size == len("print(1)")
+        # 被剪掉的目录不会被 scandir
+        assert scanned_dirs == ["src", "src/pkg"]
+
+        stats = walker.stats
+        assert stats.dirs_pruned_gitignore == 2
+        assert stats.dirs_pruned_excluded == 1
+        assert stats.dirs_pruned == 3
+        assert stats.files_skipped_binary == 1
+        assert stats.files_skipped_suffix == 1
+        assert stats.files_skipped_excluded == 1
+        assert stats.files_pruned == stats.files_seen - 3
@@ -0,0 +1,135 @@
+"""
+测试下载缓存：用本地的 http.server 代替 codeload.github.com
+"""
+import hashlib
+import os
+import tempfile
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from nb_ai_context.download_cache import DownloadCache, DownloadError, is_immutable_url
+
+
+class _Handler(BaseHTTPRequestHandler):
+    # {path: bytes}，由测试设置
+    files = {}
+    requests = []
+    truncate_next = 0  # 下一次完整响应只发送这么多字节就断开
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        type(self).requests.append((self.path, dict(self.headers)))
+        data = self.files.get(self.path)
+        if data is None:
+            self.send_error(404)
+            return
+        etag = '"%s"' % hashlib.sha1(data).hexdigest()
+        if self.headers.get("If-None-Match") == etag:
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.end_headers()
+            return
+        start = 0
+        range_header = self.headers.get("Range")
+        if range_header and self.headers.get("If-Range") == etag:
+            start = int(range_header.split("=")[1].rstrip("-"))
+            self.send_response(206)
+            self.send_header("Content-Range", f"bytes {start}-{len(data) - 1}/{len(data)}")
+        else:
+            self.send_response(200)
+        self.send_header("ETag", etag)
+        self.send_header("Content-Length", str(len(data) - start))
+        self.end_headers()
+        body = data[start:]
+        if type(self).truncate_next:
+            body, type(self).truncate_next = body[:type(self).truncate_next], 0
+            self.wfile.write(body)
+            self.wfile.flush()
+            self.close_connection = True
+            return
+        self.wfile.write(body)
+
+
+@pytest.fixture
+def server():
+    handler = type("Handler", (_Handler,), {"files": {}, "requests": [], "truncate_next": 0})
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield handler, f"http://127.0.0.1:{httpd.server_address[1]}"
+    finally:
+        httpd.shutdown()
+        httpd.server_close()
+
+
+def test_immutable_urls():
+    assert is_immutable_url("https://codeload.github.com/fastapi/sqlmodel/zip/refs/tags/0.0.25")
+    assert is_immutable_url("https://codeload.github.com/a/b/tar.gz/" + "a" * 40)
+    assert not is_immutable_url("https://codeload.github.com/fastapi/sqlmodel/zip/refs/heads/main")
+
+
+def test_tag_is_cached_and_branch_is_revalidated(server):
+    handler, base = server
+    handler.files["/o/r/zip/refs/tags/1.0"] = b"tag archive"
+    handler.files["/o/r/zip/refs/heads/main"] = b"main v1"
+    with tempfile.TemporaryDirectory() as cache_dir:
+        cache = DownloadCache(cache_dir)
+        tag_url, branch_url = base + "/o/r/zip/refs/tags/1.0", base + "/o/r/zip/refs/heads/main"
+        for _ in range(3):
+            with open(cache.fetch(tag_url), "rb") as f:
+                assert f.read() == b"tag archive"
+        assert [p for p, _ in handler.requests].count("/o/r/zip/refs/tags/1.0") == 1
+
+        assert open(cache.fetch(branch_url), "rb").read() == b"main v1"
+        assert open(cache.fetch(branch_url), "rb").read() == b"main v1"
+        assert "If-None-Match" in handler.requests[-1][1]
+        handler.files["/o/r/zip/refs/heads/main"] = b"main v2"
+        assert open(cache.fetch(branch_url), "rb").read() == b"main v2"
+        assert cache.stats()["hits"] == 2 and cache.stats()["not_modified"] == 1 and cache.stats()["downloads"] == 3
+
+        with pytest.raises(DownloadError):
+            cache.fetch(base + "/missing")
+
+
+def test_resume_and_eviction(server):
+    handler, base = server
+    data = os.urandom(300 * 1024)
+    handler.files["/big/zip/refs/tags/1"] = data
+    with tempfile.TemporaryDirectory() as cache_dir:
+        cache = DownloadCache(cache_dir, max_bytes=500 * 1024)
+        handler.truncate_next = 100 * 1024
+        path = cache.fetch(base + "/big/zip/refs/tags/1")
+        assert open(path, "rb").read() == data
+        assert cache.stats()["resumed"] == 1
+        assert handler.requests[-1][1]["Range"] == f"bytes={100 * 1024}-"
+
+        handler.files["/other/zip/refs/tags/1"] = os.urandom(300 * 1024)
+        other = cache.fetch(base + "/other/zip/refs/tags/1")
+        # 超过上限，最早使用的条目被淘汰，刚刚下载的保留
+        assert os.path.exists(other) and not os.path.exists(path)
+
+
+def test_pinned_entries_are_not_evicted(server):
+    handler, base = server
+    for name in ("a", "b", "c"):
+        handler.files[f"/{name}/zip/refs/tags/1"] = os.urandom(300 * 1024)
+    with tempfile.TemporaryDirectory() as cache_dir:
+        cache = DownloadCache(cache_dir, max_bytes=500 * 1024)
+        a_url = base + "/a/zip/refs/tags/1"
+        a = cache.fetch(a_url, pin=True)
+        cache.fetch(a_url, pin=True)
+        b = cache.fetch(base + "/b/zip/refs/tags/1")
+        # 超过上限，但 a 还在使用中
+        assert os.path.exists(a) and os.path.exists(b)
+        c = cache.fetch(base + "/c/zip/refs/tags/1")
+        assert os.path.exists(a) and not os.path.exists(b) and os.path.exists(c)
+        cache.unpin(a_url)
+        assert os.path.exists(a)
+        # 最后一个引用释放后按最近使用时间淘汰
+        cache.unpin(a_url)
+        assert not os.path.exists(a) and os.path.exists(c)
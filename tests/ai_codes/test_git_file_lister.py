@@ -0,0 +1,103 @@
+"""
+测试基于 git 索引的文件枚举：结果和顺序与 PruningDirWalker + GitIgnoreMatcher 相同
+"""
+import os
+import shutil
+import subprocess
+import tempfile
+
+import pytest
+
+from nb_ai_context import AiMdGenerator
+from nb_ai_context.dir_walker import PruningDirWalker
+from nb_ai_context.git_file_lister import GitFileLister, GitListError
+from nb_ai_context.gitignore_matcher import GitIgnoreMatcher
+
+pytestmark = pytest.mark.skipif(shutil.which("git") is None, reason="git is not installed")
+
+
+def _write(root, rel, content="x = 1\n", mode="w"):
+    path = os.path.join(root, *rel.split("/"))
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, mode) as f:
+        f.write(content)
+
+
+def _git(root, *args):
+    subprocess.run(["git", "-C", root, *args], check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+
+def _make_repo(root):
+    _git(root, "init", "-q")
+    _write(root, ".gitignore", "*.log\nbuild/\n/app/generated/\n!keep.log\n")
+    _write(root, "app/.gitignore", "local_*.py\n")
+    for rel in ["app/main.py", "app/a_b.py", "app/a/x.py", "app/a/b/y.py", "app/z.md", "app/keep.log",
+                "app/generated/g.py", "app/node/n.py", "app/sub.dir/s.py", "README.md"]:
+        _write(root, rel)
+    _write(root, "app/image.bin", b"\x00\x01binary", mode="wb")
+    _git(root, "add", "-A")
+    # 被跟踪但匹配 .gitignore 的文件：遍历器会忽略它，git 枚举也要忽略
+    _write(root, "app/tracked.log")
+    _git(root, "add", "-f", "app/tracked.log")
+    _git(root, "-c", "user.name=t", "-c", "user.email=t@t", "commit", "-q", "-m", "init")
+    # 未跟踪的文件：没有被忽略的要列出
+    _write(root, "app/new.py")
+    _write(root, "app/local_settings.py")
+    _write(root, "app/debug.log")
+    _write(root, "app/build/out.py")
+    # 被跟踪但在工作区中被删除
+    os.remove(os.path.join(root, "app", "z.md"))
+
+
+def _walk(root, target, **kwargs):
+    walker = PruningDirWalker(root, gitignore_matcher=GitIgnoreMatcher(root), **kwargs)
+    return [tuple(f) for f in walker.walk(os.path.join(root, target))]
+
+
+def _list(root, target, **kwargs):
+    return [tuple(f) for f in GitFileLister(root, root, **kwargs).walk(os.path.join(root, target))]
+
+
+@pytest.mark.parametrize("kwargs", [
+    {},
+    {"should_include_suffixes": [".py"]},
+    {"excluded_dir_paths": ["<root>/app/a"], "excluded_file_paths": ["<root>/app/main.py"]},
+])
+def test_same_files_and_order_as_walker(kwargs):
+    with tempfile.TemporaryDirectory() as root:
+        root = os.path.realpath(root)
+        _make_repo(root)
+        kwargs = {k: [p.replace("<root>", root) for p in v] if k.startswith("excluded") else v for k, v in kwargs.items()}
+        for target in ["", "app", "app/a"]:
+            assert _list(root, target, **kwargs) == _walk(root, target, **kwargs)
+        names = [f[0] for f in _list(root, "app", **kwargs)]
+        assert "app/new.py" in names
+        for ignored in ["app/tracked.log", "app/debug.log", "app/local_settings.py", "app/generated/g.py", "app/z.md"]:
+            assert ignored not in names
+
+
+def test_merge_from_dir_uses_git_and_falls_back():
+    with tempfile.TemporaryDirectory() as root:
+        root = os.path.realpath(root)
+        _make_repo(root)
+        outputs = {}
+        for enumerator in ["git", "walk", "auto"]:
+            generator = AiMdGenerator(os.path.join(root, f"{enumerator}.md")).set_project_propery("demo", root)
+            generator.clear_text().merge_from_dir("app", as_title="app", file_enumerator=enumerator)
+            outputs[enumerator] = generator.read_bytes()
+        assert outputs["git"] == outputs["walk"] == outputs["auto"]
+
+        # project_root 是 git 仓库的子目录
+        sub = AiMdGenerator(os.path.join(root, "sub.md")).set_project_propery("demo", os.path.join(root, "app"))
+        sub.clear_text().merge_from_dir("a", as_title="a", file_enumerator="git")
+        assert "a/b/y.py" in sub.read_text(encoding="utf-8-sig")
+
+    with tempfile.TemporaryDirectory() as root:
+        # 只有 .gitignore 没有 .git：auto 退回遍历，git 报错
+        _write(root, ".gitignore", "*.log\n")
+        _write(root, "app/main.py")
+        generator = AiMdGenerator(os.path.join(root, "out.md")).set_project_propery("demo", root)
+        generator.clear_text().merge_from_dir("app", as_title="app")
+        assert "app/main.py" in generator.read_text(encoding="utf-8-sig")
+        with pytest.raises(GitListError):
+            generator.merge_from_dir("app", as_title="app", file_enumerator="git")
@@ -0,0 +1,101 @@
+"""
+测试从 git 版本生成上下文：结果与检出该版本后生成的相同，工作区的修改不影响结果
+"""
+import os
+import shutil
+import subprocess
+import tempfile
+
+import pytest
+
+from nb_ai_context import AiMdGenerator
+from nb_ai_context.git_revision import GitRevisionError, SourceLister, GitRevisionSource
+
+pytestmark = pytest.mark.skipif(shutil.which("git") is None, reason="git is not installed")
+
+
+def _write(root, rel, content, mode="w"):
+    path = os.path.join(root, *rel.split("/"))
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, mode) as f:
+        f.write(content)
+
+
+def _git(root, *args):
+    subprocess.run(["git", "-C", root, "-c", "user.name=t", "-c", "user.email=t@t", *args],
+                   check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+
+def _make_repo(root):
+    _git(root, "init", "-q")
+    _write(root, "README.md", "# demo v1\n")
+    _write(root, "pkg/__init__.py", "from pkg.core import run\n")
+    _write(root, "pkg/core.py", "import os\n\n\ndef run(x):\n    '''run it'''\n    return os.path.join(x)\n")
+    _write(root, "pkg/util/helpers.py", "from ..core import run\n\n\nclass Helper:\n    pass\n")
+    _write(root, "pkg/notes.md", "notes\r\nline2\n", mode="w")
+    _write(root, "pkg/data.bin", b"\x00\x01binary", mode="wb")
+    _git(root, "add", "-A")
+    _git(root, "commit", "-q", "-m", "v1")
+    _git(root, "tag", "v1")
+    _write(root, "pkg/core.py", "def run(x):\n    return x\n")
+    _write(root, "pkg/new.py", "y = 2\n")
+    _git(root, "add", "-A")
+    _git(root, "commit", "-q", "-m", "v2")
+    # 工作区中未提交的修改
+    _write(root, "pkg/core.py", "dirty = True\n")
+    _write(root, "pkg/untracked.py", "z = 3\n")
+
+
+def _build(project_root, output, **kwargs):
+    generator = AiMdGenerator(output).set_project_propery("demo", project_root, **kwargs)
+    generator.clear_text().add_project_summary("summary", ["pkg/core.py"]).auto_merge_from_python_project_some_files()
+    generator.merge_from_dir("pkg", as_title="pkg").add_file_dependencies()
+    return generator
+
+
+def test_build_from_revision_equals_checkout():
+    with tempfile.TemporaryDirectory() as root, tempfile.TemporaryDirectory() as other:
+        root = os.path.realpath(root)
+        _make_repo(root)
+        checkout = os.path.join(os.path.realpath(other), "checkout")
+        _git(root, "worktree", "add", "-q", "--detach", checkout, "v1")
+
+        from_rev = _build(root, os.path.join(root, "rev.md"), git_rev="v1")
+        from_checkout = _build(checkout, os.path.join(checkout, "checkout.md"))
+        assert from_rev.read_bytes() == from_checkout.read_bytes()
+        text = from_rev.read_text(encoding="utf-8-sig")
+        assert "run it" in text and "dirty" not in text and "pkg/new.py" not in text and "untracked" not in text
+        # 所有对象都通过同一个 cat-file 进程读取，同一个 blob 只请求一次
+        stats = from_rev._file_source().stats()
+        assert 0 < stats["git_requests"] <= 12
+
+        head = _build(root, os.path.join(root, "head.md"), git_rev="HEAD").read_text(encoding="utf-8-sig")
+        assert "pkg/new.py" in head and "dirty" not in head
+
+
+def test_revision_source_and_lister():
+    with tempfile.TemporaryDirectory() as root:
+        root = os.path.realpath(root)
+        _make_repo(root)
+        source = GitRevisionSource(root, "v1")
+        try:
+            pkg = os.path.join(root, "pkg")
+            assert source.is_dir(pkg) and not source.is_file(pkg)
+            assert source.is_text(os.path.join(pkg, "core.py"))
+            assert not source.is_text(os.path.join(pkg, "data.bin"))
+            assert not source.exists(os.path.join(pkg, "new.py"))
+            assert source.read_text(os.path.join(pkg, "notes.md")) == "notes\nline2\n"
+            with pytest.raises(FileNotFoundError):
+                source.read_bytes(os.path.join(pkg, "missing.py"))
+
+            lister = SourceLister(source, pkg, excluded_dir_paths=[os.path.join(pkg, "util")])
+            assert [f.relative_path for f in lister.walk(pkg)] == ["__init__.py", "core.py", "notes.md"]
+            assert lister.stats.files_skipped_binary == 1 and lister.stats.files_skipped_excluded == 1
+        finally:
+            source.close()
+
+        with pytest.raises(GitRevisionError):
+            GitRevisionSource(root, "no-such-rev")
+        generator = AiMdGenerator(os.path.join(root, "out.md")).set_project_propery("demo", root, git_rev="v1")
+        with pytest.raises(ValueError):
+            generator.open_output_session(incremental=True)
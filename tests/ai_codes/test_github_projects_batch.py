@@ -0,0 +1,123 @@
+"""
+测试 gen_github_projects_batch：本地的 http.server 提供测试用的 zip，代替 codeload.github.com
+"""
+import io
+import os
+import tempfile
+import threading
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from nb_ai_context.contrib import gen_github_proj_ai_md
+from nb_ai_context.contrib.gen_github_proj_ai_md import gen_github_projects_batch
+
+
+def _make_zip(top: str, files: dict) -> bytes:
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w") as zf:
+        for name, text in files.items():
+            zf.writestr(f"{top}/{name}", text)
+    return buffer.getvalue()
+
+
+ZIPS = {
+    "/o/alpha/zip/refs/tags/1.0": _make_zip("alpha-1.0", {
+        "README.md": "# alpha readme\n",
+        "docs/index.md": "# alpha docs\n",
+        "alpha/core.py": "def alpha_func():\n    return 1\n",
+        "tests/test_core.py": "def test_x():\n    pass\n",
+    }),
+    "/o/beta/zip/refs/heads/main": _make_zip("beta-main", {
+        "beta/__init__.py": "class Beta:\n    pass\n",
+        "notes.md": "beta notes\n",
+    }),
+    "/o/broken/zip/refs/heads/main": b"this is not an archive",
+}
+
+
+class _Handler(BaseHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        data = ZIPS.get(self.path)
+        if data is None:
+            self.send_error(404)
+            return
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+
+def test_batch_builds_in_parallel_and_isolates_failures():
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    base = f"http://127.0.0.1:{httpd.server_address[1]}"
+    try:
+        with tempfile.TemporaryDirectory() as out_dir:
+            specs = [
+                dict(github_zip_url=base + "/o/alpha/zip/refs/tags/1.0", project_name="alpha",
+                     output_md_path=os.path.join(out_dir, "alpha.md"),
+                     docs_dir_name="docs", codes_dir_name="alpha", should_include_suffixes=[".py", ".md"]),
+                dict(github_zip_url=base + "/o/missing/zip/refs/heads/main", project_name="missing",
+                     output_md_path=os.path.join(out_dir, "missing.md")),
+                dict(github_zip_url=base + "/o/beta/zip/refs/heads/main", project_name="beta",
+                     output_md_path=os.path.join(out_dir, "beta.md"), should_include_suffixes=[".py"]),
+                dict(github_zip_url=base + "/o/broken/zip/refs/heads/main", project_name="broken",
+                     output_md_path=os.path.join(out_dir, "broken.md")),
+            ]
+            results = gen_github_projects_batch(specs, max_parallel=2, download_cache_dir=os.path.join(out_dir, "cache"))
+
+            assert [r.github_zip_url for r in results] == [s["github_zip_url"] for s in specs]
+            assert [r.error is None for r in results] == [True, False, True, False]
+            assert "404" in results[1].error and "ArchiveError" in results[3].error
+
+            alpha = open(specs[0]["output_md_path"], encoding="utf-8").read()
+            assert "alpha readme" in alpha and "alpha docs" in alpha and "alpha_func" in alpha
+            assert "test_core.py" not in alpha
+            beta = open(specs[2]["output_md_path"], encoding="utf-8").read()
+            assert "class Beta" in beta and "beta notes" not in beta
+    finally:
+        httpd.shutdown()
+        httpd.server_close()
+
+
+def test_batch_records_failed_submit_and_unpins(monkeypatch):
+    caches = []
+
+    class RecordingCache(gen_github_proj_ai_md.DownloadCache):
+        def __init__(self, *args, **kwargs):
+            super().__init__(*args, **kwargs)
+            caches.append(self)
+
+    class BrokenPool(ProcessPoolExecutor):
+        def submit(self, fn, zip_file, spec):
+            # 生成进程崩溃之后，进程池不再接受任务
+            if spec["project_name"] == "beta":
+                raise BrokenProcessPool("a child process terminated abruptly")
+            return super().submit(fn, zip_file, spec)
+
+    monkeypatch.setattr(gen_github_proj_ai_md, "DownloadCache", RecordingCache)
+    monkeypatch.setattr(gen_github_proj_ai_md, "ProcessPoolExecutor", BrokenPool)
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    base = f"http://127.0.0.1:{httpd.server_address[1]}"
+    try:
+        with tempfile.TemporaryDirectory() as out_dir:
+            specs = [
+                dict(github_zip_url=base + "/o/alpha/zip/refs/tags/1.0", project_name="alpha",
+                     output_md_path=os.path.join(out_dir, "alpha.md"), should_include_suffixes=[".py"]),
+                dict(github_zip_url=base + "/o/beta/zip/refs/heads/main", project_name="beta",
+                     output_md_path=os.path.join(out_dir, "beta.md"), should_include_suffixes=[".py"]),
+            ]
+            results = gen_github_projects_batch(specs, max_parallel=2, download_cache_dir=os.path.join(out_dir, "cache"))
+
+            assert [r.error is None for r in results] == [True, False]
+            assert "BrokenProcessPool" in results[1].error and results[1].download_seconds > 0
+            assert caches[0]._pins == {}
+    finally:
+        httpd.shutdown()
+        httpd.server_close()
@@ -0,0 +1,124 @@
+"""
+测试 GitIgnoreMatcher，与 `git check-ignore` 的结果逐个路径对比
+"""
+import os
+import shutil
+import subprocess
+import tempfile
+
+import pytest
+
+from nb_ai_context.gitignore_matcher import GitIgnoreMatcher
+
+root_gitignore = """
+# comment
+*.pyc
+__pycache__/
+/build/
+dist
+*.log
+!keep.log
+docs/**/*.tmp
+**/generated/
+abc/**
+data/*.csv
+!data/important.csv
+node_modules
+\\#hash.txt
+trailing_space.txt
+[Tt]emp*/
+"""
+
+nested_gitignore = """
+*.md
+!README.md
+/local_only.py
+sub_ignored/
+"""
+
+info_exclude = """
+secret.txt
+"""
+
+tree_files = [
+    "a.py", "a.pyc", "x.log", "keep.log", "sub/keep.log", "sub/y.log",
+    "__pycache__/m.pyc", "pkg/__pycache__/m.py", "build/out.py", "pkg/build/out.py",
+    "dist/pkg.whl", "pkg/dist", "docs/a/b/c.tmp", "docs/c.tmp", "other/c.tmp",
+    "src/generated/x.py", "generated/y.py", "abc/def.py", "abc/x/y.py",
+    "data/a.csv", "data/important.csv", "data/sub/b.csv", "web/node_modules/lib.js",
+    "#hash.txt", "trailing_space.txt", "Temp1/x.py", "temp2/y.py", "pkg/Temp3/z.py",
+    "pkg/README.md", "pkg/guide.md", "pkg/local_only.py", "pkg/deep/local_only.py",
+    "pkg/sub_ignored/x.py", "pkg/deep/sub_ignored/y.py", "secret.txt", "pkg/secret.txt",
+    "README.md", "keep/me.py",
+]
+
+
+def _git_check_ignore(repo_root, paths):
+    env = dict(os.environ, HOME=repo_root, GIT_CONFIG_NOSYSTEM="1")
+    proc = subprocess.run(
+        ["git", "-c", "core.excludesFile=", "check-ignore", "--stdin", "-z"],
+        cwd=repo_root, input="\0".join(paths) + "\0", capture_output=True, text=True, env=env,
+    )
+    return {p for p in proc.stdout.split("\0") if p}
+
+
+@pytest.mark.skipif(shutil.which("git") is None, reason="git is not installed")
+def test_matches_git_check_ignore():
+    with tempfile.TemporaryDirectory() as repo_root:
+        subprocess.run(["git", "init", "-q", repo_root], check=True)
+        with open(os.path.join(repo_root, ".gitignore"), "w", encoding="utf-8") as f:
+            f.write(root_gitignore)
+        os.makedirs(os.path.join(repo_root, "pkg"))
+        with open(os.path.join(repo_root, "pkg", ".gitignore"), "w", encoding="utf-8") as f:
+            f.write(nested_gitignore)
+        with open(os.path.join(repo_root, ".git", "info", "exclude"), "w", encoding="utf-8") as f:
+            f.write(info_exclude)
+        for rel in tree_files:
+            abs_path = os.path.join(repo_root, *rel.split("/"))
+            os.makedirs(os.path.dirname(abs_path), exist_ok=True)
+            with open(abs_path, "w") as f:
+                f.write("x")
+
+        expected = _git_check_ignore(repo_root, tree_files)
+        matcher = GitIgnoreMatcher(repo_root)
+        actual = {p for p in tree_files if matcher.is_ignored(p)}
+        assert actual == expected
+        # 抽查几个关键语义
+        assert "keep.log" not in actual
+        assert "pkg/README.md" not in actual and "pkg/guide.md" in actual
+        assert "pkg/local_only.py" in actual and "pkg/deep/local_only.py" not in actual
+        assert "data/important.csv" not in actual and "data/a.csv" in actual
+
+
+def test_dir_only_and_cache():
+    with tempfile.TemporaryDirectory() as repo_root:
+        with open(os.path.join(repo_root, ".gitignore"), "w", encoding="utf-8") as f:
+            f.write("logs/\n")
+        matcher = GitIgnoreMatcher.for_root(repo_root)
+        assert matcher is GitIgnoreMatcher.for_root(repo_root)
+        assert matcher.is_ignored("logs", is_dir=True)
+        assert not matcher.is_ignored("logs", is_dir=False)
+        assert matcher.is_ignored("logs/a/b.txt")
+        with open(os.path.join(repo_root, ".gitignore"), "w", encoding="utf-8") as f:
+            f.write("")
+        assert matcher.is_ignored("logs/a/b.txt")
+        assert not matcher.invalidate().is_ignored("logs/a/b.txt")
+
+
+def test_for_root_revalidates_changed_files():
+    with tempfile.TemporaryDirectory() as repo_root:
+        with open(os.path.join(repo_root, ".gitignore"), "w", encoding="utf-8") as f:
+            f.write("*.log\n")
+        matcher = GitIgnoreMatcher.for_root(repo_root)
+        assert matcher.is_ignored("a.log") and not matcher.is_ignored("pkg/tmp/x.py")
+        assert not matcher.is_stale()
+
+        # 修改已有的 .gitignore、新建子目录的 .gitignore，再次 for_root 时都会重新读取
+        with open(os.path.join(repo_root, ".gitignore"), "w", encoding="utf-8") as f:
+            f.write("*.txt\n")
+        assert GitIgnoreMatcher.for_root(repo_root) is matcher
+        assert not matcher.is_ignored("a.log") and matcher.is_ignored("a.txt")
+        os.makedirs(os.path.join(repo_root, "pkg"))
+        with open(os.path.join(repo_root, "pkg", ".gitignore"), "w", encoding="utf-8") as f:
+            f.write("tmp/\n")
+        assert GitIgnoreMatcher.for_root(repo_root).is_ignored("pkg/tmp/x.py")
@@ -0,0 +1,82 @@
+"""
+测试增量生成：只重新渲染变化的文件块，结果与完整生成逐字节相同
+"""
+import json
+import os
+import tempfile
+
+import pytest
+
+from nb_ai_context import AiMdGenerator
+
+
+def _write(root, rel, content):
+    path = os.path.join(root, *rel.split("/"))
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(content)
+
+
+def _make_project(root):
+    for i in range(12):
+        _write(root, f"pkg/m{i:02d}.py", f"import os\n\n\ndef f{i}(x: int = {i}) -> int:\n    '''函数 {i}'''\n    return x\n")
+    _write(root, "pkg/README.md", "# 说明\n")
+    _write(root, "docs/a.md", "doc a\n")
+
+
+def _build(root, name, incremental):
+    generator = AiMdGenerator(os.path.join(root, "out", name)).set_project_propery("demo", root)
+    with generator.output_session(incremental=incremental):
+        generator.merge_from_files(["docs/a.md", "pkg/README.md"], as_title="docs")
+        generator.merge_from_dir("pkg", as_title="codes", use_gitignore=False)
+        generator.merge_from_dir("pkg", as_title="metadata only", use_gitignore=False, include_file_text=False)
+    return generator
+
+
+def test_incremental_build_matches_clean_build():
+    with tempfile.TemporaryDirectory() as root:
+        _make_project(root)
+        first = _build(root, "inc.md", incremental=True)
+        with open(str(first) + ".manifest.json", encoding="utf-8") as f:
+            assert len(json.load(f)["blocks"]) == 2 + 13 + 13
+
+        # 没有变化时全部复用
+        again = _build(root, "inc.md", incremental=True)
+        assert again.read_bytes() == first.read_bytes()
+
+        # 修改、新增、删除文件
+        _write(root, "pkg/m03.py", "def changed():\n    return '改了'\n")
+        _write(root, "pkg/m99.py", "class New:\n    pass\n")
+        os.remove(os.path.join(root, "pkg", "m05.py"))
+        incremental = _build(root, "inc.md", incremental=True)
+        clean = _build(root, "clean.md", incremental=False)
+        assert incremental.read_bytes() == clean.read_bytes()
+        assert "'改了'" in incremental.read_text(encoding="utf-8-sig")
+        assert "m05.py" not in incremental.read_text(encoding="utf-8-sig")
+        assert incremental.get_token_report() == clean.get_token_report()
+
+
+def test_stats_and_invalidated_manifest():
+    with tempfile.TemporaryDirectory() as root:
+        _make_project(root)
+        _build(root, "inc.md", incremental=True)
+        _write(root, "pkg/m01.py", "x = 1\n")
+
+        generator = AiMdGenerator(os.path.join(root, "out", "inc.md")).set_project_propery("demo", root)
+        generator.open_output_session(incremental=True)
+        generator.merge_from_dir("pkg", as_title="codes", use_gitignore=False)
+        assert generator._get_incremental_build().stats()["reused"] == 12
+        assert generator._get_incremental_build().stats()["rendered"] == 1
+        generator.commit_output_session()
+
+        # 输出文件被手动修改后清单作废，按完整生成处理
+        with open(generator, "ab") as f:
+            f.write(b"edited by hand\n")
+        generator.open_output_session(incremental=True)
+        assert generator._get_incremental_build().previous == {}
+        generator.merge_from_dir("pkg", as_title="codes", use_gitignore=False)
+        generator.commit_output_session()
+        assert not generator.read_text(encoding="utf-8-sig").endswith("edited by hand\n")
+
+        with pytest.raises(ValueError):
+            generator.open_output_session(atomic=False, incremental=True)
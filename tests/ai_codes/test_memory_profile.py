@@ -0,0 +1,64 @@
+"""
+测试 set_project_propery(..., profile_memory=True)：按阶段、章节的峰值内存，分配位置和占用最多的文件
+"""
+import os
+import tempfile
+import tracemalloc
+
+from nb_ai_context import AiMdGenerator
+
+
+def _make_project(root):
+    big_module = "".join(f"def func_{i}(a, b):\n    '''doc {i}'''\n    return a + b + {i}\n\n" for i in range(2000))
+    files = {
+        "pkg/__init__.py": "from .core import Core\n",
+        "pkg/core.py": "import os\n\nclass Core:\n    def run(self):\n        return os.getcwd()\n",
+        "pkg/big.py": big_module,
+        "docs/guide.md": "# guide\n\n中文说明\n",
+    }
+    for rel, content in files.items():
+        path = os.path.join(root, *rel.split("/"))
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(content)
+
+
+def test_memory_profile_per_stage_and_section():
+    assert not tracemalloc.is_tracing()
+    with tempfile.TemporaryDirectory() as root:
+        _make_project(root)
+        generator = AiMdGenerator(os.path.join(root, "out.md")).set_project_propery("demo", root, profile_memory=True)
+        try:
+            (generator.clear_text()
+             .merge_from_dir("pkg", as_title="pkg", use_gitignore=False)
+             .merge_from_dir("docs", as_title="docs", use_gitignore=False))
+            memory = generator.stats.to_dict()["memory"]
+        finally:
+            generator.stats.memory.stop()
+
+        assert not tracemalloc.is_tracing()
+        assert memory["stages"]["merge_from_dir"]["calls"] == 2
+        assert memory["stages"]["merge_from_dir"]["peak_delta"] > 0
+        assert memory["stages"]["scan"]["calls"] == 2
+        # 外层阶段的峰值不小于它包含的阶段
+        assert memory["stages"]["merge_from_dir"]["peak"] >= memory["stages"]["merge_from_files_with_metadata"]["peak"]
+        assert set(memory["sections"]) == {"pkg", "docs"}
+        assert memory["peak"] >= memory["sections"]["pkg"]["peak"] > 0
+        assert memory["top_allocations"]["merge_from_dir"]
+        assert os.path.basename(memory["top_files"][0]["path"]) == "big.py"
+        assert memory["top_files"][0]["metadata_bytes"] > 0
+        report = generator.stats.format_report()
+        assert "memory peak" in report and "big.py" in report
+
+        generator.set_project_propery("demo", root)
+        assert generator.stats.memory is None
+
+
+def test_memory_profile_disabled_by_default():
+    with tempfile.TemporaryDirectory() as root:
+        _make_project(root)
+        generator = AiMdGenerator(os.path.join(root, "out.md")).set_project_propery("demo", root)
+        generator.clear_text().merge_from_dir("pkg", as_title="pkg", use_gitignore=False)
+        assert generator.stats.memory is None
+        assert "memory" not in generator.stats.to_dict()
+        assert not tracemalloc.is_tracing()
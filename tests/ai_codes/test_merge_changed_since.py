@@ -0,0 +1,149 @@
+"""
+测试 merge_changed_since：只合并两个版本之间变化的文件、diff，以及 import 了它们的文件
+"""
+import os
+import shutil
+import subprocess
+import tempfile
+
+import pytest
+
+from nb_ai_context import AiMdGenerator
+from nb_ai_context.git_diff import diff_changed_files, parse_diff_output, unquote_path
+from nb_ai_context.git_revision import GitRevisionError
+
+pytestmark = pytest.mark.skipif(shutil.which("git") is None, reason="git is not installed")
+
+
+def _write(root, rel, content):
+    path = os.path.join(root, *rel.split("/"))
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w") as f:
+        f.write(content)
+
+
+def _git(root, *args):
+    subprocess.run(["git", "-C", root, "-c", "user.name=t", "-c", "user.email=t@t", *args],
+                   check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+
+def _make_repo(root):
+    _git(root, "init", "-q")
+    _write(root, "pkg/__init__.py", "")
+    _write(root, "pkg/core.py", "def run():\n    return 1\n")
+    _write(root, "pkg/api.py", "from pkg.core import run\n\n\ndef serve():\n    return run()\n")
+    _write(root, "pkg/cli.py", "from .core import run\n")
+    _write(root, "pkg/other.py", "import os\n\n\ndef core_like():\n    return os.sep\n")
+    _write(root, "pkg/old.py", "X = 1\n")
+    _write(root, "pkg/uses_old.py", "from pkg import old\nimport pkg.old\n")
+    _write(root, "docs/guide.md", "# guide\n")
+    _git(root, "add", "-A")
+    _git(root, "commit", "-q", "-m", "base")
+    _git(root, "tag", "base")
+    _write(root, "pkg/core.py", "def run():\n    return 2\n")
+    _write(root, "docs/guide.md", "# guide v2\n")
+    _write(root, "pkg/new.py", "from pkg.core import run\n")
+    _git(root, "rm", "-q", "pkg/old.py")
+    _git(root, "add", "-A")
+    _git(root, "commit", "-q", "-m", "head")
+
+
+def test_merge_changed_since_worktree_and_revision():
+    with tempfile.TemporaryDirectory() as root:
+        root = os.path.realpath(root)
+        _make_repo(root)
+        _write(root, "pkg/other.py", "import os\n\n\ndef core_like():\n    return os.pathsep\n")
+
+        generator = AiMdGenerator(os.path.join(root, "review.md")).set_project_propery("demo", root)
+        generator.clear_text().merge_changed_since("base")
+        text = generator.read_text(encoding="utf-8-sig")
+        assert "demo changes since base diff" in text
+        assert "-    return 1\n+    return 2" in text and "- `pkg/old.py` (deleted)" in text
+        changed = text.split("demo changes since base changed files")[1].split("demo changes since base dependents")[0]
+        for path in ["pkg/core.py", "pkg/new.py", "pkg/other.py", "docs/guide.md"]:
+            assert f"start of file: {path}" in changed
+        # 依赖变化文件（包括被删除的 pkg/old.py）的文件只有元数据
+        dependents = text.split("demo changes since base dependents (metadata only)")[1]
+        assert "`pkg/api.py`" in dependents and "`pkg/cli.py`" in dependents and "`pkg/uses_old.py`" in dependents
+        assert "start of file: pkg/api.py" not in dependents and "`pkg/__init__.py`" not in dependents
+        # 候选文件由 git grep 找出，没有引用变化模块的文件不会被读取
+        assert os.path.join(root, "pkg", "api.py") in generator.module_registry
+        assert os.path.join(root, "pkg", "__init__.py") not in generator.module_registry
+
+        # 指定 head_rev 时从该版本读取，工作区的修改不计入
+        at_head = AiMdGenerator(os.path.join(root, "head.md")).set_project_propery("demo", root, git_rev="HEAD")
+        at_head.clear_text().merge_changed_since("base", head_rev="HEAD", include_dependents=False)
+        head_text = at_head.read_text(encoding="utf-8-sig")
+        assert "pkg/other.py" not in head_text and "start of file: pkg/core.py" in head_text
+
+        with pytest.raises(ValueError):
+            generator.merge_changed_since("base", head_rev="HEAD")
+        with pytest.raises(GitRevisionError):
+            generator.merge_changed_since("no-such-rev")
+
+
+def test_diff_changed_files_parsing():
+    with tempfile.TemporaryDirectory() as root:
+        root = os.path.realpath(root)
+        _make_repo(root)
+        changes = diff_changed_files(os.path.join(root, "pkg"), "base", "HEAD", context_lines=0)
+        assert [(c.status, c.path) for c in changes] == [("M", "core.py"), ("A", "new.py"), ("D", "old.py")]
+        assert all(c.patch.startswith("diff --git ") for c in changes)
+        assert "@@ -2 +2 @@" in changes[0].patch
+
+    assert unquote_path('"caf\\303\\251 \\"x\\".py"') == 'café "x".py'
+    output = ":100644 100644 aaaaaaa bbbbbbb U\tconflict.py\n:000000 100644 0000000 ccccccc A\tnew.py\n\n" \
+             "* Unmerged path conflict.py\ndiff --git a/new.py b/new.py\n+x\n"
+    assert [(c.status, c.path, c.patch) for c in parse_diff_output(output)] == [
+        ("U", "conflict.py", ""), ("A", "new.py", "diff --git a/new.py b/new.py\n+x\n"),
+    ]
+
+
+@pytest.mark.skipif(os.name == "nt", reason="needs symlinks")
+def test_type_change_patches_matched_by_path():
+    with tempfile.TemporaryDirectory() as root:
+        root = os.path.realpath(root)
+        _git(root, "init", "-q")
+        _write(root, "x.txt", "x\n")
+        _write(root, "y.txt", "y\n")
+        _write(root, "a b.txt", "a\n")
+        _git(root, "add", "-A")
+        _git(root, "commit", "-q", "-m", "base")
+        os.remove(os.path.join(root, "x.txt"))
+        os.symlink("y.txt", os.path.join(root, "x.txt"))
+        _write(root, "y.txt", "y2\n")
+        _write(root, "a b.txt", "a2\n")
+        changes = {c.path: c for c in diff_changed_files(root, "HEAD")}
+        assert {path: c.status for path, c in changes.items()} == {"a b.txt": "M", "x.txt": "T", "y.txt": "M"}
+        # 类型变化有删除、新增两个补丁，都属于 x.txt，后面的文件不会错位
+        assert changes["x.txt"].patch.count("diff --git a/x.txt b/x.txt") == 2
+        assert "new file mode 120000" in changes["x.txt"].patch
+        assert changes["y.txt"].patch.startswith("diff --git a/y.txt b/y.txt") and "+y2" in changes["y.txt"].patch
+        assert "120000" not in changes["y.txt"].patch
+        assert changes["a b.txt"].patch.startswith("diff --git a/a b.txt b/a b.txt") and "+a2" in changes["a b.txt"].patch
+
+
+def test_dependents_do_not_walk_ignored_trees(monkeypatch):
+    with tempfile.TemporaryDirectory() as root:
+        root = os.path.realpath(root)
+        _make_repo(root)
+        _write(root, ".gitignore", "venv/\n")
+        for i in range(10):
+            _write(root, f"venv/lib/m{i}/mod.py", "from pkg.core import run\n")
+            _write(root, f".cache/m{i}/mod.py", "from pkg.core import run\n")
+        _write(root, "pkg/core.py", "def run():\n    return 3\n")
+        scanned = []
+        real_scandir = os.scandir
+
+        def scandir(path=None):
+            scanned.append(str(path))
+            return real_scandir(path)
+
+        monkeypatch.setattr(os, "scandir", scandir)
+        generator = AiMdGenerator(os.path.join(root, "review.md")).set_project_propery("demo", root)
+        generator.clear_text().merge_changed_since("HEAD")
+        text = generator.read_text(encoding="utf-8-sig")
+        assert "pkg/api.py" in text and "venv/lib" not in text and ".cache" not in text
+        for ignored in ("venv", ".cache"):
+            ignored = os.path.join(root, ignored)
+            assert not any(p == ignored or p.startswith(ignored + os.sep) for p in scanned)
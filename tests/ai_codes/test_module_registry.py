@@ -0,0 +1,116 @@
+"""
+测试 ModuleRegistry：一次构建里每个 Python 文件只读取、解析一次
+"""
+import os
+import tempfile
+
+from nb_ai_context import AiMdGenerator
+from nb_ai_context import module_registry
+from nb_ai_context.module_registry import ModuleRegistry
+
+
+def _make_project(root):
+    os.makedirs(os.path.join(root, "pkg", "sub"))
+    files = {
+        "pkg/__init__.py": "from .core import Core\n",
+        "pkg/core.py": "import os, json\nfrom .sub import helper\n\nclass Core:\n    def run(self):\n        import re\n        return helper.go()\n",
+        "pkg/sub/__init__.py": "",
+        "pkg/sub/helper.py": "from .. import core\nfrom ..core import Core\n\ndef go():\n    return 1\n",
+    }
+    for rel, content in files.items():
+        with open(os.path.join(root, *rel.split("/")), "w", encoding="utf-8") as f:
+            f.write(content)
+    return sorted(files)
+
+
+def test_each_file_parsed_once_per_build(monkeypatch):
+    with tempfile.TemporaryDirectory() as root:
+        files = _make_project(root)
+        parse_count = {}
+        real_parse = module_registry.ast_extractor.parse_python_source
+
+        def counting_parse(source_code, filename="<unknown>"):
+            parse_count[filename] = parse_count.get(filename, 0) + 1
+            return real_parse(source_code, filename)
+
+        monkeypatch.setattr(module_registry.ast_extractor, "parse_python_source", counting_parse)
+
+        generator = AiMdGenerator(os.path.join(root, "out.md")).set_project_propery("demo", root)
+        (
+            generator.clear_text()
+            .add_project_summary("summary", files)
+            .merge_from_files_with_metadata(files, as_title="codes")
+        )
+
+        assert sorted(parse_count.values()) == [1] * len(files)
+        stats = generator.module_registry.stats()
+        assert stats["misses"] == len(files)
+        # 摘要元数据 + 依赖分析 + 源码 + 元数据，每个文件至少命中 3 次
+        assert stats["hits"] >= 3 * len(files)
+
+        text = generator.read_text()
+        assert "`pkg/sub/helper.py`" in text and "class Core" in text
+
+
+def test_dependencies_resolve_relative_imports_from_registry():
+    with tempfile.TemporaryDirectory() as root:
+        files = _make_project(root)
+        generator = AiMdGenerator(os.path.join(root, "out.md")).set_project_propery("demo", root)
+        deps = generator._analyze_file_dependencies(files)
+        assert deps["internal_deps"]["pkg/core.py"] == ["pkg/sub/__init__.py"]
+        assert deps["internal_deps"]["pkg/sub/helper.py"] == ["pkg/__init__.py", "pkg/core.py"]
+        # 函数内部的 import 也会被统计
+        assert deps["external_deps"]["pkg/core.py"] == ["json", "os", "re"]
+
+
+def test_registry_invalidates_on_change():
+    with tempfile.TemporaryDirectory() as root:
+        path = os.path.join(root, "m.py")
+        with open(path, "w", encoding="utf-8") as f:
+            f.write("def a():\n    pass\n")
+        registry = ModuleRegistry()
+        assert [f["name"] for f in registry.get(path).metadata["functions"]] == ["a"]
+        assert registry.get(path).tree is None
+        assert (registry.hits, registry.misses) == (1, 1)
+
+        with open(path, "w", encoding="utf-8") as f:
+            f.write("def a():\n    pass\n\ndef b():\n    pass\n")
+        os.utime(path, ns=(0, 10 ** 9))
+        assert [f["name"] for f in registry.get(path).metadata["functions"]] == ["a", "b"]
+        assert registry.misses == 2
+
+        broken = os.path.join(root, "broken.py")
+        with open(broken, "w", encoding="utf-8") as f:
+            f.write("def (:\n")
+        module = registry.get(broken)
+        assert module.parse_error is not None
+        assert module.metadata["error"] and module.import_refs == []
+
+
+def test_text_cache_bounds_source_memory():
+    with tempfile.TemporaryDirectory() as root:
+        paths = []
+        for i in range(10):
+            path = os.path.join(root, f"m{i}.py")
+            with open(path, "w", encoding="utf-8") as f:
+                f.write(f"def f{i}():\n    return '{'x' * 1000}'\n")
+            paths.append(path)
+        # 大约能放下 3 个文件的源码
+        registry = ModuleRegistry(text_cache_max_bytes=3500)
+        modules = []
+        for p in paths:
+            modules.append(registry.get(p))
+            assert modules[-1].metadata["functions"]
+        stats = registry.stats()["text_cache"]
+        assert stats["entries"] == 3 and stats["bytes"] <= 3500 and stats["evictions"] == 7
+        assert modules[0].cached_text() is None and modules[0].parsed_objects()["text"] is None
+
+        # 被淘汰的源码在用到时重新读取，元数据不需要重新解析
+        assert modules[0].text.startswith("def f0():")
+        assert modules[0].reads == 2 and modules[-1].reads == 1
+        assert modules[0].cached_text() is not None
+
+        unbounded = ModuleRegistry(text_cache_max_bytes=None)
+        for p in paths:
+            unbounded.get(p).metadata
+        assert unbounded.stats()["text_cache"]["entries"] == len(paths)
@@ -0,0 +1,104 @@
+"""
+测试流式输出写入器和输出会话
+"""
+import os
+import tempfile
+
+import pytest
+
+from nb_ai_context import AiMdGenerator
+from nb_ai_context.output_writer import OutputWriter, UTF8_BOM
+
+
+def _make_project(root):
+    os.makedirs(os.path.join(root, "pkg"))
+    with open(os.path.join(root, "README.md"), "w", encoding="utf-8") as f:
+        f.write("# demo\n中文说明\n")
+    with open(os.path.join(root, "pkg", "a.py"), "w", encoding="utf-8") as f:
+        f.write('"""mod a"""\n\nclass A:\n    def run(self, x: int = 1) -> int:\n        return x\n')
+    with open(os.path.join(root, "pkg", "b.md"), "w", encoding="utf-8") as f:
+        f.write("b doc\n")
+
+
+def _build(generator):
+    return (
+        generator
+        .add_ai_reading_guide()
+        .merge_from_files(["README.md"], as_title="readme")
+        .merge_from_dir("pkg", as_title="codes", use_gitignore=False)
+    )
+
+
+def test_session_output_identical_to_direct_output():
+    with tempfile.TemporaryDirectory() as root:
+        _make_project(root)
+        direct = AiMdGenerator(os.path.join(root, "out", "direct.md")).set_project_propery("demo", root)
+        _build(direct.ensure_parent().clear_text())
+
+        streamed = AiMdGenerator(os.path.join(root, "out", "streamed.md")).set_project_propery("demo", root)
+        streamed.open_output_session()
+        _build(streamed)
+        streamed.commit_output_session()
+
+        direct_bytes = direct.read_bytes()
+        assert direct_bytes.startswith(UTF8_BOM)
+        # 阅读指南里有生成时间，去掉后比较
+        strip_time = lambda b: b.split(b"\n", 4)[4]
+        assert strip_time(streamed.read_bytes()) == strip_time(direct_bytes)
+
+
+def test_atomic_session_commit_and_abort():
+    with tempfile.TemporaryDirectory() as root:
+        _make_project(root)
+        output = os.path.join(root, "out.md")
+        with open(output, "w", encoding="utf-8") as f:
+            f.write("previous build")
+        generator = AiMdGenerator(output).set_project_propery("demo", root)
+
+        with pytest.raises(FileNotFoundError):
+            with generator.output_session():
+                generator.merge_from_files(["README.md"], as_title="readme")
+                generator.merge_from_files(["missing.md"], as_title="missing")
+        # 出错时目标文件保持上一次的结果，临时文件被删除
+        assert generator.read_text() == "previous build"
+        assert sorted(os.listdir(root)) == ["README.md", "out.md", "pkg"]
+
+        generator.open_output_session()
+        generator.merge_from_files(["README.md"], as_title="readme")
+        assert generator.read_text() == "previous build"
+        generator.show_textfile_info()  # 会自动提交会话
+        assert "中文说明" in generator.read_text()
+
+
+def test_writer_truncate_rewrites_bom():
+    with tempfile.TemporaryDirectory() as root:
+        target = os.path.join(root, "x.md")
+        writer = OutputWriter(target, atomic=True, write_bom=True)
+        writer.write("hello")
+        writer.truncate()
+        writer.write("world")
+        writer.commit()
+        with open(target, "rb") as f:
+            assert f.read() == UTF8_BOM + b"world"
+
+
+@pytest.mark.skipif(os.name == "nt", reason="Windows 没有 posix 权限位")
+def test_atomic_commit_keeps_file_mode():
+    with tempfile.TemporaryDirectory() as root:
+        target = os.path.join(root, "x.md")
+        # 新建的文件与 open 创建的权限相同（按 umask），而不是 mkstemp 的 0600
+        umask = os.umask(0o022)
+        try:
+            writer = OutputWriter(target, atomic=True)
+            writer.write("new")
+            writer.commit()
+        finally:
+            os.umask(umask)
+        assert os.stat(target).st_mode & 0o777 == 0o644
+
+        # 替换已有的文件时保留它原来的权限
+        os.chmod(target, 0o640)
+        writer = OutputWriter(target, atomic=True)
+        writer.write("again")
+        writer.commit()
+        assert os.stat(target).st_mode & 0o777 == 0o640
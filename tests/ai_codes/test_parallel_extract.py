@@ -0,0 +1,72 @@
+"""
+测试 workers > 1 的多进程元数据提取：输出与串行完全一致，结果写回 module_registry
+"""
+import os
+import tempfile
+
+from nb_ai_context import AiMdGenerator
+from nb_ai_context import parallel_extract
+
+
+def _make_project(root, count=12):
+    os.makedirs(os.path.join(root, "pkg"))
+    for i in range(count):
+        with open(os.path.join(root, "pkg", f"m{i:02d}.py"), "w", encoding="utf-8") as f:
+            f.write(f'"""module {i}"""\nimport os\nfrom . import m00\n\nclass C{i}:\n    def run(self, x: int = {i}) -> int:\n        return x\n')
+    with open(os.path.join(root, "pkg", "broken.py"), "w", encoding="utf-8") as f:
+        f.write("def broken(:\n")
+    with open(os.path.join(root, "pkg", "notes.md"), "w", encoding="utf-8") as f:
+        f.write("# notes\n")
+
+
+def _build(root, name, workers, include_file_text=True):
+    generator = AiMdGenerator(os.path.join(root, name)).set_project_propery("demo", root)
+    generator.clear_text().merge_from_dir(
+        "pkg", as_title="codes", use_gitignore=False, workers=workers, include_file_text=include_file_text
+    )
+    return generator
+
+
+def test_parallel_output_matches_serial(monkeypatch):
+    with tempfile.TemporaryDirectory() as root:
+        _make_project(root)
+        submitted = []
+        real_iter = parallel_extract.iter_metadata_markdown
+
+        def spy(registry, files, workers, on_error=None):
+            submitted.extend(files)
+            return real_iter(registry, files, workers, on_error)
+
+        monkeypatch.setattr(parallel_extract, "iter_metadata_markdown", spy)
+
+        for include_file_text in (True, False):
+            serial = _build(root, "serial.md", 1, include_file_text)
+            parallel = _build(root, "parallel.md", 3, include_file_text)
+            assert parallel.read_bytes() == serial.read_bytes()
+        assert len(submitted) == 2 * 13
+
+        # 子进程的结果写回了 registry，依赖分析不会再解析
+        stats_before = parallel.module_registry.stats()
+        parallel._analyze_file_dependencies([f"pkg/m{i:02d}.py" for i in range(12)])
+        assert parallel.module_registry.stats()["misses"] == stats_before["misses"]
+        m03 = parallel.module_registry.get(os.path.join(root, "pkg", "m03.py"))
+        assert [d["qualname"] for d in m03.nested_definitions] == ["C3.run"]
+        assert parallel.module_registry.get(os.path.join(root, "pkg", "broken.py")).parse_error is not None
+
+
+def test_iter_metadata_markdown_keeps_order():
+    with tempfile.TemporaryDirectory() as root:
+        _make_project(root, count=20)
+        from nb_ai_context.module_registry import ModuleRegistry
+        from nb_ai_context.metadata_markdown import format_py_metadata_as_markdown
+
+        files = [(os.path.join(root, "pkg", f"m{i:02d}.py"), f"pkg/m{i:02d}.py") for i in reversed(range(20))]
+        errors = []
+        markdowns = list(parallel_extract.iter_metadata_markdown(
+            ModuleRegistry(), files + [(os.path.join(root, "pkg", "broken.py"), "pkg/broken.py")], 2,
+            on_error=lambda path, error: errors.append(path),
+        ))
+        serial_registry = ModuleRegistry()
+        expected = [format_py_metadata_as_markdown(serial_registry.get(p).metadata, rel) for p, rel in files]
+        assert markdowns[:-1] == expected
+        assert errors == [os.path.join(root, "pkg", "broken.py")]
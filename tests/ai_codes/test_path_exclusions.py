@@ -0,0 +1,123 @@
+"""
+测试 PathExclusions：普通路径、通配符、** 的匹配，命中次数，以及 merge_from_dir 中的使用
+"""
+import os
+import shutil
+import subprocess
+import tempfile
+
+from nb_ai_context import AiMdGenerator
+from nb_ai_context.path_exclusions import PathExclusions
+
+
+def test_literal_glob_and_recursive_patterns():
+    exclusions = PathExclusions.for_root(
+        "/project",
+        ["tests", "**/migrations", "docs/v[12]", "/project/build/", "./vendor/", "/elsewhere/lib"],
+        ["static/*.min.js", "README.md"],
+    )
+    assert exclusions.dir_patterns == ["**/migrations", "build", "docs/v[12]", "tests", "vendor"]
+
+    assert exclusions.match_dir("tests") == "tests/"
+    assert exclusions.is_excluded_dir("tests/unit/deep")
+    assert not exclusions.is_excluded_dir("tests_extra")
+    assert exclusions.is_excluded_dir("migrations") and exclusions.is_excluded_dir("app/db/migrations")
+    assert exclusions.is_excluded_dir("docs/v1") and not exclusions.is_excluded_dir("docs/v3")
+    assert exclusions.is_excluded_dir("build") and exclusions.is_excluded_dir("vendor/pkg")
+    assert not exclusions.is_excluded_dir("") and not exclusions.is_excluded_dir("src")
+
+    assert exclusions.match_file("static/app.min.js") == "static/*.min.js"
+    assert not exclusions.is_excluded_file("static/js/app.min.js")
+    assert exclusions.is_excluded_file("README.md") and not exclusions.is_excluded_file("src/README.md")
+    assert exclusions.match_file("app/migrations/0001_initial.py") == "**/migrations/"
+    assert exclusions.is_excluded_file("tests/test_a.py")
+
+    # 同一个被排除的目录只计一次（tests、tests/unit/deep 和 tests/test_a.py 都计入 tests）
+    assert exclusions.hits["tests/"] == 1
+    assert exclusions.hits["**/migrations/"] == 3
+    assert exclusions.hits["static/*.min.js"] == 1
+    assert not PathExclusions() and PathExclusions(["."]).is_excluded_file("any/file.py")
+
+
+def test_merge_from_dir_with_glob_exclusions():
+    files = {
+        "pkg/core.py": "x = 1\n",
+        "pkg/build_cache/gen.py": "y = 2\n",
+        "pkg/app/migrations/0001.py": "z = 3\n",
+        "pkg/static/app.min.js": "var a;\n",
+        "pkg/static/app.js": "var b;\n",
+    }
+    with tempfile.TemporaryDirectory() as root:
+        for rel, content in files.items():
+            path = os.path.join(root, *rel.split("/"))
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, "w", encoding="utf-8") as f:
+                f.write(content)
+        for scan_index in (True, False):
+            output = os.path.join(root, "out.md")
+            generator = AiMdGenerator(output).set_project_propery("demo", root, scan_index=scan_index)
+            generator.clear_text().merge_from_dir(
+                "pkg", as_title="pkg", use_gitignore=False,
+                excluded_dir_name_list=["pkg/build_*", "**/migrations"],
+                excluded_file_name_list=["pkg/static/*.min.js"],
+            )
+            with open(output, encoding="utf-8") as f:
+                text = f.read()
+            assert "pkg/core.py" in text and "pkg/static/app.js" in text
+            assert "gen.py" not in text and "0001.py" not in text and "app.min.js" not in text
+            hits = generator.stats.caches["exclusions"]
+            assert set(hits) == {"pkg/build_*/", "**/migrations/", "pkg/static/*.min.js"}
+            assert all(count >= 1 for count in hits.values())
+
+
+def test_hits_count_each_path_once():
+    exclusions = PathExclusions(["tests"], ["*.min.js"])
+    for _ in range(3):
+        assert exclusions.is_excluded_file("tests/test_a.py")
+        assert exclusions.is_excluded_file("app.min.js")
+        assert exclusions.is_excluded_dir("tests")
+    assert exclusions.is_excluded_dir(".") is False
+    assert exclusions.hits == {"tests/": 1, "*.min.js": 1}
+
+
+def test_merge_from_dir_hits_are_distinct_paths():
+    files = ["pkg/a.py", "pkg/gen/x.py", "pkg/gen/y.py", "pkg/b.min.js", "pkg/c.js"]
+    with tempfile.TemporaryDirectory() as root:
+        for rel in files:
+            path = os.path.join(root, *rel.split("/"))
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, "w", encoding="utf-8") as f:
+                f.write("x = 1\n")
+        # 扫描索引和遍历器都剪掉 gen 目录，每次调用计一次
+        for scan_index in (True, False):
+            generator = AiMdGenerator(os.path.join(root, "out.md")).set_project_propery("demo", root, scan_index=scan_index)
+            generator.clear_text()
+            for _ in range(2):
+                generator.merge_from_dir("pkg", as_title="pkg", use_gitignore=False,
+                                         excluded_dir_name_list=["pkg/gen"], excluded_file_name_list=["pkg/*.min.js"])
+            assert generator.stats.caches["exclusions"] == {"pkg/gen/": 2, "pkg/*.min.js": 2}
+
+
+def test_hits_do_not_depend_on_file_lister():
+    files = ["pkg/a.py", "pkg/gen/x.py", "pkg/gen/y.py", "pkg/gen/deep/z.py", "pkg/app/migrations/0001.py",
+             "pkg/app/migrations/0002.py", "pkg/b.min.js"]
+    with tempfile.TemporaryDirectory() as root:
+        for rel in files:
+            path = os.path.join(root, *rel.split("/"))
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, "w", encoding="utf-8") as f:
+                f.write("x = 1\n")
+        listers = [("walk", False), ("walk", True)]
+        if shutil.which("git") is not None:
+            subprocess.run(["git", "init", "-q", root], check=True)
+            listers += [("git", False), ("git", True)]
+        results = []
+        for file_enumerator, scan_index in listers:
+            generator = AiMdGenerator(os.path.join(root, "out.md")).set_project_propery("demo", root, scan_index=scan_index)
+            generator.clear_text().merge_from_dir(
+                "pkg", as_title="pkg", file_enumerator=file_enumerator,
+                excluded_dir_name_list=["pkg/gen", "**/migrations"], excluded_file_name_list=["pkg/*.min.js"],
+            )
+            results.append(generator.stats.caches["exclusions"])
+        # 被排除的目录计一次，不管它是遍历时被剪掉还是从文件列表中过滤掉
+        assert results == [{"pkg/gen/": 1, "**/migrations/": 1, "pkg/*.min.js": 1}] * len(listers)
@@ -0,0 +1,136 @@
+"""
+测试 ScanIndex：同一个项目只遍历一次，之后的查询与 PruningDirWalker 的结果相同，目录变化后重新遍历
+"""
+import os
+import tempfile
+
+from nb_ai_context import AiMdGenerator
+from nb_ai_context.dir_walker import PruningDirWalker
+from nb_ai_context.gitignore_matcher import GitIgnoreMatcher
+from nb_ai_context.scan_index import ScanIndex
+
+tree_files = {
+    "src/a.py": "print(1)",
+    "src/b.md": "# b",
+    "src/c.txt": "c",
+    "src/bin.py": "\x00\x01",
+    "src/pkg/d.py": "d = 1",
+    "src/pkg/__pycache__/d.cpython-311.pyc": "x",
+    "src/vendor/f.py": "f",
+    "src/vendor/deep/g.py": "g",
+    "src/skip_me.py": "skip",
+}
+
+
+def _make_tree(root):
+    for rel, content in tree_files.items():
+        abs_path = os.path.join(root, *rel.split("/"))
+        os.makedirs(os.path.dirname(abs_path), exist_ok=True)
+        with open(abs_path, "w", encoding="utf-8") as f:
+            f.write(content)
+    with open(os.path.join(root, ".gitignore"), "w", encoding="utf-8") as f:
+        f.write("__pycache__/\n")
+
+
+def test_indexed_queries_match_walker():
+    with tempfile.TemporaryDirectory() as root:
+        root = os.path.realpath(root)
+        _make_tree(root)
+        index = ScanIndex()
+        queries = [
+            ("src", {}),
+            ("src", {"should_include_suffixes": [".py"]}),
+            ("src/pkg", {}),
+            ("src", {"excluded_dir_paths": [os.path.join(root, "src", "vendor")],
+                     "excluded_file_paths": [os.path.join(root, "src", "skip_me.py")],
+                     "should_include_suffixes": [".py", ".md"]}),
+            ("src/vendor", {"excluded_dir_paths": [os.path.join(root, "src", "vendor", "deep")]}),
+        ]
+        for target, options in queries:
+            walker = PruningDirWalker(root, gitignore_matcher=GitIgnoreMatcher(root), **options)
+            expected = list(walker.walk(os.path.join(root, target)))
+            indexed = index.wrap(walker)
+            assert list(indexed.walk(os.path.join(root, target))) == expected, (target, options)
+            assert indexed.stats.files_included == len(expected)
+        assert index.stats()["walks"] == 1
+        assert index.stats()["hits"] == len(queries) - 1
+
+
+def test_generator_reuses_scan_and_sees_new_files():
+    with tempfile.TemporaryDirectory() as root:
+        _make_tree(root)
+        index = ScanIndex()
+        outputs = []
+        for scan_index in (index, False):
+            generator = AiMdGenerator(os.path.join(root, "out.md")).set_project_propery("demo", root, scan_index=scan_index)
+            (generator.clear_text()
+             .merge_from_dir("src", as_title="src", should_include_suffixes=[".py"])
+             .merge_from_dir("src/pkg", as_title="pkg"))
+            outputs.append(open(os.path.join(root, "out.md"), encoding="utf-8").read())
+        assert outputs[0] == outputs[1]
+        assert index.stats()["walks"] == 1 and index.stats()["hits"] == 1
+
+        # 另一个生成器共享同一个索引；新增的文件改变了目录的 mtime，查询的目录会被重新遍历
+        with open(os.path.join(root, "src", "pkg", "new_module.py"), "w", encoding="utf-8") as f:
+            f.write("x = 1\n")
+        os.utime(os.path.join(root, "src", "pkg"), ns=(1, 1))
+        generator = AiMdGenerator(os.path.join(root, "out.md")).set_project_propery("demo", root, scan_index=index)
+        generator.clear_text().merge_from_dir("src/pkg", as_title="pkg")
+        assert "new_module.py" in open(os.path.join(root, "out.md"), encoding="utf-8").read()
+        assert index.stats()["stale"] == 1
+        assert generator.stats.caches["scan_index"]["walks"] == 2
+
+
+
+def test_gitignore_change_invalidates_listing():
+    with tempfile.TemporaryDirectory() as root:
+        _make_tree(root)
+        os.makedirs(os.path.join(root, ".git"))
+        index = ScanIndex()
+        output = os.path.join(root, "out.md")
+        generator = AiMdGenerator(output).set_project_propery("demo", root, scan_index=index)
+        generator.clear_text().merge_from_dir("src", as_title="src")
+        assert "skip_me.py" in open(output, encoding="utf-8").read()
+
+        # 原地修改 .gitignore 不改变 src 下目录的 mtime，由共享的 GitIgnoreMatcher 发现后不再命中旧的遍历结果
+        with open(os.path.join(root, ".gitignore"), "w", encoding="utf-8") as f:
+            f.write("__pycache__/\nskip_me.py\n")
+        generator.clear_text().merge_from_dir("src", as_title="src")
+        assert "skip_me.py" not in open(output, encoding="utf-8").read()
+        assert index.stats()["walks"] == 2 and index.stats()["hits"] == 0
+
+
+def test_index_prunes_excluded_dirs(monkeypatch):
+    with tempfile.TemporaryDirectory() as root:
+        root = os.path.realpath(root)
+        _make_tree(root)
+        for i in range(20):
+            path = os.path.join(root, "src", "node_modules", f"m{i}", "index.js")
+            os.makedirs(os.path.dirname(path))
+            with open(path, "w", encoding="utf-8") as f:
+                f.write("x")
+        scanned = []
+        real_scandir = os.scandir
+
+        def scandir(path):
+            scanned.append(path)
+            return real_scandir(path)
+
+        monkeypatch.setattr(os, "scandir", scandir)
+        index = ScanIndex()
+        excluded = os.path.join(root, "src", "node_modules")
+        for target in ("src", "src", "src/pkg"):
+            walker = PruningDirWalker(root, gitignore_matcher=GitIgnoreMatcher(root), excluded_dir_paths=["src/node_modules"])
+            indexed = index.wrap(walker)
+            files = list(indexed.walk(os.path.join(root, target)))
+            assert files == list(PruningDirWalker(root, excluded_dir_paths=["src/node_modules"],
+                                                  gitignore_matcher=GitIgnoreMatcher(root)).walk(os.path.join(root, target)))
+            assert indexed.stats.dirs_pruned_excluded == (1 if target == "src" else 0)
+        assert not any(str(p) == excluded or str(p).startswith(excluded + os.sep) for p in scanned)
+        assert index.stats()["walks"] == 1 and index.stats()["hits"] == 2
+
+        # 遍历时剪掉了 node_modules，不排除它的查询需要重新遍历
+        walker = PruningDirWalker(root, gitignore_matcher=GitIgnoreMatcher(root))
+        files = list(index.wrap(walker).walk(os.path.join(root, "src")))
+        assert sum(1 for f in files if "node_modules" in f.relative_path) == 20
+        assert index.stats()["walks"] == 2
@@ -0,0 +1,121 @@
+"""
+测试分片输出：只在文件块之间切分，每个分片都有阅读指南和分片索引，不超过上限，清单列出每个分片的文件
+"""
+import json
+import os
+import re
+import tempfile
+
+import pytest
+
+from nb_ai_context import AiMdGenerator
+from nb_ai_context.output_writer import UTF8_BOM
+from nb_ai_context.sharded_writer import ShardedOutputWriter
+from nb_ai_context.token_estimator import estimate_tokens
+
+
+def _make_project(root, big_file=False):
+    os.makedirs(os.path.join(root, "pkg"), exist_ok=True)
+    for i in range(30):
+        with open(os.path.join(root, "pkg", f"m{i:02d}.py"), "w", encoding="utf-8") as f:
+            f.write(f"def f{i}():\n    return {i}\n" + f"# 注释 line {i}\n" * (20 + i * 7))
+    if big_file:
+        with open(os.path.join(root, "pkg", "zz_big.md"), "w", encoding="utf-8") as f:
+            f.write("big line\n" * 20000)
+
+
+def _build(root, shard_max_tokens=None, shard_max_bytes=None):
+    generator = AiMdGenerator(os.path.join(root, "out", "demo.md")).set_project_propery("demo", root)
+    with generator.output_session(shard_max_tokens=shard_max_tokens, shard_max_bytes=shard_max_bytes):
+        generator.add_ai_reading_guide()
+        generator.merge_from_dir("pkg", as_title="codes", use_gitignore=False)
+        generator.merge_from_files(["pkg/m00.py"], as_title="again")
+    with open(os.path.join(root, "out", "demo.manifest.json"), encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _read_part(root, name):
+    with open(os.path.join(root, "out", name), "rb") as f:
+        return f.read()
+
+
+def test_shards_split_at_file_boundaries():
+    with tempfile.TemporaryDirectory() as root:
+        _make_project(root)
+        manifest = _build(root, shard_max_bytes=40000)
+        parts = manifest["parts"]
+        assert len(parts) > 2
+        all_files = []
+        for i, part in enumerate(parts):
+            data = _read_part(root, part["path"])
+            assert len(data) == part["bytes"] <= 40000
+            assert data.startswith(UTF8_BOM)
+            text = data[len(UTF8_BOM):].decode("utf-8")
+            assert "AI 上下文阅读协议" in text.split("# shard index")[0]
+            assert f"# shard index: part {i + 1} of {len(parts)} of `demo.md`" in text
+            # 文件块完整地落在一个分片里
+            starts = re.findall(r"--- \*\*start of file: (pkg/\S+)\*\*", text)
+            ends = re.findall(r"--- \*\*end of file: (pkg/\S+)\*\*", text)
+            assert starts == ends == [f["path"] for f in part["files"]]
+            if i > 0:
+                assert "(continued)" in text
+            all_files.extend((f["section"], f["path"]) for f in part["files"])
+        assert all_files == [("codes", f"pkg/m{i:02d}.py") for i in range(30)] + [("again", "pkg/m00.py")]
+        assert sorted(os.listdir(os.path.join(root, "out"))) == ["demo.manifest.json"] + [p["path"] for p in parts]
+
+        # 再次生成时分片变少，多余的旧分片被删除
+        fewer = _build(root, shard_max_bytes=80000)["parts"]
+        assert len(fewer) < len(parts)
+        assert sorted(os.listdir(os.path.join(root, "out"))) == ["demo.manifest.json"] + [p["path"] for p in fewer]
+
+
+def test_token_limit_and_oversized_file():
+    with tempfile.TemporaryDirectory() as root:
+        _make_project(root, big_file=True)
+        manifest = _build(root, shard_max_tokens=12000)
+        for part in manifest["parts"]:
+            text = _read_part(root, part["path"]).decode("utf-8-sig")
+            assert abs(estimate_tokens(text) - part["tokens"]) <= part["tokens"] * 0.01
+            if [f["path"] for f in part["files"]] == ["pkg/zz_big.md"]:
+                # 超过上限的单个文件独占一个分片
+                assert part["tokens"] > 12000
+            else:
+                assert part["tokens"] <= 12000
+
+
+def test_fenced_blocks_never_split():
+    with tempfile.TemporaryDirectory() as root:
+        _make_project(root)
+        os.makedirs(os.path.join(root, "docs"))
+        for i in range(15):
+            with open(os.path.join(root, "docs", f"d{i}.md"), "w", encoding="utf-8") as f:
+                f.write(f"# doc {i}\n" + "text\n" * (i * 10))
+        for limit in range(13000, 22001, 1500):
+            out = os.path.join(root, f"out{limit}")
+            generator = AiMdGenerator(os.path.join(out, "demo.md")).set_project_propery("demo", root)
+            with generator.output_session(shard_max_bytes=limit):
+                generator.add_ai_reading_guide()
+                generator.merge_from_dir("pkg", as_title="codes", use_gitignore=False)
+                generator.merge_from_dir("docs", as_title="docs", use_gitignore=False)
+            with open(os.path.join(out, "demo.manifest.json"), encoding="utf-8") as f:
+                parts = json.load(f)["parts"]
+            for part in parts:
+                with open(os.path.join(out, part["path"]), encoding="utf-8-sig") as f:
+                    text = f.read()
+                # 每个分片中的围栏都成对出现：文件树和文件块都没有被切开
+                assert len(re.findall(r"^`{3,}", text, re.M)) % 2 == 0, (limit, part["path"])
+                assert part["bytes"] <= limit
+
+
+def test_limit_smaller_than_preamble_and_byte_counts():
+    with tempfile.TemporaryDirectory() as root:
+        target = os.path.join(root, "out", "demo.md")
+        with pytest.raises(ValueError, match="shard_max_bytes=2000 is too small"):
+            ShardedOutputWriter(target, max_bytes=2000)
+        writer = ShardedOutputWriter(target, max_bytes=20000)
+        with pytest.raises(ValueError, match="too small"):
+            writer.set_preamble("指南\n" * 5000)
+        writer.truncate()
+        # 返回编码后的字节数
+        assert writer.write("中文") == len("中文".encode("utf-8"))
+        writer.commit()
@@ -0,0 +1,72 @@
+"""
+测试 token 预算：按优先级选择完整源码 / 只有元数据 / 占位说明，输出不超过预算
+"""
+import os
+import tempfile
+
+from nb_ai_context import AiMdGenerator
+from nb_ai_context.token_budget import BudgetEntry, TokenBudgetPlanner, MODE_FULL, MODE_METADATA, MODE_STUB
+from nb_ai_context.token_estimator import estimate_tokens
+
+
+def _make_project(root):
+    files = {
+        "pkg/__init__.py": "",
+        "pkg/core.py": "from pkg import util\n\nclass Core:\n    def run(self):\n        return util.helper()\n" + "# core\n" * 200,
+        "pkg/util.py": "def helper():\n    return 1\n" + "# util\n" * 200,
+        "pkg/a.py": "from pkg import util\n\ndef a():\n    pass\n" + "# a\n" * 400,
+        "pkg/b.py": "from pkg import util\n\ndef b():\n    pass\n" + "# b\n" * 400,
+        "pkg/page.html": "<div>页面</div>\n" * 2000,
+        "pkg/README.md": "# 说明\n" * 50,
+    }
+    for rel, content in files.items():
+        path = os.path.join(root, *rel.split("/"))
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(content)
+
+
+def _merge(root, name, token_budget):
+    generator = AiMdGenerator(os.path.join(root, name)).set_project_propery("demo", root)
+    generator.core_file_list = ["pkg/core.py"]
+    generator.clear_text().merge_from_dir("pkg", as_title="codes", use_gitignore=False, token_budget=token_budget)
+    return generator.read_text(encoding="utf-8-sig")
+
+
+def test_budget_fits_and_prefers_important_files():
+    with tempfile.TemporaryDirectory() as root:
+        _make_project(root)
+        unlimited = _merge(root, "unlimited.md", None)
+
+        everything = _merge(root, "everything.md", 10 ** 7)
+        assert "full source: 7, metadata only: 0, omitted: 0" in everything
+        lines = everything.split("\n")
+        summary_index = next(i for i, line in enumerate(lines) if line.startswith("> 🎯 token budget"))
+        # 除了预算说明行（和它后面的空行），与不设预算的输出完全相同
+        assert lines[:summary_index] + lines[summary_index + 2:] == unlimited.split("\n")
+
+        budget = estimate_tokens(unlimited) // 3
+        text = _merge(root, "budget.md", budget)
+        assert estimate_tokens(text) <= budget
+        assert "--- **start of file: pkg/core.py**" in text
+        assert "--- **start of file: pkg/util.py**" in text
+        assert "--- **omitted file: pkg/page.html**" in text
+        # 文件树仍然列出全部文件
+        assert "page.html" in text.split("--- **")[0]
+
+        tiny = _merge(root, "tiny.md", estimate_tokens(text.split("--- **")[0]) + 400)
+        assert "### 📄 Python File Metadata: `pkg/a.py`" in tiny
+        assert "--- **start of file: pkg/a.py**" not in tiny
+
+
+def test_planner_order():
+    entries = [
+        BudgetEntry("page.html", ".html", 50, None, 5),
+        BudgetEntry("leaf.py", ".py", 50, 20, 5),
+        BudgetEntry("hub.py", ".py", 50, 20, 5, centrality=3),
+        BudgetEntry("core.py", ".py", 80, 30, 5, is_core=True),
+    ]
+    plan = TokenBudgetPlanner(max_tokens=170, fixed_tokens=0).plan(entries)
+    assert [plan.mode_of(e.relative_path) for e in entries] == [MODE_STUB, MODE_METADATA, MODE_FULL, MODE_FULL]
+    assert plan.planned_tokens == 5 + 20 + 50 + 80
+    assert plan.mode_counts() == {MODE_FULL: 2, MODE_METADATA: 1, MODE_STUB: 1}
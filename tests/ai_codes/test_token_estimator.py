@@ -0,0 +1,64 @@
+"""
+测试 token 估算：与参考分词器数据的误差，以及按章节、按文件的 token 统计
+"""
+import json
+import os
+import tempfile
+from pathlib import Path
+
+from nb_ai_context import AiMdGenerator
+from nb_ai_context.token_estimator import TokenAccounting, estimate_tokens
+
+FIXTURE = Path(__file__).resolve().parents[2] / "benchmarks" / "fixtures" / "token_reference_cl100k.json"
+
+
+def test_estimate_matches_reference_fixture():
+    with open(FIXTURE, encoding="utf-8") as f:
+        samples = json.load(f)["samples"]
+    errors = [abs(estimate_tokens(s["text"]) - s["tokens"]) / s["tokens"] for s in samples]
+    assert sum(errors) / len(errors) < 0.08
+    total = sum(estimate_tokens(s["text"]) for s in samples) / sum(s["tokens"] for s in samples)
+    assert 0.97 < total < 1.03
+
+    assert estimate_tokens("") == 0
+    assert estimate_tokens("中文一个字一个 token") > estimate_tokens("abc")
+
+
+def test_accounting_by_section_and_file():
+    accounting = TokenAccounting()
+    accounting.add("before any section")
+    accounting.begin_section("codes").add("header\n").begin_file("a.py").add("x = 1\n" * 50).end_file()
+    accounting.begin_file("b.py").add("print('b')\n").end_file().add("footer")
+    report = accounting.report()
+    assert [s["title"] for s in report["sections"]] == ["", "codes"]
+    codes = report["sections"][1]
+    assert [path for path, _ in codes["files"]] == ["a.py", "b.py"]
+    assert codes["files"][0][1] > codes["files"][1][1] > 0
+    assert "a.py" in accounting.format_report(top_n=1) and "b.py" not in accounting.format_report(top_n=1)
+    assert accounting.reset().report() == {"total": 0, "sections": []}
+
+
+def test_generator_token_report():
+    with tempfile.TemporaryDirectory() as root:
+        for name, content in {"a.py": "def a():\n    return 1\n" * 30, "b.md": "# 说明\n中文文档\n" * 30}.items():
+            with open(os.path.join(root, name), "w", encoding="utf-8") as f:
+                f.write(content)
+        generator = AiMdGenerator(os.path.join(root, "out.md")).set_project_propery("demo", root)
+        generator.clear_text().add_ai_reading_guide()
+        generator.merge_from_files(["b.md"], as_title="docs")
+        generator.merge_from_files_with_metadata(["a.py", "b.md"], as_title="codes")
+
+        report = generator.get_token_report()
+        sections = {s["title"]: s for s in report["sections"]}
+        assert list(sections) == ["ai reading guide", "docs", "codes"]
+        assert [path for path, _ in sections["codes"]["files"]] == ["a.py", "b.md"]
+        # 文件的 token 数不超过所在章节，章节之和等于总数（按块累计，有取整误差）
+        for section in sections.values():
+            assert sum(tokens for _, tokens in section["files"]) <= section["tokens"] + len(section["files"])
+        assert abs(sum(s["tokens"] for s in sections.values()) - report["total"]) <= len(sections)
+        # 逐块累计的结果与整个文件一次估算的结果接近
+        whole = estimate_tokens(generator.read_text(encoding="utf-8-sig"))
+        assert abs(report["total"] - whole) <= whole * 0.02
+
+        generator.clear_text()
+        assert generator.get_token_report()["total"] == 0
@@ -0,0 +1,248 @@
+"""
+测试监视模式：只有符合 merge_from_dir 规则的变化才触发重新生成，没有变化的目录章节整段复制，结果与完整生成逐字节相同
+"""
+import errno
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import pytest
+
+from nb_ai_context import AiMdGenerator
+from nb_ai_context import watcher
+from nb_ai_context.dir_walker import PruningDirWalker
+from nb_ai_context.gitignore_matcher import GitIgnoreMatcher
+
+
+def _write(root, rel, content):
+    path = os.path.join(root, *rel.split("/"))
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(content)
+
+
+def _make_project(root):
+    os.makedirs(os.path.join(root, ".git"))
+    _write(root, ".gitignore", "*.log\nbuild/\n")
+    for i in range(10):
+        _write(root, f"pkg/m{i}.py", f"def f{i}(x: int = {i}) -> int:\n    '''函数 {i}'''\n    return x\n")
+    _write(root, "pkg/sub/deep.py", "VALUE = 1\n")
+    _write(root, "docs/a.md", "doc a\n")
+    _write(root, "README.md", "readme\n")
+
+
+def _build(generator):
+    generator.merge_from_files(["README.md"], as_title="root files")
+    generator.merge_from_dir("pkg", as_title="codes", excluded_dir_name_list=["pkg/skip"])
+    generator.merge_from_dir("docs", as_title="docs")
+
+
+def _clean_build(root):
+    generator = AiMdGenerator(os.path.join(root, "out", "clean.md")).set_project_propery("demo", root)
+    with generator.output_session():
+        _build(generator)
+    return generator.read_bytes()
+
+
+def _watchers():
+    kinds = ["polling"]
+    if sys.platform.startswith("linux"):
+        kinds.append("inotify")
+    return kinds
+
+
+@pytest.mark.parametrize("kind", _watchers())
+def test_watchers_report_changes(kind):
+    with tempfile.TemporaryDirectory() as root:
+        _make_project(root)
+        targets = watcher.WatchTargets().add_dir(os.path.join(root, "pkg"), PruningDirWalker(root))
+        source_watcher = watcher.create_watcher(targets, use_inotify=kind == "inotify", poll_interval=0.05)
+        try:
+            assert type(source_watcher).__name__ == ("InotifyWatcher" if kind == "inotify" else "PollingWatcher")
+            assert source_watcher.wait(0.2) == []
+            _write(root, "pkg/m1.py", "changed = True\n")
+            # 新建目录里的文件也要能发现
+            _write(root, "pkg/new_dir/n.py", "n = 1\n")
+            changes = set()
+            deadline = time.monotonic() + 5
+            while time.monotonic() < deadline and os.path.join(root, "pkg", "new_dir", "n.py") not in changes:
+                changes.update(path for path, _ in source_watcher.wait(0.2))
+            assert os.path.join(root, "pkg", "m1.py") in changes
+            assert os.path.join(root, "pkg", "new_dir", "n.py") in changes
+        finally:
+            source_watcher.close()
+
+
+def test_watch_targets_follow_merge_from_dir_rules():
+    with tempfile.TemporaryDirectory() as root:
+        _make_project(root)
+        root = os.path.realpath(root)
+        walker = PruningDirWalker(
+            root, gitignore_matcher=GitIgnoreMatcher(root), excluded_dir_paths=[os.path.join(root, "pkg", "skip")],
+            should_include_suffixes=[".py"],
+        )
+        output = os.path.join(root, "pkg", "out.md")
+        targets = watcher.WatchTargets(ignored_prefixes=[output]).add_dir(os.path.join(root, "pkg"), walker)
+        targets.add_files([os.path.join(root, "README.md")])
+
+        def relevant(rel, is_dir=False):
+            return targets.is_relevant(os.path.join(root, *rel.split("/")), is_dir)
+
+        assert relevant("pkg/m1.py")
+        assert relevant("pkg/sub/deep.py")
+        assert relevant("pkg/sub", is_dir=True)
+        assert relevant("README.md")
+        assert relevant(".gitignore")
+        assert not relevant("pkg/notes.md")  # 后缀不符合
+        assert not relevant("pkg/debug.log")  # gitignore
+        assert not relevant("pkg/build/gen.py")  # gitignore 的目录
+        assert not relevant("pkg/skip/x.py")  # 排除的目录
+        assert not relevant("docs/a.md")  # 不在监视范围内
+        assert not relevant("pkg/out.md.manifest.json")  # 输出文件自身
+        assert os.path.join(root, "pkg", "sub") in targets.watch_dirs()
+
+
+def test_watch_rebuilds_only_on_relevant_changes():
+    with tempfile.TemporaryDirectory() as root:
+        _make_project(root)
+        generator = AiMdGenerator(os.path.join(root, "out", "demo.md")).set_project_propery("demo", root)
+        stop = threading.Event()
+        builds = []
+
+        def build(g):
+            _build(g)
+            builds.append(g.get_token_report())
+
+        thread = threading.Thread(target=generator.watch, args=(build,), kwargs=dict(
+            debounce=0.05, poll_interval=0.05, stop_event=stop,
+        ))
+        thread.start()
+        try:
+            def wait_for_build(count):
+                deadline = time.monotonic() + 10
+                while len(builds) < count and time.monotonic() < deadline:
+                    time.sleep(0.02)
+                assert len(builds) == count
+
+            wait_for_build(1)
+            # 等 commit 完成（build 回调在 commit 之前执行）
+            time.sleep(0.3)
+            assert generator.read_bytes() == _clean_build(root)
+
+            # 被 gitignore 的文件不触发重新生成
+            _write(root, "pkg/debug.log", "log\n")
+            time.sleep(0.5)
+            assert len(builds) == 1
+
+            # 修改 pkg 里的文件：docs 章节整段复制，结果与完整生成相同
+            _write(root, "pkg/m3.py", "def changed():\n    return '改了'\n")
+            wait_for_build(2)
+            # 等 commit 完成（build 回调在 commit 之前执行）
+            time.sleep(0.3)
+            assert generator.read_bytes() == _clean_build(root)
+
+            # 新增目录和文件
+            _write(root, "pkg/new_dir/n.py", "n = 1\n")
+            wait_for_build(3)
+            time.sleep(0.3)
+            assert generator.read_bytes() == _clean_build(root)
+            assert b"pkg/new_dir/n.py" in generator.read_bytes()
+        finally:
+            stop.set()
+            thread.join(10)
+        assert not thread.is_alive()
+
+
+@pytest.mark.skipif(not sys.platform.startswith("linux"), reason="inotify is only available on Linux")
+def test_watch_falls_back_to_polling_when_watch_limit_is_reached(monkeypatch):
+    with tempfile.TemporaryDirectory() as root:
+        _make_project(root)
+        generator = AiMdGenerator(os.path.join(root, "out", "demo.md")).set_project_propery("demo", root)
+        stop = threading.Event()
+        builds = []
+        started = threading.Event()
+        real_add_watch = watcher.InotifyWatcher._add_watch
+        real_create_watcher = watcher.create_watcher
+        limit_errors = []
+
+        def add_watch(self, directory):
+            # 启动之后不能再加入新的 watch
+            if started.is_set() and directory not in self._dir_to_wd:
+                limit_errors.append(directory)
+                raise watcher.WatchLimitError(errno.ENOSPC, f"inotify watch limit reached while watching {directory}")
+            return real_add_watch(self, directory)
+
+        def create_watcher(*args, **kwargs):
+            source_watcher = real_create_watcher(*args, **kwargs)
+            started.set()
+            return source_watcher
+
+        monkeypatch.setattr(watcher.InotifyWatcher, "_add_watch", add_watch)
+        monkeypatch.setattr(watcher, "create_watcher", create_watcher)
+
+        def build(g):
+            _build(g)
+            builds.append(g.get_token_report())
+
+        thread = threading.Thread(target=generator.watch, args=(build,), kwargs=dict(
+            debounce=0.05, poll_interval=0.05, stop_event=stop,
+        ))
+        thread.start()
+        try:
+            def wait_for_build(count):
+                deadline = time.monotonic() + 10
+                while len(builds) < count and time.monotonic() < deadline:
+                    time.sleep(0.02)
+                assert len(builds) == count
+
+            wait_for_build(1)
+            assert started.wait(10)
+            # inotify 自动监视新建的目录时超过限制：换成轮询并完整重新生成
+            _write(root, "pkg/new_dir/n.py", "n = 1\n")
+            wait_for_build(2)
+            assert limit_errors and thread.is_alive()
+            time.sleep(0.3)
+            assert b"pkg/new_dir/n.py" in generator.read_bytes()
+
+            # 之后由轮询发现新目录中的变化
+            _write(root, "pkg/new_dir/deeper/m.py", "m = 1\n")
+            wait_for_build(3)
+            time.sleep(0.3)
+            assert generator.read_bytes() == _clean_build(root)
+            assert len(limit_errors) == 1
+        finally:
+            stop.set()
+            thread.join(10)
+        assert not thread.is_alive()
+
+
+def test_reused_section_keeps_token_report():
+    with tempfile.TemporaryDirectory() as root:
+        _make_project(root)
+        generator = AiMdGenerator(os.path.join(root, "out", "demo.md")).set_project_propery("demo", root)
+        generator._watch_build(_build, None)
+        full_report = generator.get_token_report()
+        _write(root, "README.md", "readme changed\n")
+        generator._watch_build(_build, {os.path.join(root, "README.md")})
+        with generator.output_session():
+            _build(generator)
+        assert generator.get_token_report()["sections"][1:] == full_report["sections"][1:]
+
+
+def test_cli_once():
+    with tempfile.TemporaryDirectory() as root:
+        _make_project(root)
+        output = os.path.join(root, "out", "cli.md")
+        subprocess.run(
+            [sys.executable, "-m", "nb_ai_context", "watch", "--once", "--output", output, "--project-name", "demo",
+             "--project-root", root, "--file", "README.md", "--dir", "pkg:codes", "--suffix", ".py"],
+            check=True, cwd=os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))),
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+        )
+        with open(output, encoding="utf-8-sig") as f:
+            text = f.read()
+        assert "# markdown content namespace: codes" in text
+        assert "pkg/sub/deep.py" in text